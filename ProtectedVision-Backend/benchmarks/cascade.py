@@ -0,0 +1,134 @@
+"""
+Benchmark of the cascaded image detection
+
+Analyzes a mix of synthetic photos with YOLO, OCR and transformer models
+active, with the cascade gate off and on:
+
+- ``benign``: photos with nothing sensitive in them
+- ``cards``: photos of cards
+- ``text``: photos of printed pages
+
+and reports the mean latency per image of each kind, which cascade stage
+decided, and how many sensitive images the gate wrongly let exit. The
+models' simulated latency stands in for their cost and is kept on unless
+``--no-simulate-delay`` is given, which leaves only real CPU time.
+
+Usage:
+    python benchmarks/cascade.py
+    python benchmarks/cascade.py --images 30 --width 1920 --height 1080 --output cascade.json
+"""
+
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+from collections import Counter
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'core.settings')
+
+import django
+
+django.setup()
+
+# Import Django modules after setting up Django
+import cv2
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import connection
+from django.test.utils import override_settings, setup_test_environment
+
+from benchmarks.run_benchmarks import summarize_ms
+from benchmarks.synthetic import make_benign_frame, make_frame, make_text_frame
+from detection.detection_service import DetectionService
+from detection.models import DetectionJob, DetectionModel
+from documents.models import Document
+from users.models import User
+
+KINDS = {
+    'benign': make_benign_frame,
+    'cards': make_frame,
+    'text': make_text_frame,
+}
+
+
+def run(documents, enabled):
+    results = {}
+    cascade = {**getattr(settings, 'CASCADE', {}), 'ENABLED': enabled}
+    with override_settings(CASCADE=cascade):
+        for kind, kind_documents in documents.items():
+            durations, stages = [], Counter()
+            for document in kind_documents:
+                start = time.perf_counter()
+                analysis = DetectionService().analyze_document(document.id)
+                durations.append(time.perf_counter() - start)
+                assert 'error' not in analysis, analysis
+                job = DetectionJob.objects.filter(document=document).latest('id')
+                stages[(job.cascade or {}).get('stage', 'off')] += 1
+            results[kind] = {**summarize_ms(durations), 'stages': dict(stages)}
+    total = sum(len(kind_documents) for kind_documents in documents.values())
+    results['mean_ms'] = round(
+        sum(results[kind]['mean_ms'] * len(documents[kind]) for kind in documents) / total, 1
+    )
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--images', type=int, default=10, help="Images of each kind")
+    parser.add_argument('--width', type=int, default=1920, help="Image width")
+    parser.add_argument('--height', type=int, default=1080, help="Image height")
+    parser.add_argument('--no-simulate-delay', action='store_true', help="Drop the models' simulated latency")
+    parser.add_argument('--output', help="Write the JSON results here")
+    args = parser.parse_args()
+
+    setup_test_environment()
+    work_dir = tempfile.mkdtemp(prefix='pv-cascade-benchmark-')
+    settings.DATABASES['default'].setdefault('TEST', {})['NAME'] = os.path.join(work_dir, 'benchmark.sqlite3')
+    old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+
+    caches = {'default': {**settings.CACHES['default'], 'LOCATION': os.path.join(work_dir, 'cache')}}
+    ml_models = {**settings.ML_MODELS, 'SIMULATE_PROCESSING_DELAY': not args.no_simulate_delay}
+    results = {}
+    try:
+        with override_settings(MEDIA_ROOT=os.path.join(work_dir, 'media'), CACHES=caches, ML_MODELS=ml_models):
+            user = User.objects.create_user(username='cascade', email='cascade@example.com', password='x')
+            for name, model_type in (('yolo', 'yolo'), ('ocr', 'ocr'), ('transformer', 'transformer')):
+                DetectionModel.objects.create(name=name, model_type=model_type, version='1')
+            documents = {}
+            for kind, make in KINDS.items():
+                documents[kind] = []
+                for seed in range(args.images):
+                    ok, buffer = cv2.imencode('.jpg', make(args.width, args.height, seed))
+                    document = Document(user=user, title=f'{kind} {seed}', file_type='image')
+                    document.file.save(f'{kind}_{seed}.jpg', ContentFile(buffer.tobytes()))
+                    documents[kind].append(document)
+            DetectionService.preload()
+
+            for name, enabled in (('off', False), ('on', True)):
+                results[name] = run(documents, enabled)
+                print(f"cascade {name}: mean {results[name]['mean_ms']:.1f}ms per image")
+                for kind in KINDS:
+                    print(
+                        f"  {kind:<7} mean {results[name][kind]['mean_ms']:>8.1f}ms  "
+                        f"p95 {results[name][kind]['p95_ms']:>8.1f}ms  decided by {results[name][kind]['stages']}"
+                    )
+            missed = sum(results['on'][kind]['stages'].get('gate', 0) for kind in ('cards', 'text'))
+            results['missed_sensitive_images'] = missed
+            print(f"Sensitive images that exited at the gate: {missed} of {2 * args.images}")
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
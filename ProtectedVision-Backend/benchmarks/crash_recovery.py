@@ -0,0 +1,197 @@
+"""
+Crash-recovery harness for the detection job scheduler
+
+Queues a mix of videos, PDFs and images, runs them with several
+``run_detection_workers`` processes and SIGKILLs workers at random moments,
+starting replacements as it goes. Once the queue drains it checks that:
+
+- every job completed and none is left pending or processing,
+- every document got exactly one scan (no job ran to completion twice),
+- killed video/PDF jobs resumed from their checkpoint instead of starting over.
+
+Everything runs against a throwaway database and media directory.
+
+Usage:
+    python benchmarks/crash_recovery.py
+    python benchmarks/crash_recovery.py --videos 6 --pdfs 6 --workers 3 --seed 7
+"""
+
+import argparse
+import os
+import random
+import shutil
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SETTINGS_TEMPLATE = """
+from core.settings import *
+
+DATABASES = {{
+    'default': {{
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': {database!r},
+        'OPTIONS': {{'timeout': 30}},
+    }}
+}}
+MEDIA_ROOT = {media!r}
+CACHES = {{'default': {{**CACHES['default'], 'LOCATION': {cache!r}}}}}
+ML_MODELS = {{**ML_MODELS, 'SIMULATE_PROCESSING_DELAY': True}}
+JOB_SCHEDULER = {{
+    **JOB_SCHEDULER,
+    'POLL_SECONDS': 0.5,
+    'HEARTBEAT_TIMEOUT_SECONDS': 3,
+    'RECOVERY_INTERVAL_SECONDS': 1,
+    'MAX_ATTEMPTS': 100,
+}}
+PROGRESS_EVENTS = {{**PROGRESS_EVENTS, 'CHECKPOINT_INTERVAL_SECONDS': 0}}
+"""
+
+
+def prepare_environment(work_dir):
+    """
+    Write a settings module pointing at a scratch database and media root
+    """
+    with open(os.path.join(work_dir, 'crash_settings.py'), 'w') as f:
+        f.write(SETTINGS_TEMPLATE.format(
+            database=os.path.join(work_dir, 'crash.sqlite3'),
+            media=os.path.join(work_dir, 'media'),
+            cache=os.path.join(work_dir, 'cache'),
+        ))
+    os.environ['DJANGO_SETTINGS_MODULE'] = 'crash_settings'
+    os.environ['PYTHONPATH'] = os.pathsep.join(
+        [work_dir, BACKEND_DIR] + [p for p in os.environ.get('PYTHONPATH', '').split(os.pathsep) if p]
+    )
+    sys.path[:0] = [work_dir, BACKEND_DIR]
+
+
+def start_worker(log):
+    return subprocess.Popen(
+        [sys.executable, 'manage.py', 'run_detection_workers', '--workers', '1', '--fast-lane-workers', '0'],
+        cwd=BACKEND_DIR, stdout=log, stderr=subprocess.STDOUT
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--videos', type=int, default=4, help="Videos to analyze")
+    parser.add_argument('--pdfs', type=int, default=4, help="PDFs to analyze")
+    parser.add_argument('--images', type=int, default=4, help="Images to analyze")
+    parser.add_argument('--workers', type=int, default=2, help="Worker processes running at a time")
+    parser.add_argument('--min-kill-interval', type=float, default=1.0, help="Shortest time between kills")
+    parser.add_argument('--max-kill-interval', type=float, default=4.0, help="Longest time between kills")
+    parser.add_argument('--timeout', type=float, default=300, help="Give up after this many seconds")
+    parser.add_argument('--seed', type=int, default=0, help="Seed for file contents and kill timing")
+    parser.add_argument('--keep', action='store_true', help="Keep the scratch directory")
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp(prefix='pv-crash-')
+    prepare_environment(work_dir)
+
+    import django
+
+    django.setup()
+
+    # Import Django modules after setting up Django
+    from django.core.files.base import ContentFile
+    from django.core.management import call_command
+    from django.db.models import Count
+
+    from benchmarks.synthetic import make_image, make_pdf, make_video
+    from detection.models import DetectionModel, DetectionJob
+    from detection.scheduler import get_scheduler
+    from documents.models import Document, DocumentScan
+    from users.models import User
+
+    rng = random.Random(args.seed)
+    workers = []
+    kills = 0
+    log = open(os.path.join(work_dir, 'workers.log'), 'wb')
+    try:
+        call_command('migrate', run_syncdb=True, verbosity=0)
+        DetectionModel.objects.create(name='Crash test detector', model_type='yolo', version='1.0')
+        user = User.objects.create_user(username='crash', email='crash@benchmark.local', password='crash-password')
+
+        files = (
+            [('video', f'video_{i}.avi', make_video(4, seed=args.seed + i)) for i in range(args.videos)]
+            + [('pdf', f'pdf_{i}.pdf', make_pdf(8, seed=args.seed + i)) for i in range(args.pdfs)]
+            + [('image', f'image_{i}.jpg', make_image(0.3, seed=args.seed + i)) for i in range(args.images)]
+        )
+        documents = [
+            Document.objects.create(user=user, title=name, file=ContentFile(content, name=name), file_type=file_type)
+            for file_type, name, content in files
+        ]
+        # Let one user run as many jobs as there are workers
+        get_scheduler().enqueue(documents)
+        print(f"Queued {len(documents)} jobs in {work_dir}")
+
+        start = time.monotonic()
+        workers = [start_worker(log) for _ in range(args.workers)]
+        while DetectionJob.objects.exclude(status__in=['completed', 'failed']).exists():
+            if time.monotonic() - start > args.timeout:
+                print("Timed out waiting for the queue to drain")
+                break
+            time.sleep(rng.uniform(args.min_kill_interval, args.max_kill_interval))
+            victim = rng.choice(workers)
+            victim.send_signal(signal.SIGKILL)
+            victim.wait()
+            kills += 1
+            workers[workers.index(victim)] = start_worker(log)
+            done = DetectionJob.objects.filter(status='completed').count()
+            print(f"  killed worker {victim.pid} ({done}/{len(documents)} jobs completed)")
+        elapsed = time.monotonic() - start
+
+        # Summarize
+        jobs = list(DetectionJob.objects.select_related('document'))
+        statuses = {}
+        for job in jobs:
+            statuses[job.status] = statuses.get(job.status, 0) + 1
+        scans = dict(
+            DocumentScan.objects.values_list('document').annotate(total=Count('id')).order_by()
+        )
+        duplicated = [doc_id for doc_id, total in scans.items() if total > 1]
+        missing = [document.id for document in documents if document.id not in scans]
+
+        expected_inference = {'video': 5, 'pdf': 4}
+        retried = [job for job in jobs if job.attempts > 1]
+        resumed = []
+        for job in retried:
+            expected = expected_inference.get(job.document.file_type)
+            stages = (job.stage_timings or {}).get('stages', {})
+            inference = stages.get('inference', {}).get('seconds')
+            if expected and inference is not None and inference < expected * 0.9:
+                resumed.append(job)
+
+        print(f"\n{kills} workers killed in {elapsed:.1f}s")
+        print(f"Job statuses: {statuses}")
+        print(f"Jobs retried after a crash: {len(retried)}, resumed from a checkpoint: {len(resumed)}")
+        print(f"Documents without a scan: {missing}, with duplicate scans: {duplicated}")
+
+        problems = []
+        if statuses.get('completed', 0) != len(documents):
+            problems.append("not every job completed")
+        if missing or duplicated:
+            problems.append("documents must end up with exactly one scan")
+        if retried and not resumed and any(job.document.file_type in expected_inference for job in retried):
+            problems.append("no retried video/PDF job resumed from its checkpoint")
+        if problems:
+            print("FAILED: " + "; ".join(problems))
+            sys.exit(1)
+        print("OK")
+    finally:
+        for worker in workers:
+            worker.kill()
+            worker.wait()
+        log.close()
+        if args.keep:
+            print(f"Scratch directory kept at {work_dir}")
+        else:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
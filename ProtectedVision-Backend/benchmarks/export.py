@@ -0,0 +1,164 @@
+"""
+Benchmark of the streaming history export
+
+Generates synthetic histories of growing size for single users and streams
+each one through documents.export.export_chunks() in every output format,
+reporting throughput (rows and megabytes per second), the gzip ratio and the
+peak Python memory allocated while streaming. The peak should stay flat as
+the history grows; it grows with the history only if something buffers it.
+
+With ``--http`` the largest history is also downloaded through the API with
+the test client, to include the view, authentication and response overhead.
+
+Usage:
+    python benchmarks/export.py
+    python benchmarks/export.py --sizes 10000 100000 500000 --output export.json
+"""
+
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'core.settings')
+
+import django
+
+django.setup()
+
+# Import Django modules after setting up Django
+from django.conf import settings
+from django.db import connection
+from django.test.utils import override_settings, setup_test_environment
+from rest_framework.test import APIClient
+
+from documents.data_generator import SyntheticDataGenerator
+from documents.export import EXPORT_ROWS, export_chunks
+from documents.models import Document
+from users.models import User
+
+OUTPUTS = [('ndjson', False), ('csv', False), ('ndjson', True), ('csv', True)]
+
+
+def stream(user, output, gzip):
+    """
+    Consume one export, returning seconds, bytes and the allocation peak
+
+    Tracing allocations slows Python down several times, so the export is
+    timed in one pass and its memory measured in a second one.
+    """
+    start = time.perf_counter()
+    size = 0
+    for chunk in export_chunks(user, output, gzip):
+        size += len(chunk)
+    seconds = time.perf_counter() - start
+
+    tracemalloc.start()
+    for chunk in export_chunks(user, output, gzip):
+        pass
+    _current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return seconds, size, peak
+
+
+def rows_read(output):
+    return EXPORT_ROWS.value(output=output)
+
+
+def bench(user):
+    results = {}
+    plain_sizes = {}
+    for output, gzip in OUTPUTS:
+        label = output + ('.gz' if gzip else '')
+        before = rows_read(output)
+        seconds, size, peak = stream(user, output, gzip)
+        rows = (rows_read(output) - before) // 2
+        results[label] = {
+            'rows': rows,
+            'seconds': round(seconds, 3),
+            'rows_per_second': round(rows / seconds),
+            'mb': round(size / 1e6, 2),
+            'mb_per_second': round(size / 1e6 / seconds, 1),
+            'peak_alloc_mb': round(peak / 1e6, 2),
+        }
+        if gzip:
+            results[label]['gzip_ratio'] = round(plain_sizes[output] / size, 1)
+        else:
+            plain_sizes[output] = size
+        result = results[label]
+        print(
+            f"    {label:<10}{result['rows']:>9} rows {result['seconds']:>7.2f}s "
+            f"{result['rows_per_second']:>8} rows/s {result['mb']:>8.1f} MB "
+            f"{result['mb_per_second']:>6.1f} MB/s  peak {result['peak_alloc_mb']:.2f} MB"
+            + (f"  ratio {result['gzip_ratio']}x" if gzip else '')
+        )
+    return results
+
+
+def bench_http(user):
+    """
+    Download the CSV export through the API
+    """
+    client = APIClient()
+    client.force_authenticate(user)
+    start = time.perf_counter()
+    response = client.get('/api/documents/export/', {'output': 'csv'})
+    size = sum(len(chunk) for chunk in response.streaming_content)
+    seconds = time.perf_counter() - start
+    result = {
+        'status': response.status_code,
+        'seconds': round(seconds, 3),
+        'mb': round(size / 1e6, 2),
+        'mb_per_second': round(size / 1e6 / seconds, 1),
+    }
+    print(f"  HTTP csv: {result['mb']} MB in {result['seconds']}s ({result['mb_per_second']} MB/s)")
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000],
+                        help="Documents in each exported history")
+    parser.add_argument('--http', action='store_true', help="Also download the largest history through the API")
+    parser.add_argument('--output', help="Write the JSON results here")
+    args = parser.parse_args()
+
+    setup_test_environment()
+    work_dir = tempfile.mkdtemp(prefix='pv-export-benchmark-')
+    settings.DATABASES['default'].setdefault('TEST', {})['NAME'] = os.path.join(work_dir, 'benchmark.sqlite3')
+    old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+
+    caches = {'default': {**settings.CACHES['default'], 'LOCATION': os.path.join(work_dir, 'cache')}}
+    results = {'histories': {}}
+    try:
+        with override_settings(MEDIA_ROOT=os.path.join(work_dir, 'media'), CACHES=caches):
+            with connection.cursor() as cursor:
+                cursor.execute('PRAGMA synchronous = OFF')
+            for seed, size in enumerate(sorted(args.sizes)):
+                # One user per history, so each export reads exactly its own
+                first_id = (User.objects.order_by('-id').values_list('id', flat=True).first() or 0) + 1
+                SyntheticDataGenerator(seed=seed, documents_per_user=size).generate(1)
+                user = User.objects.get(id__gte=first_id)
+                documents = Document.objects.filter(user=user).count()
+                print(f"History of {documents} documents:")
+                results['histories'][documents] = bench(user)
+            if args.http:
+                results['http'] = bench_http(user)
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
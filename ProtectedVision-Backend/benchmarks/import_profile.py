@@ -0,0 +1,163 @@
+"""
+Import-time profile of the backend's process types
+
+Starts a fresh interpreter per target with ``python -X importtime`` and
+reports the wall time to get ready, the slowest imports and, for a list of
+known heavy packages (OpenCV, numpy, Pillow, drf_yasg), the chain of imports
+that pulled each one in. Targets:
+
+- ``command``: django.setup(), what every management command pays
+- ``api``: django.setup() plus the URLconf, what a web process pays before
+  its first request
+- ``worker``: django.setup() plus loading the detection pipeline
+
+Usage:
+    python benchmarks/import_profile.py
+    python benchmarks/import_profile.py --target api --top 30
+    python benchmarks/import_profile.py --check   # fail if API processes import OpenCV/numpy/Pillow
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+TARGETS = {
+    'command': "import django; django.setup()",
+    'api': (
+        "import django; django.setup(); "
+        "from django.conf import settings; from django.urls import get_resolver; "
+        "get_resolver(settings.ROOT_URLCONF).url_patterns"
+    ),
+    'worker': (
+        "import django; django.setup(); "
+        "from detection.detection_service import DetectionService; DetectionService.preload()"
+    ),
+}
+
+HEAVY_MODULES = ('cv2', 'numpy', 'PIL', 'drf_yasg', 'coreapi', 'pkg_resources')
+
+# Modules API processes must not load at startup
+API_FORBIDDEN = ('cv2', 'numpy', 'PIL')
+
+
+def profile(code, settings_module):
+    """
+    Run ``code`` in a fresh interpreter under -X importtime
+
+    Returns:
+        tuple: Wall seconds, and (depth, module, self_us, cumulative_us) rows
+            in the order Python reports them (children before parents)
+    """
+    env = dict(os.environ, DJANGO_SETTINGS_MODULE=settings_module, PYTHONPATH=BACKEND_DIR)
+    start = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', code],
+        cwd=BACKEND_DIR, env=env, capture_output=True, text=True
+    )
+    wall = time.perf_counter() - start
+    if result.returncode:
+        raise RuntimeError(result.stderr[-2000:])
+
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|', 2)
+        depth = (len(name) - len(name.lstrip())) // 2
+        rows.append((depth, name.strip(), int(self_us), int(cumulative_us)))
+    return wall, rows
+
+
+def import_chain(rows, index):
+    """
+    Modules that led to the import at ``rows[index]``, outermost last
+    """
+    depth, name = rows[index][0], rows[index][1]
+    chain = [name]
+    for row_depth, row_name, _self, _cumulative in rows[index + 1:]:
+        if row_depth < depth:
+            chain.append(row_name)
+            depth = row_depth
+            if depth <= 1:
+                break
+    return chain
+
+
+def summarize(rows, top):
+    loaded = {name for _depth, name, _self, _cumulative in rows}
+    heavy = {}
+    for index, (depth, name, _self, cumulative) in enumerate(rows):
+        if name in HEAVY_MODULES and name not in heavy:
+            heavy[name] = {
+                'cumulative_ms': round(cumulative / 1000, 1),
+                'imported_by': ' <- '.join(import_chain(rows, index)[1:]),
+            }
+    first_party = [
+        row for row in rows
+        if row[1].split('.')[0] in ('core', 'users', 'documents', 'detection')
+    ]
+    return {
+        'modules': len(loaded),
+        'heavy': heavy,
+        'slowest_self': [
+            {'module': name, 'self_ms': round(self_us / 1000, 1)}
+            for _depth, name, self_us, _cumulative in sorted(rows, key=lambda row: -row[2])[:top]
+        ],
+        'slowest_first_party': [
+            {'module': name, 'cumulative_ms': round(cumulative / 1000, 1)}
+            for _depth, name, _self, cumulative in sorted(first_party, key=lambda row: -row[3])[:top]
+        ],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--target', choices=sorted(TARGETS), action='append', help="Process type(s) to profile")
+    parser.add_argument('--settings', default='core.settings', help="Settings module to load")
+    parser.add_argument('--top', type=int, default=15, help="Rows in the slowest-import tables")
+    parser.add_argument('--repeats', type=int, default=3, help="Runs per target; the fastest wall time is kept")
+    parser.add_argument('--check', action='store_true', help="Exit non-zero if the api target imports OpenCV, numpy or Pillow")
+    parser.add_argument('--output', help="Write the JSON results here")
+    args = parser.parse_args()
+
+    results = {}
+    for target in args.target or ['command', 'api', 'worker']:
+        runs = [profile(TARGETS[target], args.settings) for _ in range(args.repeats)]
+        wall, rows = min(runs, key=lambda run: run[0])
+        results[target] = {'wall_ms': round(wall * 1000, 1), **summarize(rows, args.top)}
+
+        summary = results[target]
+        print(f"\n== {target}: {summary['wall_ms']:.0f} ms to ready, {summary['modules']} modules")
+        for name in HEAVY_MODULES:
+            info = summary['heavy'].get(name)
+            if info:
+                via = f"via {info['imported_by']}" if info['imported_by'] else "imported directly"
+                print(f"  {name:<10}{info['cumulative_ms']:>8.1f} ms  {via}")
+            else:
+                print(f"  {name:<10}{'-':>8}     not imported")
+        print("  slowest first-party imports (cumulative):")
+        for row in summary['slowest_first_party']:
+            print(f"    {row['cumulative_ms']:>8.1f} ms  {row['module']}")
+        print("  slowest imports (self):")
+        for row in summary['slowest_self']:
+            print(f"    {row['self_ms']:>8.1f} ms  {row['module']}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"\nResults written to {args.output}")
+
+    if args.check and 'api' in results:
+        leaked = [name for name in API_FORBIDDEN if name in results['api']['heavy']]
+        if leaked:
+            print(f"FAILED: API processes import {', '.join(leaked)} at startup")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
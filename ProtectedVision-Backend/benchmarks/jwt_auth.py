@@ -0,0 +1,132 @@
+"""
+Benchmark of JWT authentication on the document list endpoint
+
+Sends authenticated GET /api/documents/ requests with a real Bearer token,
+first through simplejwt's JWTAuthentication (one user query per request)
+and then through users.authentication.CachedJWTAuthentication, and reports
+requests per second for each. It finishes by logging out and checking that
+the revoked access token is refused.
+
+Usage:
+    python benchmarks/jwt_auth.py
+    python benchmarks/jwt_auth.py --requests 2000 --documents 50 --output auth.json
+"""
+
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'core.settings')
+
+import django
+
+django.setup()
+
+# Import Django modules after setting up Django
+from django.conf import settings
+from django.db import connection
+from django.test.utils import CaptureQueriesContext, override_settings, setup_test_environment
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from benchmarks.run_benchmarks import seed_api_dataset, summarize_ms
+from documents.views import DocumentViewSet
+from users.authentication import USER_CACHE_REQUESTS, CachedJWTAuthentication
+
+
+def run_requests(client, requests):
+    """
+    Time sequential document list requests
+
+    Returns:
+        dict: Requests per second, latency summary and queries per request
+    """
+    durations = []
+    with CaptureQueriesContext(connection) as queries:
+        for _ in range(requests):
+            start = time.perf_counter()
+            response = client.get('/api/documents/')
+            durations.append(time.perf_counter() - start)
+            if response.status_code != 200:
+                raise RuntimeError(f"/api/documents/ returned {response.status_code}")
+    return {
+        'requests_per_s': round(len(durations) / sum(durations), 1),
+        **summarize_ms(durations),
+        'queries_per_request': round(len(queries) / requests, 2),
+    }
+
+
+def bench(user, requests):
+    refresh = RefreshToken.for_user(user)
+    client = APIClient()
+    client.credentials(HTTP_AUTHORIZATION=f'Bearer {refresh.access_token}')
+
+    results = {}
+    for name, authentication in (('jwt', JWTAuthentication), ('cached_jwt', CachedJWTAuthentication)):
+        print(f"  {name} x{requests}")
+        DocumentViewSet.authentication_classes = [authentication]
+        run_requests(client, min(requests, 20))  # Warm up
+        hits = USER_CACHE_REQUESTS.value(outcome='hit')
+        results[name] = run_requests(client, requests)
+        if authentication is CachedJWTAuthentication:
+            results[name]['user_cache_hits'] = USER_CACHE_REQUESTS.value(outcome='hit') - hits
+    results['speedup'] = round(results['cached_jwt']['requests_per_s'] / results['jwt']['requests_per_s'], 2)
+
+    # A logged out access token must be refused right away
+    logout = client.post('/api/auth/logout/', {'refresh': str(refresh)}, format='json')
+    after = client.get('/api/documents/')
+    results['revoked_token_refused'] = logout.status_code == 200 and after.status_code == 401
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--requests', type=int, default=1000, help="Requests per authentication class")
+    parser.add_argument('--documents', type=int, default=20, help="Documents the user owns")
+    parser.add_argument('--output', help="Write the JSON results here")
+    args = parser.parse_args()
+
+    setup_test_environment()
+    work_dir = tempfile.mkdtemp(prefix='pv-auth-benchmark-')
+    settings.DATABASES['default'].setdefault('TEST', {})['NAME'] = os.path.join(work_dir, 'benchmark.sqlite3')
+    old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+
+    caches = {'default': {**settings.CACHES['default'], 'LOCATION': os.path.join(work_dir, 'cache')}}
+    authentication_classes = DocumentViewSet.authentication_classes
+    try:
+        with override_settings(MEDIA_ROOT=os.path.join(work_dir, 'media'), CACHES=caches):
+            print("Seeding:")
+            user, _document_ids = seed_api_dataset(args.documents)
+            print("Requests:")
+            results = bench(user, args.requests)
+    finally:
+        DocumentViewSet.authentication_classes = authentication_classes
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    for name in ('jwt', 'cached_jwt'):
+        result = results[name]
+        print(
+            f"{name:<12}{result['requests_per_s']:>10.1f} req/s  p50 {result['p50_ms']:.2f}ms"
+            f"  {result['queries_per_request']} queries/request"
+        )
+    print(f"Speedup: {results['speedup']}x, revoked token refused: {results['revoked_token_refused']}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"Results written to {args.output}")
+    if not results['revoked_token_refused']:
+        print("FAILED: a logged out access token was still accepted")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
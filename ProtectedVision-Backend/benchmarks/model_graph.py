@@ -0,0 +1,145 @@
+"""
+Benchmark of concurrent multi-model execution
+
+Runs detection.model_graph.ModelGraph with an object detector, an OCR model
+and a transformer active, one after another and concurrently, two ways:
+
+- ``simulated``: the placeholder models, whose latency is spent sleeping,
+  as in the detection service with SIMULATE_PROCESSING_DELAY on
+- ``opencv``: the same graph with each model replaced by real OpenCV work
+  on the shared decoded image (OpenCV limited to one thread per call), to
+  check that the models overlap because OpenCV releases the GIL
+
+and reports the latency per image and each model's own time.
+
+Usage:
+    python benchmarks/model_graph.py
+    python benchmarks/model_graph.py --megapixels 12 --repeats 20 --output model_graph.json
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'core.settings')
+
+import django
+
+django.setup()
+
+# Import Django modules after setting up Django
+import cv2
+import numpy as np
+
+from benchmarks.run_benchmarks import summarize_ms
+from benchmarks.synthetic import make_image
+from detection.model_graph import ModelGraph, ObjectDetector, TextClassifier, TextRecognizer
+from detection.models import DetectionModel
+
+MODELS = [
+    DetectionModel(name='yolo', model_type='yolo', version='8'),
+    DetectionModel(name='ocr', model_type='ocr', version='5'),
+    DetectionModel(name='transformer', model_type='transformer', version='1'),
+]
+
+
+def sample(types):
+    return [
+        {'type': sensitive_type, 'confidence': 0.9, 'count': 1,
+         'location': {'x': 10, 'y': 10, 'width': 100, 'height': 30}}
+        for sensitive_type in types or ()
+    ]
+
+
+class OpenCVObjectDetector(ObjectDetector):
+    def infer(self, inputs, sample):
+        blurred = cv2.GaussianBlur(inputs['pixels'], (31, 31), 0)
+        cv2.Canny(cv2.cvtColor(blurred, cv2.COLOR_BGR2GRAY), 50, 150)
+        return sample(self.types), {}
+
+
+class OpenCVTextRecognizer(TextRecognizer):
+    def infer(self, inputs, sample):
+        gray = cv2.cvtColor(inputs['pixels'], cv2.COLOR_BGR2GRAY)
+        binary = cv2.adaptiveThreshold(gray, 255, cv2.ADAPTIVE_THRESH_MEAN_C, cv2.THRESH_BINARY, 31, 5)
+        cv2.morphologyEx(binary, cv2.MORPH_CLOSE, cv2.getStructuringElement(cv2.MORPH_RECT, (15, 3)))
+        detections = sample(self.types)
+        return detections, {'text_regions': [item['location'] for item in detections]}
+
+
+class OpenCVTextClassifier(TextClassifier):
+    def infer(self, inputs, sample):
+        cv2.resize(inputs['pixels'], None, fx=0.5, fy=0.5, interpolation=cv2.INTER_AREA)
+        return super().infer(inputs, sample)
+
+
+OPENCV_NODES = {
+    'yolo': OpenCVObjectDetector,
+    'ocr': OpenCVTextRecognizer,
+    'transformer': OpenCVTextClassifier,
+}
+
+
+def build(concurrent, opencv):
+    graph = ModelGraph(MODELS, concurrent=concurrent)
+    if opencv:
+        graph.nodes = [OPENCV_NODES[node.model_type](node.name, node.model) for node in graph.nodes]
+    return graph
+
+
+def bench(image, opencv, seconds, repeats):
+    results = {}
+    for mode, concurrent in (('sequential', False), ('concurrent', True)):
+        graph = build(concurrent, opencv)
+        graph.run({'pixels': image}, sample, seconds)  # Warm up
+        graph = build(concurrent, opencv)
+        durations = []
+        for _ in range(repeats):
+            start = time.perf_counter()
+            graph.run({'pixels': image}, sample, seconds)
+            durations.append(time.perf_counter() - start)
+        results[mode] = {
+            **summarize_ms(durations),
+            'models_ms': {
+                timing.name: round(timing.seconds / timing.calls * 1000, 2) for timing in graph.timings.values()
+            },
+        }
+    results['speedup'] = round(results['sequential']['p50_ms'] / results['concurrent']['p50_ms'], 2)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--megapixels', type=float, default=8, help="Size of the decoded image")
+    parser.add_argument('--seconds', type=float, default=0.2, help="Simulated latency per image")
+    parser.add_argument('--repeats', type=int, default=10, help="Runs per mode")
+    parser.add_argument('--output', help="Write the JSON results here")
+    args = parser.parse_args()
+
+    # One thread per OpenCV call, so any overlap comes from the graph
+    cv2.setNumThreads(1)
+    image = cv2.imdecode(np.frombuffer(make_image(args.megapixels, seed=0), dtype=np.uint8), cv2.IMREAD_COLOR)
+
+    results = {}
+    for name, opencv, seconds in (('simulated', False, args.seconds), ('opencv', True, 0.0)):
+        results[name] = bench(image, opencv, seconds, args.repeats)
+        sequential, concurrent = results[name]['sequential'], results[name]['concurrent']
+        print(
+            f"{name:<10} sequential p50 {sequential['p50_ms']:>8.1f}ms  "
+            f"concurrent p50 {concurrent['p50_ms']:>8.1f}ms  speedup {results[name]['speedup']}x"
+        )
+        print(f"           per model: {concurrent['models_ms']}")
+    print(f"({os.cpu_count()} CPUs; the opencv speedup is bounded by the number of cores)")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
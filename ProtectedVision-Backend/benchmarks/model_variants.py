@@ -0,0 +1,165 @@
+"""
+Latency/accuracy comparison of detection model variants
+
+Evaluates a grid of model variants (FP32, FP16 and INT8 precision; native,
+640 and 320 pixel input) on a labelled synthetic set of card photos and
+reports each variant's mAP@0.5, mAP@0.5:0.95, latency per image and peak
+memory, then shows which variant detection.variants.select_variants runs
+by default, in fast mode and under a few latency budgets.
+
+The production models are placeholders, so each variant is measured on
+detection.evaluation.CardDetector, a reference OpenCV detector that
+resizes and quantizes its preprocessing the way the variant would.
+
+With ``--save``, the active DetectionModel rows of the configured database
+are evaluated instead, and their measured latency, mAP@0.5:0.95 and memory
+are stored on them for variant selection. The card detector only stands in
+for object detection, so only models of MEASURED_TYPES are updated; OCR and
+transformer models keep their nominal costs.
+
+Usage:
+    python benchmarks/model_variants.py
+    python benchmarks/model_variants.py --images 50 --width 1920 --height 1080 --output variants.json
+    python benchmarks/model_variants.py --save
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'core.settings')
+
+import django
+
+django.setup()
+
+# Import Django modules after setting up Django
+import cv2
+from django.utils import timezone
+
+from benchmarks.run_benchmarks import summarize_ms
+from benchmarks.synthetic import make_labelled_frame
+from detection.evaluation import CardDetector, mean_average_precision
+from detection.models import DetectionModel
+from detection.variants import select_variants
+
+# Model types the reference card detector can stand in for
+MEASURED_TYPES = ('yolo',)
+
+GRID = [
+    (precision, input_size)
+    for input_size in (None, 640, 320)
+    for precision in ('fp32', 'fp16', 'int8')
+]
+
+
+def evaluate(detector, images, ground_truth):
+    """
+    Accuracy, latency and memory of one variant over the labelled set
+    """
+    detector.detect(images[0])  # Warm up
+    durations, predictions = [], []
+    for image in images:
+        start = time.perf_counter()
+        predictions.append(detector.detect(image))
+        durations.append(time.perf_counter() - start)
+
+    # Separate pass, since tracing allocations slows the detector down
+    tracemalloc.start()
+    for image in images[:5]:
+        detector.detect(image)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    return {
+        **{name: round(value, 4) for name, value in mean_average_precision(predictions, ground_truth).items()},
+        'latency': summarize_ms(durations),
+        'memory_mb': round(peak / 1e6, 2),
+    }
+
+
+def report(label, result):
+    print(
+        f"  {label:<16} mAP50 {result['map50']:.3f}  mAP50:95 {result['map50_95']:.3f}  "
+        f"p50 {result['latency']['p50_ms']:>7.2f}ms  peak {result['memory_mb']:>6.2f} MB"
+    )
+
+
+def save(images, ground_truth):
+    models = list(DetectionModel.objects.filter(active=True, model_type__in=MEASURED_TYPES).order_by('id'))
+    skipped = DetectionModel.objects.filter(active=True).exclude(model_type__in=MEASURED_TYPES).count()
+    if skipped:
+        print(f"Not measuring {skipped} active model(s) of types other than {', '.join(MEASURED_TYPES)}")
+    if not models:
+        print("No active detection models to evaluate")
+        return {}
+    results = {}
+    for model in models:
+        result = evaluate(CardDetector(model.input_size, model.precision), images, ground_truth)
+        model.latency_ms = result['latency']['p50_ms']
+        model.mean_average_precision = result['map50_95']
+        model.memory_mb = result['memory_mb']
+        model.evaluated_at = timezone.now()
+        model.save(update_fields=['latency_ms', 'mean_average_precision', 'memory_mb', 'evaluated_at', 'updated_at'])
+        label = f'{model.name} {model.variant}'
+        results[label] = result
+        report(label, result)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--images', type=int, default=30, help="Labelled images to evaluate on")
+    parser.add_argument('--width', type=int, default=1920, help="Image width")
+    parser.add_argument('--height', type=int, default=1080, help="Image height")
+    parser.add_argument('--save', action='store_true', help="Evaluate and update the active registered models")
+    parser.add_argument('--output', help="Write the JSON results here")
+    args = parser.parse_args()
+
+    cv2.setNumThreads(1)
+    labelled = [make_labelled_frame(args.width, args.height, seed) for seed in range(args.images)]
+    images = [image for image, _ in labelled]
+    ground_truth = [boxes for _, boxes in labelled]
+    print(f"{args.images} labelled {args.width}x{args.height} images, "
+          f"{sum(len(boxes) for boxes in ground_truth)} cards")
+
+    if args.save:
+        results = save(images, ground_truth)
+    else:
+        results, variants = {}, []
+        for precision, input_size in GRID:
+            variant = DetectionModel(
+                name='cards', model_type='yolo', version=f'{precision}-{input_size or "native"}',
+                precision=precision, input_size=input_size
+            )
+            result = evaluate(CardDetector(input_size, precision), images, ground_truth)
+            variant.latency_ms = result['latency']['p50_ms']
+            variant.mean_average_precision = result['map50_95']
+            variants.append(variant)
+            results[variant.variant] = result
+            report(variant.variant, result)
+
+        latencies = sorted(variant.latency_ms for variant in variants)
+        budgets = sorted({round(latencies[0] * 1.1, 1), round(latencies[len(latencies) // 2], 1), 1000.0})
+        choices = {
+            'default': select_variants(variants)[0].variant,
+            'fast_mode': select_variants(variants, fast_mode=True)[0].variant,
+            **{f'budget {budget}ms': select_variants(variants, latency_budget_ms=budget)[0].variant for budget in budgets},
+        }
+        results['selected'] = choices
+        for mode, variant in choices.items():
+            print(f"  {mode:<18} runs {variant}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,226 @@
+"""
+Benchmark of the near-duplicate index
+
+Three parts:
+
+- ``index``: fills a HashIndex with random hashes (100,000 by default) and
+  times lookups of hashes a few bits from stored ones and of unrelated ones,
+  against a linear scan, checking that both return the same matches
+- ``hash``: hashes synthetic photos and re-photographs of them (shifted,
+  rotated, rescaled, re-exposed and recompressed) and reports how many
+  re-photographs fall within MAX_DISTANCE of their original, and how many
+  pairs of different photos do
+- ``analysis``: analyzes photos, then re-photographs of them with the index
+  off and on, and reports the mean latency of a re-photograph
+
+Usage:
+    python benchmarks/near_duplicates.py
+    python benchmarks/near_duplicates.py --index-size 1000000 --queries 2000 --output near_duplicates.json
+"""
+
+import argparse
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'core.settings')
+
+import django
+
+django.setup()
+
+# Import Django modules after setting up Django
+import cv2
+import numpy as np
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import connection
+from django.test.utils import override_settings, setup_test_environment
+
+from benchmarks.run_benchmarks import summarize_ms
+from benchmarks.synthetic import make_benign_frame, make_frame, make_text_frame
+from detection.detection_service import DetectionService
+from detection.models import DetectionJob, DetectionModel
+from detection.near_duplicates import HashIndex, near_duplicate_settings, perceptual_hash
+from documents.models import Document
+from users.models import User
+
+
+def flip(value, bits, rng):
+    for bit in rng.sample(range(64), bits):
+        value ^= 1 << bit
+    return value
+
+
+def bench_index(size, queries, radius, seed=0):
+    rng = random.Random(seed)
+    hashes = [rng.getrandbits(64) for _ in range(size)]
+    index = HashIndex()
+    start = time.perf_counter()
+    for position, value in enumerate(hashes):
+        index.add(value, position)
+    build_seconds = time.perf_counter() - start
+
+    lookups = [flip(rng.choice(hashes), rng.randint(0, radius), rng) for _ in range(queries // 2)]
+    lookups += [rng.getrandbits(64) for _ in range(queries - len(lookups))]
+    durations, mismatches, found = [], 0, 0
+    for position, value in enumerate(lookups):
+        start = time.perf_counter()
+        matches = index.search(value, radius)
+        durations.append(time.perf_counter() - start)
+        found += bool(matches)
+        # Check a sample against a linear scan
+        if position % max(queries // 50, 1) == 0:
+            expected = sorted(
+                other for other, stored in enumerate(hashes) if (value ^ stored).bit_count() <= radius
+            )
+            mismatches += sorted(payload for _, payload in matches) != expected
+
+    linear = []
+    for value in lookups[:20]:
+        start = time.perf_counter()
+        [other for other in hashes if (value ^ other).bit_count() <= radius]
+        linear.append(time.perf_counter() - start)
+    return {
+        'size': size,
+        'radius': radius,
+        'build_s': round(build_seconds, 2),
+        'lookup': summarize_ms(durations),
+        'linear_scan': summarize_ms(linear),
+        'queries_with_matches': found,
+        'mismatches_against_linear_scan': mismatches,
+    }
+
+
+def rephotograph(image, rng):
+    height, width = image.shape[:2]
+    matrix = cv2.getRotationMatrix2D((width / 2, height / 2), rng.uniform(-2, 2), rng.uniform(0.97, 1.03))
+    matrix[:, 2] += (rng.uniform(-0.02, 0.02) * width, rng.uniform(-0.02, 0.02) * height)
+    image = cv2.warpAffine(image, matrix, (width, height), borderMode=cv2.BORDER_REPLICATE)
+    image = cv2.convertScaleAbs(image, alpha=rng.uniform(0.9, 1.1), beta=rng.uniform(-15, 15))
+    scale = rng.uniform(0.5, 1.0)
+    image = cv2.resize(image, (int(width * scale), int(height * scale)), interpolation=cv2.INTER_AREA)
+    ok, buffer = cv2.imencode('.jpg', image, [cv2.IMWRITE_JPEG_QUALITY, int(rng.integers(70, 95))])
+    return cv2.imdecode(buffer, cv2.IMREAD_COLOR)
+
+
+def originals(count, width, height):
+    makers = (make_frame, make_text_frame, make_benign_frame)
+    return [makers[seed % 3](width, height, seed) for seed in range(count)]
+
+
+def bench_hash(count, radius, width, height):
+    rng = np.random.default_rng(0)
+    photos = originals(count, width, height)
+    durations, hashes, distances = [], [], []
+    for photo in photos:
+        start = time.perf_counter()
+        hashes.append(perceptual_hash(photo))
+        durations.append(time.perf_counter() - start)
+        for _ in range(3):
+            distances.append((hashes[-1] ^ perceptual_hash(rephotograph(photo, rng))).bit_count())
+    different = [
+        (hashes[i] ^ hashes[j]).bit_count() for i in range(len(hashes)) for j in range(i + 1, len(hashes))
+    ]
+    return {
+        'hash': summarize_ms(durations),
+        'rephotographs_matched': sum(distance <= radius for distance in distances),
+        'rephotographs': len(distances),
+        'different_pairs_matched': sum(distance <= radius for distance in different),
+        'different_pairs': len(different),
+    }
+
+
+def bench_analysis(count, width, height):
+    rng = np.random.default_rng(1)
+    results = {}
+    user = User.objects.create_user(username='duplicates', email='duplicates@example.com', password='x')
+    for name, model_type in (('yolo', 'yolo'), ('ocr', 'ocr'), ('transformer', 'transformer')):
+        DetectionModel.objects.create(name=name, model_type=model_type, version='1')
+    DetectionService.preload()
+
+    def upload(title, image):
+        ok, buffer = cv2.imencode('.jpg', image)
+        document = Document(user=user, title=title, file_type='image')
+        document.file.save(f'{title}.jpg', ContentFile(buffer.tobytes()))
+        return document
+
+    photos = [make_frame(width, height, seed) for seed in range(count)]
+    for seed, photo in enumerate(photos):
+        DetectionService().analyze_document(upload(f'original_{seed}', photo).id)
+    for name, enabled in (('off', False), ('on', True)):
+        config = {**getattr(settings, 'NEAR_DUPLICATES', {}), 'ENABLED': enabled}
+        durations, reused = [], 0
+        with override_settings(NEAR_DUPLICATES=config):
+            for seed, photo in enumerate(photos):
+                document = upload(f'again_{name}_{seed}', rephotograph(photo, rng))
+                start = time.perf_counter()
+                analysis = DetectionService().analyze_document(document.id)
+                durations.append(time.perf_counter() - start)
+                assert 'error' not in analysis, analysis
+                job = DetectionJob.objects.filter(document=document).latest('id')
+                reused += bool(job.near_duplicate and job.near_duplicate['reused'])
+        results[name] = {**summarize_ms(durations), 'reused': reused}
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--index-size', type=int, default=100000, help="Hashes in the index")
+    parser.add_argument('--queries', type=int, default=2000, help="Index lookups to time")
+    parser.add_argument('--photos', type=int, default=30, help="Photos to hash")
+    parser.add_argument('--documents', type=int, default=8, help="Photos to analyze and re-photograph")
+    parser.add_argument('--width', type=int, default=1920, help="Image width")
+    parser.add_argument('--height', type=int, default=1080, help="Image height")
+    parser.add_argument('--output', help="Write the JSON results here")
+    args = parser.parse_args()
+    radius = near_duplicate_settings()['MAX_DISTANCE']
+
+    results = {'index': bench_index(args.index_size, args.queries, radius)}
+    index = results['index']
+    print(
+        f"index of {index['size']} hashes (built in {index['build_s']}s): lookup within {radius} bits "
+        f"p50 {index['lookup']['p50_ms']:.3f}ms  p95 {index['lookup']['p95_ms']:.3f}ms  "
+        f"max {index['lookup']['max_ms']:.3f}ms; linear scan p50 {index['linear_scan']['p50_ms']:.1f}ms; "
+        f"{index['mismatches_against_linear_scan']} mismatches"
+    )
+
+    results['hash'] = bench_hash(args.photos, radius, args.width, args.height)
+    hashed = results['hash']
+    print(
+        f"hash: mean {hashed['hash']['mean_ms']:.2f}ms; re-photographs matched "
+        f"{hashed['rephotographs_matched']} of {hashed['rephotographs']}; different photos matched "
+        f"{hashed['different_pairs_matched']} of {hashed['different_pairs']}"
+    )
+
+    setup_test_environment()
+    work_dir = tempfile.mkdtemp(prefix='pv-near-duplicates-benchmark-')
+    settings.DATABASES['default'].setdefault('TEST', {})['NAME'] = os.path.join(work_dir, 'benchmark.sqlite3')
+    old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+    caches = {'default': {**settings.CACHES['default'], 'LOCATION': os.path.join(work_dir, 'cache')}}
+    try:
+        with override_settings(MEDIA_ROOT=os.path.join(work_dir, 'media'), CACHES=caches):
+            results['analysis'] = bench_analysis(args.documents, args.width, args.height)
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        shutil.rmtree(work_dir, ignore_errors=True)
+    for name, analysis in results['analysis'].items():
+        print(
+            f"re-photograph analysis, index {name}: mean {analysis['mean_ms']:.1f}ms  "
+            f"p95 {analysis['p95_ms']:.1f}ms  reused {analysis['reused']} of {args.documents}"
+        )
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
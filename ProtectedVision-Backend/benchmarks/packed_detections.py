@@ -0,0 +1,198 @@
+"""
+Benchmark of packed video detection storage
+
+Stores the detections of one long synthetic video two ways:
+
+- ``rows``: one SensitiveInformation row per box, with the frame and box in
+  the JSON location, as video scans were stored before packing
+- ``packed``: one documents.detections record file plus a summary row per
+  type, as DetectionResultSerializer stores them now
+
+and reports the write time, the space used, the time to read a range of
+frames (through JSON lookups on the rows, through an opened memory map for
+the packed file) and the time to re-score the scan.
+
+Usage:
+    python benchmarks/packed_detections.py
+    python benchmarks/packed_detections.py --frames 108000 --per-frame 3 --output packed.json
+"""
+
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'core.settings')
+
+import django
+
+django.setup()
+
+# Import Django modules after setting up Django
+import numpy as np
+from django.conf import settings
+from django.db import connection
+from django.test.utils import override_settings, setup_test_environment
+
+from benchmarks.run_benchmarks import summarize_ms
+from detection.risk_engine import get_risk_engine
+from documents.detections import TYPE_CODES, decode, frame_range, load, pack, summarize, to_file
+from documents.models import Document, DocumentScan, SensitiveInformation
+from users.models import User
+
+RANGES = [(1000, 2000), (50000, 50030)]
+
+
+def synthetic_detections(frames, per_frame, seed=0):
+    """
+    Detection dicts as the video pipeline produces them
+    """
+    rng = np.random.default_rng(seed)
+    count = frames * per_frame
+    types = rng.integers(0, len(TYPE_CODES) - 1, count).tolist()
+    confidences = rng.uniform(0.5, 0.99, count).tolist()
+    boxes = rng.integers(0, 1800, (count, 4)).tolist()
+    return [
+        {
+            'frame': index // per_frame + 1,
+            'type': TYPE_CODES[type_index],
+            'confidence': confidence,
+            'count': 1,
+            'location': {'x': x, 'y': y, 'width': width % 300 + 20, 'height': height % 80 + 10},
+        }
+        for index, (type_index, confidence, (x, y, width, height)) in enumerate(zip(types, confidences, boxes))
+    ]
+
+
+def database_bytes():
+    with connection.cursor() as cursor:
+        cursor.execute('PRAGMA page_count')
+        pages = cursor.fetchone()[0]
+        cursor.execute('PRAGMA freelist_count')
+        pages -= cursor.fetchone()[0]
+        cursor.execute('PRAGMA page_size')
+        return pages * cursor.fetchone()[0]
+
+
+def timed(function, repeats):
+    function()  # Warm up
+    durations = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        function()
+        durations.append(time.perf_counter() - start)
+    return summarize_ms(durations)
+
+
+def store_rows(document, detections):
+    scan = DocumentScan.objects.create(document=document, processing_time=0)
+    SensitiveInformation.objects.bulk_create([
+        SensitiveInformation(scan=scan, type=item['type'], confidence=item['confidence'],
+                             count=1, location={'frame': item['frame'], **item['location']})
+        for item in detections
+    ], batch_size=2000)
+    return scan
+
+
+def store_packed(document, detections):
+    records = pack(detections)
+    scan = DocumentScan.objects.create(
+        document=document, processing_time=0, detections=to_file(records), detection_count=len(records)
+    )
+    SensitiveInformation.objects.bulk_create([
+        SensitiveInformation(scan=scan, **item) for item in summarize(records)
+    ])
+    return scan
+
+
+def read_rows(scan, start, end):
+    return list(
+        SensitiveInformation.objects.filter(
+            scan=scan, location__frame__gte=start, location__frame__lte=end
+        ).order_by('id').values('type', 'confidence', 'location')
+    )
+
+
+def read_packed(scan, start, end):
+    return decode(frame_range(load(scan), start, end))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--frames', type=int, default=108000, help="Frames of the video (108000 is an hour at 30 fps)")
+    parser.add_argument('--per-frame', type=int, default=3, help="Detections per frame")
+    parser.add_argument('--repeats', type=int, default=10, help="Runs per read")
+    parser.add_argument('--output', help="Write the JSON results here")
+    args = parser.parse_args()
+
+    setup_test_environment()
+    work_dir = tempfile.mkdtemp(prefix='pv-packed-benchmark-')
+    settings.DATABASES['default'].setdefault('TEST', {})['NAME'] = os.path.join(work_dir, 'benchmark.sqlite3')
+    old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+
+    caches = {'default': {**settings.CACHES['default'], 'LOCATION': os.path.join(work_dir, 'cache')}}
+    results = {}
+    try:
+        with override_settings(MEDIA_ROOT=os.path.join(work_dir, 'media'), CACHES=caches):
+            user = User.objects.create_user(username='packed', email='packed@example.com', password='x')
+            document = Document.objects.create(user=user, title='Long video', file='video.mp4', file_type='video')
+            detections = synthetic_detections(args.frames, args.per_frame)
+            print(f"{len(detections)} detections over {args.frames} frames")
+
+            scans = {}
+            for name, store in (('rows', store_rows), ('packed', store_packed)):
+                before = database_bytes()
+                start = time.perf_counter()
+                scans[name] = store(document, detections)
+                seconds = time.perf_counter() - start
+                scan = scans[name]
+                results[name] = {
+                    'write_seconds': round(seconds, 2),
+                    'database_mb': round((database_bytes() - before) / 1e6, 2),
+                    'file_mb': round(scan.detections.size / 1e6, 2) if scan.detections else 0.0,
+                    'rows': scan.sensitive_information.count(),
+                }
+                print(
+                    f"  {name:<7} write {results[name]['write_seconds']:>6.2f}s  "
+                    f"database +{results[name]['database_mb']:.2f} MB  file {results[name]['file_mb']:.2f} MB  "
+                    f"{results[name]['rows']} rows"
+                )
+
+            for first, last in RANGES:
+                label = f'frames {first}-{last}'
+                rows = read_rows(scans['rows'], first, last)
+                packed = read_packed(scans['packed'], first, last)
+                assert len(rows) == len(packed), (len(rows), len(packed))
+                results[label] = {
+                    'detections': len(packed),
+                    'rows': timed(lambda: read_rows(scans['rows'], first, last), args.repeats),
+                    'packed': timed(lambda: read_packed(scans['packed'], first, last), args.repeats),
+                }
+                print(
+                    f"  {label:<20} {len(packed):>5} detections  rows p50 {results[label]['rows']['p50_ms']:>8.2f}ms  "
+                    f"packed p50 {results[label]['packed']['p50_ms']:>6.2f}ms"
+                )
+
+            engine = get_risk_engine()
+            for name, scan in scans.items():
+                results[name]['rescore'] = timed(
+                    lambda: engine.rescore_scans(DocumentScan.objects.filter(pk=scan.pk)), args.repeats
+                )
+                print(f"  rescore {name:<7} p50 {results[name]['rescore']['p50_ms']:>8.2f}ms")
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,189 @@
+"""
+Benchmark of the input quality gate
+
+Measures what the gate costs per image at several resolutions, and which
+action it takes on synthetic photos of each kind:
+
+- ``good``: sharp card photos and printed pages
+- ``blurry``: the same, out of focus
+- ``dark`` and ``overexposed``: the card photos badly exposed
+- ``blank``: a wall or lens cap, with sensor noise
+- ``tiny``: thumbnails
+
+Then analyzes the photos with the gate off and on and reports the mean
+latency per image of each kind and the gate's hit rate, the share of images
+it did not simply pass. The models' simulated latency stands in for their
+cost and is kept on unless ``--no-simulate-delay`` is given.
+
+Usage:
+    python benchmarks/quality.py
+    python benchmarks/quality.py --images 10 --width 1920 --height 1080 --output quality.json
+"""
+
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+from collections import Counter
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'core.settings')
+
+import django
+
+django.setup()
+
+# Import Django modules after setting up Django
+import cv2
+import numpy as np
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import connection
+from django.test.utils import override_settings, setup_test_environment
+
+from benchmarks.run_benchmarks import summarize_ms
+from benchmarks.synthetic import make_frame, make_text_frame
+from detection.detection_service import DetectionService
+from detection.models import DetectionJob, DetectionModel
+from detection.quality import assess
+from documents.models import Document
+from users.models import User
+
+RESOLUTIONS = ((640, 480), (1920, 1080), (4000, 3000))
+
+
+def make_good(width, height, seed):
+    return (make_frame if seed % 2 else make_text_frame)(width, height, seed)
+
+
+def make_blurry(width, height, seed):
+    kernel = max(width, height) // 150 * 2 + 1
+    return cv2.GaussianBlur(make_good(width, height, seed), (kernel, kernel), 0)
+
+
+def make_dark(width, height, seed):
+    return (make_frame(width, height, seed) * 0.12).astype(np.uint8)
+
+
+def make_overexposed(width, height, seed):
+    return cv2.add(make_frame(width, height, seed), np.full((height, width, 3), 120, dtype=np.uint8))
+
+
+def make_blank(width, height, seed):
+    rng = np.random.default_rng(seed)
+    frame = np.full((height, width, 3), rng.integers(40, 220), dtype=np.uint8)
+    return cv2.add(frame, rng.integers(0, 8, size=(height, width, 3), dtype=np.uint8))
+
+
+def make_tiny(width, height, seed):
+    return cv2.resize(make_frame(width, height, seed), (80, 50), interpolation=cv2.INTER_AREA)
+
+
+KINDS = {
+    'good': make_good,
+    'blurry': make_blurry,
+    'dark': make_dark,
+    'overexposed': make_overexposed,
+    'blank': make_blank,
+    'tiny': make_tiny,
+}
+
+
+def gate_cost(images):
+    results = {}
+    for width, height in RESOLUTIONS:
+        frames = [make_good(width, height, seed) for seed in range(images)]
+        durations = []
+        for frame in frames:
+            start = time.perf_counter()
+            assess(frame)
+            durations.append(time.perf_counter() - start)
+        results[f'{width}x{height}'] = summarize_ms(durations)
+    return results
+
+
+def run(documents, enabled):
+    results = {}
+    quality = {**getattr(settings, 'QUALITY_GATE', {}), 'ENABLED': enabled}
+    with override_settings(QUALITY_GATE=quality):
+        for kind, kind_documents in documents.items():
+            durations, actions = [], Counter()
+            for document in kind_documents:
+                start = time.perf_counter()
+                analysis = DetectionService().analyze_document(document.id)
+                durations.append(time.perf_counter() - start)
+                assert 'error' not in analysis, analysis
+                job = DetectionJob.objects.filter(document=document).latest('id')
+                actions[(job.quality or {}).get('action', 'off')] += 1
+            results[kind] = {**summarize_ms(durations), 'actions': dict(actions)}
+    total = sum(len(kind_documents) for kind_documents in documents.values())
+    results['mean_ms'] = round(
+        sum(results[kind]['mean_ms'] * len(documents[kind]) for kind in documents) / total, 1
+    )
+    results['hit_rate'] = round(
+        sum(count for kind in documents for action, count in results[kind]['actions'].items()
+            if action not in ('pass', 'off')) / total, 3
+    )
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--images', type=int, default=6, help="Images of each kind")
+    parser.add_argument('--width', type=int, default=1920, help="Image width")
+    parser.add_argument('--height', type=int, default=1080, help="Image height")
+    parser.add_argument('--no-simulate-delay', action='store_true', help="Drop the models' simulated latency")
+    parser.add_argument('--output', help="Write the JSON results here")
+    args = parser.parse_args()
+
+    results = {'gate_cost': gate_cost(max(args.images, 10))}
+    for resolution, cost in results['gate_cost'].items():
+        print(f"gate on {resolution:<10} mean {cost['mean_ms']:.2f}ms  p95 {cost['p95_ms']:.2f}ms")
+
+    setup_test_environment()
+    work_dir = tempfile.mkdtemp(prefix='pv-quality-benchmark-')
+    settings.DATABASES['default'].setdefault('TEST', {})['NAME'] = os.path.join(work_dir, 'benchmark.sqlite3')
+    old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+
+    caches = {'default': {**settings.CACHES['default'], 'LOCATION': os.path.join(work_dir, 'cache')}}
+    ml_models = {**settings.ML_MODELS, 'SIMULATE_PROCESSING_DELAY': not args.no_simulate_delay}
+    try:
+        with override_settings(MEDIA_ROOT=os.path.join(work_dir, 'media'), CACHES=caches, ML_MODELS=ml_models):
+            user = User.objects.create_user(username='quality', email='quality@example.com', password='x')
+            for name, model_type in (('yolo', 'yolo'), ('ocr', 'ocr'), ('transformer', 'transformer')):
+                DetectionModel.objects.create(name=name, model_type=model_type, version='1')
+            documents = {}
+            for kind, make in KINDS.items():
+                documents[kind] = []
+                for seed in range(args.images):
+                    ok, buffer = cv2.imencode('.jpg', make(args.width, args.height, seed))
+                    document = Document(user=user, title=f'{kind} {seed}', file_type='image')
+                    document.file.save(f'{kind}_{seed}.jpg', ContentFile(buffer.tobytes()))
+                    documents[kind].append(document)
+            DetectionService.preload()
+
+            for name, enabled in (('off', False), ('on', True)):
+                results[name] = run(documents, enabled)
+                print(f"quality gate {name}: mean {results[name]['mean_ms']:.1f}ms per image")
+                for kind in KINDS:
+                    print(
+                        f"  {kind:<11} mean {results[name][kind]['mean_ms']:>8.1f}ms  "
+                        f"actions {results[name][kind]['actions']}"
+                    )
+            print(f"Hit rate: {results['on']['hit_rate']:.1%} of images flagged, downgraded or skipped")
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,165 @@
+"""
+Benchmark of delta re-scans against full re-analysis
+
+Analyzes a set of synthetic photos with YOLO, OCR and transformer models,
+then upgrades one of them (``--upgrade``, the transformer by default) and
+applies the new version two ways:
+
+- ``full``: every document is analyzed again with all active models
+- ``delta``: a DeltaRescanner runs only the new version and merges its
+  detections into each document's latest scan
+
+The delta re-scan is run with a cold decode cache and again with a warm one.
+Reports the latency per document, decode cache hits, and how many merged
+scans kept the other models' detections exactly as they were. The models'
+simulated latency stands in for their cost and is kept on unless
+``--no-simulate-delay`` is given.
+
+Usage:
+    python benchmarks/rescan.py
+    python benchmarks/rescan.py --upgrade yolo --documents 30 --output rescan.json
+"""
+
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'core.settings')
+
+import django
+
+django.setup()
+
+# Import Django modules after setting up Django
+import cv2
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import connection
+from django.test.utils import override_settings, setup_test_environment
+
+from benchmarks.synthetic import make_frame
+from detection.decode_cache import DECODE_CACHE_LOOKUPS, configure_for_worker, get_decode_cache
+from detection.detection_service import DetectionService
+from detection.model_graph import NODE_TYPES
+from detection.models import DetectionModel
+from detection.rescan import DeltaRescanner
+from documents.detections import scan_detections
+from documents.models import Document
+from users.models import User
+
+
+def kept_detections(documents, replaced):
+    """
+    Each document's latest detections of the types a re-scan must keep
+    """
+    return [
+        sorted(
+            (item['type'], json.dumps(item['location'], sort_keys=True))
+            for item in scan_detections(document.scans.order_by('-scan_date', '-id').first())
+            if item['type'] not in replaced
+        )
+        for document in documents
+    ]
+
+
+def full(documents):
+    get_decode_cache().clear()
+    start = time.perf_counter()
+    for document in documents:
+        analysis = DetectionService().analyze_document(document.id)
+        assert 'error' not in analysis, analysis
+    return time.perf_counter() - start
+
+
+def delta(documents, models, clear_cache):
+    if clear_cache:
+        get_decode_cache().clear()
+    hits = DECODE_CACHE_LOOKUPS.value(result='hit')
+    rescanner = DeltaRescanner(batch_pause=0, max_open_jobs=0)
+    start = time.perf_counter()
+    run = rescanner.run(rescanner.start(models))
+    elapsed = time.perf_counter() - start
+    assert run.status == 'completed' and run.documents_done == len(documents), run.status
+    return elapsed, DECODE_CACHE_LOOKUPS.value(result='hit') - hits
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--upgrade', choices=sorted(NODE_TYPES), default='transformer', help="Model to upgrade")
+    parser.add_argument('--documents', type=int, default=10, help="Image documents to re-scan")
+    parser.add_argument('--width', type=int, default=1920, help="Image width")
+    parser.add_argument('--height', type=int, default=1080, help="Image height")
+    parser.add_argument('--no-simulate-delay', action='store_true', help="Drop the models' simulated latency")
+    parser.add_argument('--output', help="Write the JSON results here")
+    args = parser.parse_args()
+    # Analyses and re-scans run in workers, which get the worker-sized cache
+    configure_for_worker()
+
+    setup_test_environment()
+    work_dir = tempfile.mkdtemp(prefix='pv-rescan-benchmark-')
+    settings.DATABASES['default'].setdefault('TEST', {})['NAME'] = os.path.join(work_dir, 'benchmark.sqlite3')
+    old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+
+    caches = {'default': {**settings.CACHES['default'], 'LOCATION': os.path.join(work_dir, 'cache')}}
+    ml_models = {**settings.ML_MODELS, 'SIMULATE_PROCESSING_DELAY': not args.no_simulate_delay}
+    results = {}
+    try:
+        with override_settings(MEDIA_ROOT=os.path.join(work_dir, 'media'), CACHES=caches, ML_MODELS=ml_models):
+            user = User.objects.create_user(username='rescan', email='rescan@example.com', password='x')
+            for model_type in ('yolo', 'ocr', 'transformer'):
+                DetectionModel.objects.create(name=model_type, model_type=model_type, version='1')
+            documents = []
+            for seed in range(args.documents):
+                ok, buffer = cv2.imencode('.jpg', make_frame(args.width, args.height, seed))
+                document = Document(user=user, title=f'photo {seed}', file_type='image')
+                document.file.save(f'photo_{seed}.jpg', ContentFile(buffer.tobytes()))
+                documents.append(document)
+            DetectionService.preload()
+            full(documents)
+
+            DetectionModel.objects.filter(model_type=args.upgrade).update(active=False)
+            upgraded = DetectionModel.objects.create(name=args.upgrade, model_type=args.upgrade, version='2')
+            replaced = set(NODE_TYPES[args.upgrade].types)
+
+            runs = {
+                'full': lambda: (full(documents), None),
+                'delta_cold': lambda: delta(documents, [upgraded], clear_cache=True),
+                'delta_warm': lambda: delta(documents, [upgraded], clear_cache=False),
+            }
+            kept = 0
+            for name, measure in runs.items():
+                before = kept_detections(documents, replaced)
+                elapsed, hits = measure()
+                if name != 'full':
+                    kept += sum(a == b for a, b in zip(before, kept_detections(documents, replaced)))
+                results[name] = {
+                    'total_s': round(elapsed, 3),
+                    'per_document_ms': round(elapsed * 1000 / len(documents), 1),
+                    'decode_cache_hits': hits,
+                }
+                print(
+                    f"{name:<10} {results[name]['per_document_ms']:>8.1f}ms per document"
+                    + (f"  decode cache hits {hits}" if hits is not None else "")
+                )
+            results['speedup'] = round(results['full']['total_s'] / results['delta_cold']['total_s'], 2)
+            results['kept_other_models'] = kept
+            print(f"Delta re-scan of {args.upgrade} is {results['speedup']}x faster than full re-analysis")
+            print(f"Merged scans that kept the other models' detections: {kept} of {2 * len(documents)}")
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,178 @@
+"""
+Benchmark of the response cache on read-heavy endpoints
+
+Seeds a user with a document history, then reads the detection model list,
+profile, preferences and document detail endpoints three ways: with the
+cache disabled, with the cache enabled, and with If-None-Match so the
+answer is a 304. Hit rates come from the cache's own counters. It also
+checks that saving a document makes the next read a miss with fresh data.
+
+Usage:
+    python benchmarks/response_cache.py
+    python benchmarks/response_cache.py --documents 5000 --repeats 200 --output cache.json
+"""
+
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'core.settings')
+
+import django
+
+django.setup()
+
+# Import Django modules after setting up Django
+from django.conf import settings
+from django.db import connection
+from django.test.utils import override_settings, setup_test_environment
+from rest_framework.test import APIClient
+
+from benchmarks.run_benchmarks import seed_api_dataset, summarize_ms
+from core.cache import CACHE_REQUESTS
+from detection.models import DetectionModel
+from documents.models import Document
+
+
+def time_reads(client, urls, repeats, etags=None):
+    """
+    Time GET requests cycling through ``urls``
+
+    Returns:
+        tuple: Durations, and the last ETag seen per URL
+    """
+    durations = []
+    seen = {}
+    for i in range(repeats):
+        url = urls[i % len(urls)]
+        headers = {'HTTP_IF_NONE_MATCH': etags[url]} if etags else {}
+        start = time.perf_counter()
+        response = client.get(url, **headers)
+        durations.append(time.perf_counter() - start)
+        expected = 304 if etags else 200
+        if response.status_code != expected:
+            raise RuntimeError(f"{url} returned {response.status_code}, expected {expected}")
+        seen[url] = response.get('ETag')
+    return durations, seen
+
+
+def outcomes(view):
+    return {
+        outcome: CACHE_REQUESTS.value(view=view, outcome=outcome)
+        for outcome in ('hit', 'miss', 'not_modified')
+    }
+
+
+def bench_endpoints(user, document_ids, repeats, sample):
+    client = APIClient()
+    client.force_authenticate(user)
+    step = max(len(document_ids) // sample, 1)
+    detail_urls = [f'/api/documents/{document_id}/' for document_id in document_ids[::step][:sample]]
+    endpoints = {
+        'detection_models_list': ('DetectionModelViewSet', ['/api/detection/models/']),
+        'profile': ('UserProfileView', ['/api/auth/profile/']),
+        'preferences': ('UserPreferenceView', ['/api/auth/preferences/']),
+        'documents_retrieve': ('DocumentViewSet', detail_urls),
+    }
+
+    results = {}
+    for name, (view, urls) in endpoints.items():
+        print(f"  {name} x{repeats} over {len(urls)} url(s)")
+        with override_settings(RESPONSE_CACHE={**settings.RESPONSE_CACHE, 'ENABLED': False}):
+            uncached, _ = time_reads(client, urls, repeats)
+
+        before = outcomes(view)
+        cached, etags = time_reads(client, urls, repeats)
+        after = outcomes(view)
+        hits = after['hit'] - before['hit']
+        misses = after['miss'] - before['miss']
+
+        not_modified, _ = time_reads(client, urls, repeats, etags=etags)
+
+        results[name] = {
+            'uncached': summarize_ms(uncached),
+            'cached': summarize_ms(cached),
+            'not_modified': summarize_ms(not_modified),
+            'hit_rate': round(hits / (hits + misses), 4),
+            'speedup_p50': round(summarize_ms(uncached)['p50_ms'] / summarize_ms(cached)['p50_ms'], 2),
+        }
+    return results
+
+
+def check_invalidation(user, document_id):
+    """
+    A saved document must be served fresh on the very next read
+    """
+    client = APIClient()
+    client.force_authenticate(user)
+    url = f'/api/documents/{document_id}/'
+    first = client.get(url)
+    document = Document.objects.get(id=document_id)
+    document.title = 'Renamed by the cache benchmark'
+    document.save()
+    before = CACHE_REQUESTS.value(view='DocumentViewSet', outcome='miss')
+    second = client.get(url, HTTP_IF_NONE_MATCH=first['ETag'])
+    return {
+        'full_response_after_save': second.status_code == 200,
+        'missed_after_save': CACHE_REQUESTS.value(view='DocumentViewSet', outcome='miss') - before == 1,
+        'fresh_title': second.status_code == 200 and second.data['title'] == document.title,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--documents', type=int, default=2000, help="Documents seeded for the user")
+    parser.add_argument('--repeats', type=int, default=100, help="Requests per endpoint and mode")
+    parser.add_argument('--sample', type=int, default=20, help="Distinct documents read by the detail benchmark")
+    parser.add_argument('--output', help="Write the JSON results here")
+    args = parser.parse_args()
+
+    setup_test_environment()
+    work_dir = tempfile.mkdtemp(prefix='pv-cache-benchmark-')
+    settings.DATABASES['default'].setdefault('TEST', {})['NAME'] = os.path.join(work_dir, 'benchmark.sqlite3')
+    old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+
+    caches = {
+        'default': {**settings.CACHES['default'], 'LOCATION': os.path.join(work_dir, 'cache')}
+    }
+    try:
+        with override_settings(MEDIA_ROOT=os.path.join(work_dir, 'media'), CACHES=caches):
+            for i in range(5):
+                DetectionModel.objects.create(name=f'Benchmark detector {i}', model_type='yolo', version='1.0')
+            print("Seeding:")
+            user, document_ids = seed_api_dataset(args.documents)
+            print("Reads:")
+            results = {
+                'backend': caches['default']['BACKEND'],
+                'endpoints': bench_endpoints(user, document_ids, args.repeats, args.sample),
+                'invalidation': check_invalidation(user, document_ids[0]),
+            }
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    print(f"\n{'endpoint':<24}{'uncached p50':>14}{'cached p50':>12}{'304 p50':>10}{'hit rate':>10}")
+    for name, result in results['endpoints'].items():
+        print(
+            f"{name:<24}{result['uncached']['p50_ms']:>12.2f}ms{result['cached']['p50_ms']:>10.2f}ms"
+            f"{result['not_modified']['p50_ms']:>8.2f}ms{result['hit_rate']:>10.1%}"
+        )
+    print(f"Invalidation after save: {results['invalidation']}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"Results written to {args.output}")
+    if not all(results['invalidation'].values()):
+        print("FAILED: a saved document was served stale")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,332 @@
+"""
+Benchmark suite for the detection pipeline and API hot paths
+
+Builds synthetic images, videos and PDFs, runs them through
+DetectionService.analyze_document, seeds a large document history and times
+the list/retrieve endpoints. Everything runs against a throwaway database
+and media directory, and the results are written as JSON so a later run can
+be compared against a saved baseline.
+
+Usage:
+    python benchmarks/run_benchmarks.py --output baseline.json
+    python benchmarks/run_benchmarks.py --quick --baseline baseline.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import resource
+import shutil
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'core.settings')
+
+import django
+
+django.setup()
+
+# Import Django modules after setting up Django
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import connection
+from django.test.utils import override_settings, setup_test_environment
+from rest_framework.test import APIClient
+
+from benchmarks.synthetic import make_image, make_pdf, make_video
+from documents.data_generator import SyntheticDataGenerator
+from documents.models import Document
+from detection.detection_service import DetectionService
+from detection.models import DetectionModel, DetectionJob
+from users.models import User
+
+
+SCENARIOS = {
+    # name: (file type, file extension, builder, runs)
+    'image_0.3mp': ('image', 'jpg', lambda seed: make_image(0.3, seed), 10),
+    'image_2mp': ('image', 'jpg', lambda seed: make_image(2, seed), 10),
+    'image_12mp': ('image', 'jpg', lambda seed: make_image(12, seed), 5),
+    'video_10s_480p': ('video', 'avi', lambda seed: make_video(10, seed=seed), 3),
+    'pdf_5_pages': ('pdf', 'pdf', lambda seed: make_pdf(5, seed=seed), 3),
+    'pdf_20_pages': ('pdf', 'pdf', lambda seed: make_pdf(20, seed=seed), 2),
+}
+
+QUICK_SCENARIOS = {
+    'image_0.3mp': ('image', 'jpg', lambda seed: make_image(0.3, seed), 3),
+    'image_2mp': ('image', 'jpg', lambda seed: make_image(2, seed), 3),
+    'video_2s_480p': ('video', 'avi', lambda seed: make_video(2, seed=seed), 1),
+    'pdf_3_pages': ('pdf', 'pdf', lambda seed: make_pdf(3, seed=seed), 1),
+}
+
+# Metrics where a higher value is better when comparing against a baseline
+HIGHER_IS_BETTER = ('throughput_per_s',)
+
+
+def percentile(values, q):
+    """
+    Linear-interpolated percentile of a list of numbers
+    """
+    if not values:
+        return None
+    ordered = sorted(values)
+    position = (len(ordered) - 1) * q
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+
+def summarize_ms(seconds):
+    """
+    Summary statistics of a list of durations, in milliseconds
+    """
+    values = [s * 1000 for s in seconds]
+    return {
+        'mean_ms': round(sum(values) / len(values), 3),
+        'p50_ms': round(percentile(values, 0.5), 3),
+        'p95_ms': round(percentile(values, 0.95), 3),
+        'max_ms': round(max(values), 3),
+    }
+
+
+def peak_rss_mb():
+    """
+    Peak resident set size of this process so far
+    """
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS reports bytes
+    if sys.platform == 'darwin':
+        return round(peak / (1024 * 1024), 1)
+    return round(peak / 1024, 1)
+
+
+def create_benchmark_user(email):
+    user = User.objects.create_user(
+        username=email.split('@')[0],
+        email=email,
+        password='benchmark-password'
+    )
+    return user
+
+
+def bench_analyze(user, scenarios):
+    """
+    Run every synthetic document scenario through analyze_document
+
+    Returns:
+        dict: Throughput, latency, per-stage latency and peak RSS per scenario
+    """
+    results = {}
+    service = DetectionService()
+    for name, (file_type, extension, builder, runs) in scenarios.items():
+        print(f"  analyze {name} x{runs}")
+        durations = []
+        stage_seconds = {}
+        input_bytes = 0
+        failures = 0
+
+        for run in range(runs):
+            content = builder(run)
+            input_bytes += len(content)
+            document = Document.objects.create(
+                user=user,
+                title=f"{name} {run}",
+                file=ContentFile(content, name=f"{name}_{run}.{extension}"),
+                file_type=file_type
+            )
+
+            start = time.perf_counter()
+            outcome = service.analyze_document(document.id)
+            durations.append(time.perf_counter() - start)
+            if 'error' in outcome:
+                failures += 1
+                continue
+
+            job = DetectionJob.objects.filter(document=document).latest('started_at')
+            for stage, record in (job.stage_timings or {}).get('stages', {}).items():
+                stage_seconds.setdefault(stage, []).append(record['seconds'])
+
+        total = sum(durations)
+        results[name] = {
+            'runs': runs,
+            'failures': failures,
+            'throughput_per_s': round(runs / total, 3) if total else None,
+            'input_mb_per_s': round(input_bytes / total / 1e6, 3) if total else None,
+            'latency': summarize_ms(durations),
+            'stages': {
+                stage: summarize_ms(seconds) for stage, seconds in sorted(stage_seconds.items())
+            },
+            'peak_rss_mb': peak_rss_mb(),
+        }
+    return results
+
+
+def seed_api_dataset(documents, items_per_scan=3):
+    """
+    Bulk-generate one user with a large document history for the API benchmarks
+
+    Returns:
+        tuple: The seeded user and the ids of their documents
+    """
+    print(f"  seeding ~{documents} documents")
+    generator = SyntheticDataGenerator(
+        seed=0,
+        documents_per_user=documents,
+        items_per_scan=items_per_scan,
+        file_type_weights='image=1',
+    )
+    generator.generate(1)
+    user = User.objects.latest('id')
+    document_ids = list(Document.objects.filter(user=user).values_list('id', flat=True))
+    return user, document_ids
+
+
+def bench_api(user, document_ids, repeats):
+    """
+    Time list and retrieve endpoints against the seeded history
+
+    Returns:
+        dict: Latency summary and response size per endpoint
+    """
+    client = APIClient()
+    client.force_authenticate(user)
+    step = max(len(document_ids) // repeats, 1)
+    sample_ids = document_ids[::step][:repeats]
+    endpoints = {
+        'documents_list': lambda i: '/api/documents/',
+        'documents_retrieve': lambda i: f'/api/documents/{sample_ids[i % len(sample_ids)]}/',
+        'document_scans_list': lambda i: '/api/documents/scans/',
+        'detection_models_list': lambda i: '/api/detection/models/',
+        'detection_jobs_list': lambda i: '/api/detection/jobs/',
+    }
+
+    results = {}
+    for name, url_for in endpoints.items():
+        print(f"  api {name} x{repeats}")
+        durations = []
+        size = 0
+        for i in range(repeats):
+            start = time.perf_counter()
+            response = client.get(url_for(i))
+            durations.append(time.perf_counter() - start)
+            if response.status_code != 200:
+                raise RuntimeError(f"{name} returned {response.status_code}")
+            size = len(response.content)
+        results[name] = {**summarize_ms(durations), 'response_bytes': size}
+    results['peak_rss_mb'] = peak_rss_mb()
+    return results
+
+
+def compare(current, baseline, path=''):
+    """
+    Yield (metric path, baseline value, current value) for comparable numbers
+    """
+    for key, value in current.items():
+        if key not in baseline:
+            continue
+        metric = f"{path}.{key}" if path else key
+        if isinstance(value, dict) and isinstance(baseline[key], dict):
+            yield from compare(value, baseline[key], metric)
+        elif isinstance(value, (int, float)) and isinstance(baseline[key], (int, float)):
+            if baseline[key] and key not in ('runs', 'failures'):
+                yield metric, baseline[key], value
+
+
+def report_comparison(results, baseline_path, tolerance, min_ms):
+    """
+    Print how each headline metric moved and count regressions
+
+    Latencies whose baseline is below ``min_ms`` are too small to compare
+    reliably and are only flagged when they cross that floor.
+    """
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+
+    regressions = 0
+    print(f"\nComparison against {baseline_path} (tolerance {tolerance:.0%}):")
+    for metric, before, after in compare(results, baseline):
+        key = metric.rsplit('.', 1)[-1]
+        if key not in ('p50_ms', 'p95_ms', 'throughput_per_s', 'peak_rss_mb'):
+            continue
+        change = (after - before) / before
+        worse = -change if key in HIGHER_IS_BETTER else change
+        if key.endswith('_ms') and max(before, after) < min_ms:
+            worse = 0
+        flag = ''
+        if worse > tolerance:
+            flag = '  REGRESSION'
+            regressions += 1
+        elif worse < -tolerance:
+            flag = '  improved'
+        print(f"  {metric:60s} {before:>12} -> {after:>12} ({change:+.1%}){flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--output', default='benchmark_results.json', help="Where to write the JSON results")
+    parser.add_argument('--baseline', help="Earlier results to compare against")
+    parser.add_argument('--tolerance', type=float, default=0.1, help="Allowed relative slowdown before flagging")
+    parser.add_argument('--min-ms', type=float, default=1.0, help="Ignore latency changes below this many milliseconds")
+    parser.add_argument('--quick', action='store_true', help="Smaller inputs and fewer runs")
+    parser.add_argument('--documents', type=int, default=None, help="Documents seeded for the API benchmarks")
+    parser.add_argument('--api-repeats', type=int, default=None, help="Requests per API endpoint")
+    args = parser.parse_args()
+
+    scenarios = QUICK_SCENARIOS if args.quick else SCENARIOS
+    documents = args.documents or (1000 if args.quick else 20000)
+    api_repeats = args.api_repeats or (10 if args.quick else 30)
+
+    setup_test_environment()
+    work_dir = tempfile.mkdtemp(prefix='pv-benchmark-')
+    settings.DATABASES['default'].setdefault('TEST', {})['NAME'] = os.path.join(work_dir, 'benchmark.sqlite3')
+    old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+
+    ml_models = {**settings.ML_MODELS, 'SIMULATE_PROCESSING_DELAY': False}
+    # Cached responses from an earlier run's database must not be served
+    caches = {'default': {**settings.CACHES['default'], 'LOCATION': os.path.join(work_dir, 'cache')}}
+    try:
+        with override_settings(MEDIA_ROOT=os.path.join(work_dir, 'media'), ML_MODELS=ml_models, CACHES=caches):
+            DetectionModel.objects.create(name='Benchmark detector', model_type='yolo', version='1.0')
+
+            print("Detection pipeline:")
+            analyze_user = create_benchmark_user('analyze@benchmark.local')
+            analyze_results = bench_analyze(analyze_user, scenarios)
+
+            print("API:")
+            api_user, document_ids = seed_api_dataset(documents)
+            api_results = bench_api(api_user, document_ids, api_repeats)
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    results = {
+        'meta': {
+            'timestamp': datetime.now(timezone.utc).isoformat(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'django': django.get_version(),
+            'quick': args.quick,
+            'seeded_documents': documents,
+            'api_repeats': api_repeats,
+        },
+        'analyze': analyze_results,
+        'api': api_results,
+    }
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"\nResults written to {args.output}")
+
+    if args.baseline:
+        regressions = report_comparison(results, args.baseline, args.tolerance, args.min_ms)
+        if regressions:
+            print(f"{regressions} metric(s) regressed beyond tolerance")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,159 @@
+"""
+Benchmark of full-text document search
+
+Generates a synthetic dataset spread over a few users, so each user owns a
+large share of it, then runs the same searches two ways for one user:
+
+- ``icontains``: what searching titles and detected types costs through the
+  ORM, a LIKE over titles OR'ed with a join to the sensitive items
+- ``fts``: documents.search.search_documents(), which also returns the
+  type and risk facet counts
+
+and reports latency per query, plus how long a full index rebuild takes.
+
+Usage:
+    python benchmarks/search.py
+    python benchmarks/search.py --documents 1000000 --users 4 --output search.json
+"""
+
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'core.settings')
+
+import django
+
+django.setup()
+
+# Import Django modules after setting up Django
+from django.conf import settings
+from django.db import connection
+from django.db.models import Q
+from django.test.utils import override_settings, setup_test_environment
+
+from benchmarks.run_benchmarks import summarize_ms
+from documents.data_generator import SyntheticDataGenerator
+from documents.models import Document
+from documents.search import index_documents, search_documents
+from users.models import User
+
+QUERIES = [
+    {'text': 'passport'},
+    {'text': 'bank statement'},
+    {'text': 'credit card'},
+    {'text': 'medic'},
+    {'text': 'passport', 'ordering': 'relevance'},
+    {'text': 'passport', 'risk_level': 'high'},
+    {'text': 'insurance', 'file_type': 'pdf'},
+    {'text': '', 'risk_level': 'high', 'file_type': 'video'},
+]
+
+
+def icontains_search(user, text='', file_type=None, risk_level=None, limit=50, ordering='newest'):
+    """
+    The same search through the ORM, without facet counts
+    """
+    documents = Document.objects.filter(user=user)
+    for term in text.split():
+        documents = documents.filter(
+            Q(title__icontains=term) | Q(scans__sensitive_information__type__icontains=term)
+        )
+    if file_type:
+        documents = documents.filter(file_type=file_type)
+    if risk_level:
+        documents = documents.filter(scans__risk_level=risk_level)
+    documents = documents.distinct()
+    return documents.count(), list(documents.order_by('-created_at').values_list('id', flat=True)[:limit])
+
+
+def fts_search(user, text='', file_type=None, risk_level=None, limit=50, ordering='newest'):
+    result = search_documents(
+        user, text, file_type=file_type, risk_level=risk_level, ordering=ordering, limit=limit
+    )
+    return result['count'], result['ids']
+
+
+def bench(user, repeats):
+    results = {}
+    for query in QUERIES:
+        label = ' '.join(f'{key}={value}' for key, value in query.items() if value)
+        results[label] = {}
+        for name, search in (('icontains', icontains_search), ('fts', fts_search)):
+            if name == 'icontains' and query.get('ordering') == 'relevance':
+                continue
+            search(user, **query)  # Warm up
+            durations = []
+            for _ in range(repeats):
+                start = time.perf_counter()
+                count, _ids = search(user, **query)
+                durations.append(time.perf_counter() - start)
+            results[label][name] = {'matches': count, **summarize_ms(durations)}
+        baseline = results[label].get('icontains')
+        print(
+            f"  {label:<40}"
+            + (f"icontains p50 {baseline['p50_ms']:>8.2f}ms  " if baseline else ' ' * 29)
+            + f"fts p50 {results[label]['fts']['p50_ms']:>6.2f}ms  ({results[label]['fts']['matches']} matches)"
+        )
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--documents', type=int, default=100000, help="Documents to generate")
+    parser.add_argument('--users', type=int, default=4, help="Users the documents are spread over")
+    parser.add_argument('--repeats', type=int, default=20, help="Runs per query and method")
+    parser.add_argument('--output', help="Write the JSON results here")
+    args = parser.parse_args()
+
+    setup_test_environment()
+    work_dir = tempfile.mkdtemp(prefix='pv-search-benchmark-')
+    settings.DATABASES['default'].setdefault('TEST', {})['NAME'] = os.path.join(work_dir, 'benchmark.sqlite3')
+    old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+
+    caches = {'default': {**settings.CACHES['default'], 'LOCATION': os.path.join(work_dir, 'cache')}}
+    try:
+        with override_settings(MEDIA_ROOT=os.path.join(work_dir, 'media'), CACHES=caches):
+            with connection.cursor() as cursor:
+                cursor.execute('PRAGMA synchronous = OFF')
+            print(f"Seeding ~{args.documents} documents over {args.users} users (indexed as they are written):")
+            generator = SyntheticDataGenerator(
+                seed=0,
+                documents_per_user=args.documents / args.users,
+                users_per_block=max(1, args.users // 20),
+            )
+            seeded = generator.generate(args.users)
+            print(f"  {seeded['documents']} documents, {seeded['sensitive_items']} items in {seeded['seconds']}s")
+
+            start = time.perf_counter()
+            index_documents()
+            rebuild_seconds = round(time.perf_counter() - start, 2)
+            print(f"Full index rebuild: {rebuild_seconds}s")
+
+            user = User.objects.earliest('id')
+            owned = Document.objects.filter(user=user).count()
+            print(f"Searching {owned} documents of one user:")
+            results = {
+                'documents': seeded['documents'],
+                'user_documents': owned,
+                'rebuild_seconds': rebuild_seconds,
+                'queries': bench(user, args.repeats),
+            }
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""
+Benchmark of shadow-mode evaluation
+
+Analyzes the same synthetic images with production YOLO and OCR models
+three times: without shadow candidates, with a candidate YOLO version
+evaluated on every job (SHADOW['SAMPLE_RATE'] 1.0), and with it evaluated on
+the default sample. It reports the user-facing latency of each run, how long
+the shadow queue took to drain after the last request, and the candidate's
+aggregated evaluation.
+
+Usage:
+    python benchmarks/shadow.py
+    python benchmarks/shadow.py --images 40 --megapixels 4 --simulate-delay --output shadow.json
+"""
+
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'core.settings')
+
+import django
+
+django.setup()
+
+# Import Django modules after setting up Django
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import connection
+from django.test.utils import override_settings, setup_test_environment
+
+from benchmarks.run_benchmarks import summarize_ms
+from benchmarks.synthetic import make_image
+from detection import shadow
+from detection.detection_service import DetectionService
+from detection.models import DetectionModel
+from documents.models import Document
+from users.models import User
+
+
+def drain():
+    """
+    Wait for queued shadow evaluations and return how long that took
+    """
+    start = time.perf_counter()
+    while shadow._pending:
+        time.sleep(0.01)
+    return time.perf_counter() - start
+
+
+def run(documents, sample_rate):
+    durations = []
+    with override_settings(SHADOW={**getattr(settings, 'SHADOW', {}), 'SAMPLE_RATE': sample_rate}):
+        for document in documents:
+            start = time.perf_counter()
+            results = DetectionService().analyze_document(document.id)
+            durations.append(time.perf_counter() - start)
+            assert 'error' not in results, results
+        return {**summarize_ms(durations), 'drain_seconds': round(drain(), 2)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--images', type=int, default=20, help="Images analyzed per run")
+    parser.add_argument('--megapixels', type=float, default=2, help="Size of each image")
+    parser.add_argument('--simulate-delay', action='store_true', help="Keep the models' simulated latency")
+    parser.add_argument('--output', help="Write the JSON results here")
+    args = parser.parse_args()
+
+    setup_test_environment()
+    work_dir = tempfile.mkdtemp(prefix='pv-shadow-benchmark-')
+    settings.DATABASES['default'].setdefault('TEST', {})['NAME'] = os.path.join(work_dir, 'benchmark.sqlite3')
+    old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+
+    caches = {'default': {**settings.CACHES['default'], 'LOCATION': os.path.join(work_dir, 'cache')}}
+    ml_models = {**settings.ML_MODELS, 'SIMULATE_PROCESSING_DELAY': args.simulate_delay}
+    results = {}
+    try:
+        with override_settings(MEDIA_ROOT=os.path.join(work_dir, 'media'), CACHES=caches, ML_MODELS=ml_models):
+            user = User.objects.create_user(username='shadow', email='shadow@example.com', password='x')
+            documents = []
+            for seed in range(args.images):
+                document = Document(user=user, title=f'Image {seed}', file_type='image')
+                document.file.save(f'image_{seed}.jpg', ContentFile(make_image(args.megapixels, seed=seed)))
+                documents.append(document)
+            DetectionModel.objects.create(name='yolo', model_type='yolo', version='8')
+            DetectionModel.objects.create(name='ocr', model_type='ocr', version='5')
+            run(documents[:2], 0.0)  # Warm up
+
+            results['no_candidate'] = run(documents, 1.0)
+            candidate = DetectionModel.objects.create(
+                name='yolo', model_type='yolo', version='9-int8', precision='int8', active=False, shadow=True
+            )
+            results['every_job'] = run(documents, 1.0)
+            results['sampled'] = run(documents, shadow.shadow_settings()['SAMPLE_RATE'])
+            for name in ('no_candidate', 'every_job', 'sampled'):
+                print(
+                    f"  {name:<13} p50 {results[name]['p50_ms']:>8.1f}ms  p95 {results[name]['p95_ms']:>8.1f}ms  "
+                    f"shadow queue drained {results[name]['drain_seconds']:.2f}s after the last request"
+                )
+
+            summary = shadow.summarize(DetectionModel.objects.filter(pk=candidate.pk)).get(candidate.pk, {})
+            results['candidate'] = {
+                key: value.isoformat() if hasattr(value, 'isoformat') else value for key, value in summary.items()
+            }
+            print(f"  candidate {candidate.version}: {results['candidate']}")
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
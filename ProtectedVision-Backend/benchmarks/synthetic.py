@@ -0,0 +1,199 @@
+"""
+Synthetic documents for benchmarks
+
+Images contain a few card-like rectangles and lines of text so decoders and
+detectors have realistic content to chew on. Videos are written with OpenCV
+(MJPG in an AVI container, which every OpenCV build can encode) and PDFs with
+Pillow, one raster page per PDF page.
+"""
+
+import io
+import math
+import os
+import tempfile
+
+import cv2
+import numpy as np
+from PIL import Image
+
+
+def make_frame(width, height, seed=0):
+    """
+    Draw a synthetic photo of a document or card
+
+    Args:
+        width (int): Width in pixels
+        height (int): Height in pixels
+        seed (int): Seed controlling the layout
+
+    Returns:
+        ndarray: BGR image
+    """
+    return make_labelled_frame(width, height, seed)[0]
+
+
+def make_labelled_frame(width, height, seed=0):
+    """
+    Draw a synthetic card photo along with where its cards are
+
+    Args:
+        width (int): Width in pixels
+        height (int): Height in pixels
+        seed (int): Seed controlling the layout
+
+    Returns:
+        tuple: BGR image, and the cards' (x1, y1, x2, y2) boxes clipped to it
+    """
+    rng = np.random.default_rng(seed)
+    frame = np.empty((height, width, 3), dtype=np.uint8)
+    frame[:] = rng.integers(150, 230, size=3, dtype=np.uint8)
+    noise = rng.integers(0, 12, size=(height, width, 1), dtype=np.uint8)
+    frame = cv2.add(frame, np.repeat(noise, 3, axis=2))
+
+    scale = max(width, height) / 1000.0
+    boxes = []
+    for _ in range(rng.integers(1, 4)):
+        card_w = int(rng.uniform(0.2, 0.45) * width)
+        card_h = int(card_w / 1.586)
+        x = int(rng.uniform(0, max(width - card_w, 1)))
+        y = int(rng.uniform(0, max(height - card_h, 1)))
+        color = tuple(int(c) for c in rng.integers(20, 120, size=3))
+        cv2.rectangle(frame, (x, y), (x + card_w, y + card_h), color, thickness=-1)
+        boxes.append((x, y, min(x + card_w, width - 1), min(y + card_h, height - 1)))
+        for line in range(3):
+            cv2.putText(
+                frame, '4111 1111 1111 1111' if line == 0 else 'JOHN Q SAMPLE',
+                (x + int(10 * scale), y + int((40 + 40 * line) * scale)),
+                cv2.FONT_HERSHEY_SIMPLEX, 0.8 * scale, (240, 240, 240),
+                max(1, int(2 * scale))
+            )
+    return frame, boxes
+
+
+def make_benign_frame(width, height, seed=0):
+    """
+    Draw a synthetic photo with nothing sensitive in it: a sky-to-ground
+    gradient with a few soft, blurred shapes
+
+    Args:
+        width (int): Width in pixels
+        height (int): Height in pixels
+        seed (int): Seed controlling the scene
+
+    Returns:
+        ndarray: BGR image
+    """
+    rng = np.random.default_rng(seed)
+    top = rng.integers(150, 255, size=3)
+    bottom = rng.integers(40, 160, size=3)
+    blend = np.linspace(0, 1, height, dtype=np.float32)[:, None, None]
+    frame = np.repeat(top * (1 - blend) + bottom * blend, width, axis=1).astype(np.float32)
+    for _ in range(rng.integers(2, 6)):
+        center = (int(rng.uniform(0, width)), int(rng.uniform(0, height)))
+        axes = (int(rng.uniform(0.05, 0.25) * width), int(rng.uniform(0.05, 0.2) * height))
+        color = tuple(float(c) for c in rng.integers(60, 230, size=3))
+        cv2.ellipse(frame, center, axes, float(rng.uniform(0, 180)), 0, 360, color, thickness=-1)
+    frame = cv2.GaussianBlur(frame, (0, 0), width / 100)
+    frame += rng.normal(0, 6, size=frame.shape).astype(np.float32)
+    return np.clip(frame, 0, 255).astype(np.uint8)
+
+
+def make_text_frame(width, height, seed=0):
+    """
+    Draw a synthetic photo of a printed page: dark lines of text on paper
+
+    Args:
+        width (int): Width in pixels
+        height (int): Height in pixels
+        seed (int): Seed controlling the layout
+
+    Returns:
+        ndarray: BGR image
+    """
+    rng = np.random.default_rng(seed)
+    frame = np.full((height, width, 3), rng.integers(215, 245), dtype=np.uint8)
+    frame = cv2.add(frame, rng.integers(0, 12, size=(height, width, 3), dtype=np.uint8))
+    scale = max(width, height) / 1000.0
+    y = int(rng.uniform(0.05, 0.2) * height)
+    while y < height * 0.9:
+        cv2.putText(
+            frame, 'Account 4111 1111 1111 1111 JOHN Q SAMPLE'[:int(rng.integers(12, 42))],
+            (int(0.05 * width), y), cv2.FONT_HERSHEY_SIMPLEX, 0.8 * scale, (30, 30, 30), max(1, int(1.5 * scale))
+        )
+        y += int(rng.uniform(40, 80) * scale)
+    return frame
+
+
+def make_image(megapixels, seed=0, quality=90):
+    """
+    Build a JPEG of roughly the requested size
+
+    Args:
+        megapixels (float): Target resolution in millions of pixels
+        seed (int): Seed controlling the layout
+        quality (int): JPEG quality
+
+    Returns:
+        bytes: Encoded JPEG
+    """
+    width = int(math.sqrt(megapixels * 1e6 * 4 / 3))
+    height = int(width * 3 / 4)
+    ok, buffer = cv2.imencode(
+        '.jpg', make_frame(width, height, seed), [cv2.IMWRITE_JPEG_QUALITY, quality]
+    )
+    if not ok:
+        raise RuntimeError("Unable to encode synthetic image")
+    return buffer.tobytes()
+
+
+def make_video(seconds, fps=15, width=640, height=480, seed=0):
+    """
+    Build a short MJPG video with a slowly moving card
+
+    Args:
+        seconds (float): Duration of the clip
+        fps (int): Frames per second
+        width (int): Frame width in pixels
+        height (int): Frame height in pixels
+        seed (int): Seed controlling the layout
+
+    Returns:
+        bytes: AVI file contents
+    """
+    base = make_frame(width, height, seed)
+    fd, path = tempfile.mkstemp(suffix='.avi')
+    os.close(fd)
+    try:
+        writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*'MJPG'), fps, (width, height))
+        if not writer.isOpened():
+            raise RuntimeError("OpenCV cannot write MJPG video in this build")
+        for index in range(int(seconds * fps)):
+            shift = np.float32([[1, 0, (index * 2) % 40], [0, 1, 0]])
+            writer.write(cv2.warpAffine(base, shift, (width, height), borderMode=cv2.BORDER_REFLECT))
+        writer.release()
+        with open(path, 'rb') as f:
+            return f.read()
+    finally:
+        os.remove(path)
+
+
+def make_pdf(pages, width=1275, height=1650, seed=0):
+    """
+    Build a multi-page PDF with one raster image per page (150 dpi Letter)
+
+    Args:
+        pages (int): Number of pages
+        width (int): Page raster width in pixels
+        height (int): Page raster height in pixels
+        seed (int): Seed controlling the layout
+
+    Returns:
+        bytes: PDF file contents
+    """
+    images = [
+        Image.fromarray(cv2.cvtColor(make_frame(width, height, seed + page), cv2.COLOR_BGR2RGB))
+        for page in range(pages)
+    ]
+    buffer = io.BytesIO()
+    images[0].save(buffer, format='PDF', save_all=True, append_images=images[1:], resolution=150)
+    return buffer.getvalue()
@@ -0,0 +1,210 @@
+"""
+Startup time and memory of detection worker processes
+
+Starts N workers two ways and compares them:
+
+- ``independent``: N ``run_detection_workers --workers 1`` processes, each
+  importing Django, OpenCV and numpy and loading the pipeline on its own
+- ``prefork``: one ``run_detection_workers --prefork --workers N`` supervisor
+  that loads everything once and forks N children
+
+For each it reports the seconds until every worker is ready and the memory
+of each process from /proc/<pid>/smaps_rollup: RSS, PSS (shared pages split
+between the processes that map them) and USS (pages only that process
+holds). PSS summed over all processes is the real footprint of the group.
+Workers poll an empty scratch database, so no jobs run. Linux only.
+
+Usage:
+    python benchmarks/worker_startup.py
+    python benchmarks/worker_startup.py --workers 8 --output startup.json
+"""
+
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SETTINGS_TEMPLATE = """
+from core.settings import *
+
+DATABASES = {{
+    'default': {{
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': {database!r},
+        'OPTIONS': {{'timeout': 30}},
+    }}
+}}
+MEDIA_ROOT = {media!r}
+CACHES = {{'default': {{**CACHES['default'], 'LOCATION': {cache!r}}}}}
+"""
+
+READY_MARKER = b'detection workers'
+
+
+def prepare_environment(work_dir):
+    """
+    Write a settings module pointing at a scratch database and migrate it
+    """
+    with open(os.path.join(work_dir, 'startup_settings.py'), 'w') as f:
+        f.write(SETTINGS_TEMPLATE.format(
+            database=os.path.join(work_dir, 'startup.sqlite3'),
+            media=os.path.join(work_dir, 'media'),
+            cache=os.path.join(work_dir, 'cache'),
+        ))
+    env = dict(os.environ, DJANGO_SETTINGS_MODULE='startup_settings')
+    env['PYTHONPATH'] = os.pathsep.join(
+        [work_dir, BACKEND_DIR] + [p for p in os.environ.get('PYTHONPATH', '').split(os.pathsep) if p]
+    )
+    subprocess.run(
+        [sys.executable, 'manage.py', 'migrate', '--run-syncdb', '--verbosity', '0'],
+        cwd=BACKEND_DIR, env=env, check=True
+    )
+    return env
+
+
+def start_worker(args, env):
+    """
+    Start a worker command and an event that is set once it reports ready
+    """
+    process = subprocess.Popen(
+        [sys.executable, 'manage.py', 'run_detection_workers', '--fast-lane-workers', '0'] + args,
+        cwd=BACKEND_DIR, env=env, stdout=subprocess.PIPE, stderr=subprocess.STDOUT
+    )
+    ready = threading.Event()
+
+    def watch():
+        for line in process.stdout:
+            if READY_MARKER in line:
+                ready.set()
+
+    threading.Thread(target=watch, daemon=True).start()
+    return process, ready
+
+
+def memory_kb(pid):
+    """
+    RSS, PSS and USS of a process in kB
+    """
+    fields = {}
+    with open(f'/proc/{pid}/smaps_rollup') as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) == 3 and parts[2] == 'kB':
+                fields[parts[0].rstrip(':')] = int(parts[1])
+    return {
+        'rss_kb': fields.get('Rss', 0),
+        'pss_kb': fields.get('Pss', 0),
+        'uss_kb': fields.get('Private_Clean', 0) + fields.get('Private_Dirty', 0),
+    }
+
+
+def child_pids(pid):
+    with open(f'/proc/{pid}/task/{pid}/children') as f:
+        return [int(child) for child in f.read().split()]
+
+
+def summarize(role_by_pid, elapsed):
+    processes = [{'pid': pid, 'role': role, **memory_kb(pid)} for pid, role in role_by_pid.items()]
+    workers = [process for process in processes if process['role'] == 'worker']
+    return {
+        'startup_s': round(elapsed, 2),
+        'processes': processes,
+        'total_pss_mb': round(sum(p['pss_kb'] for p in processes) / 1024, 1),
+        'worker_rss_mb': round(sum(p['rss_kb'] for p in workers) / len(workers) / 1024, 1),
+        'worker_pss_mb': round(sum(p['pss_kb'] for p in workers) / len(workers) / 1024, 1),
+        'worker_uss_mb': round(sum(p['uss_kb'] for p in workers) / len(workers) / 1024, 1),
+    }
+
+
+def wait_ready(events, timeout):
+    deadline = time.monotonic() + timeout
+    for event in events:
+        if not event.wait(max(0.0, deadline - time.monotonic())):
+            raise RuntimeError("Workers did not report ready in time")
+
+
+def stop(processes):
+    for process in processes:
+        process.terminate()
+    for process in processes:
+        try:
+            process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+            process.wait()
+
+
+def bench_independent(workers, env, settle, timeout):
+    start = time.perf_counter()
+    started = [start_worker(['--workers', '1'], env) for _ in range(workers)]
+    processes = [process for process, _ready in started]
+    try:
+        wait_ready([ready for _process, ready in started], timeout)
+        elapsed = time.perf_counter() - start
+        time.sleep(settle)
+        return summarize({process.pid: 'worker' for process in processes}, elapsed)
+    finally:
+        stop(processes)
+
+
+def bench_prefork(workers, env, settle, timeout):
+    start = time.perf_counter()
+    supervisor, ready = start_worker(['--prefork', '--workers', str(workers)], env)
+    try:
+        wait_ready([ready], timeout)
+        elapsed = time.perf_counter() - start
+        time.sleep(settle)
+        roles = {supervisor.pid: 'supervisor'}
+        roles.update({pid: 'worker' for pid in child_pids(supervisor.pid)})
+        return summarize(roles, elapsed)
+    finally:
+        stop([supervisor])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--workers', type=int, default=4, help="Worker processes to start")
+    parser.add_argument('--settle', type=float, default=2.0, help="Seconds to let workers idle before measuring")
+    parser.add_argument('--timeout', type=float, default=120, help="Give up if workers are not ready after this")
+    parser.add_argument('--output', help="Write the JSON results here")
+    args = parser.parse_args()
+
+    if not os.path.exists('/proc/self/smaps_rollup'):
+        print("This benchmark reads /proc/<pid>/smaps_rollup and needs Linux 4.14 or later")
+        sys.exit(1)
+
+    work_dir = tempfile.mkdtemp(prefix='pv-startup-')
+    try:
+        env = prepare_environment(work_dir)
+        results = {'workers': args.workers}
+        for mode, bench in (('independent', bench_independent), ('prefork', bench_prefork)):
+            print(f"  {mode} x{args.workers}")
+            results[mode] = bench(args.workers, env, args.settle, args.timeout)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    print(f"{'mode':<14}{'startup':>10}{'total PSS':>12}{'RSS/worker':>12}{'PSS/worker':>12}{'USS/worker':>12}")
+    for mode in ('independent', 'prefork'):
+        result = results[mode]
+        print(
+            f"{mode:<14}{result['startup_s']:>9.2f}s{result['total_pss_mb']:>10.1f}MB"
+            f"{result['worker_rss_mb']:>10.1f}MB{result['worker_pss_mb']:>10.1f}MB{result['worker_uss_mb']:>10.1f}MB"
+        )
+    results['memory_saved_mb'] = round(results['independent']['total_pss_mb'] - results['prefork']['total_pss_mb'], 1)
+    print(f"Prefork saves {results['memory_saved_mb']} MB across {args.workers} workers")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
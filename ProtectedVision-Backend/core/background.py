@@ -0,0 +1,101 @@
+"""
+Background work that runs inside server processes
+
+Apps register periodic tasks from their AppConfig.ready(); the WSGI and ASGI
+entry points call start_background_tasks() once the application is loaded.
+Because only those entry points start them, management commands, scripts and
+the autoreloader's parent process never spawn periodic threads.
+"""
+
+import logging
+import threading
+
+from django.conf import settings
+from django.db import close_old_connections
+
+
+logger = logging.getLogger(__name__)
+
+_registry = {}
+_running = {}
+_lock = threading.Lock()
+
+
+class PeriodicTask(threading.Thread):
+    """
+    Daemon thread that calls a function every ``interval`` seconds
+
+    Setting the optional ``wakeup`` event starts the next run immediately
+    instead of waiting out the interval.
+    """
+
+    def __init__(self, name, func, interval, initial_delay=0, wakeup=None):
+        super().__init__(name=f'background-{name}', daemon=True)
+        self.task_name = name
+        self.func = func
+        self.interval = interval
+        self.initial_delay = initial_delay
+        self.stopped = threading.Event()
+        self.wakeup = wakeup or self.stopped
+
+    def run(self):
+        if self.stopped.wait(self.initial_delay):
+            return
+        while True:
+            try:
+                self.func()
+            except Exception:
+                logger.exception("Background task %s failed", self.task_name)
+            finally:
+                # Threads outside the request cycle must release their connections
+                close_old_connections()
+            self.wakeup.wait(self.interval)
+            if self.stopped.is_set():
+                return
+            if self.wakeup is not self.stopped:
+                self.wakeup.clear()
+
+    def stop(self):
+        self.stopped.set()
+        self.wakeup.set()
+
+
+def register(name, func, interval, initial_delay=None, wakeup=None):
+    """
+    Register a periodic task to be started with the server
+
+    Args:
+        name (str): Unique task name
+        func (callable): Function called with no arguments on every run
+        interval (float): Seconds between the end of one run and the next
+        initial_delay (float): Seconds before the first run (defaults to interval)
+        wakeup (Event): Event that triggers a run before the interval is up
+    """
+    _registry[name] = (func, interval, interval if initial_delay is None else initial_delay, wakeup)
+
+
+def start_background_tasks():
+    """
+    Start every registered task that is not already running in this process
+    """
+    if not getattr(settings, 'BACKGROUND_TASKS', {}).get('ENABLED', True):
+        return
+    with _lock:
+        for name, (func, interval, initial_delay, wakeup) in _registry.items():
+            if name in _running:
+                continue
+            task = PeriodicTask(name, func, interval, initial_delay, wakeup)
+            task.start()
+            _running[name] = task
+            logger.info("Started background task %s (every %ss)", name, interval)
+
+
+def stop_background_tasks():
+    """
+    Ask all running tasks to stop after their current run
+    """
+    with _lock:
+        for task in _running.values():
+            task.stop()
+        _running.clear()
+
@@ -0,0 +1,160 @@
+"""
+Response caching for read-heavy API endpoints
+
+Cached responses are grouped in namespaces such as ``user:42`` or
+``document:7``. Each namespace has a version number stored in the cache,
+and the versions of every namespace a response depends on are part of its
+key. Invalidating a namespace bumps its version, so stale entries are never
+read again and simply expire. Model signals bump the namespaces of the rows
+they touch (see the apps' ``signals`` modules).
+
+Every cached response carries an ETag, and requests whose If-None-Match
+matches get an empty 304 response.
+"""
+
+import functools
+import hashlib
+import json
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework import status
+from rest_framework.renderers import JSONRenderer
+from rest_framework.response import Response
+
+from .metrics import registry
+
+
+CACHE_REQUESTS = registry.counter(
+    'response_cache_requests_total',
+    'Cacheable API reads by view and outcome (hit, miss, not_modified)',
+    ['view', 'outcome']
+)
+
+
+def cache_settings():
+    config = getattr(settings, 'RESPONSE_CACHE', {})
+    return {
+        'ENABLED': config.get('ENABLED', True),
+        'ALIAS': config.get('ALIAS', 'default'),
+        'TIMEOUT': config.get('TIMEOUT', 300),
+    }
+
+
+def get_cache():
+    return caches[cache_settings()['ALIAS']]
+
+
+def _version_key(namespace):
+    return f'cache-version:{namespace}'
+
+
+def _new_version():
+    # Versions start from the clock, so a namespace whose version was evicted
+    # can never come back to a number that old entries were stored under
+    return int(time.time() * 1000)
+
+
+def namespace_versions(namespaces):
+    """
+    Current version of each namespace, creating missing ones
+
+    Returns:
+        list: Versions in the order of ``namespaces``
+    """
+    cache = get_cache()
+    keys = [_version_key(namespace) for namespace in namespaces]
+    versions = cache.get_many(keys)
+    missing = {key: _new_version() for key in keys if key not in versions}
+    if missing:
+        cache.set_many(missing, None)
+        versions.update(missing)
+    return [versions[key] for key in keys]
+
+
+def invalidate(*namespaces):
+    """
+    Make every cached response depending on these namespaces stale
+    """
+    cache = get_cache()
+    for namespace in set(namespaces):
+        key = _version_key(namespace)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, _new_version(), None)
+
+
+def make_etag(content):
+    return '"%s"' % hashlib.sha1(content).hexdigest()
+
+
+def etag_matches(request, etag):
+    header = request.META.get('HTTP_IF_NONE_MATCH')
+    if not header:
+        return False
+    candidates = [value.strip() for value in header.split(',')]
+    # Weak comparison, as RFC 9110 requires for If-None-Match
+    return '*' in candidates or etag in [value[2:] if value.startswith('W/') else value for value in candidates]
+
+
+def cached_response(namespaces, per_user=True, timeout=None):
+    """
+    Cache the 200 responses of a DRF view handler
+
+    The handler runs after authentication and permission checks, so only
+    requests that would have been served are answered from the cache.
+
+    Args:
+        namespaces (list or callable): Namespaces the response depends on,
+            or a callable taking (view, request, *args, **kwargs) that
+            returns them
+        per_user (bool): Keep a separate entry for every user
+        timeout (int): Seconds to keep entries, RESPONSE_CACHE['TIMEOUT'] if None
+
+    Returns:
+        callable: Decorator for ``get``, ``list`` or ``retrieve`` methods
+    """
+    def decorator(handler):
+        @functools.wraps(handler)
+        def wrapper(view, request, *args, **kwargs):
+            config = cache_settings()
+            if not config['ENABLED']:
+                return handler(view, request, *args, **kwargs)
+
+            view_name = type(view).__name__
+            names = namespaces(view, request, *args, **kwargs) if callable(namespaces) else namespaces
+            versions = namespace_versions(names)
+            key = ':'.join(
+                ['response', view_name, request.build_absolute_uri()]
+                + (['user', str(request.user.pk)] if per_user else [])
+                + [f'{name}@{version}' for name, version in zip(names, versions)]
+            )
+            key = 'response:' + hashlib.sha1(key.encode()).hexdigest()
+
+            cache = get_cache()
+            entry = cache.get(key)
+            if entry is None:
+                response = handler(view, request, *args, **kwargs)
+                if response.status_code != status.HTTP_200_OK:
+                    return response
+                content = JSONRenderer().render(response.data)
+                etag = make_etag(content)
+                # Store plain JSON types so any cache backend can pickle them
+                cache.set(key, (json.loads(content), etag), config['TIMEOUT'] if timeout is None else timeout)
+                outcome = 'miss'
+            else:
+                data, etag = entry
+                response = Response(data)
+                outcome = 'hit'
+
+            if etag_matches(request, etag):
+                response = Response(status=status.HTTP_304_NOT_MODIFIED)
+                outcome = 'not_modified'
+            response['ETag'] = etag
+            response['Cache-Control'] = 'private, no-cache'
+            CACHE_REQUESTS.inc(view=view_name, outcome=outcome)
+            return response
+        return wrapper
+    return decorator
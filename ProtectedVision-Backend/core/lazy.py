@@ -0,0 +1,48 @@
+"""
+Deferred imports for heavy optional modules
+
+OpenCV, numpy and Pillow add a noticeable share of process start-up time
+and memory, but API-only processes never run the detection pipeline. Modules
+bind them with ``lazy_import`` and the real import happens on first use.
+"""
+
+import importlib
+import threading
+
+
+class LazyModule:
+    """
+    Stand-in for a module that imports it on first attribute access
+    """
+
+    def __init__(self, name):
+        self._name = name
+        self._module = None
+        self._lock = threading.Lock()
+
+    def _load(self):
+        with self._lock:
+            if self._module is None:
+                self._module = importlib.import_module(self._name)
+        return self._module
+
+    def __getattr__(self, attr):
+        module = self._module or self._load()
+        return getattr(module, attr)
+
+    def __repr__(self):
+        state = 'loaded' if self._module is not None else 'not loaded'
+        return f"<lazy module '{self._name}' ({state})>"
+
+
+def lazy_import(name):
+    """
+    Module proxy for ``name``, imported the first time it is used
+
+    Args:
+        name (str): Dotted module name
+
+    Returns:
+        LazyModule: Proxy forwarding attribute access to the module
+    """
+    return LazyModule(name)
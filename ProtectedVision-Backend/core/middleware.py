@@ -0,0 +1,145 @@
+import logging
+import random
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+
+from .metrics import registry
+
+
+logger = logging.getLogger('core.slow_requests')
+
+REQUEST_SECONDS = registry.histogram(
+    'http_request_duration_seconds',
+    'Wall time spent handling each request',
+    ['view', 'method']
+)
+REQUEST_DB_SECONDS = registry.histogram(
+    'http_request_db_seconds',
+    'Time spent in database queries per request',
+    ['view', 'method']
+)
+REQUEST_DB_QUERIES = registry.histogram(
+    'http_request_db_queries',
+    'Number of database queries per request',
+    ['view', 'method'],
+    buckets=(0, 1, 2, 5, 10, 20, 50, 100, 200, 500)
+)
+RESPONSE_BYTES = registry.histogram(
+    'http_response_size_bytes',
+    'Size of response bodies (streaming responses are not counted)',
+    ['view', 'method'],
+    buckets=(256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+)
+REQUESTS_TOTAL = registry.counter(
+    'http_requests_total',
+    'Requests handled, by view and response status',
+    ['view', 'method', 'status']
+)
+
+
+class QueryTracker:
+    """
+    Database execute wrapper that counts and times queries
+
+    Only the first ``max_queries`` statements are kept for the slow-request
+    log; the count and total time always cover every query.
+    """
+
+    def __init__(self, max_queries=50):
+        self.max_queries = max_queries
+        self.count = 0
+        self.seconds = 0.0
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = time.perf_counter() - start
+            self.count += 1
+            self.seconds += duration
+            if len(self.queries) < self.max_queries:
+                self.queries.append((sql, duration))
+
+
+class RequestMetricsMiddleware:
+    """
+    Record latency, query count/time and response size for every view
+
+    Measurements feed the in-process histograms exposed at /metrics/ and a
+    ``Server-Timing`` header. Requests slower than the configured threshold
+    are sampled into the ``core.slow_requests`` log together with the
+    queries they ran.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        config = getattr(settings, 'REQUEST_METRICS', {})
+        self.slow_threshold = config.get('SLOW_REQUEST_THRESHOLD_MS', 500) / 1000.0
+        self.sample_rate = config.get('SLOW_REQUEST_SAMPLE_RATE', 1.0)
+        self.max_logged_queries = config.get('MAX_LOGGED_QUERIES', 50)
+        self.server_timing = config.get('SERVER_TIMING', True)
+
+    def __call__(self, request):
+        tracker = QueryTracker(self.max_logged_queries)
+        start = time.perf_counter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(tracker))
+            response = self.get_response(request)
+        elapsed = time.perf_counter() - start
+
+        view = self._view_name(request)
+        method = request.method
+        REQUEST_SECONDS.observe(elapsed, view=view, method=method)
+        REQUEST_DB_SECONDS.observe(tracker.seconds, view=view, method=method)
+        REQUEST_DB_QUERIES.observe(tracker.count, view=view, method=method)
+        REQUESTS_TOTAL.inc(view=view, method=method, status=response.status_code)
+        if not response.streaming:
+            RESPONSE_BYTES.observe(len(response.content), view=view, method=method)
+
+        if self.server_timing:
+            response['Server-Timing'] = (
+                f'db;dur={tracker.seconds * 1000:.1f};desc="{tracker.count} queries", '
+                f'app;dur={(elapsed - tracker.seconds) * 1000:.1f}, '
+                f'total;dur={elapsed * 1000:.1f}'
+            )
+
+        if elapsed >= self.slow_threshold and random.random() < self.sample_rate:
+            self._log_slow_request(request, response, view, elapsed, tracker)
+
+        return response
+
+    def _view_name(self, request):
+        """
+        Stable, low-cardinality name for the view that handled a request
+        """
+        match = getattr(request, 'resolver_match', None)
+        if match is None:
+            return 'unresolved'
+        if match.view_name:
+            return match.view_name
+        func = getattr(match.func, 'view_class', match.func)
+        return f'{func.__module__}.{func.__qualname__}'
+
+    def _log_slow_request(self, request, response, view, elapsed, tracker):
+        queries = '\n'.join(
+            f'  {duration * 1000:8.2f} ms  {sql}' for sql, duration in tracker.queries
+        )
+        if tracker.count > len(tracker.queries):
+            queries += f'\n  ... {tracker.count - len(tracker.queries)} more'
+        logger.warning(
+            "Slow request %s %s (%s) -> %s in %.1f ms, %d queries in %.1f ms\n%s",
+            request.method, request.path, view, response.status_code,
+            elapsed * 1000, tracker.count, tracker.seconds * 1000, queries,
+            extra={
+                'view': view,
+                'duration_ms': elapsed * 1000,
+                'query_count': tracker.count,
+                'db_ms': tracker.seconds * 1000,
+            }
+        )
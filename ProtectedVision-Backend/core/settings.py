@@ -1,3 +1,4 @@
+import importlib.util
 import os
 from pathlib import Path
 from datetime import timedelta
@@ -13,6 +14,11 @@ DEBUG = True
 
 ALLOWED_HOSTS = ['localhost', '127.0.0.1']
 
+# drf_yasg is not an installed app: importing the package pulls in
+# pkg_resources, which slows down every process start. core/urls.py imports it
+# on the first docs request, and its templates and static files are found here.
+DRF_YASG_DIR = os.path.dirname(importlib.util.find_spec('drf_yasg').origin)
+
 # Application definition
 INSTALLED_APPS = [
     'django.contrib.admin',
@@ -24,8 +30,8 @@ INSTALLED_APPS = [
     
     # Third party apps
     'rest_framework',
+    'rest_framework_simplejwt.token_blacklist',
     'corsheaders',
-    'drf_yasg',
     
     # Custom apps
     'users',
@@ -34,6 +40,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.middleware.RequestMetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
@@ -49,7 +56,7 @@ ROOT_URLCONF = 'core.urls'
 TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
-        'DIRS': [],
+        'DIRS': [os.path.join(DRF_YASG_DIR, 'templates')],
         'APP_DIRS': True,
         'OPTIONS': {
             'context_processors': [
@@ -98,6 +105,7 @@ USE_TZ = True
 # Static files (CSS, JavaScript, Images)
 STATIC_URL = '/static/'
 STATIC_ROOT = os.path.join(BASE_DIR, 'static')
+STATICFILES_DIRS = [os.path.join(DRF_YASG_DIR, 'static')]
 
 # Media files
 MEDIA_URL = '/media/'
@@ -112,7 +120,7 @@ AUTH_USER_MODEL = 'users.User'
 # DRF settings
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'users.authentication.CachedJWTAuthentication',
     ),
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
@@ -137,9 +145,241 @@ SIMPLE_JWT = {
     'BLACKLIST_AFTER_ROTATION': True,
 }
 
+# Authentication shortcuts (see users/authentication.py): users are cached in
+# each process and blacklisted token ids are kept in memory. A deactivated user
+# or revoked token is refused by other processes within these many seconds.
+JWT_AUTH_CACHE = {
+    'USER_TTL_SECONDS': 60,
+    'MAX_USERS': 10000,
+    'REVOCATION_REFRESH_SECONDS': 30,
+    'REVOCATION_OVERLAP_SECONDS': 300,
+}
+
 # ML Model Settings
 ML_MODELS = {
     'YOLO_WEIGHTS_PATH': os.path.join(BASE_DIR, 'detection', 'models', 'yolo_weights.pt'),
     'CONFIDENCE_THRESHOLD': 0.5,  # Minimum confidence score
     'IOU_THRESHOLD': 0.45,        # IoU threshold for non-max suppression
-} 
\ No newline at end of file
+    'SIMULATE_PROCESSING_DELAY': True,  # Sleep in the mock detectors to mimic model latency
+    'MAX_BATCH_DOCUMENTS': 50,    # Documents accepted by one batch analysis request
+    # Admission control: job cost is estimated in worker-seconds from file
+    # type, size, image resolution and video duration; analysis requests get
+    # 429 + Retry-After while open jobs would go over these budgets
+    'ADMISSION': {
+        'ENABLED': True,
+        'MAX_QUEUED_COST': 1800,
+        'MAX_USER_QUEUED_COST': 600,
+        'COST_PER_MB': 0.05,
+        'IMAGE_BASE_COST': 2.0,
+        'IMAGE_COST_PER_MEGAPIXEL': 0.1,
+        'VIDEO_BASE_COST': 5.0,
+        'VIDEO_COST_PER_SECOND': 0.5,
+        'PDF_BASE_COST': 2.0,
+        'PDF_COST_PER_MB': 2.0,
+    },
+    # Jobs started while open work exceeds QUEUE_PRESSURE x MAX_QUEUED_COST run in fast mode
+    'DEGRADATION': {
+        'QUEUE_PRESSURE': 0.75,
+        'VIDEO_FRAME_STRIDE': 5,      # Analyze every Nth frame
+        'MAX_IMAGE_SIDE': 1280,       # Downscale larger images before inference
+    },
+} 
+
+# Metrics endpoint (/metrics/) is only served to these client addresses
+METRICS = {
+    'ALLOWED_IPS': ['127.0.0.1', '::1'],
+}
+
+# Per-view request metrics and slow-request sampling
+REQUEST_METRICS = {
+    'SLOW_REQUEST_THRESHOLD_MS': 500,
+    'SLOW_REQUEST_SAMPLE_RATE': 1.0,   # Fraction of slow requests that are logged
+    'MAX_LOGGED_QUERIES': 50,
+    'SERVER_TIMING': True,
+}
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+        },
+    },
+    'loggers': {
+        'core.slow_requests': {
+            'handlers': ['console'],
+            'level': 'WARNING',
+            'propagate': False,
+        },
+    },
+}
+
+# Risk scoring policy (see detection/risk_engine.py for the full set of keys).
+# After changing it, run `python manage.py rescore_scans` to update old scans.
+RISK_POLICY = {
+    'CONFIDENCE_BANDS': [0.5, 0.75, 0.9],
+    'CONFIDENCE_WEIGHTS': [0.25, 0.6, 0.9, 1.0],
+    'THRESHOLDS': {
+        'medium': 0.35,
+        'high': 0.7,
+    },
+}
+
+# Periodic tasks started by the WSGI/ASGI entry points (see core/background.py)
+BACKGROUND_TASKS = {
+    'ENABLED': True,
+}
+
+# Enforcement of UserPreference.auto_delete_processed_files
+RETENTION = {
+    'ENABLED': True,
+    'INTERVAL_SECONDS': 3600,
+    'BATCH_SIZE': 500,
+    'BATCH_PAUSE_SECONDS': 0.5,
+    'MAX_BATCHES_PER_RUN': 200,
+}
+
+# Server-Sent Event streams of detection progress (served by core/asgi.py)
+PROGRESS_EVENTS = {
+    'KEEPALIVE_SECONDS': 15,
+    'MAX_STREAM_SECONDS': 600,
+    'DB_UPDATE_INTERVAL_SECONDS': 1.0,  # How often progress is written to the job row
+    'CHECKPOINT_INTERVAL_SECONDS': 5.0,  # How often partial video/PDF results are saved
+    'QUEUE_SIZE': 100,
+    'TICKET_SECONDS': 30,  # How long a stream ticket can be used to open a stream
+}
+
+# Background detection workers (see detection/scheduler.py). Small images use
+# a dedicated fast lane; videos and files over BULK_MIN_BYTES run as bulk.
+JOB_SCHEDULER = {
+    'ENABLED': True,              # Run workers inside server processes
+    'WORKERS': 2,
+    'FAST_LANE_WORKERS': 1,
+    'MAX_CONCURRENT_PER_USER': 2,
+    'FAST_LANE_MAX_BYTES': 5 * 1024 * 1024,
+    'BULK_MIN_BYTES': 50 * 1024 * 1024,
+    'AGING_SECONDS': 300,         # Waiting this long promotes a job by one class
+    'POLL_SECONDS': 2,
+    'HEARTBEAT_TIMEOUT_SECONDS': 60,  # Processing jobs silent this long are requeued
+    'MAX_ATTEMPTS': 3,
+    'RECOVERY_INTERVAL_SECONDS': 30,
+    'BATCH_MODEL_SETS': 16,       # Batches whose loaded models each process keeps
+}
+
+# Shared by all server processes on a host, so signal-driven invalidation in
+# one process is seen by the others. Use Redis/Memcached across hosts.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.path.join(BASE_DIR, 'cache'),
+        'OPTIONS': {
+            'MAX_ENTRIES': 10000,
+        },
+    }
+}
+
+# Cached API reads with ETags (see core/cache.py)
+RESPONSE_CACHE = {
+    'ENABLED': True,
+    'ALIAS': 'default',
+    'TIMEOUT': 300,
+}
+
+# Full-text document search (see documents/search.py)
+SEARCH = {
+    'ENABLED': True,
+    'MAX_TERMS': 16,
+    'PREFIX_LAST_TERM': True,
+    'DEFAULT_LIMIT': 50,
+    'MAX_LIMIT': 200,
+}
+
+# Streaming history export (see documents/export.py)
+EXPORT = {
+    'CHUNK_SIZE': 2000,
+    'BUFFER_BYTES': 64 * 1024,
+    'GZIP_LEVEL': 6,
+}
+
+# Packed per-frame video detections (see documents/detections.py)
+PACKED_DETECTIONS = {
+    'ENABLED': True,
+    'DEFAULT_LIMIT': 1000,
+    'MAX_LIMIT': 10000,
+}
+
+# Concurrent execution of the active detection models (see detection/model_graph.py)
+MODEL_EXECUTION = {
+    'CONCURRENT': True,
+    'MAX_WORKERS': 4,
+}
+
+# Nominal cost of detection model variants not yet measured (see detection/variants.py)
+MODEL_VARIANTS = {
+    'REFERENCE_INPUT_SIZE': 1280,
+    'PRECISION_COST': {'fp32': 1.0, 'fp16': 0.7, 'int8': 0.4},
+}
+
+# Shadow evaluation of candidate detection models (see detection/shadow.py)
+SHADOW = {
+    'ENABLED': True,
+    'SAMPLE_RATE': 0.1,
+    'MAX_WORKERS': 1,
+    'MAX_PENDING': 100,
+    'IOU_THRESHOLD': 0.5,
+}
+
+# Cheap early-exit stages in front of the image detection models (see detection/cascade.py)
+CASCADE = {
+    'ENABLED': True,
+    'INPUT_SIZE': 640,
+    'CARDS': True,
+    'TEXT': True,
+    'FACES': True,
+    'FACE_INPUT_SIZE': 320,
+    # Card proposals: outline sharpness, box area as a share of the image,
+    # long-to-short side ratio and the share of its box a card fills
+    'CARD_EDGE_THRESHOLD': 100,
+    'CARD_MIN_AREA': 0.01,
+    'CARD_MAX_AREA': 0.95,
+    'CARD_MAX_ASPECT': 3.0,
+    'CARD_MIN_FILL': 0.5,
+    'TEXT_EDGE_THRESHOLD': 60,
+    'PADDING': 0.05,
+    'MAX_COVERAGE': 0.6,
+}
+
+# Delta re-scans with new or upgraded models (see detection/rescan.py)
+RESCAN = {
+    'BATCH_SIZE': 50,
+    'BATCH_PAUSE_SECONDS': 1.0,
+    'MAX_BATCHES_PER_RUN': 1000,
+    'MAX_OPEN_JOBS': 4,
+}
+
+# Recently decoded images kept in memory per process (see detection/decode_cache.py):
+# WORKER_MAX_BYTES in processes that run detection jobs, MAX_BYTES in the others
+DECODE_CACHE = {
+    'MAX_BYTES': 0,
+    'WORKER_MAX_BYTES': 256 * 1024 * 1024,
+}
+
+# Input quality gate run on images before any model (see detection/quality.py)
+QUALITY_GATE = {
+    'ENABLED': True,
+    'INPUT_SIZE': 384,
+    'MIN_SIDE': 96,
+    'BLANK_CONTRAST': 2.0,
+    'BLUR_THRESHOLD': 150.0,
+    'DARK_LEVEL': 64,
+    'CLIPPED_SHARE': 0.5,
+}
+
+# Near-duplicate images reuse earlier detections (see detection/near_duplicates.py)
+NEAR_DUPLICATES = {
+    'ENABLED': True,
+    'MAX_DISTANCE': 8,
+    'KEYFRAMES': 8,
+    'MAX_USERS': 256,
+}
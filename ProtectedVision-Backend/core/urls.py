@@ -1,33 +1,60 @@
+import functools
+
 from django.contrib import admin
 from django.urls import path, include
 from django.conf import settings
 from django.conf.urls.static import static
-from drf_yasg.views import get_schema_view
-from drf_yasg import openapi
 from rest_framework import permissions
+from .metrics import metrics_view
+
+
+@functools.lru_cache(maxsize=None)
+def schema_view():
+    """
+    API schema view, built on first use
+
+    drf_yasg is imported here rather than at module level so that processes
+    which never serve the docs do not pay for importing it.
+    """
+    from drf_yasg import openapi
+    from drf_yasg.views import get_schema_view
+
+    return get_schema_view(
+        openapi.Info(
+            title="Protected Vision API",
+            default_version='v1',
+            description="API for detecting and protecting sensitive information in documents",
+            terms_of_service="https://www.google.com/policies/terms/",
+            contact=openapi.Contact(email="contact@protectedvision.com"),
+            license=openapi.License(name="BSD License"),
+        ),
+        public=True,
+        permission_classes=(permissions.AllowAny,),
+    )
+
+
+def docs_view(renderer):
+    @functools.lru_cache(maxsize=None)
+    def view():
+        return schema_view().with_ui(renderer, cache_timeout=0)
+
+    def docs(request, *args, **kwargs):
+        return view()(request, *args, **kwargs)
+    return docs
 
-schema_view = get_schema_view(
-    openapi.Info(
-        title="Protected Vision API",
-        default_version='v1',
-        description="API for detecting and protecting sensitive information in documents",
-        terms_of_service="https://www.google.com/policies/terms/",
-        contact=openapi.Contact(email="contact@protectedvision.com"),
-        license=openapi.License(name="BSD License"),
-    ),
-    public=True,
-    permission_classes=(permissions.AllowAny,),
-)
 
 urlpatterns = [
     path('admin/', admin.site.urls),
-    path('api/docs/', schema_view.with_ui('swagger', cache_timeout=0), name='schema-swagger-ui'),
-    path('api/redoc/', schema_view.with_ui('redoc', cache_timeout=0), name='schema-redoc'),
+    path('api/docs/', docs_view('swagger'), name='schema-swagger-ui'),
+    path('api/redoc/', docs_view('redoc'), name='schema-redoc'),
     
     # API endpoints
     path('api/auth/', include('users.urls')),
     path('api/documents/', include('documents.urls')),
     path('api/detection/', include('detection.urls')),
+    
+    # Prometheus metrics
+    path('metrics/', metrics_view, name='metrics'),
 ]
 
 # Serve media files in development
@@ -1,5 +1,8 @@
 import os
 from django.core.wsgi import get_wsgi_application
+from core.background import start_background_tasks
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'core.settings')
-application = get_wsgi_application()
\ No newline at end of file
+application = get_wsgi_application()
+
+start_background_tasks()
\ No newline at end of file
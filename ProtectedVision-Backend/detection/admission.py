@@ -0,0 +1,108 @@
+"""
+Cost estimates for admission control and fast-mode degradation
+
+A job's cost is an estimate of the worker-seconds it will take, derived
+from cheap metadata only: image resolution from the file header, video
+duration from the container, and file size. The scheduler sums the costs
+of pending and processing jobs to decide whether to accept more work.
+"""
+
+from django.conf import settings
+
+from core.lazy import lazy_import
+
+
+cv2 = lazy_import('cv2')
+Image = lazy_import('PIL.Image')
+
+
+def admission_settings():
+    config = getattr(settings, 'ML_MODELS', {}).get('ADMISSION', {})
+    return {
+        'ENABLED': config.get('ENABLED', True),
+        'MAX_QUEUED_COST': config.get('MAX_QUEUED_COST', 1800),
+        'MAX_USER_QUEUED_COST': config.get('MAX_USER_QUEUED_COST', 600),
+        'COST_PER_MB': config.get('COST_PER_MB', 0.05),
+        'IMAGE_BASE_COST': config.get('IMAGE_BASE_COST', 2.0),
+        'IMAGE_COST_PER_MEGAPIXEL': config.get('IMAGE_COST_PER_MEGAPIXEL', 0.1),
+        'VIDEO_BASE_COST': config.get('VIDEO_BASE_COST', 5.0),
+        'VIDEO_COST_PER_SECOND': config.get('VIDEO_COST_PER_SECOND', 0.5),
+        'PDF_BASE_COST': config.get('PDF_BASE_COST', 2.0),
+        'PDF_COST_PER_MB': config.get('PDF_COST_PER_MB', 2.0),
+    }
+
+
+def degradation_settings():
+    config = getattr(settings, 'ML_MODELS', {}).get('DEGRADATION', {})
+    return {
+        'QUEUE_PRESSURE': config.get('QUEUE_PRESSURE', 0.75),
+        'VIDEO_FRAME_STRIDE': config.get('VIDEO_FRAME_STRIDE', 5),
+        'MAX_IMAGE_SIDE': config.get('MAX_IMAGE_SIDE', 1280),
+    }
+
+
+def image_resolution(path):
+    """
+    Width and height of an image, read from its header only
+
+    Returns:
+        tuple: (width, height), or None if the file is not a readable image
+    """
+    try:
+        with Image.open(path) as image:
+            return image.size
+    except OSError:
+        # Includes PIL.UnidentifiedImageError
+        return None
+
+
+def video_duration(path):
+    """
+    Length of a video in seconds, from the container's frame count and rate
+
+    Returns:
+        float: Duration, or None if the stream does not report it
+    """
+    capture = cv2.VideoCapture(path)
+    try:
+        frames = capture.get(cv2.CAP_PROP_FRAME_COUNT)
+        fps = capture.get(cv2.CAP_PROP_FPS)
+    finally:
+        capture.release()
+    if frames > 0 and fps > 0:
+        return frames / fps
+    return None
+
+
+def estimate_cost(document, config=None):
+    """
+    Estimated worker-seconds needed to analyze a document
+
+    Args:
+        document (Document): Document to analyze
+        config (dict): Admission settings, read from ML_MODELS if omitted
+
+    Returns:
+        float: Estimated cost
+    """
+    config = config or admission_settings()
+    try:
+        path = document.file.path
+        size_mb = document.file.size / (1024 * 1024)
+    except (OSError, ValueError, NotImplementedError):
+        path, size_mb = None, 0.0
+    cost = size_mb * config['COST_PER_MB']
+
+    if document.file_type == 'image':
+        cost += config['IMAGE_BASE_COST']
+        resolution = image_resolution(path) if path else None
+        if resolution:
+            cost += resolution[0] * resolution[1] / 1e6 * config['IMAGE_COST_PER_MEGAPIXEL']
+    elif document.file_type == 'video':
+        cost += config['VIDEO_BASE_COST']
+        duration = video_duration(path) if path else None
+        if duration:
+            cost += duration * config['VIDEO_COST_PER_SECOND']
+    elif document.file_type == 'pdf':
+        cost += config['PDF_BASE_COST'] + size_mb * config['PDF_COST_PER_MB']
+    return round(cost, 3)
@@ -0,0 +1,29 @@
+from django.apps import AppConfig
+
+
+class DetectionConfig(AppConfig):
+    name = 'detection'
+
+    def ready(self):
+        from core.background import register
+        from .scheduler import get_scheduler
+        from .signals import connect_signals
+
+        connect_signals()
+
+        scheduler = get_scheduler()
+        if scheduler.config['ENABLED']:
+            for name, classes in scheduler.workers():
+                register(
+                    f'detection-{name}',
+                    lambda classes=classes: scheduler.work(classes),
+                    scheduler.config['POLL_SECONDS'],
+                    initial_delay=0,
+                    wakeup=scheduler.wakeup_event()
+                )
+            register(
+                'detection-recovery',
+                scheduler.recover_stale_jobs,
+                scheduler.config['RECOVERY_INTERVAL_SECONDS'],
+                initial_delay=0
+            )
@@ -0,0 +1,263 @@
+"""
+Cascaded image detection with cheap early-exit stages
+
+Before the detection models see an image, a gate of fast OpenCV detectors
+looks at a small copy of it (CASCADE['INPUT_SIZE']) and proposes regions
+of interest:
+
+- cards: solid, card-shaped regions such as payment cards, IDs and passports
+- text: lines of text, found by their strong stroke edges
+- faces: frontal faces, with OpenCV's Haar cascade on an even smaller copy
+  (CASCADE['FACE_INPUT_SIZE']). It costs more than the other two together,
+  so it only runs when they found nothing; a face on an ID card already
+  lies within the card's region.
+
+An image without proposals exits at the gate and no model runs on it.
+Otherwise the proposals are padded and merged, and the models run on those
+regions only, unless together they cover most of the image
+(CASCADE['MAX_COVERAGE']) and the full image is analyzed instead. The stage
+that decided ('gate', 'regions' or 'full') is recorded on the job.
+"""
+
+from functools import lru_cache
+
+from django.conf import settings
+
+from core.lazy import lazy_import
+from core.metrics import registry
+
+
+# Loaded on first use, so processes that never analyze a file skip them
+cv2 = lazy_import('cv2')
+np = lazy_import('numpy')
+
+CASCADE_DECISIONS = registry.counter(
+    'detection_cascade_decisions_total',
+    'Images by the cascade stage that decided how they were analyzed',
+    ['stage']
+)
+
+
+def cascade_settings():
+    config = getattr(settings, 'CASCADE', {})
+    return {
+        'ENABLED': config.get('ENABLED', True),
+        'INPUT_SIZE': config.get('INPUT_SIZE', 640),
+        'CARDS': config.get('CARDS', True),
+        'TEXT': config.get('TEXT', True),
+        'FACES': config.get('FACES', True),
+        'FACE_INPUT_SIZE': config.get('FACE_INPUT_SIZE', 320),
+        'CARD_EDGE_THRESHOLD': config.get('CARD_EDGE_THRESHOLD', 100),
+        'CARD_MIN_AREA': config.get('CARD_MIN_AREA', 0.01),
+        'CARD_MAX_AREA': config.get('CARD_MAX_AREA', 0.95),
+        'CARD_MAX_ASPECT': config.get('CARD_MAX_ASPECT', 3.0),
+        'CARD_MIN_FILL': config.get('CARD_MIN_FILL', 0.5),
+        'TEXT_EDGE_THRESHOLD': config.get('TEXT_EDGE_THRESHOLD', 60),
+        'PADDING': config.get('PADDING', 0.05),
+        'MAX_COVERAGE': config.get('MAX_COVERAGE', 0.6),
+    }
+
+
+@lru_cache(maxsize=None)
+def face_classifier():
+    """
+    OpenCV's frontal face Haar cascade, loaded once per process
+    """
+    return cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
+
+
+def find_cards(image, edge_threshold=100, min_area=0.01, max_area=0.95, max_aspect=3.0, min_fill=0.5):
+    """
+    Solid, sharp-edged regions roughly the shape of cards or passport pages
+
+    The shape test is loose, since overlapping cards merge into one irregular
+    region; the printed edge of a card is what tells it apart from soft
+    shapes such as blurred objects or shadows.
+
+    Args:
+        image (ndarray): BGR image
+        edge_threshold (int): Median gradient along a card's outline
+        min_area (float): Smallest bounding box, as a share of the image
+        max_area (float): Largest bounding box, as a share of the image
+        max_aspect (float): Largest ratio of the box's long side to its short side
+        min_fill (float): Smallest share of its bounding box a region fills
+
+    Returns:
+        list: (x1, y1, x2, y2) boxes
+    """
+    height, width = image.shape[:2]
+    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    _, mask = cv2.threshold(cv2.blur(gray, (5, 5)), 0, 255, cv2.THRESH_BINARY_INV | cv2.THRESH_OTSU)
+    mask = cv2.morphologyEx(mask, cv2.MORPH_OPEN, cv2.getStructuringElement(cv2.MORPH_RECT, (3, 3)))
+    contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_NONE)
+    gradient = None
+
+    boxes = []
+    for contour in contours:
+        x, y, box_width, box_height = cv2.boundingRect(contour)
+        area = box_width * box_height
+        if not min_area * width * height <= area <= max_area * width * height:
+            continue
+        if max(box_width, box_height) / min(box_width, box_height) > max_aspect:
+            continue
+        if cv2.contourArea(contour) < min_fill * area:
+            continue
+        if gradient is None:
+            gradient = cv2.magnitude(cv2.Sobel(gray, cv2.CV_32F, 1, 0), cv2.Sobel(gray, cv2.CV_32F, 0, 1))
+        outline = contour[:, 0, :]
+        if float(np.median(gradient[outline[:, 1], outline[:, 0]])) >= edge_threshold:
+            boxes.append((x, y, x + box_width - 1, y + box_height - 1))
+    return boxes
+
+
+def find_text(image, edge_threshold=60):
+    """
+    Lines of text, as runs of strong edges wider than they are tall
+
+    Args:
+        image (ndarray): BGR image
+        edge_threshold (int): Morphological gradient a text stroke reaches
+
+    Returns:
+        list: (x1, y1, x2, y2) boxes
+    """
+    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    edges = cv2.morphologyEx(gray, cv2.MORPH_GRADIENT, cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (3, 3)))
+    _, mask = cv2.threshold(edges, edge_threshold, 255, cv2.THRESH_BINARY)
+    # Join the letters of a line into one blob
+    mask = cv2.morphologyEx(mask, cv2.MORPH_CLOSE, cv2.getStructuringElement(cv2.MORPH_RECT, (9, 3)))
+    contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+
+    height, width = mask.shape
+    boxes = []
+    for contour in contours:
+        x, y, box_width, box_height = cv2.boundingRect(contour)
+        if (box_width >= 2 * box_height and 0.008 * height <= box_height <= 0.1 * height
+                and box_width >= 0.03 * width and cv2.contourArea(contour) >= 0.3 * box_width * box_height):
+            boxes.append((x, y, x + box_width - 1, y + box_height - 1))
+    return boxes
+
+
+def find_faces(image, input_size=None):
+    """
+    Frontal faces
+
+    Args:
+        image (ndarray): BGR image
+        input_size (int): Longest side to search at, or None for the image's own
+
+    Returns:
+        list: (x1, y1, x2, y2) boxes
+    """
+    height, width = image.shape[:2]
+    scale = min(input_size / max(height, width), 1.0) if input_size else 1.0
+    if scale < 1.0:
+        image = cv2.resize(image, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    faces = face_classifier().detectMultiScale(gray, scaleFactor=1.1, minNeighbors=5, minSize=(20, 20))
+    return [
+        (x / scale, y / scale, (x + face_width - 1) / scale, (y + face_height - 1) / scale)
+        for x, y, face_width, face_height in faces
+    ]
+
+
+def merge(boxes):
+    """
+    Merge overlapping (x1, y1, x2, y2) boxes until none overlap
+    """
+    boxes = list(boxes)
+    merged = True
+    while merged:
+        merged = False
+        for i in range(len(boxes)):
+            for j in range(i + 1, len(boxes)):
+                a, b = boxes[i], boxes[j]
+                if a[0] <= b[2] and b[0] <= a[2] and a[1] <= b[3] and b[1] <= a[3]:
+                    boxes[i] = (min(a[0], b[0]), min(a[1], b[1]), max(a[2], b[2]), max(a[3], b[3]))
+                    boxes.pop(j)
+                    merged = True
+                    break
+            if merged:
+                break
+    return boxes
+
+
+class CascadeDecision:
+    """
+    How the cascade gate decided to analyze one image
+
+    Attributes:
+        stage (str): 'gate' (nothing to analyze), 'regions' or 'full'
+        regions (list): (x, y, width, height) regions the models run on
+        proposals (dict): Number of proposals by kind
+        coverage (float): Share of the image the regions cover
+    """
+
+    def __init__(self, stage, regions=(), proposals=None, coverage=0.0):
+        self.stage = stage
+        self.regions = list(regions)
+        self.proposals = proposals or {}
+        self.coverage = coverage
+
+    def as_dict(self):
+        return {
+            'stage': self.stage,
+            'regions': len(self.regions),
+            'proposals': self.proposals,
+            'coverage': round(self.coverage, 4),
+        }
+
+    def export(self):
+        """
+        Publish the decision to the process metrics registry
+        """
+        CASCADE_DECISIONS.inc(stage=self.stage)
+
+
+def propose(image, config=None):
+    """
+    Run the gate over an image and decide which parts the models analyze
+
+    Args:
+        image (ndarray): BGR image the models would analyze
+        config (dict): cascade_settings(), if already read
+
+    Returns:
+        CascadeDecision: The decision, with regions in the image's coordinates
+    """
+    config = config or cascade_settings()
+    height, width = image.shape[:2]
+    scale = min(config['INPUT_SIZE'] / max(height, width), 1.0)
+    small = image
+    if scale < 1.0:
+        small = cv2.resize(image, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+
+    proposals = {}
+    if config['CARDS']:
+        proposals['cards'] = find_cards(
+            small, config['CARD_EDGE_THRESHOLD'], config['CARD_MIN_AREA'], config['CARD_MAX_AREA'],
+            config['CARD_MAX_ASPECT'], config['CARD_MIN_FILL']
+        )
+    if config['TEXT']:
+        proposals['text'] = find_text(small, config['TEXT_EDGE_THRESHOLD'])
+    boxes = [box for found in proposals.values() for box in found]
+    if config['FACES'] and not boxes:
+        proposals['faces'] = boxes = find_faces(small, config['FACE_INPUT_SIZE'])
+    counts = {kind: len(found) for kind, found in proposals.items()}
+    if not boxes:
+        return CascadeDecision('gate', proposals=counts)
+
+    # Pad in full-size pixels so the models see some context
+    pad = config['PADDING'] * max(height, width)
+    boxes = merge(
+        (
+            max(int(x1 / scale - pad), 0), max(int(y1 / scale - pad), 0),
+            min(int(x2 / scale + pad), width - 1), min(int(y2 / scale + pad), height - 1),
+        )
+        for x1, y1, x2, y2 in boxes
+    )
+    regions = [(x1, y1, x2 - x1 + 1, y2 - y1 + 1) for x1, y1, x2, y2 in boxes]
+    coverage = sum(region_width * region_height for _, _, region_width, region_height in regions) / (width * height)
+    if coverage > config['MAX_COVERAGE']:
+        return CascadeDecision('full', [(0, 0, width, height)], counts, 1.0)
+    return CascadeDecision('regions', regions, counts, coverage)
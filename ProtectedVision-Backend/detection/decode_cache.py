@@ -0,0 +1,133 @@
+"""
+Process-wide cache of decoded images
+
+The same image is often decoded again shortly after its analysis: by a
+shadow evaluation of a candidate model, or by a delta re-scan with a new
+model. Decoded pixels are kept in a least-recently-used cache keyed by the
+stored file's name, since uploads are never rewritten in place. Cached
+arrays are made read-only, so callers copy them before drawing on them, as
+redaction already does.
+
+The cache is sized by the process's role: processes that run detection jobs
+call configure_for_worker() and keep up to DECODE_CACHE['WORKER_MAX_BYTES'],
+while other processes, such as API servers without in-process workers, keep
+DECODE_CACHE['MAX_BYTES'] (nothing by default).
+"""
+
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+
+from core.metrics import registry
+
+
+DECODE_CACHE_LOOKUPS = registry.counter(
+    'detection_decode_cache_total',
+    'Decoded image cache lookups by result',
+    ['result']
+)
+
+_cache = None
+_cache_lock = threading.Lock()
+_worker = False
+
+
+def decode_cache_settings():
+    config = getattr(settings, 'DECODE_CACHE', {})
+    return {
+        'MAX_BYTES': config.get('MAX_BYTES', 0),
+        'WORKER_MAX_BYTES': config.get('WORKER_MAX_BYTES', 256 * 1024 * 1024),
+    }
+
+
+def cache_size():
+    """
+    Bytes this process's cache may hold, for its role
+    """
+    config = decode_cache_settings()
+    return config['WORKER_MAX_BYTES'] if _worker else config['MAX_BYTES']
+
+
+class DecodeCache:
+    """
+    Least-recently-used cache of decoded images bounded by their total size
+
+    Args:
+        max_bytes (int): Total pixel bytes kept; 0 disables the cache
+    """
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self._images = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """
+        Return the cached image for a key, or None
+        """
+        with self._lock:
+            image = self._images.get(key)
+            if image is not None:
+                self._images.move_to_end(key)
+        DECODE_CACHE_LOOKUPS.inc(result='hit' if image is not None else 'miss')
+        return image
+
+    def put(self, key, image):
+        """
+        Cache an image, evicting the least recently used ones to make room
+
+        Images larger than the whole cache are not kept.
+        """
+        if image.nbytes > self.max_bytes:
+            return
+        image.flags.writeable = False
+        with self._lock:
+            previous = self._images.pop(key, None)
+            if previous is not None:
+                self.bytes -= previous.nbytes
+            self._images[key] = image
+            self.bytes += image.nbytes
+            while self.bytes > self.max_bytes:
+                _, evicted = self._images.popitem(last=False)
+                self.bytes -= evicted.nbytes
+
+    def clear(self):
+        with self._lock:
+            self._images.clear()
+            self.bytes = 0
+
+    def resize(self, max_bytes):
+        """
+        Change the bound, evicting the least recently used images over it
+        """
+        with self._lock:
+            self.max_bytes = max_bytes
+            while self.bytes > self.max_bytes:
+                _, evicted = self._images.popitem(last=False)
+                self.bytes -= evicted.nbytes
+
+
+def get_decode_cache():
+    """
+    Return the process-wide decode cache
+    """
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = DecodeCache(cache_size())
+    return _cache
+
+
+def configure_for_worker():
+    """
+    Size this process's cache for running detection jobs
+    """
+    global _worker
+    with _cache_lock:
+        if _worker:
+            return
+        _worker = True
+        if _cache is not None:
+            _cache.resize(cache_size())
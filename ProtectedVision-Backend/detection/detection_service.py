@@ -1,15 +1,45 @@
 import time
 import os
+import re
 import random
-import cv2
-import numpy as np
-from datetime import datetime
 from django.conf import settings
-from django.core.files.base import ContentFile
-from PIL import Image, ImageDraw
+from django.core.files.base import ContentFile, File
+from django.utils import timezone
 
-from documents.models import Document, DocumentScan, SensitiveInformation
-from .models import DetectionModel, DetectionJob
+from core.lazy import lazy_import
+from documents.detections import pack, packed_settings, scan_detections
+from documents.models import Document, DocumentScan
+from .admission import degradation_settings
+from .cascade import cascade_settings, face_classifier, propose
+from .decode_cache import get_decode_cache
+from .model_graph import NODE_TYPES, ModelGraph
+from .models import DetectionModel, DetectionJob, ImageHash
+from .near_duplicates import (
+    NEAR_DUPLICATE_LOOKUPS, find_near_duplicates, forget_document, near_duplicate_settings, perceptual_hash,
+    rescale, to_signed
+)
+from .profiling import StageProfiler
+from .progress import JobLost, JobProgress
+from .quality import assess, quality_settings
+from .risk_engine import get_risk_engine
+from .serializers import DetectionResultSerializer
+from .shadow import schedule_shadow
+from .variants import select_variants
+
+
+# Loaded on first use, so processes that never analyze a file skip them
+cv2 = lazy_import('cv2')
+np = lazy_import('numpy')
+
+PDF_PAGE_PATTERN = re.compile(rb'/Type\s*/Page\b')
+
+# Share of a job's overall progress covered by model inference; decoding
+# comes before it and redaction/saving after it
+INFERENCE_PROGRESS = (0.05, 0.9)
+
+# Frames and pages are analyzed in up to this many segments; each finished
+# segment is reported as progress and checkpointed
+INFERENCE_SEGMENTS = 20
 
 
 class DetectionService:
@@ -18,8 +48,28 @@ class DetectionService:
     
     This is a placeholder implementation that simulates detection.
     In a real implementation, this would use actual ML models.
+    
+    Every step of a run is timed with a StageProfiler; the breakdown is
+    saved on the DetectionJob and exported to the metrics endpoint. Progress
+    through the stages is published to open event streams via JobProgress,
+    and videos and PDFs are checkpointed per segment of frames or pages so a
+    job restarted after a crash resumes instead of starting over.
+    
+    Jobs flagged ``fast_mode`` by the scheduler analyze every
+    VIDEO_FRAME_STRIDE-th frame and downscale images to MAX_IMAGE_SIDE
+    before inference. PDFs always get every page analyzed.
+    
+    Inference runs the job's active models through a ModelGraph, which
+    runs independent models concurrently and records each one's latency.
+    Of a detector registered in several variants (precision, input size),
+    the one fitting the job's fast mode or latency budget runs.
     """
     
+    MOCK_SENSITIVE_TYPES = [
+        'credit_card', 'passport', 'driver_license', 'social_security',
+        'phone_number', 'email', 'address', 'bank_account', 'pii'
+    ]
+    
     def __init__(self):
         self.yolo_weights_path = getattr(settings, 'ML_MODELS', {}).get(
             'YOLO_WEIGHTS_PATH', None
@@ -30,35 +80,118 @@ class DetectionService:
         self.iou_threshold = getattr(settings, 'ML_MODELS', {}).get(
             'IOU_THRESHOLD', 0.45
         )
+        self.simulate_delay = getattr(settings, 'ML_MODELS', {}).get(
+            'SIMULATE_PROCESSING_DELAY', True
+        )
+        self.degradation = degradation_settings()
+        self.profiler = StageProfiler()
+        self.decoded_image = None
+        self.reporter = None
+        self.fast_mode = False
+        self.models = ModelGraph()
+        self.shared_inputs = {}
+        self.cascade = None
+        self.quality = None
+        self.near_duplicate = None
+        self.image_hashes = []
+        self.deduplicate = False
     
-    def analyze_document(self, document_id):
+    @classmethod
+    def preload(cls):
+        """
+        Load everything a first analysis would otherwise load on demand
+        
+        Imports OpenCV and numpy, runs the image codecs once, loads the
+        cascade's face classifier and compiles the risk policy. Worker
+        processes call this at start-up; the preforking supervisor calls it
+        once before forking so its workers share the pages.
+        """
+        ok, buffer = cv2.imencode('.jpg', np.zeros((8, 8, 3), dtype=np.uint8))
+        cv2.imdecode(buffer, cv2.IMREAD_COLOR)
+        capture = cv2.VideoCapture()
+        capture.release()
+        face_classifier()
+        get_risk_engine()
+    
+    @staticmethod
+    def select_models(fast_mode=False, latency_budget_ms=None):
+        """
+        One variant of each active detector, picked for a fast mode or latency budget
+        """
+        return select_variants(
+            DetectionModel.objects.filter(active=True, shadow=False).order_by('id'),
+            fast_mode,
+            latency_budget_ms
+        )
+    
+    def analyze_document(self, document_id, job=None, models=None):
         """
         Main method to analyze a document for sensitive information
         
         Args:
             document_id (int): ID of the document to analyze
-            
+            job (DetectionJob): Pending job to run instead of creating a new one
+            models (list): Models from select_models() already loaded for the
+                job's batch; selected for this job when None
+        
         Returns:
-            dict: Detection results
+            dict: Detection results, including the id of the saved scan
         """
         start_time = time.time()
+        self.profiler = profiler = StageProfiler()
+        self.decoded_image = None
+        self.models = ModelGraph()
+        self.shared_inputs = {}
+        self.cascade = None
+        self.quality = None
+        self.near_duplicate = None
+        self.image_hashes = []
+        # Near-duplicates of earlier images reuse their detections
+        self.deduplicate = near_duplicate_settings()['ENABLED']
         
-        # Get the document
-        try:
-            document = Document.objects.get(id=document_id)
-        except Document.DoesNotExist:
-            return {"error": "Document not found"}
-        
-        # Create a detection job
-        job = DetectionJob.objects.create(
-            document=document,
-            status='processing'
-        )
+        if job is not None:
+            document = job.document
+            job.status = 'processing'
+            if job.processing_started_at is None:
+                job.processing_started_at = timezone.now()
+            job.save(update_fields=['status', 'processing_started_at'])
+        else:
+            # Get the document
+            try:
+                document = Document.objects.get(id=document_id)
+            except Document.DoesNotExist:
+                return {"error": "Document not found"}
+            
+            # Create a detection job
+            job = DetectionJob.objects.create(
+                document=document,
+                status='processing',
+                processing_started_at=timezone.now(),
+                heartbeat_at=timezone.now(),
+                attempts=1
+            )
+        
+        self.fast_mode = job.fast_mode
+        self.reporter = JobProgress(job, document.user_id)
+        self._report('decode', 0.0)
         
         try:
             # Get active detection models
-            active_models = DetectionModel.objects.filter(active=True)
-            job.models_used.set(active_models)
+            with profiler.stage('db'):
+                # One variant of each detector, picked for the job's fast
+                # mode or latency budget
+                active_models = models
+                if active_models is None:
+                    active_models = self.select_models(job.fast_mode, job.latency_budget_ms)
+                # A plain INSERT: models_used.set() reads the existing rows
+                # first, and that read-then-write transaction makes SQLite
+                # fail with "database is locked" under concurrent workers
+                UsedModel = DetectionJob.models_used.through
+                UsedModel.objects.bulk_create([
+                    UsedModel(detectionjob_id=job.id, detectionmodel_id=model.id)
+                    for model in active_models
+                ], ignore_conflicts=True)
+            self.models = ModelGraph(active_models)
             
             # Process based on file type
             if document.file_type == 'image':
@@ -69,15 +202,15 @@ class DetectionService:
                 results = self._process_pdf(document)
             else:
                 results = {"error": "Unsupported file type"}
-                job.status = 'failed'
-                job.error_message = "Unsupported file type"
-                job.save()
+                self._finish_job(job, document, 'failed', "Unsupported file type")
                 return results
             
             # Calculate risk level based on sensitive items found
-            risk_level = self._calculate_risk_level(results)
+            with profiler.stage('risk'):
+                risk_level, risk_score = self._calculate_risk_level(results)
             
             # Create processed file with redactions
+            self._report('redaction', INFERENCE_PROGRESS[1])
             processed_file = self._create_redacted_file(document, results)
             
             # Store a reference to the processed file
@@ -85,64 +218,224 @@ class DetectionService:
                 # Keep track of processing time
                 processing_time = time.time() - start_time
                 
-                # Update job status
-                job.status = 'completed'
-                job.completed_at = datetime.now()
-                job.save()
-                
-                # Return results
-                return {
+                results_data = {
                     "document_id": document.id,
                     "risk_level": risk_level,
+                    "risk_score": risk_score,
                     "processing_time": processing_time,
                     "sensitive_items": results
                 }
+                
+                # Save the scan, its sensitive items and the redacted file,
+                # unless the job was recovered and handed to another worker
+                self._report('saving', 0.95)
+                self.reporter.heartbeat()
+                with profiler.stage('db') as stage:
+                    scan = self._save_results(results_data, processed_file)
+                    stage.items += len(results)
+                    self._store_hashes(document)
+                
+                # Update job status
+                self._finish_job(job, document, 'completed')
+                
+                # Compare shadow candidates on a sample of jobs, in the background
+                schedule_shadow(job, scan)
+                
+                # Return results
+                results_data["scan_id"] = scan.id
+                if self.quality is not None:
+                    results_data["quality"] = self.quality.as_dict()
+                if self.near_duplicate is not None:
+                    results_data["near_duplicate"] = self.near_duplicate.as_dict()
+                return results_data
             else:
-                job.status = 'failed'
-                job.error_message = "Failed to create processed file"
-                job.save()
+                self._finish_job(job, document, 'failed', "Failed to create processed file")
                 return {"error": "Failed to create processed file"}
-                
+        
+        except JobLost as e:
+            # The job now belongs to another worker, which will finish it
+            return {"error": str(e)}
+        
         except Exception as e:
             # Update job status in case of error
-            job.status = 'failed'
-            job.error_message = str(e)
-            job.save()
+            self._finish_job(job, document, 'failed', str(e))
             return {"error": str(e)}
     
-    def _process_image(self, document):
+    def _finish_job(self, job, document, status, error_message=None):
         """
-        Process an image document to detect sensitive information
+        Record the final status and stage breakdown of a detection job
         
-        This is a placeholder implementation that returns mock results.
-        In a real implementation, this would use actual ML models.
+        Args:
+            job (DetectionJob): Job being finished
+            document (Document): Document the job analyzed
+            status (str): 'completed' or 'failed'
+            error_message (str): Reason for a failure
+        """
+        job.status = status
+        job.error_message = error_message
+        if status == 'completed':
+            job.completed_at = timezone.now()
+            job.progress = 1.0
+            job.checkpoint = None
+        job.current_stage = ''
+        job.stage_timings = self.profiler.as_dict()
+        job.model_timings = self.models.as_dict()
+        job.cascade = self.cascade.as_dict() if self.cascade is not None else None
+        job.quality = self.quality.as_dict() if self.quality is not None else None
+        job.near_duplicate = self.near_duplicate.as_dict() if self.near_duplicate is not None else None
+        # Only the attempt that currently owns the job may finish it
+        updated = DetectionJob.objects.filter(pk=job.pk, attempts=job.attempts).update(
+            status=job.status,
+            error_message=job.error_message,
+            completed_at=job.completed_at,
+            progress=job.progress,
+            current_stage=job.current_stage,
+            stage_timings=job.stage_timings,
+            model_timings=job.model_timings,
+            cascade=job.cascade,
+            quality=job.quality,
+            near_duplicate=job.near_duplicate,
+            checkpoint=job.checkpoint,
+            heartbeat_at=timezone.now()
+        )
+        if not updated:
+            return
+        self.profiler.export(document.file_type, status)
+        self.models.export()
+        if self.cascade is not None:
+            self.cascade.export()
+        if self.quality is not None:
+            self.quality.export()
+        self.reporter.finish(error_message)
+    
+    def _report(self, stage, progress, done=None, total=None, unit=None):
+        """
+        Publish the current job's progress, if a job is running
+        """
+        if self.reporter is not None:
+            self.reporter.update(stage, progress, done, total, unit)
+    
+    def _run_inference(self, seconds, units, unit, detect):
+        """
+        Run (simulated) inference over a document's frames, pages or image
+        
+        Work is split into up to INFERENCE_SEGMENTS segments. Each finished
+        segment is reported as progress and, for multi-unit documents,
+        checkpointed with the detections found so far. Segments covered by
+        the job's checkpoint are skipped, so a recovered job resumes where
+        the crashed worker stopped.
         
         Args:
-            document (Document): Document object to process
-            
+            seconds (float): Simulated latency for the whole document
+            units (int): Number of frames, pages or images to process
+            unit (str): Name of the units ('frames', 'pages', 'images')
+            detect (callable): Returns detections for units [first, last)
+                given (first, last, number of segments, simulated seconds
+                of the segment)
+        
         Returns:
-            list: List of detected sensitive items
+            list: Detections from every segment
         """
-        # In a real implementation, this would load the image and pass it to ML models
+        start, end = INFERENCE_PROGRESS
+        steps = max(min(units, INFERENCE_SEGMENTS), 1)
+        bounds = [units * i // steps for i in range(steps + 1)]
         
-        # Simulate processing delay
-        time.sleep(2)
+        done, detections = 0, []
+        checkpoint = self.reporter.job.checkpoint if self.reporter else None
+        if checkpoint and checkpoint.get('unit') == unit and checkpoint.get('total') == units:
+            done, detections = checkpoint['done'], list(checkpoint['detections'])
         
-        # Return mock results
-        mock_sensitive_types = [
-            'credit_card', 'passport', 'driver_license', 'social_security',
-            'phone_number', 'email', 'address', 'bank_account', 'pii'
-        ]
+        for first, last in zip(bounds, bounds[1:]):
+            if last <= done:
+                continue
+            detections.extend(detect(first, last, steps, seconds / steps if self.simulate_delay else 0))
+            done = last
+            self._report('inference', start + (end - start) * done / units, done, units, unit)
+            if units > 1 and self.reporter is not None:
+                self.reporter.checkpoint({
+                    'unit': unit, 'total': units, 'done': done, 'detections': detections
+                })
+        return detections
+    
+    def _save_results(self, results_data, processed_file):
+        """
+        Persist detection results as a DocumentScan with its sensitive items
+        
+        Video detections, which carry a frame, are packed into the scan's
+        detections file rather than saved as one row each; the scan gets a
+        summary row per detected type instead.
+        
+        Args:
+            results_data (dict): Detection results for the document
+            processed_file (File): Redacted version of the document
+        
+        Returns:
+            DocumentScan: The saved scan
+        """
+        detections = None
+        items = results_data['sensitive_items']
+        if packed_settings()['ENABLED'] and any('frame' in item for item in items):
+            detections = pack([item for item in items if 'frame' in item])
+            results_data = dict(results_data, sensitive_items=[item for item in items if 'frame' not in item])
+        
+        serializer = DetectionResultSerializer(data=results_data)
+        serializer.is_valid(raise_exception=True)
+        try:
+            return serializer.save(processed_file=processed_file, detections=detections)
+        finally:
+            processed_file.close()
+    
+    def _decode_image(self, document):
+        """
+        Read and decode an image document into a BGR pixel array
+        
+        Recently decoded images come from the process's decode cache.
+        
+        Args:
+            document (Document): Image document to decode
+        
+        Returns:
+            ndarray: Decoded image, read-only
+        """
+        cache = get_decode_cache()
+        with self.profiler.stage('decode') as stage:
+            image = cache.get(document.file.name)
+            if image is not None:
+                stage.items += 1
+                return image
+            with document.file.open('rb') as f:
+                data = f.read()
+            stage.bytes += len(data)
+            image = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)
+            if image is None:
+                raise ValueError("Unable to decode image")
+            stage.items += 1
+        cache.put(document.file.name, image)
+        return image
+    
+    def _mock_detections(self, width, height, types=None):
+        """
+        Generate random detections inside a frame of the given size
         
+        Args:
+            width (int): Frame width in pixels
+            height (int): Frame height in pixels
+            types (tuple): Sensitive types to pick from (all mock types by default)
+        
+        Returns:
+            list: List of detected sensitive items
+        """
         results = []
         for _ in range(random.randint(1, 5)):  # Random number of detections
-            sensitive_type = random.choice(mock_sensitive_types)
+            sensitive_type = random.choice(types or self.MOCK_SENSITIVE_TYPES)
             confidence = random.uniform(0.75, 0.99)
+            box_width = min(random.randint(50, 200), width)
+            box_height = min(random.randint(20, 50), height)
             location = {
-                'x': random.randint(10, 500),
-                'y': random.randint(10, 500),
-                'width': random.randint(50, 200),
-                'height': random.randint(20, 50)
+                'x': random.randint(0, max(width - box_width, 0)),
+                'y': random.randint(0, max(height - box_height, 0)),
+                'width': box_width,
+                'height': box_height
             }
             results.append({
                 'type': sensitive_type,
@@ -150,9 +443,337 @@ class DetectionService:
                 'location': location,
                 'count': 1
             })
-        
         return results
     
+    def _mock_segment_detections(self, width, height, segments, types=None):
+        """
+        Generate the share of a document's random detections found in one segment
+        
+        Args:
+            width (int): Frame width in pixels
+            height (int): Frame height in pixels
+            segments (int): Number of segments the document is split into
+            types (tuple): Sensitive types to pick from (all mock types by default)
+        
+        Returns:
+            list: List of detected sensitive items
+        """
+        return [
+            item for item in self._mock_detections(width, height, types)
+            if random.random() < 1.0 / segments
+        ]
+    
+    def _detect(self, pixels, width, height, steps, seconds, tag=None):
+        """
+        Run the active models over one segment of a document
+        
+        Args:
+            pixels (ndarray): Decoded image shared by the models, if any
+            width (int): Frame width in pixels
+            height (int): Frame height in pixels
+            steps (int): Number of segments the document is split into
+            seconds (float): Simulated latency of the segment
+            tag (callable): Adds the frame or page to a detection
+        
+        Returns:
+            list: Detections of all models
+        """
+        def sample(types):
+            items = self._mock_segment_detections(width, height, steps, types)
+            return [tag(item) for item in items] if tag else items
+        
+        return self.models.run({'pixels': pixels, **self.shared_inputs}, sample, seconds)
+    
+    def run_models(self, document, models, fast_mode=False, inputs=None):
+        """
+        Run some models over an analyzed document without saving or reporting anything
+        
+        Used for shadow candidates and delta re-scans.
+        
+        Args:
+            document (Document): Document an earlier job analyzed
+            models (list): DetectionModel rows to run
+            fast_mode (bool): Whether to run in fast mode
+            inputs (dict): Earlier outputs the models may need, such as
+                OCR's text_regions
+        
+        Returns:
+            tuple: The models' detections and their ModelGraph
+        """
+        inputs = dict(inputs or {})
+        self.profiler = StageProfiler()
+        self.reporter = None
+        self.decoded_image = None
+        self.cascade = None
+        self.quality = None
+        self.near_duplicate = None
+        self.image_hashes = []
+        # The models must see every document they are run over
+        self.deduplicate = False
+        self.fast_mode = fast_mode
+        self.models = ModelGraph(models, inputs=('pixels',) + tuple(inputs))
+        self.shared_inputs = inputs
+        
+        process = {
+            'image': self._process_image,
+            'video': self._process_video,
+            'pdf': self._process_pdf,
+        }[document.file_type]
+        return process(document), self.models
+    
+    def rescan_document(self, document, models):
+        """
+        Run only some models over an analyzed document and save a merged scan
+        
+        Detections of the models' sensitive types in the document's latest
+        scan are replaced by theirs; those of every other model are kept.
+        The merged detections are re-scored and saved as a new scan with a
+        fresh redacted file. A transformer gets the stored OCR text regions
+        unless an OCR model is re-run too.
+        
+        Args:
+            document (Document): Document analyzed before
+            models (list): New or upgraded DetectionModel rows
+        
+        Returns:
+            DocumentScan: The new scan, or None if the document has no scan
+        """
+        start_time = time.time()
+        latest = document.scans.order_by('-scan_date', '-id').first()
+        if latest is None:
+            return None
+        previous = scan_detections(latest)
+        
+        replaced, provided = set(), set()
+        for model in models:
+            node = NODE_TYPES.get(model.model_type)
+            if node is not None:
+                replaced.update(node.types)
+                provided.update(node.provides)
+        inputs = {}
+        if 'text_regions' not in provided:
+            inputs['text_regions'] = [
+                item['location'] for item in previous
+                if item['type'] in NODE_TYPES['ocr'].types and item['location']
+            ]
+        
+        detections, _ = self.run_models(document, models, inputs=inputs)
+        items = [item for item in previous if item['type'] not in replaced] + detections
+        risk_level, risk_score = self._calculate_risk_level(items)
+        processed_file = self._create_redacted_file(document, items)
+        if not processed_file:
+            raise ValueError("Failed to create processed file")
+        return self._save_results({
+            "document_id": document.id,
+            "risk_level": risk_level,
+            "risk_score": risk_score,
+            "processing_time": time.time() - start_time,
+            "sensitive_items": items
+        }, processed_file)
+    
+    def _non_max_suppression(self, detections):
+        """
+        Drop overlapping detections of the same type
+        
+        Args:
+            detections (list): Candidate detections with 'location' boxes
+        
+        Returns:
+            list: Detections that survived suppression
+        """
+        with self.profiler.stage('nms') as stage:
+            stage.items += len(detections)
+            by_type = {}
+            for item in detections:
+                by_type.setdefault(item['type'], []).append(item)
+            
+            kept = []
+            for items in by_type.values():
+                boxes = [
+                    [item['location']['x'], item['location']['y'],
+                     item['location']['width'], item['location']['height']]
+                    for item in items
+                ]
+                scores = [float(item['confidence']) for item in items]
+                indices = cv2.dnn.NMSBoxes(
+                    boxes, scores, self.confidence_threshold, self.iou_threshold
+                )
+                kept.extend(items[i] for i in np.array(indices).flatten())
+        return kept
+    
+    def _reuse_near_duplicate(self, document, image):
+        """
+        Hash an image and reuse the detections of an earlier near-duplicate
+        
+        Args:
+            document (Document): Image document being analyzed
+            image (ndarray): Its decoded pixels
+        
+        Returns:
+            list: The earlier image's detections rescaled to this one, or
+                None if the models have to run
+        """
+        height, width = image.shape[:2]
+        with self.profiler.stage('hash') as stage:
+            value = perceptual_hash(image)
+            matches = find_near_duplicates(document.user_id, document.id, value)
+            stage.items += 1
+        
+        scan = None
+        for match in matches:
+            if match.frame is None:
+                scan = DocumentScan.objects.filter(document_id=match.document_id).order_by('-scan_date', '-id').first()
+                if scan is not None:
+                    break
+            if not Document.objects.filter(id=match.document_id).exists():
+                # Deleted since this process loaded its hashes
+                forget_document(document.user_id, match.document_id)
+            elif match.frame is not None:
+                # Keyframe matches are only recorded; a video's detections
+                # only cover the frames it sampled
+                break
+        else:
+            match = None
+        self.near_duplicate = match
+        if scan is None:
+            # Only images the models analyzed are indexed, so reuse never chains
+            self.image_hashes = [(None, value, width, height)]
+            NEAR_DUPLICATE_LOOKUPS.inc(result='miss' if match is None else 'matched')
+            return None
+        
+        match.reused = True
+        NEAR_DUPLICATE_LOOKUPS.inc(result='reused')
+        return rescale(scan_detections(scan), match.width, match.height, width, height)
+    
+    def _hash_keyframes(self, document, frame_count):
+        """
+        Hash evenly spaced keyframes of a video for the near-duplicate index
+        
+        Args:
+            document (Document): Video document being analyzed
+            frame_count (int): Number of frames in the video
+        """
+        keyframes = near_duplicate_settings()['KEYFRAMES']
+        with self.profiler.stage('hash') as stage:
+            capture = cv2.VideoCapture(document.file.path)
+            try:
+                for index in range(keyframes if capture.isOpened() else 0):
+                    frame_index = index * frame_count // keyframes
+                    capture.set(cv2.CAP_PROP_POS_FRAMES, frame_index)
+                    ok, frame = capture.read()
+                    if not ok:
+                        break
+                    height, width = frame.shape[:2]
+                    self.image_hashes.append((frame_index, perceptual_hash(frame), width, height))
+                    stage.items += 1
+            finally:
+                capture.release()
+    
+    def _store_hashes(self, document):
+        """
+        Add the analyzed image's or keyframes' hashes to the user's index
+        
+        Uploads are never rewritten, so a document re-analyzed later keeps
+        the hashes it got the first time.
+        """
+        if not self.image_hashes or ImageHash.objects.filter(document=document).exists():
+            return
+        ImageHash.objects.bulk_create([
+            ImageHash(
+                document=document, user_id=document.user_id, frame=frame,
+                hash=to_signed(value), width=width, height=height
+            )
+            for frame, value, width, height in self.image_hashes
+        ])
+    
+    def _process_image(self, document):
+        """
+        Process an image document to detect sensitive information
+        
+        This is a placeholder implementation that returns mock results.
+        In a real implementation, this would use actual ML models.
+        
+        The image goes through the input quality gate first (see
+        quality.py): tiny or blank images skip the models, blurry ones are
+        analyzed downscaled, as in fast mode, and badly exposed ones in full.
+        A near-duplicate of an earlier image of the user's (see
+        near_duplicates.py) reuses that image's detections. Then the cascade
+        gate (see cascade.py) lets an image without cards, text or faces skip
+        the models, and otherwise the models only see the regions it proposed.
+        
+        Args:
+            document (Document): Document object to process
+        
+        Returns:
+            list: List of detected sensitive items
+        """
+        image = self._decode_image(document)
+        self.decoded_image = image
+        height, width = image.shape[:2]
+        
+        # Unusable images stop here, before any model runs
+        if quality_settings()['ENABLED']:
+            with self.profiler.stage('quality') as stage:
+                self.quality = assess(image)
+                stage.items += 1
+            if self.quality.action == 'skip':
+                return []
+        
+        # A near-duplicate of an earlier photo gets that photo's detections
+        if self.deduplicate:
+            reused = self._reuse_near_duplicate(document, image)
+            if reused is not None:
+                return reused
+        
+        downgrade = self.quality is not None and self.quality.action == 'downgrade'
+        
+        # In fast mode, or for a blurry image, the model sees a downscaled
+        # copy; boxes are mapped back to the full-size image that gets redacted
+        scale = 1.0
+        max_side = self.degradation['MAX_IMAGE_SIDE']
+        if (self.fast_mode or downgrade) and max(width, height) > max_side:
+            scale = max_side / max(width, height)
+            with self.profiler.stage('decode'):
+                image = cv2.resize(image, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+        input_height, input_width = image.shape[:2]
+        
+        # Cheap detectors decide whether the models run, and on which regions;
+        # they are no more reliable than the models on a badly exposed image
+        regions = [(0, 0, input_width, input_height)]
+        flagged = self.quality is not None and self.quality.action == 'flag'
+        if cascade_settings()['ENABLED'] and not flagged:
+            with self.profiler.stage('gate') as stage:
+                self.cascade = propose(image)
+                stage.items += 1
+            regions = self.cascade.regions
+        
+        def detect(first, last, steps, seconds):
+            detections = []
+            for x, y, width, height in regions:
+                # Models are charged for the share of the image they see
+                share = width * height / (input_width * input_height)
+                detections.extend(self._detect(
+                    image[y:y + height, x:x + width], width, height, steps, seconds * share,
+                    lambda item, x=x, y=y: dict(item, location=dict(
+                        item['location'], x=item['location']['x'] + x, y=item['location']['y'] + y
+                    ))
+                ))
+            return detections
+        
+        detections = []
+        if regions:
+            with self.profiler.stage('inference') as stage:
+                detections = self._run_inference(2 * scale * scale, 1, 'images', detect)
+                stage.items += 1
+        
+        if scale != 1.0:
+            for item in detections:
+                item['location'] = {
+                    key: int(round(value / scale)) for key, value in item['location'].items()
+                }
+        
+        return self._non_max_suppression(detections)
+    
     def _process_video(self, document):
         """
         Process a video to detect sensitive information
@@ -162,21 +783,38 @@ class DetectionService:
         
         Args:
             document (Document): Document object to process
-            
+        
         Returns:
             list: List of detected sensitive items
         """
-        # Simulate processing delay
-        time.sleep(5)
+        # Read the stream metadata; unreadable streams fall back to defaults
+        with self.profiler.stage('decode') as stage:
+            capture = cv2.VideoCapture(document.file.path)
+            try:
+                frame_count = int(capture.get(cv2.CAP_PROP_FRAME_COUNT)) or 500
+                width = int(capture.get(cv2.CAP_PROP_FRAME_WIDTH)) or 640
+                height = int(capture.get(cv2.CAP_PROP_FRAME_HEIGHT)) or 480
+            finally:
+                capture.release()
+            stage.bytes += document.file.size
+        if self.deduplicate:
+            self._hash_keyframes(document, frame_count)
         
-        # Just use the image processor as a mock
-        results = self._process_image(document)
+        # Fast mode only analyzes every stride-th frame
+        stride = self.degradation['VIDEO_FRAME_STRIDE'] if self.fast_mode else 1
+        sampled = -(-frame_count // stride)
         
-        # Add video-specific metadata
-        for item in results:
-            item['frame'] = random.randint(1, 500)
-            
-        return results
+        with self.profiler.stage('inference') as stage:
+            detections = self._run_inference(
+                5 * sampled / frame_count, sampled, 'frames',
+                lambda first, last, steps, seconds: self._detect(
+                    None, width, height, steps, seconds,
+                    lambda item: dict(item, frame=min(random.randint(first, last - 1) * stride + 1, frame_count))
+                )
+            )
+            stage.items += sampled
+        
+        return self._non_max_suppression(detections)
     
     def _process_pdf(self, document):
         """
@@ -187,103 +825,94 @@ class DetectionService:
         
         Args:
             document (Document): Document object to process
-            
+        
         Returns:
             list: List of detected sensitive items
         """
-        # Simulate processing delay
-        time.sleep(4)
+        with self.profiler.stage('decode') as stage:
+            with document.file.open('rb') as f:
+                data = f.read()
+            stage.bytes += len(data)
+            page_count = len(PDF_PAGE_PATTERN.findall(data)) or 10
+            stage.items += page_count
         
-        # Similar to image processing but with page numbers
-        results = self._process_image(document)
+        with self.profiler.stage('inference') as stage:
+            # Pages are treated as US Letter at 72 dpi
+            detections = self._run_inference(
+                4, page_count, 'pages',
+                lambda first, last, steps, seconds: self._detect(
+                    None, 612, 792, steps, seconds,
+                    lambda item: dict(item, page=random.randint(first + 1, last))
+                )
+            )
+            stage.items += page_count
         
-        # Add PDF-specific metadata
-        for item in results:
-            item['page'] = random.randint(1, 10)
-            
-        return results
+        return self._non_max_suppression(detections)
     
     def _calculate_risk_level(self, sensitive_items):
         """
         Calculate risk level based on sensitive items detected
         
+        Scoring is delegated to the configurable risk engine, which weighs
+        each item by type, confidence band, count and area.
+        
         Args:
             sensitive_items (list): List of detected sensitive items
-            
+        
         Returns:
-            str: Risk level ('low', 'medium', 'high')
+            tuple: Risk level ('low', 'medium', 'high') and risk score
         """
-        if not sensitive_items:
-            return 'low'
-        
-        # Count high-risk items (documents, financial info)
-        high_risk_count = sum(1 for item in sensitive_items 
-                             if item['type'] in ['credit_card', 'passport', 'driver_license', 
-                                                'social_security', 'bank_account'])
-        
-        # Count medium-risk items (contact info)
-        medium_risk_count = sum(1 for item in sensitive_items 
-                               if item['type'] in ['phone_number', 'email', 'address'])
-        
-        # Determine risk level based on counts
-        if high_risk_count > 0:
-            return 'high'
-        elif medium_risk_count > 0:
-            return 'medium'
-        else:
-            return 'low'
+        return get_risk_engine().score(sensitive_items)
     
     def _create_redacted_file(self, document, sensitive_items):
         """
         Create a redacted version of the document
         
-        This is a placeholder implementation that mocks redaction.
-        In a real implementation, this would apply actual redaction to the document.
+        Images are redacted in place on the pixels decoded for detection,
+        so the original file is not read a second time.
         
         Args:
             document (Document): Document object to redact
             sensitive_items (list): List of detected sensitive items
-            
+        
         Returns:
             File: Redacted file
         """
         try:
-            # For now, let's just create a copy of the original file
-            # In a real implementation, this would apply redaction
-            
             if document.file_type == 'image':
-                # Create a placeholder redacted image
-                # In a real implementation, this would apply actual redaction
+                image = self.decoded_image
+                if image is None:
+                    image = self._decode_image(document)
                 
-                # Open the image file
-                img = Image.open(document.file.path)
-                draw = ImageDraw.Draw(img)
+                with self.profiler.stage('redaction') as stage:
+                    redacted = image.copy()
+                    # Draw black rectangles over sensitive areas
+                    for item in sensitive_items:
+                        if 'location' in item:
+                            loc = item['location']
+                            x = loc.get('x', 0)
+                            y = loc.get('y', 0)
+                            width = loc.get('width', 100)
+                            height = loc.get('height', 20)
+                            cv2.rectangle(
+                                redacted, (x, y), (x + width, y + height),
+                                (0, 0, 0), thickness=-1
+                            )
+                            stage.items += 1
                 
-                # Draw rectangles over sensitive areas
-                for item in sensitive_items:
-                    if 'location' in item:
-                        loc = item['location']
-                        x = loc.get('x', 0)
-                        y = loc.get('y', 0)
-                        width = loc.get('width', 100)
-                        height = loc.get('height', 20)
-                        
-                        # Draw a black rectangle
-                        draw.rectangle(
-                            [(x, y), (x + width, y + height)],
-                            fill='black'
-                        )
+                # Encode the redacted image
+                with self.profiler.stage('encoding') as stage:
+                    ok, buffer = cv2.imencode('.jpg', redacted)
+                    if not ok:
+                        raise ValueError("Unable to encode redacted image")
+                    stage.bytes += buffer.nbytes
                 
-                # Save the redacted image
-                img_temp = ContentFile(b'')
-                img.save(img_temp, format='JPEG')
-                img_temp.seek(0)
-                
-                return img_temp
+                name = os.path.splitext(os.path.basename(document.file.name))[0]
+                return ContentFile(buffer.tobytes(), name=f"redacted_{name}.jpg")
             else:
                 # For other types, just return a copy for now
-                return document.file.file
-                
+                return File(document.file.open('rb'), name=os.path.basename(document.file.name))
+        
         except Exception as e:
             print(f"Error creating redacted file: {str(e)}")
-            return None 
\ No newline at end of file
+            return None
@@ -0,0 +1,156 @@
+"""
+Accuracy evaluation of detection model variants
+
+The detection models are placeholders, so variants are compared on a
+reference detector built the same way a quantized or reduced-input model
+is: ``CardDetector`` finds card-shaped regions with OpenCV, after resizing
+the image to the variant's input size and running its preprocessing at the
+variant's precision (float32, float16, or 8-bit integer arithmetic).
+Its boxes are scored against labelled ground truth with the usual
+object-detection mean average precision (mAP).
+"""
+
+from core.lazy import lazy_import
+
+
+# Loaded on first use, so processes that never evaluate a model skip them
+cv2 = lazy_import('cv2')
+np = lazy_import('numpy')
+
+# IoU thresholds of COCO-style mAP@0.5:0.95
+COCO_THRESHOLDS = tuple(0.5 + 0.05 * step for step in range(10))
+
+
+class CardDetector:
+    """
+    Reference OpenCV card detector with a configurable variant
+
+    Args:
+        input_size (int): Longest side the image is resized to, or None
+            to keep the native size
+        precision (str): 'fp32', 'fp16' or 'int8' preprocessing arithmetic
+        min_area (float): Smallest region kept, as a share of the image
+    """
+
+    def __init__(self, input_size=None, precision='fp32', min_area=0.01):
+        self.input_size = input_size
+        self.precision = precision
+        self.min_area = min_area
+
+    def _smooth(self, gray):
+        if self.precision == 'int8':
+            return cv2.blur(gray, (5, 5))
+        smoothed = cv2.GaussianBlur(gray.astype(np.float32) / 255.0, (5, 5), 0)
+        if self.precision == 'fp16':
+            smoothed = smoothed.astype(np.float16).astype(np.float32)
+        return np.clip(smoothed * 255.0, 0, 255).astype(np.uint8)
+
+    def detect(self, image):
+        """
+        Find card-like regions in an image
+
+        Args:
+            image (ndarray): BGR image
+
+        Returns:
+            list: (x1, y1, x2, y2, score) tuples in the image's coordinates
+        """
+        height, width = image.shape[:2]
+        scale = 1.0
+        if self.input_size and max(height, width) > self.input_size:
+            scale = self.input_size / max(height, width)
+            image = cv2.resize(image, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+
+        gray = self._smooth(cv2.cvtColor(image, cv2.COLOR_BGR2GRAY))
+        _, mask = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY_INV | cv2.THRESH_OTSU)
+        mask = cv2.morphologyEx(mask, cv2.MORPH_OPEN, cv2.getStructuringElement(cv2.MORPH_RECT, (3, 3)))
+        contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+
+        min_area = self.min_area * mask.shape[0] * mask.shape[1]
+        boxes = []
+        for contour in contours:
+            x, y, box_width, box_height = cv2.boundingRect(contour)
+            if box_width * box_height < min_area:
+                continue
+            # A solid card fills its box; clutter does not
+            score = min(cv2.contourArea(contour) / (box_width * box_height), 1.0)
+            boxes.append((
+                x / scale, y / scale, (x + box_width - 1) / scale, (y + box_height - 1) / scale, score
+            ))
+        return boxes
+
+
+def iou(first, second):
+    """
+    Intersection over union of two (x1, y1, x2, y2) boxes
+    """
+    width = min(first[2], second[2]) - max(first[0], second[0]) + 1
+    height = min(first[3], second[3]) - max(first[1], second[1]) + 1
+    if width <= 0 or height <= 0:
+        return 0.0
+    intersection = width * height
+    area = lambda box: (box[2] - box[0] + 1) * (box[3] - box[1] + 1)
+    return intersection / (area(first) + area(second) - intersection)
+
+
+def average_precision(predictions, ground_truth, threshold=0.5):
+    """
+    Average precision of detections over a set of images
+
+    Args:
+        predictions (list): Per image, the detector's (x1, y1, x2, y2, score) boxes
+        ground_truth (list): Per image, the true (x1, y1, x2, y2) boxes
+        threshold (float): IoU a detection needs to match a true box
+
+    Returns:
+        float: Area under the interpolated precision-recall curve
+    """
+    total = sum(len(boxes) for boxes in ground_truth)
+    if not total:
+        return 0.0
+    ranked = sorted(
+        ((box[4], image, box) for image, boxes in enumerate(predictions) for box in boxes),
+        key=lambda item: -item[0]
+    )
+    matched = [set() for _ in ground_truth]
+    hits = []
+    for _, image, box in ranked:
+        best, best_index = threshold, None
+        for index, truth in enumerate(ground_truth[image]):
+            overlap = iou(box, truth)
+            if index not in matched[image] and overlap >= best:
+                best, best_index = overlap, index
+        if best_index is not None:
+            matched[image].add(best_index)
+        hits.append(best_index is not None)
+
+    # All-point interpolation, as in PASCAL VOC 2010 and later
+    precision, recall = [], []
+    true_positives = 0
+    for rank, hit in enumerate(hits, start=1):
+        true_positives += hit
+        precision.append(true_positives / rank)
+        recall.append(true_positives / total)
+    for index in range(len(precision) - 2, -1, -1):
+        precision[index] = max(precision[index], precision[index + 1])
+    area, previous_recall = 0.0, 0.0
+    for index in range(len(hits)):
+        area += (recall[index] - previous_recall) * precision[index]
+        previous_recall = recall[index]
+    return area
+
+
+def mean_average_precision(predictions, ground_truth):
+    """
+    mAP at IoU 0.5 and averaged over IoU 0.5 to 0.95
+
+    Cards are the only class, so the mean is over IoU thresholds alone.
+
+    Returns:
+        dict: ``map50`` and ``map50_95``
+    """
+    per_threshold = [average_precision(predictions, ground_truth, threshold) for threshold in COCO_THRESHOLDS]
+    return {
+        'map50': per_threshold[0],
+        'map50_95': sum(per_threshold) / len(per_threshold),
+    }
@@ -0,0 +1,269 @@
+"""
+Server-Sent Event streams of detection job progress
+
+Served through core/asgi.py, the views are async and each open stream is a
+coroutine waiting on a queue. Under WSGI (core/wsgi.py, runserver) Django
+would read an async stream to the end before sending anything, so there the
+same events come from a generator that holds its worker thread for as long
+as the stream is open.
+
+Browsers' EventSource cannot send an Authorization header. Instead of the
+access token, which would end up in server and proxy access logs, streams
+take ``?ticket=`` from POST /api/detection/events/ticket/: a random value
+that expires after PROGRESS_EVENTS['TICKET_SECONDS'] and opens one stream.
+"""
+
+import json
+import secrets
+import time
+
+from asgiref.sync import sync_to_async
+from django.core.cache import cache
+from django.http import JsonResponse, StreamingHttpResponse
+from rest_framework import permissions, status
+from rest_framework.response import Response
+from rest_framework.views import APIView
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+
+from users.authentication import CachedJWTAuthentication
+from users.models import User
+from .models import DetectionJob
+from .progress import TERMINAL_STATUSES, broker, job_snapshot, progress_settings
+
+
+def format_event(event):
+    """
+    Encode an event dict in the text/event-stream wire format
+    """
+    lines = []
+    if event.get('id') is not None:
+        lines.append(f"id: {event['id']}")
+    lines.append(f"event: {event['type']}")
+    lines.append(f"data: {json.dumps(event)}")
+    return '\n'.join(lines) + '\n\n'
+
+
+def _ticket_key(ticket):
+    return f'event-ticket:{ticket}'
+
+
+def issue_ticket(user):
+    """
+    Create a single-use ticket that opens one event stream as ``user``
+    """
+    ticket = secrets.token_urlsafe(32)
+    cache.set(_ticket_key(ticket), user.pk, progress_settings()['TICKET_SECONDS'])
+    return ticket
+
+
+def redeem_ticket(ticket):
+    """
+    Spend a ticket
+
+    Returns:
+        User: The user it was issued to, or None if it is unknown, expired
+        or already spent
+    """
+    key = _ticket_key(ticket)
+    user_id = cache.get(key)
+    # Of concurrent redemptions only the one that deletes the key succeeds
+    if user_id is None or not cache.delete(key):
+        return None
+    return User.objects.filter(pk=user_id, is_active=True).first()
+
+
+def authenticate(request):
+    """
+    Resolve the user from a ``ticket`` query parameter or a Bearer header
+
+    Returns:
+        User: The authenticated user, or None
+    """
+    ticket = request.GET.get('ticket')
+    if ticket:
+        return redeem_ticket(ticket)
+    authentication = CachedJWTAuthentication()
+    header = authentication.get_header(request)
+    raw_token = header and authentication.get_raw_token(header)
+    if not raw_token:
+        return None
+    try:
+        return authentication.get_user(authentication.get_validated_token(raw_token))
+    except (InvalidToken, AuthenticationFailed):
+        return None
+
+
+class EventTicketView(APIView):
+    """
+    API endpoint issuing a ticket for opening an event stream
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def post(self, request):
+        return Response(
+            {'ticket': issue_ticket(request.user), 'expires_in': progress_settings()['TICKET_SECONDS']},
+            status=status.HTTP_201_CREATED
+        )
+
+
+def get_job(job_id, user):
+    return DetectionJob.objects.filter(id=job_id, document__user=user).first()
+
+
+def state_of(event):
+    return event['status'], event['stage'], event['progress']
+
+
+def polled_event(current, last):
+    """
+    Snapshot of a job read back from the database, or None if unchanged
+
+    Jobs running in another process only update the row.
+    """
+    snapshot = job_snapshot(current)
+    return None if state_of(snapshot) == state_of(last) else snapshot
+
+
+def job_gone_event(job_id):
+    """
+    Error event ending the stream of a job deleted while it was watched
+    """
+    return format_event({'type': 'error', 'job': job_id, 'detail': "Job not found"})
+
+
+def is_asgi(request):
+    return getattr(request, 'scope', None) is not None
+
+
+def event_stream_response(events):
+    response = StreamingHttpResponse(events, content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    # Stop nginx from buffering the stream
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+async def async_job_stream(job, user, config):
+    subscription = broker.subscribe(('job', job.id))
+    try:
+        # The stored state goes first so late subscribers are up to date
+        current = await sync_to_async(get_job)(job.id, user)
+        if current is None:
+            yield job_gone_event(job.id)
+            return
+        last = job_snapshot(current)
+        yield f"retry: {config['KEEPALIVE_SECONDS'] * 1000}\n" + format_event(last)
+        if current.status in TERMINAL_STATUSES:
+            return
+
+        deadline = time.monotonic() + config['MAX_STREAM_SECONDS']
+        while time.monotonic() < deadline:
+            event = await subscription.get(config['KEEPALIVE_SECONDS'])
+            if event is None:
+                current = await sync_to_async(get_job)(job.id, user)
+                if current is None:
+                    yield job_gone_event(job.id)
+                    return
+                event = polled_event(current, last)
+                if event is None:
+                    yield ': keepalive\n\n'
+                    continue
+            last = event
+            yield format_event(event)
+            if event['status'] in TERMINAL_STATUSES:
+                return
+    finally:
+        broker.unsubscribe(subscription)
+
+
+def job_stream(job, user, config):
+    """
+    WSGI counterpart of async_job_stream
+    """
+    subscription = broker.subscribe(('job', job.id), blocking=True)
+    try:
+        current = get_job(job.id, user)
+        if current is None:
+            yield job_gone_event(job.id)
+            return
+        last = job_snapshot(current)
+        yield f"retry: {config['KEEPALIVE_SECONDS'] * 1000}\n" + format_event(last)
+        if current.status in TERMINAL_STATUSES:
+            return
+
+        deadline = time.monotonic() + config['MAX_STREAM_SECONDS']
+        while time.monotonic() < deadline:
+            event = subscription.get(config['KEEPALIVE_SECONDS'])
+            if event is None:
+                current = get_job(job.id, user)
+                if current is None:
+                    yield job_gone_event(job.id)
+                    return
+                event = polled_event(current, last)
+                if event is None:
+                    yield ': keepalive\n\n'
+                    continue
+            last = event
+            yield format_event(event)
+            if event['status'] in TERMINAL_STATUSES:
+                return
+    finally:
+        broker.unsubscribe(subscription)
+
+
+async def async_user_stream(user, config):
+    subscription = broker.subscribe(('user', user.id))
+    try:
+        yield f"retry: {config['KEEPALIVE_SECONDS'] * 1000}\n\n"
+        deadline = time.monotonic() + config['MAX_STREAM_SECONDS']
+        while time.monotonic() < deadline:
+            event = await subscription.get(config['KEEPALIVE_SECONDS'])
+            yield ': keepalive\n\n' if event is None else format_event(event)
+    finally:
+        broker.unsubscribe(subscription)
+
+
+def user_stream(user, config):
+    """
+    WSGI counterpart of async_user_stream
+    """
+    subscription = broker.subscribe(('user', user.id), blocking=True)
+    try:
+        yield f"retry: {config['KEEPALIVE_SECONDS'] * 1000}\n\n"
+        deadline = time.monotonic() + config['MAX_STREAM_SECONDS']
+        while time.monotonic() < deadline:
+            event = subscription.get(config['KEEPALIVE_SECONDS'])
+            yield ': keepalive\n\n' if event is None else format_event(event)
+    finally:
+        broker.unsubscribe(subscription)
+
+
+async def job_events(request, job_id):
+    """
+    Stream progress events of one job until it completes or fails
+    """
+    user = await sync_to_async(authenticate)(request)
+    if user is None:
+        return JsonResponse({'detail': 'Authentication credentials were not provided.'}, status=401)
+    job = await sync_to_async(get_job)(job_id, user)
+    if job is None:
+        return JsonResponse({'detail': 'Not found.'}, status=404)
+
+    stream = async_job_stream if is_asgi(request) else job_stream
+    return event_stream_response(stream(job, user, progress_settings()))
+
+
+async def user_events(request):
+    """
+    Stream progress events of all of the current user's jobs
+
+    Only jobs running in the same server process are reported. The stream
+    ends after MAX_STREAM_SECONDS; a ticket opens only one stream, so clients
+    reconnect with a new one.
+    """
+    user = await sync_to_async(authenticate)(request)
+    if user is None:
+        return JsonResponse({'detail': 'Authentication credentials were not provided.'}, status=401)
+
+    stream = async_user_stream if is_asgi(request) else user_stream
+    return event_stream_response(stream(user, progress_settings()))
@@ -0,0 +1,84 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from detection.decode_cache import configure_for_worker
+from detection.models import DetectionModel, RescanRun
+from detection.rescan import DeltaRescanner
+from users.models import User
+
+
+class Command(BaseCommand):
+    """
+    Apply new or upgraded detection models to documents analyzed before
+    """
+    help = "Re-scan analyzed documents with only the given detection models, keeping other models' results"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--models', type=int, nargs='+', default=None,
+            help="Ids of the new or upgraded detection models to run"
+        )
+        parser.add_argument(
+            '--resume', type=int, default=None,
+            help="Id of a paused or interrupted run to continue"
+        )
+        parser.add_argument(
+            '--user', type=int, default=None,
+            help="Only re-scan documents owned by this user id"
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=None,
+            help="Documents per batch"
+        )
+        parser.add_argument(
+            '--max-batches', type=int, default=None,
+            help="Pause the run after this many batches"
+        )
+        parser.add_argument(
+            '--pause', type=float, default=None,
+            help="Seconds to sleep between batches"
+        )
+        parser.add_argument(
+            '--max-open-jobs', type=int, default=None,
+            help="Wait while this many user detection jobs are open (0 never waits)"
+        )
+
+    def handle(self, *args, **options):
+        # Re-scans are detection work, so they get a worker's decode cache
+        configure_for_worker()
+        rescanner = DeltaRescanner(
+            batch_size=options['batch_size'],
+            batch_pause=options['pause'],
+            max_batches=options['max_batches'],
+            max_open_jobs=options['max_open_jobs'],
+        )
+        if options['resume'] is not None:
+            try:
+                run = RescanRun.objects.get(pk=options['resume'])
+            except RescanRun.DoesNotExist:
+                raise CommandError(f"Re-scan run {options['resume']} does not exist")
+            if run.status == 'completed':
+                raise CommandError(f"Re-scan run {run.pk} is already completed")
+        elif options['models']:
+            models = list(DetectionModel.objects.filter(pk__in=options['models']))
+            missing = set(options['models']) - {model.pk for model in models}
+            if missing:
+                raise CommandError(f"Unknown detection models: {', '.join(map(str, sorted(missing)))}")
+            user = None
+            if options['user'] is not None:
+                user = User.objects.filter(pk=options['user']).first()
+                if user is None:
+                    raise CommandError(f"User {options['user']} does not exist")
+            run = rescanner.start(models, user=user)
+            self.stdout.write(f"Started re-scan run {run.pk} over {run.documents_total} documents")
+        else:
+            raise CommandError("Give --models to start a run or --resume to continue one")
+
+        run = rescanner.run(run)
+        message = (
+            f"Re-scan run {run.pk} {run.status}: {run.documents_done} documents re-scanned, "
+            f"{run.documents_failed} failed, of {run.documents_total}"
+        )
+        if run.status == 'completed':
+            self.stdout.write(self.style.SUCCESS(message))
+        else:
+            self.stdout.write(self.style.WARNING(f"{message}; continue it with --resume {run.pk}"))
@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+
+from documents.models import DocumentScan
+from detection.risk_engine import RiskEngine
+
+
+class Command(BaseCommand):
+    """
+    Re-score stored document scans with the current RISK_POLICY
+    """
+    help = "Recalculate risk levels of existing scans without re-running detection"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--chunk-size', type=int, default=2000,
+            help="Number of scans loaded per query"
+        )
+        parser.add_argument(
+            '--user', type=int, default=None,
+            help="Only re-score scans of documents owned by this user id"
+        )
+
+    def handle(self, *args, **options):
+        queryset = DocumentScan.objects.all()
+        if options['user'] is not None:
+            queryset = queryset.filter(document__user_id=options['user'])
+
+        result = RiskEngine().rescore_scans(queryset, chunk_size=options['chunk_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Re-scored {result['examined']} scans, {result['updated']} changed"
+        ))
@@ -0,0 +1,83 @@
+import os
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.background import PeriodicTask
+from detection.detection_service import DetectionService
+from detection.prefork import PreforkSupervisor
+from detection.scheduler import PRIORITY_CLASSES, get_scheduler
+
+
+class Command(BaseCommand):
+    """
+    Run detection workers outside the web server processes
+    """
+    help = "Process queued detection jobs until interrupted"
+
+    # Workers never serve requests, so skip the checks that load the URLconf
+    requires_system_checks = []
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers', type=int, default=None,
+            help="General workers (defaults to JOB_SCHEDULER['WORKERS'])"
+        )
+        parser.add_argument(
+            '--fast-lane-workers', type=int, default=None,
+            help="Workers reserved for small image jobs"
+        )
+        parser.add_argument(
+            '--once', action='store_true',
+            help="Drain the queue once and exit"
+        )
+        parser.add_argument(
+            '--prefork', action='store_true',
+            help="Run each worker in its own process, forked after the models are loaded"
+        )
+
+    def handle(self, *args, **options):
+        scheduler = get_scheduler()
+        if options['workers'] is not None:
+            scheduler.config['WORKERS'] = options['workers']
+        if options['fast_lane_workers'] is not None:
+            scheduler.config['FAST_LANE_WORKERS'] = options['fast_lane_workers']
+        if options['prefork'] and not hasattr(os, 'fork'):
+            raise CommandError("--prefork needs a platform with os.fork()")
+
+        start = time.perf_counter()
+        DetectionService.preload()
+        self.stdout.write(f"Loaded detection pipeline in {time.perf_counter() - start:.2f}s")
+
+        if options['once']:
+            scheduler.recover_stale_jobs()
+            scheduler.work(PRIORITY_CLASSES)
+            return
+
+        recovery = PeriodicTask('recovery', scheduler.recover_stale_jobs,
+                                scheduler.config['RECOVERY_INTERVAL_SECONDS'])
+
+        if options['prefork']:
+            supervisor = PreforkSupervisor(scheduler, scheduler.workers())
+            supervisor.start()
+            self.stdout.write(f"Started {len(supervisor.children)} preforked detection workers")
+            self.stdout.flush()
+            supervisor.supervise([recovery])
+            return
+
+        tasks = [
+            PeriodicTask(name, lambda classes=classes: scheduler.work(classes),
+                         scheduler.config['POLL_SECONDS'], wakeup=scheduler.wakeup_event())
+            for name, classes in scheduler.workers()
+        ]
+        tasks.append(recovery)
+        for task in tasks:
+            task.start()
+        self.stdout.write(f"Started {len(tasks)} detection workers")
+        self.stdout.flush()
+        try:
+            while True:
+                time.sleep(60)
+        except KeyboardInterrupt:
+            for task in tasks:
+                task.stop()
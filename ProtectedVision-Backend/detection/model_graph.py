@@ -0,0 +1,310 @@
+"""
+Concurrent execution of the active detection models
+
+Every active DetectionModel becomes a node of a small graph. A node names
+the inputs it needs and the outputs it produces: the object detector and
+the OCR model read the decoded pixels, and the transformer classifies the
+text regions OCR found. Each node starts as soon as its inputs exist, on a
+thread pool shared by the process. Independent models overlap, since
+OpenCV and model runtimes release the GIL while they compute. Inputs and
+outputs are shared, not recomputed: the image is decoded once for all
+models, and OCR's text regions are handed to the transformer.
+
+Detections from all models are merged and tagged with the model that found
+them, and each model's latency is recorded for the job, keyed by model id
+since several models can share a name.
+
+The models are placeholders like the rest of the detection service: each
+reports random detections of its own sensitive types, and its share of the
+simulated latency is spent sleeping.
+"""
+
+import logging
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from django.conf import settings
+
+from core.metrics import registry
+from .variants import relative_cost
+
+
+logger = logging.getLogger(__name__)
+
+MODEL_SECONDS = registry.histogram(
+    'detection_model_seconds',
+    'Time each detection model spent on a job',
+    ['model_type']
+)
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def execution_settings():
+    config = getattr(settings, 'MODEL_EXECUTION', {})
+    return {
+        'CONCURRENT': config.get('CONCURRENT', True),
+        'MAX_WORKERS': config.get('MAX_WORKERS', 4),
+    }
+
+
+def get_pool():
+    """
+    Return the process-wide model thread pool, starting it on first use
+
+    Started lazily so the preforking supervisor never forks with live threads.
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ThreadPoolExecutor(
+                max_workers=execution_settings()['MAX_WORKERS'], thread_name_prefix='detection-model'
+            )
+    return _pool
+
+
+class ModelNode:
+    """
+    One detection model in the execution graph
+
+    Args:
+        name (str): Model name, recorded on its detections
+        model (DetectionModel): Model row, if the node stands for one
+    """
+
+    # Inputs the model needs and outputs it produces for other models
+    requires = ('pixels',)
+    provides = ()
+    # Sensitive types the model reports
+    types = ()
+    # Share of a segment's simulated latency the model takes
+    cost = 1.0
+
+    def __init__(self, name, model=None):
+        self.name = name
+        self.model = model
+        if model is not None:
+            # Quantized and reduced-input variants take a smaller share
+            self.cost = type(self).cost * relative_cost(model)
+
+    @property
+    def model_type(self):
+        return self.model.model_type if self.model is not None else 'default'
+
+    @property
+    def key(self):
+        """
+        Key of the node's timing: the model's id, or the name of a node
+        without a saved model
+        """
+        if self.model is not None and self.model.pk is not None:
+            return str(self.model.pk)
+        return self.name
+
+    def infer(self, inputs, sample):
+        """
+        Detect sensitive items in one segment
+
+        Args:
+            inputs (dict): Shared inputs and the outputs of earlier models
+            sample (callable): Returns random placeholder detections of the
+                given types (None for all of them) for the segment
+
+        Returns:
+            tuple: Detections, and a dict of outputs for other models
+        """
+        return sample(self.types), {}
+
+
+class DefaultDetector(ModelNode):
+    """
+    Detector used when no model is active, reporting every type
+    """
+    # The sample source's full list of placeholder types
+    types = None
+
+
+class ObjectDetector(ModelNode):
+    """
+    YOLO-style detector of documents and faces in the pixels
+    """
+    types = ('credit_card', 'passport', 'driver_license', 'pii')
+
+
+class TextRecognizer(ModelNode):
+    """
+    OCR model finding text regions and the patterns they match
+    """
+    provides = ('text_regions',)
+    types = ('phone_number', 'email', 'social_security')
+    cost = 0.8
+
+    def infer(self, inputs, sample):
+        detections = sample(self.types)
+        return detections, {'text_regions': [item['location'] for item in detections]}
+
+
+class TextClassifier(ModelNode):
+    """
+    Transformer classifying the text of OCR's regions
+    """
+    requires = ('text_regions',)
+    types = ('address', 'bank_account')
+    cost = 0.4
+
+    def infer(self, inputs, sample):
+        regions = inputs['text_regions']
+        if not regions:
+            return [], {}
+        detections = sample(self.types)
+        # The classifier labels regions OCR found rather than new boxes
+        for index, item in enumerate(detections):
+            item['location'] = dict(regions[index % len(regions)])
+        return detections, {}
+
+
+NODE_TYPES = {
+    'yolo': ObjectDetector,
+    'ocr': TextRecognizer,
+    'transformer': TextClassifier,
+}
+
+
+class ModelTiming:
+    """
+    Accumulated latency and output of one model over a job
+    """
+
+    def __init__(self, node):
+        self.name = node.name
+        self.model_type = node.model_type
+        self.version = node.model.version if node.model is not None else ''
+        self.variant = node.model.variant if node.model is not None else ''
+        self.seconds = 0.0
+        self.calls = 0
+        self.detections = 0
+
+    def as_dict(self):
+        return {
+            'name': self.name,
+            'model_type': self.model_type,
+            'version': self.version,
+            'variant': self.variant,
+            'seconds': round(self.seconds, 6),
+            'calls': self.calls,
+            'detections': self.detections,
+        }
+
+
+class ModelGraph:
+    """
+    Execution graph of the active detection models
+
+    Models whose inputs neither the caller nor another model provides are
+    left out with a warning (a transformer without an OCR model, say).
+
+    Args:
+        models (iterable): Active DetectionModel rows
+        inputs (tuple): Inputs the caller provides to every run
+        concurrent (bool): Run independent models in parallel; defaults to
+            MODEL_EXECUTION['CONCURRENT']
+    """
+
+    def __init__(self, models=(), inputs=('pixels',), concurrent=None):
+        nodes = [
+            NODE_TYPES[model.model_type](model.name, model)
+            for model in models if model.model_type in NODE_TYPES
+        ]
+        available = set(inputs)
+        for node in nodes:
+            available.update(node.provides)
+        self.nodes = []
+        for node in nodes:
+            missing = [name for name in node.requires if name not in available]
+            if missing:
+                logger.warning("Skipping detection model %s: nothing provides %s", node.name, ', '.join(missing))
+            else:
+                self.nodes.append(node)
+        if not self.nodes:
+            self.nodes = [DefaultDetector('default')]
+
+        if concurrent is None:
+            concurrent = execution_settings()['CONCURRENT']
+        self.concurrent = concurrent and len(self.nodes) > 1
+        self.timings = {node.key: ModelTiming(node) for node in self.nodes}
+        self._lock = threading.Lock()
+
+    def run(self, inputs, sample, seconds=0.0):
+        """
+        Run every model over one segment and merge their detections
+
+        Args:
+            inputs (dict): Inputs shared by all models
+            sample (callable): Placeholder detection source, see ModelNode.infer
+            seconds (float): Simulated latency of the segment
+
+        Returns:
+            list: Detections of all models, each with a ``detected_by`` name
+        """
+        artifacts = dict(inputs)
+        detections = []
+        pending = list(self.nodes)
+        running = {}
+        while pending or running:
+            ready = [node for node in pending if all(name in artifacts for name in node.requires)]
+            for node in ready:
+                pending.remove(node)
+                if self.concurrent:
+                    future = get_pool().submit(self._run_node, node, dict(artifacts), sample, seconds)
+                    running[future] = node
+                else:
+                    found, outputs = self._run_node(node, artifacts, sample, seconds)
+                    artifacts.update(outputs)
+                    detections.extend(found)
+            if not running:
+                if pending and not ready:
+                    logger.warning(
+                        "Detection models %s never got their inputs", ', '.join(node.name for node in pending)
+                    )
+                    break
+                continue
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                running.pop(future)
+                found, outputs = future.result()
+                artifacts.update(outputs)
+                detections.extend(found)
+        return detections
+
+    def _run_node(self, node, inputs, sample, seconds):
+        start = time.perf_counter()
+        if seconds:
+            time.sleep(seconds * node.cost)
+        found, outputs = node.infer(inputs, sample)
+        elapsed = time.perf_counter() - start
+
+        with self._lock:
+            timing = self.timings[node.key]
+            timing.seconds += elapsed
+            timing.calls += 1
+            timing.detections += len(found)
+        for item in found:
+            item['detected_by'] = node.name
+        return found, outputs
+
+    def as_dict(self):
+        """
+        JSON-serializable per-model breakdown stored on the detection job
+        """
+        return {key: timing.as_dict() for key, timing in self.timings.items()}
+
+    def export(self):
+        """
+        Publish the models' latencies to the process metrics registry
+        """
+        for timing in self.timings.values():
+            if timing.calls:
+                MODEL_SECONDS.observe(timing.seconds, model_type=timing.model_type)
@@ -1,4 +1,5 @@
 from django.db import models
+from django.conf import settings
 from django.utils.translation import gettext_lazy as _
 from documents.models import Document
 
@@ -12,23 +13,73 @@ class DetectionModel(models.Model):
         ('ocr', 'OCR - Text Recognition'),
         ('transformer', 'Transformer - NLP'),
     )
+    PRECISION_CHOICES = (
+        ('fp32', 'FP32 - Full precision'),
+        ('fp16', 'FP16 - Half precision'),
+        ('int8', 'INT8 - Quantized'),
+    )
     
     name = models.CharField(max_length=255)
     model_type = models.CharField(max_length=20, choices=TYPE_CHOICES)
     version = models.CharField(max_length=50)
     weights_file = models.FileField(upload_to='detection_models/', blank=True, null=True)
     active = models.BooleanField(default=True)
+    shadow = models.BooleanField(
+        default=False,
+        help_text="Candidate evaluated in the background on a sample of jobs instead of serving users"
+    )
+    precision = models.CharField(max_length=10, choices=PRECISION_CHOICES, default='fp32')
+    input_size = models.PositiveIntegerField(
+        null=True, blank=True,
+        help_text="Longest image side the model resizes its input to; empty for the native resolution"
+    )
+    latency_ms = models.FloatField(null=True, blank=True, help_text="Median CPU latency per image, as last evaluated")
+    mean_average_precision = models.FloatField(null=True, blank=True, help_text="mAP@0.5:0.95 on the evaluation set")
+    memory_mb = models.FloatField(null=True, blank=True, help_text="Peak memory allocated per image, as last evaluated")
+    evaluated_at = models.DateTimeField(null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
     def __str__(self):
         return f"{self.name} - v{self.version}"
     
+    @property
+    def variant(self):
+        """
+        Short description of the precision and input size, e.g. 'int8@640'
+        """
+        return f"{self.precision}@{self.input_size or 'native'}"
+    
     class Meta:
         verbose_name = _("Detection Model")
         verbose_name_plural = _("Detection Models")
 
 
+class DetectionBatch(models.Model):
+    """
+    Model to group the detection jobs of documents submitted together
+    """
+    STATUS_CHOICES = (
+        ('pending', 'Pending'),
+        ('processing', 'Processing'),
+        ('completed', 'Completed'),
+        ('failed', 'Failed'),
+    )
+    
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='detection_batches')
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    created_at = models.DateTimeField(auto_now_add=True)
+    completed_at = models.DateTimeField(null=True, blank=True)
+    
+    def __str__(self):
+        return f"Detection batch {self.id} for {self.user.email} - {self.status}"
+    
+    class Meta:
+        ordering = ['-created_at']
+        verbose_name = _("Detection Batch")
+        verbose_name_plural = _("Detection Batches")
+
+
 class DetectionJob(models.Model):
     """
     Model to store detection job status and metadata
@@ -39,18 +90,166 @@ class DetectionJob(models.Model):
         ('completed', 'Completed'),
         ('failed', 'Failed'),
     )
+    PRIORITY_CLASS_CHOICES = (
+        ('fast', 'Fast lane - small images'),
+        ('standard', 'Standard'),
+        ('bulk', 'Bulk - videos and large files'),
+    )
     
     document = models.ForeignKey(Document, on_delete=models.CASCADE, related_name='detection_jobs')
+    batch = models.ForeignKey(
+        DetectionBatch, on_delete=models.CASCADE, related_name='jobs', null=True, blank=True
+    )
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    priority_class = models.CharField(max_length=10, choices=PRIORITY_CLASS_CHOICES, default='standard')
     models_used = models.ManyToManyField(DetectionModel, related_name='jobs')
     started_at = models.DateTimeField(auto_now_add=True)
+    processing_started_at = models.DateTimeField(
+        null=True, blank=True,
+        help_text="When a worker picked the job up; the wait since started_at is the queue time"
+    )
     completed_at = models.DateTimeField(null=True, blank=True)
     error_message = models.TextField(blank=True, null=True)
+    stage_timings = models.JSONField(
+        null=True, blank=True,
+        help_text="Per-stage durations, bytes and item counts recorded by the profiler"
+    )
+    model_timings = models.JSONField(
+        null=True, blank=True,
+        help_text="Latency and detection count of each model the job ran, by model id"
+    )
+    cascade = models.JSONField(
+        null=True, blank=True,
+        help_text="Cascade stage that decided how an image was analyzed, and the regions it proposed"
+    )
+    quality = models.JSONField(
+        null=True, blank=True,
+        help_text="Image quality metrics, the issues found and what the quality gate did about them"
+    )
+    near_duplicate = models.JSONField(
+        null=True, blank=True,
+        help_text="Earlier document the image is a near-duplicate of, and whether its detections were reused"
+    )
+    progress = models.FloatField(default=0, help_text="Overall completion (0-1)")
+    current_stage = models.CharField(max_length=20, blank=True, default='')
+    attempts = models.PositiveIntegerField(default=0, help_text="Times a worker has started this job")
+    heartbeat_at = models.DateTimeField(
+        null=True, blank=True,
+        help_text="Last sign of life from the worker running the job"
+    )
+    checkpoint = models.JSONField(
+        null=True, blank=True,
+        help_text="Partial results of an unfinished run, used to resume after a crash"
+    )
+    estimated_cost = models.FloatField(
+        default=0,
+        help_text="Estimated worker-seconds of work, counted against the admission budget"
+    )
+    fast_mode = models.BooleanField(
+        default=False,
+        help_text="Run with sparser frame sampling and downscaled images because the queue was under pressure"
+    )
+    latency_budget_ms = models.PositiveIntegerField(
+        null=True, blank=True,
+        help_text="Per-image latency the requester accepts; picks the most accurate model variants within it"
+    )
     
     def __str__(self):
         return f"Detection job for {self.document.title} - {self.status}"
     
     class Meta:
         ordering = ['-started_at']
+        indexes = [
+            models.Index(fields=['status', 'priority_class']),
+        ]
         verbose_name = _("Detection Job")
-        verbose_name_plural = _("Detection Jobs") 
\ No newline at end of file
+        verbose_name_plural = _("Detection Jobs") 
+
+
+class ShadowEvaluation(models.Model):
+    """
+    Comparison of a shadow candidate model with production on one job
+    """
+    candidate = models.ForeignKey(DetectionModel, on_delete=models.CASCADE, related_name='shadow_evaluations')
+    baseline = models.ForeignKey(
+        DetectionModel, on_delete=models.SET_NULL, null=True, blank=True, related_name='baseline_evaluations'
+    )
+    job = models.ForeignKey(DetectionJob, on_delete=models.CASCADE, related_name='shadow_evaluations')
+    candidate_detections = models.PositiveIntegerField(default=0)
+    baseline_detections = models.PositiveIntegerField(default=0)
+    matched = models.PositiveIntegerField(default=0)
+    agreement = models.FloatField(help_text="F1 of the candidate's detections against production's")
+    mean_iou = models.FloatField(null=True, blank=True)
+    candidate_seconds = models.FloatField()
+    baseline_seconds = models.FloatField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    def __str__(self):
+        return f"{self.candidate} on job {self.job_id}"
+    
+    class Meta:
+        verbose_name = _("Shadow Evaluation")
+        verbose_name_plural = _("Shadow Evaluations")
+        ordering = ['-created_at']
+
+
+class RescanRun(models.Model):
+    """
+    Delta re-scan of analyzed documents with new or upgraded models only
+    """
+    STATUS_CHOICES = (
+        ('pending', 'Pending'),
+        ('running', 'Running'),
+        ('paused', 'Paused'),
+        ('completed', 'Completed'),
+        ('failed', 'Failed'),
+    )
+    
+    detection_models = models.ManyToManyField(DetectionModel, related_name='rescan_runs')
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.CASCADE, null=True, blank=True, related_name='rescan_runs',
+        help_text="Only re-scan this user's documents"
+    )
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    cursor = models.PositiveIntegerField(
+        default=0, help_text="Id of the last document handled; a resumed run continues after it"
+    )
+    documents_total = models.PositiveIntegerField(default=0)
+    documents_done = models.PositiveIntegerField(default=0)
+    documents_failed = models.PositiveIntegerField(default=0)
+    error_message = models.TextField(blank=True, null=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    completed_at = models.DateTimeField(null=True, blank=True)
+    
+    def __str__(self):
+        return f"Re-scan {self.pk} - {self.status}"
+    
+    class Meta:
+        verbose_name = _("Re-scan Run")
+        verbose_name_plural = _("Re-scan Runs")
+        ordering = ['-created_at']
+
+
+class ImageHash(models.Model):
+    """
+    Perceptual hash of an analyzed image or video keyframe
+    """
+    document = models.ForeignKey(Document, on_delete=models.CASCADE, related_name='image_hashes')
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='image_hashes')
+    frame = models.PositiveIntegerField(null=True, blank=True, help_text="Keyframe of a video; empty for an image")
+    hash = models.BigIntegerField(help_text="64-bit pHash, stored as a signed integer")
+    width = models.PositiveIntegerField()
+    height = models.PositiveIntegerField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    def __str__(self):
+        return f"{self.document_id}:{self.frame} {self.hash & 0xFFFFFFFFFFFFFFFF:016x}"
+    
+    class Meta:
+        indexes = [
+            # Per-user indexes load the rows added since they last looked
+            models.Index(fields=['user', 'id']),
+        ]
+        verbose_name = _("Image Hash")
+        verbose_name_plural = _("Image Hashes")
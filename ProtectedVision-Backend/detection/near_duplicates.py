@@ -0,0 +1,294 @@
+"""
+Near-duplicate images across a user's documents
+
+People photograph the same card several times, and every photo used to be
+analyzed in full. Each analyzed image, and a few keyframes of each video
+(NEAR_DUPLICATES['KEYFRAMES']), gets a 64-bit perceptual hash (pHash: the
+signs of the lowest frequencies of a 32x32 DCT, which survive rescaling,
+recompression, small shifts and exposure changes). Hashes are stored as
+ImageHash rows.
+
+Before the models run on an image, the user's hashes are searched for one
+within NEAR_DUPLICATES['MAX_DISTANCE'] bits. When an earlier image is that
+close, its latest detections are reused with their boxes rescaled to the new
+image, and no model runs. A keyframe match is recorded on the job but not
+reused, since a video's detections only cover the frames it sampled.
+
+The search uses multi-index hashing: each hash is split into five chunks of
+12 or 13 bits, each with its own table. Two hashes within r bits agree to
+within r // 5 bits on at least one chunk, so probing every chunk value that
+close finds every match while only comparing a few hundred candidates, which
+keeps a lookup under half a millisecond at 100,000 hashes per user. Each process
+keeps the indexes of its most recently active users in memory
+(NEAR_DUPLICATES['MAX_USERS']) and loads the rows other processes added
+before each search. Hashes of deleted documents stay in an index until a
+search finds them; the caller skips such matches and drops them with
+forget_document().
+"""
+
+import itertools
+import threading
+from collections import OrderedDict, defaultdict
+from functools import lru_cache
+
+from django.conf import settings
+
+from core.lazy import lazy_import
+from core.metrics import registry
+from .models import ImageHash
+from .quality import downscale
+
+
+# Loaded on first use, so processes that never analyze a file skip them
+cv2 = lazy_import('cv2')
+np = lazy_import('numpy')
+
+NEAR_DUPLICATE_LOOKUPS = registry.counter(
+    'detection_near_duplicate_lookups_total',
+    'Near-duplicate searches by result: miss, matched (not reused) or reused',
+    ['result']
+)
+
+HASH_BITS = 64
+# Widths of the chunks a hash is split into, and where each starts
+CHUNK_BITS = (13, 13, 13, 13, 12)
+CHUNK_SHIFTS = tuple(sum(CHUNK_BITS[:chunk]) for chunk in range(len(CHUNK_BITS)))
+
+_indexes = OrderedDict()
+_indexes_lock = threading.Lock()
+
+
+def near_duplicate_settings():
+    config = getattr(settings, 'NEAR_DUPLICATES', {})
+    return {
+        'ENABLED': config.get('ENABLED', True),
+        'MAX_DISTANCE': config.get('MAX_DISTANCE', 8),
+        'KEYFRAMES': config.get('KEYFRAMES', 8),
+        'MAX_USERS': config.get('MAX_USERS', 256),
+    }
+
+
+def perceptual_hash(image):
+    """
+    64-bit pHash of a BGR image
+
+    Args:
+        image (ndarray): BGR image
+
+    Returns:
+        int: Unsigned hash
+    """
+    gray = cv2.resize(downscale(image, 64), (32, 32), interpolation=cv2.INTER_AREA)
+    low = cv2.dct(gray.astype(np.float32))[:8, :8].ravel()
+    # The DC term is the mean brightness; leave it out of the median
+    bits = low > np.median(low[1:])
+    return int.from_bytes(np.packbits(bits).tobytes(), 'big')
+
+
+def to_signed(value):
+    """
+    Store an unsigned 64-bit hash in a signed BigIntegerField
+    """
+    return value - (1 << HASH_BITS) if value >= 1 << (HASH_BITS - 1) else value
+
+
+def to_unsigned(value):
+    return value & ((1 << HASH_BITS) - 1)
+
+
+@lru_cache(maxsize=None)
+def chunk_masks(bits, radius):
+    """
+    XOR masks of every value of a bits-wide chunk within radius bits
+    """
+    return tuple(
+        sum(1 << bit for bit in flipped)
+        for distance in range(radius + 1)
+        for flipped in itertools.combinations(range(bits), distance)
+    )
+
+
+def chunks(value):
+    return [(value >> shift) & ((1 << bits) - 1) for shift, bits in zip(CHUNK_SHIFTS, CHUNK_BITS)]
+
+
+class HashIndex:
+    """
+    Multi-index hash table of one user's perceptual hashes
+
+    Each entry carries a payload, such as (document id, frame, width,
+    height), returned by search().
+    """
+
+    def __init__(self):
+        self.hashes = []
+        self.payloads = []
+        self.tables = [defaultdict(list) for _ in CHUNK_BITS]
+        self.discarded = set()
+        self.last_id = 0
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.hashes) - len(self.discarded)
+
+    def add(self, value, payload):
+        position = len(self.hashes)
+        self.hashes.append(value)
+        self.payloads.append(payload)
+        for table, key in zip(self.tables, chunks(value)):
+            table[key].append(position)
+
+    def search(self, value, radius):
+        """
+        Entries within radius bits of a hash
+
+        Args:
+            value (int): Unsigned hash to look up
+            radius (int): Largest Hamming distance to return
+
+        Returns:
+            list: (distance, payload) tuples, closest first
+        """
+        hashes = self.hashes
+        found = {}
+        for table, key, bits in zip(self.tables, chunks(value), CHUNK_BITS):
+            for mask in chunk_masks(bits, radius // len(CHUNK_BITS)):
+                for position in table.get(key ^ mask, ()):
+                    if position in self.discarded:
+                        continue
+                    distance = (value ^ hashes[position]).bit_count()
+                    if distance <= radius:
+                        # An entry close on several chunks is found once per chunk
+                        found[position] = distance
+        return sorted(
+            ((distance, self.payloads[position]) for position, distance in found.items()),
+            key=lambda match: match[0]
+        )
+
+    def discard(self, predicate):
+        """
+        Leave out of later searches every entry whose payload matches
+
+        Returns:
+            int: Number of entries discarded
+        """
+        positions = [
+            position for position, payload in enumerate(self.payloads)
+            if position not in self.discarded and predicate(payload)
+        ]
+        self.discarded.update(positions)
+        return len(positions)
+
+    def refresh(self, user_id):
+        """
+        Add the user's hashes stored since the last refresh
+        """
+        rows = ImageHash.objects.filter(user_id=user_id, id__gt=self.last_id).order_by('id').values_list(
+            'id', 'hash', 'document_id', 'frame', 'width', 'height'
+        )
+        for row_id, value, document_id, frame, width, height in rows.iterator():
+            self.add(to_unsigned(value), (document_id, frame, width, height))
+            self.last_id = row_id
+
+
+def get_index(user_id):
+    """
+    Return a user's hash index, up to date with the stored hashes
+    """
+    with _indexes_lock:
+        index = _indexes.get(user_id)
+        if index is None:
+            index = _indexes[user_id] = HashIndex()
+        _indexes.move_to_end(user_id)
+        while len(_indexes) > near_duplicate_settings()['MAX_USERS']:
+            _indexes.popitem(last=False)
+    with index.lock:
+        index.refresh(user_id)
+    return index
+
+
+class NearDuplicate:
+    """
+    Earlier image or keyframe an image is a near-duplicate of
+
+    Attributes:
+        document_id (int): Earlier document
+        frame (int): Keyframe of a video, or None for an image
+        width (int): Size of the earlier image or frame
+        height (int): Size of the earlier image or frame
+        distance (int): Hamming distance between the hashes
+        reused (bool): Whether the earlier detections were reused
+    """
+
+    def __init__(self, document_id, frame, width, height, distance):
+        self.document_id = document_id
+        self.frame = frame
+        self.width = width
+        self.height = height
+        self.distance = distance
+        self.reused = False
+
+    def as_dict(self):
+        return {
+            'document_id': self.document_id,
+            'frame': self.frame,
+            'distance': self.distance,
+            'reused': self.reused,
+        }
+
+
+def find_near_duplicates(user_id, document_id, value, config=None):
+    """
+    Earlier images and keyframes of a user's other documents, best first
+
+    The index may still hold hashes of documents deleted since it loaded
+    them, so callers take the first match whose document is still usable.
+
+    Args:
+        user_id (int): Owner of the image
+        document_id (int): Document being analyzed, which never matches itself
+        value (int): Unsigned hash of the image
+        config (dict): near_duplicate_settings(), if already read
+
+    Returns:
+        list: NearDuplicate matches within MAX_DISTANCE, images before
+            keyframes and closest first
+    """
+    config = config or near_duplicate_settings()
+    index = get_index(user_id)
+    with index.lock:
+        matches = index.search(value, config['MAX_DISTANCE'])
+    # Prefer images, whose detections can be reused, over keyframes
+    matches = [match for match in matches if match[1][0] != document_id]
+    matches.sort(key=lambda match: (match[1][1] is not None, match[0]))
+    return [
+        NearDuplicate(match_document_id, frame, width, height, distance)
+        for distance, (match_document_id, frame, width, height) in matches
+    ]
+
+
+def forget_document(user_id, document_id):
+    """
+    Drop a deleted document's hashes from this process's index of its owner
+    """
+    with _indexes_lock:
+        index = _indexes.get(user_id)
+    if index is not None:
+        with index.lock:
+            index.discard(lambda payload: payload[0] == document_id)
+
+
+def rescale(items, width, height, new_width, new_height):
+    """
+    Map detections from an image of one size onto another
+    """
+    scale_x, scale_y = new_width / width, new_height / height
+    return [
+        dict(item, location={
+            'x': int(round(item['location'].get('x', 0) * scale_x)),
+            'y': int(round(item['location'].get('y', 0) * scale_y)),
+            'width': int(round(item['location'].get('width', 0) * scale_x)),
+            'height': int(round(item['location'].get('height', 0) * scale_y)),
+        }) if item.get('location') else dict(item)
+        for item in items
+    ]
@@ -0,0 +1,119 @@
+"""
+Preforking supervisor for detection workers
+
+The supervisor imports and initializes the detection pipeline once, then
+forks one process per worker lane. Children start instantly and share the
+supervisor's loaded modules copy-on-write instead of each importing OpenCV
+and numpy on its own. Dead children are replaced by forking again. On
+SIGTERM or SIGINT every child finishes its current job and exits.
+"""
+
+import gc
+import logging
+import os
+import signal
+import time
+
+from django.db import connections
+
+from core.background import PeriodicTask
+
+
+logger = logging.getLogger(__name__)
+
+
+class PreforkSupervisor:
+    """
+    Forks and supervises one worker process per lane
+
+    Args:
+        scheduler (JobScheduler): Scheduler the workers claim jobs from
+        lanes (list): (name, priority classes) pairs, one per child
+    """
+
+    # Children that die faster than this are restarted with a delay
+    MIN_CHILD_SECONDS = 1.0
+
+    def __init__(self, scheduler, lanes):
+        self.scheduler = scheduler
+        self.lanes = lanes
+        self.children = {}
+        self.stopping = False
+
+    def start(self):
+        # Connections and threads must not be shared with the children
+        connections.close_all()
+        # Keep the garbage collector from touching, and so copying, the
+        # objects loaded so far
+        gc.freeze()
+        for lane in self.lanes:
+            self.spawn(lane)
+
+    def spawn(self, lane):
+        pid = os.fork()
+        if pid == 0:
+            code = 0
+            try:
+                self.run_child(*lane)
+            except BaseException:
+                logger.exception("Detection worker %s crashed", lane[0])
+                code = 1
+            finally:
+                os._exit(code)
+        self.children[pid] = (lane, time.monotonic())
+        return pid
+
+    def run_child(self, name, classes):
+        scheduler = self.scheduler
+        task = PeriodicTask(
+            name,
+            lambda: scheduler.work(classes, should_stop=task.stopped.is_set),
+            scheduler.config['POLL_SECONDS'],
+            wakeup=scheduler.wakeup_event()
+        )
+        for signum in (signal.SIGTERM, signal.SIGINT):
+            signal.signal(signum, lambda *args: task.stop())
+        # Run the loop in this process's only thread
+        task.run()
+
+    def supervise(self, background_tasks=()):
+        """
+        Restart children that exit until a stop signal arrives
+
+        Args:
+            background_tasks (iterable): Threads to start in the supervisor
+                once the children have been forked
+        """
+        for signum in (signal.SIGTERM, signal.SIGINT):
+            signal.signal(signum, self.stop)
+        for task in background_tasks:
+            task.start()
+
+        while self.children:
+            try:
+                pid, status = os.wait()
+            except ChildProcessError:
+                break
+            except InterruptedError:
+                continue
+            lane, started = self.children.pop(pid, (None, None))
+            if lane is None or self.stopping:
+                continue
+            code = os.WEXITSTATUS(status) if os.WIFEXITED(status) else -os.WTERMSIG(status)
+            logger.warning(
+                "Detection worker %s (pid %d) exited with status %d, restarting", lane[0], pid, code
+            )
+            if time.monotonic() - started < self.MIN_CHILD_SECONDS:
+                time.sleep(self.MIN_CHILD_SECONDS)
+            self.spawn(lane)
+
+        for task in background_tasks:
+            task.stop()
+
+    def stop(self, *args):
+        self.stopping = True
+        for pid in list(self.children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
@@ -0,0 +1,116 @@
+import time
+from contextlib import contextmanager
+
+from core.metrics import registry
+
+
+STAGE_SECONDS = registry.histogram(
+    'detection_stage_seconds',
+    'Time spent in each detection pipeline stage',
+    ['stage', 'file_type']
+)
+STAGE_BYTES = registry.counter(
+    'detection_stage_bytes_total',
+    'Bytes processed by each detection pipeline stage',
+    ['stage', 'file_type']
+)
+STAGE_ITEMS = registry.counter(
+    'detection_stage_items_total',
+    'Items (frames, pages, detections) handled by each detection pipeline stage',
+    ['stage', 'file_type']
+)
+JOB_SECONDS = registry.histogram(
+    'detection_job_seconds',
+    'End-to-end duration of detection jobs',
+    ['file_type', 'status']
+)
+
+
+class StageRecord:
+    """
+    Accumulated timing and counters for one pipeline stage
+    """
+
+    def __init__(self):
+        self.seconds = 0.0
+        self.calls = 0
+        self.bytes = 0
+        self.items = 0
+
+    def as_dict(self):
+        return {
+            'seconds': round(self.seconds, 6),
+            'calls': self.calls,
+            'bytes': self.bytes,
+            'items': self.items,
+        }
+
+
+class StageProfiler:
+    """
+    Lightweight stage timer for a single detection run
+
+    Usage:
+        profiler = StageProfiler()
+        with profiler.stage('decode') as stage:
+            data = read()
+            stage.bytes += len(data)
+
+    Entering the same stage more than once accumulates into one record.
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.stages = {}
+
+    def record(self, name):
+        """
+        Return the record for a stage, creating it on first use
+        """
+        stage = self.stages.get(name)
+        if stage is None:
+            stage = self.stages[name] = StageRecord()
+        return stage
+
+    @contextmanager
+    def stage(self, name):
+        record = self.record(name)
+        start = time.perf_counter()
+        try:
+            yield record
+        finally:
+            record.seconds += time.perf_counter() - start
+            record.calls += 1
+
+    def count(self, name, bytes=0, items=0):
+        """
+        Add to a stage's counters without timing anything
+        """
+        record = self.record(name)
+        record.bytes += bytes
+        record.items += items
+
+    @property
+    def total_seconds(self):
+        return time.perf_counter() - self.started
+
+    def as_dict(self):
+        """
+        JSON-serializable breakdown stored on the detection job
+        """
+        return {
+            'total_seconds': round(self.total_seconds, 6),
+            'stages': {name: stage.as_dict() for name, stage in self.stages.items()},
+        }
+
+    def export(self, file_type, status):
+        """
+        Publish the stage breakdown to the process metrics registry
+        """
+        for name, stage in self.stages.items():
+            STAGE_SECONDS.observe(stage.seconds, stage=name, file_type=file_type)
+            if stage.bytes:
+                STAGE_BYTES.inc(stage.bytes, stage=name, file_type=file_type)
+            if stage.items:
+                STAGE_ITEMS.inc(stage.items, stage=name, file_type=file_type)
+        JOB_SECONDS.observe(self.total_seconds, file_type=file_type, status=status)
@@ -0,0 +1,267 @@
+import asyncio
+import itertools
+import queue
+import threading
+import time
+
+from django.conf import settings
+from django.utils import timezone
+
+from core.metrics import registry
+from .models import DetectionJob
+
+
+SUBSCRIBERS = registry.gauge(
+    'detection_progress_subscribers',
+    'Open progress event streams in this process'
+)
+EVENTS_DROPPED = registry.counter(
+    'detection_progress_events_dropped_total',
+    'Progress events dropped because a subscriber fell behind'
+)
+
+TERMINAL_STATUSES = ('completed', 'failed')
+
+
+class JobLost(Exception):
+    """
+    Raised when a job was handed to another worker while this one ran it
+    """
+
+
+def progress_settings():
+    config = getattr(settings, 'PROGRESS_EVENTS', {})
+    return {
+        'KEEPALIVE_SECONDS': config.get('KEEPALIVE_SECONDS', 15),
+        'MAX_STREAM_SECONDS': config.get('MAX_STREAM_SECONDS', 600),
+        'DB_UPDATE_INTERVAL_SECONDS': config.get('DB_UPDATE_INTERVAL_SECONDS', 1.0),
+        'CHECKPOINT_INTERVAL_SECONDS': config.get('CHECKPOINT_INTERVAL_SECONDS', 5.0),
+        'QUEUE_SIZE': config.get('QUEUE_SIZE', 100),
+        'TICKET_SECONDS': config.get('TICKET_SECONDS', 30),
+    }
+
+
+class Subscription:
+    """
+    Bounded event queue owned by one stream on an asyncio event loop
+
+    Events are pushed from any thread; when the queue is full the oldest
+    event is dropped, since a newer progress event supersedes it.
+    """
+
+    def __init__(self, keys, maxsize):
+        self.keys = keys
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(maxsize=maxsize)
+
+    def push(self, event):
+        try:
+            self.loop.call_soon_threadsafe(self._put, event)
+        except RuntimeError:
+            # The stream's loop has already shut down
+            pass
+
+    def _put(self, event):
+        if self.queue.full():
+            self.queue.get_nowait()
+            EVENTS_DROPPED.inc()
+        self.queue.put_nowait(event)
+
+    async def get(self, timeout):
+        """
+        Wait for the next event
+
+        Returns:
+            dict: The event, or None if nothing arrived within ``timeout``
+        """
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+
+class BlockingSubscription:
+    """
+    Bounded event queue read by one stream on a WSGI worker thread
+
+    Behaves like Subscription, but get() blocks the calling thread.
+    """
+
+    def __init__(self, keys, maxsize):
+        self.keys = keys
+        self.queue = queue.Queue(maxsize=maxsize)
+        self.lock = threading.Lock()
+
+    def push(self, event):
+        with self.lock:
+            if self.queue.full():
+                self.queue.get_nowait()
+                EVENTS_DROPPED.inc()
+            self.queue.put_nowait(event)
+
+    def get(self, timeout):
+        """
+        Wait for the next event
+
+        Returns:
+            dict: The event, or None if nothing arrived within ``timeout``
+        """
+        try:
+            return self.queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+
+class ProgressBroker:
+    """
+    In-process fan-out of job progress events to open streams
+
+    Streams subscribe to ('job', id) or ('user', id) keys. Publishing only
+    takes a lock long enough to copy the matching subscriber list, so
+    detection threads are never blocked by slow clients.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers = {}
+        self._sequence = itertools.count(1)
+
+    def subscribe(self, *keys, blocking=False):
+        """
+        Register a stream for events matching any of the keys
+
+        Unless ``blocking``, must be called from the event loop that will
+        consume the events.
+        """
+        subscription_class = BlockingSubscription if blocking else Subscription
+        subscription = subscription_class(keys, progress_settings()['QUEUE_SIZE'])
+        with self._lock:
+            for key in keys:
+                self._subscribers.setdefault(key, set()).add(subscription)
+        SUBSCRIBERS.inc()
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            for key in subscription.keys:
+                subscribers = self._subscribers.get(key)
+                if subscribers is not None:
+                    subscribers.discard(subscription)
+                    if not subscribers:
+                        del self._subscribers[key]
+        SUBSCRIBERS.dec()
+
+    def publish(self, event):
+        """
+        Deliver an event to every stream watching its job or user
+        """
+        event['id'] = next(self._sequence)
+        keys = (('job', event.get('job')), ('user', event.get('user')))
+        with self._lock:
+            targets = set()
+            for key in keys:
+                targets.update(self._subscribers.get(key, ()))
+        for subscription in targets:
+            subscription.push(event)
+
+
+broker = ProgressBroker()
+
+
+def job_snapshot(job):
+    """
+    Progress event describing the stored state of a job
+    """
+    return {
+        'type': 'status' if job.status in TERMINAL_STATUSES else 'progress',
+        'job': job.id,
+        'document': job.document_id,
+        'status': job.status,
+        'stage': job.current_stage,
+        'progress': job.progress,
+    }
+
+
+class JobProgress:
+    """
+    Progress, heartbeat and checkpoint reporter for one detection job
+
+    Every update is published to the broker immediately. The job row is
+    written at most once per DB_UPDATE_INTERVAL_SECONDS, which also serves as
+    the worker's heartbeat, and partial results at most once per
+    CHECKPOINT_INTERVAL_SECONDS. Writes are fenced on the job's attempt
+    number: once the job has been recovered and claimed again elsewhere,
+    they raise JobLost so this worker stops.
+    """
+
+    def __init__(self, job, user_id):
+        self.job = job
+        self.user_id = user_id
+        config = progress_settings()
+        self.db_interval = config['DB_UPDATE_INTERVAL_SECONDS']
+        self.checkpoint_interval = config['CHECKPOINT_INTERVAL_SECONDS']
+        self.last_write = 0.0
+        self.last_checkpoint = time.monotonic()
+
+    def update(self, stage, progress, done=None, total=None, unit=None):
+        """
+        Report that the job reached a stage or advanced within one
+
+        Args:
+            stage (str): Pipeline stage name
+            progress (float): Overall completion between 0 and 1
+            done (int): Units processed in this stage, such as frames
+            total (int): Units to process in this stage
+            unit (str): Name of the units ('frames', 'pages')
+        """
+        job = self.job
+        job.current_stage = stage
+        job.progress = round(min(max(progress, 0.0), 1.0), 4)
+        event = job_snapshot(job)
+        event['user'] = self.user_id
+        if total:
+            event.update({'done': done, 'total': total, 'unit': unit})
+        broker.publish(event)
+
+        if time.monotonic() - self.last_write >= self.db_interval:
+            self.heartbeat()
+
+    def checkpoint(self, data):
+        """
+        Remember partial results so a restarted job can resume from them
+
+        Args:
+            data (dict): JSON-serializable state of the work done so far
+        """
+        self.job.checkpoint = data
+        if time.monotonic() - self.last_checkpoint >= self.checkpoint_interval:
+            self.last_checkpoint = time.monotonic()
+            self.heartbeat(checkpoint=data)
+
+    def heartbeat(self, **fields):
+        """
+        Write progress (and any extra fields) and prove the job is alive
+
+        Raises:
+            JobLost: If the job no longer belongs to this attempt
+        """
+        job = self.job
+        self.last_write = time.monotonic()
+        updated = DetectionJob.objects.filter(pk=job.pk, attempts=job.attempts).update(
+            progress=job.progress,
+            current_stage=job.current_stage,
+            heartbeat_at=timezone.now(),
+            **fields
+        )
+        if not updated:
+            raise JobLost(f"Detection job {job.pk} was taken over by another worker")
+
+    def finish(self, error_message=None):
+        """
+        Publish the job's final status once it has been saved
+        """
+        event = job_snapshot(self.job)
+        event['user'] = self.user_id
+        if error_message:
+            event['error'] = error_message
+        broker.publish(event)
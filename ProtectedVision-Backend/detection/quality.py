@@ -0,0 +1,166 @@
+"""
+Input quality gate for images
+
+Blurry, dark or tiny photos used to go through the whole pipeline and come
+back with junk detections. Before the cascade and the models, the gate
+measures a small grayscale copy of the image (QUALITY_GATE['INPUT_SIZE']):
+
+- resolution: the size of the decoded image
+- sharpness: variance of the Laplacian; it falls with contrast as well as
+  focus, so it is not judged on dark or overexposed photos
+- exposure: the mean and spread of the histogram, the luminance most of the
+  image stays under (its 99th percentile), and the share of clipped
+  highlights
+- blankness: almost no spread at all
+
+and decides what happens to the image:
+
+- 'skip': tiny or blank images have nothing a model could read; no model
+  runs and the job completes without detections
+- 'downgrade': blurry images lose nothing when downscaled, so they are
+  analyzed as in fast mode
+- 'flag': dark or overexposed images are analyzed in full, without the
+  cascade gate, and the job records why its results may be poor
+- 'pass': nothing wrong
+
+The metrics, issues and action are recorded on the job and returned by the
+analyze endpoint.
+"""
+
+from django.conf import settings
+
+from core.lazy import lazy_import
+from core.metrics import registry
+
+
+# Loaded on first use, so processes that never analyze a file skip them
+cv2 = lazy_import('cv2')
+np = lazy_import('numpy')
+
+QUALITY_DECISIONS = registry.counter(
+    'detection_quality_gate_total',
+    'Images by the action the input quality gate took',
+    ['action']
+)
+QUALITY_ISSUES = registry.counter(
+    'detection_quality_issues_total',
+    'Problems the input quality gate found in images',
+    ['issue']
+)
+
+# Action each issue leads to; the most severe issue of an image wins
+ISSUE_ACTIONS = {
+    'tiny': 'skip',
+    'blank': 'skip',
+    'blurry': 'downgrade',
+    'dark': 'flag',
+    'overexposed': 'flag',
+}
+ACTION_SEVERITY = ('pass', 'flag', 'downgrade', 'skip')
+
+
+def quality_settings():
+    config = getattr(settings, 'QUALITY_GATE', {})
+    return {
+        'ENABLED': config.get('ENABLED', True),
+        'INPUT_SIZE': config.get('INPUT_SIZE', 384),
+        'MIN_SIDE': config.get('MIN_SIDE', 96),
+        'BLANK_CONTRAST': config.get('BLANK_CONTRAST', 2.0),
+        'BLUR_THRESHOLD': config.get('BLUR_THRESHOLD', 150.0),
+        'DARK_LEVEL': config.get('DARK_LEVEL', 64),
+        'CLIPPED_SHARE': config.get('CLIPPED_SHARE', 0.5),
+    }
+
+
+def downscale(image, input_size):
+    """
+    Grayscale copy of an image with its longest side at most input_size
+
+    A linear resize to twice the size followed by an area resize costs a
+    fraction of one area resize of a large photo, and averages enough to
+    keep noise out of the sharpness measure.
+    """
+    height, width = image.shape[:2]
+    scale = min(input_size / max(height, width), 1.0)
+    if scale < 0.5:
+        image = cv2.resize(image, None, fx=2 * scale, fy=2 * scale, interpolation=cv2.INTER_LINEAR)
+        scale = 0.5
+    if scale < 1.0:
+        image = cv2.resize(image, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+    return cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+
+
+class QualityReport:
+    """
+    What the input quality gate measured in one image and decided
+
+    Attributes:
+        action (str): 'pass', 'flag', 'downgrade' or 'skip'
+        issues (list): Problems found, such as 'blurry' or 'dark'
+        metrics (dict): Resolution, sharpness and exposure measures
+    """
+
+    def __init__(self, action, issues=(), metrics=None):
+        self.action = action
+        self.issues = list(issues)
+        self.metrics = metrics or {}
+
+    def as_dict(self):
+        return {
+            'action': self.action,
+            'issues': self.issues,
+            'metrics': self.metrics,
+        }
+
+    def export(self):
+        """
+        Publish the decision to the process metrics registry
+        """
+        QUALITY_DECISIONS.inc(action=self.action)
+        for issue in self.issues:
+            QUALITY_ISSUES.inc(issue=issue)
+
+
+def assess(image, config=None):
+    """
+    Measure an image's quality and decide how it is analyzed
+
+    Args:
+        image (ndarray): Decoded BGR image
+        config (dict): quality_settings(), if already read
+
+    Returns:
+        QualityReport: The metrics and the action to take
+    """
+    config = config or quality_settings()
+    height, width = image.shape[:2]
+    gray = downscale(image, config['INPUT_SIZE'])
+
+    _, contrast = cv2.meanStdDev(gray)
+    _, laplacian_deviation = cv2.meanStdDev(cv2.Laplacian(gray, cv2.CV_16S))
+    histogram = cv2.calcHist([gray], [0], None, [256], [0, 256]).ravel() / gray.size
+    cumulative = np.cumsum(histogram)
+    metrics = {
+        'width': width,
+        'height': height,
+        'sharpness': round(float(laplacian_deviation[0, 0]) ** 2, 1),
+        'brightness': round(float(np.dot(histogram, np.arange(256))), 1),
+        'contrast': round(float(contrast[0, 0]), 1),
+        'peak': int(np.searchsorted(cumulative, 0.99)),
+        'clipped': round(float(histogram[250:].sum()), 4),
+    }
+
+    issues = []
+    if min(width, height) < config['MIN_SIDE']:
+        issues.append('tiny')
+    if metrics['peak'] < config['DARK_LEVEL']:
+        issues.append('dark')
+    if metrics['clipped'] > config['CLIPPED_SHARE']:
+        issues.append('overexposed')
+    if metrics['contrast'] < config['BLANK_CONTRAST']:
+        issues.append('blank')
+    elif not issues and metrics['sharpness'] < config['BLUR_THRESHOLD']:
+        issues.append('blurry')
+
+    action = max((ISSUE_ACTIONS[issue] for issue in issues), key=ACTION_SEVERITY.index, default='pass')
+    return QualityReport(action, issues, metrics)
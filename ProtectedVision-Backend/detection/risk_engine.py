@@ -0,0 +1,312 @@
+from django.conf import settings
+from django.db import transaction
+
+from core.cache import invalidate
+from core.lazy import lazy_import
+from documents.detections import TYPE_CODES, load
+from documents.models import DocumentScan, SensitiveInformation
+from documents.search import index_documents
+
+
+np = lazy_import('numpy')
+
+
+DEFAULT_RISK_POLICY = {
+    # Base weight of a single detection of each sensitive type
+    'TYPE_WEIGHTS': {
+        'credit_card': 1.0,
+        'passport': 1.0,
+        'driver_license': 1.0,
+        'social_security': 1.0,
+        'bank_account': 1.0,
+        'phone_number': 0.5,
+        'email': 0.5,
+        'address': 0.5,
+        'medical_record': 0.15,
+        'pii': 0.15,
+        'other': 0.15,
+    },
+    'DEFAULT_TYPE_WEIGHT': 0.15,
+    # Confidence band edges and the multiplier applied inside each band.
+    # There is always one more multiplier than there are edges.
+    'CONFIDENCE_BANDS': [0.5, 0.75, 0.9],
+    'CONFIDENCE_WEIGHTS': [0.25, 0.6, 0.9, 1.0],
+    # Repeated instances add to the score, up to this many per item
+    'MAX_COUNT': 5,
+    # Larger regions are boosted by up to AREA_WEIGHT once they reach
+    # AREA_REFERENCE square pixels
+    'AREA_REFERENCE': 40000,
+    'AREA_WEIGHT': 0.25,
+    # Minimum total score for each risk level
+    'THRESHOLDS': {
+        'medium': 0.35,
+        'high': 0.7,
+    },
+}
+
+
+def merge_policy(policy):
+    """
+    Overlay a RISK_POLICY setting on the defaults
+
+    TYPE_WEIGHTS and THRESHOLDS are merged key by key, so a policy can
+    override one type or one level and keep the other defaults.
+
+    Raises:
+        ValueError: If the policy has a key the defaults do not
+    """
+    unknown = set(policy) - set(DEFAULT_RISK_POLICY)
+    if unknown:
+        raise ValueError(f"Unknown RISK_POLICY keys: {', '.join(sorted(unknown))}")
+    merged = {**DEFAULT_RISK_POLICY, **policy}
+    for key in ('TYPE_WEIGHTS', 'THRESHOLDS'):
+        unknown = set(policy.get(key, {})) - set(DEFAULT_RISK_POLICY[key])
+        if unknown:
+            raise ValueError(f"Unknown RISK_POLICY['{key}'] keys: {', '.join(sorted(unknown))}")
+        merged[key] = {**DEFAULT_RISK_POLICY[key], **policy.get(key, {})}
+    return merged
+
+
+class RiskEngine:
+    """
+    Configurable risk scoring for detected sensitive information
+
+    The policy is read once from the ``RISK_POLICY`` setting and compiled
+    into lookup arrays, so scoring a set of detections is a handful of
+    vectorized numpy operations rather than per-item list membership tests.
+    """
+
+    LEVELS = ('low', 'medium', 'high')
+
+    def __init__(self, policy=None):
+        if policy is None:
+            policy = getattr(settings, 'RISK_POLICY', {})
+        policy = merge_policy(policy)
+
+        type_weights = policy['TYPE_WEIGHTS']
+        self.type_index = {name: i for i, name in enumerate(type_weights)}
+        # The last slot holds the weight used for unknown types
+        self.type_weights = np.array(
+            list(type_weights.values()) + [policy['DEFAULT_TYPE_WEIGHT']],
+            dtype=np.float64
+        )
+        self.unknown_type = len(type_weights)
+
+        self.band_edges = np.asarray(policy['CONFIDENCE_BANDS'], dtype=np.float64)
+        self.band_weights = np.asarray(policy['CONFIDENCE_WEIGHTS'], dtype=np.float64)
+        if len(self.band_weights) != len(self.band_edges) + 1:
+            raise ValueError("CONFIDENCE_WEIGHTS needs one more entry than CONFIDENCE_BANDS")
+
+        self.max_count = policy['MAX_COUNT']
+        self.area_reference = float(policy['AREA_REFERENCE'])
+        self.area_weight = float(policy['AREA_WEIGHT'])
+        self.medium_threshold = policy['THRESHOLDS']['medium']
+        self.high_threshold = policy['THRESHOLDS']['high']
+
+    def score_arrays(self, type_codes, confidences, counts, areas):
+        """
+        Score detections given as parallel arrays
+
+        Args:
+            type_codes (ndarray): Indexes into the compiled type weights
+            confidences (ndarray): Confidence scores (0-1)
+            counts (ndarray): Number of instances per detection
+            areas (ndarray): Region area in square pixels (0 if unknown)
+
+        Returns:
+            ndarray: Score contribution of each detection
+        """
+        bands = np.searchsorted(self.band_edges, confidences, side='right')
+        area_boost = 1.0 + self.area_weight * np.minimum(areas / self.area_reference, 1.0)
+        return (
+            self.type_weights[type_codes]
+            * self.band_weights[bands]
+            * np.clip(counts, 1, self.max_count)
+            * area_boost
+        )
+
+    def levels_for(self, scores):
+        """
+        Map total scores to risk level names
+
+        Args:
+            scores (ndarray): Total score per scan
+
+        Returns:
+            ndarray: Risk level string per scan
+        """
+        level_index = (
+            (scores >= self.medium_threshold).astype(np.intp)
+            + (scores >= self.high_threshold).astype(np.intp)
+        )
+        return np.asarray(self.LEVELS)[level_index]
+
+    def score(self, sensitive_items):
+        """
+        Score a list of detections from the detection service
+
+        Args:
+            sensitive_items (list): List of detected sensitive items
+
+        Returns:
+            tuple: (risk level, total score)
+        """
+        if not sensitive_items:
+            return 'low', 0.0
+
+        type_codes, confidences, counts, areas = self._item_arrays(
+            (item['type'], item.get('confidence', 0.0), item.get('count', 1),
+             item.get('location'))
+            for item in sensitive_items
+        )
+        total = round(float(self.score_arrays(type_codes, confidences, counts, areas).sum()), 4)
+        return str(self.levels_for(np.array([total]))[0]), total
+
+    def score_packed(self, records, chunk_size=1000000):
+        """
+        Total score of a scan's packed frame detections
+
+        Records are scored a chunk at a time, so a memory-mapped file is
+        never read into memory whole.
+
+        Args:
+            records (ndarray): Records from documents.detections
+            chunk_size (int): Records scored per step
+
+        Returns:
+            float: Sum of the detections' scores
+        """
+        # Packed type indexes follow SensitiveInformation.TYPE_CHOICES
+        type_codes = np.array(
+            [self.type_index.get(code, self.unknown_type) for code in TYPE_CODES], dtype=np.intp
+        )
+        total = 0.0
+        for start in range(0, len(records), chunk_size):
+            chunk = records[start:start + chunk_size]
+            total += float(self.score_arrays(
+                type_codes[chunk['type']],
+                chunk['confidence'].astype(np.float64),
+                np.ones(len(chunk), dtype=np.float64),
+                chunk['width'].astype(np.float64) * chunk['height'],
+            ).sum())
+        return total
+
+    def rescore_scans(self, queryset=None, chunk_size=2000):
+        """
+        Re-apply the current policy to stored scans without re-running detection
+
+        Scans are walked in primary key order one chunk at a time, so memory
+        use stays flat however large the table is. Only scans whose level or
+        score actually changes are written back. Scans with packed frame
+        detections are scored from those rather than from their per-type
+        summary rows.
+
+        Args:
+            queryset (QuerySet): Scans to re-score (defaults to all scans)
+            chunk_size (int): Number of scans processed per query
+
+        Returns:
+            dict: Number of scans examined and updated
+        """
+        if queryset is None:
+            queryset = DocumentScan.objects.all()
+        queryset = queryset.order_by('pk')
+
+        examined = 0
+        updated = 0
+        last_pk = 0
+        while True:
+            scans = list(
+                queryset.filter(pk__gt=last_pk)
+                .only('id', 'document_id', 'risk_level', 'risk_score', 'detections')[:chunk_size]
+            )
+            if not scans:
+                break
+            last_pk = scans[-1].pk
+            examined += len(scans)
+
+            position = {scan.pk: i for i, scan in enumerate(scans)}
+            packed = [scan for scan in scans if scan.detections]
+            rows = SensitiveInformation.objects.filter(scan_id__in=position.keys())
+            if packed:
+                # Summary rows of packed scans point at a frame
+                rows = rows.exclude(scan_id__in=[scan.pk for scan in packed], location__has_key='frame')
+            rows = rows.values_list('scan_id', 'type', 'confidence', 'count', 'location')
+
+            scan_positions = []
+            item_fields = []
+            for scan_id, *fields in rows.iterator(chunk_size=chunk_size):
+                scan_positions.append(position[scan_id])
+                item_fields.append(fields)
+
+            totals = np.zeros(len(scans), dtype=np.float64)
+            if item_fields:
+                item_scores = self.score_arrays(*self._item_arrays(item_fields))
+                totals = np.bincount(
+                    np.asarray(scan_positions, dtype=np.intp),
+                    weights=item_scores,
+                    minlength=len(scans)
+                )
+            for scan in packed:
+                totals[position[scan.pk]] += self.score_packed(load(scan))
+            levels = self.levels_for(totals)
+
+            changed = []
+            for scan, level, total in zip(scans, levels, totals):
+                total = round(float(total), 4)
+                if scan.risk_level != level or scan.risk_score != total:
+                    scan.risk_level = str(level)
+                    scan.risk_score = total
+                    changed.append(scan)
+
+            if changed:
+                with transaction.atomic():
+                    DocumentScan.objects.bulk_update(
+                        changed, ['risk_level', 'risk_score'], batch_size=500
+                    )
+                # bulk_update sends no signals
+                invalidate(*(f'document:{scan.document_id}' for scan in changed))
+                index_documents(scan.document_id for scan in changed)
+                updated += len(changed)
+
+        return {'examined': examined, 'updated': updated}
+
+    def _item_arrays(self, item_fields):
+        """
+        Convert (type, confidence, count, location) tuples into scoring arrays
+        """
+        type_index = self.type_index
+        unknown_type = self.unknown_type
+        type_codes = []
+        confidences = []
+        counts = []
+        areas = []
+        for sensitive_type, confidence, count, location in item_fields:
+            type_codes.append(type_index.get(sensitive_type, unknown_type))
+            confidences.append(confidence)
+            counts.append(count or 1)
+            if isinstance(location, dict):
+                areas.append(location.get('width', 0) * location.get('height', 0))
+            elif isinstance(location, (list, tuple)) and len(location) == 4:
+                areas.append(location[2] * location[3])
+            else:
+                areas.append(0)
+        return (
+            np.asarray(type_codes, dtype=np.intp),
+            np.asarray(confidences, dtype=np.float64),
+            np.asarray(counts, dtype=np.float64),
+            np.asarray(areas, dtype=np.float64),
+        )
+
+
+_engine = None
+
+
+def get_risk_engine():
+    """
+    Return the process-wide risk engine, compiling the policy on first use
+    """
+    global _engine
+    if _engine is None:
+        _engine = RiskEngine()
+    return _engine
@@ -0,0 +1,573 @@
+import logging
+import math
+import threading
+from collections import OrderedDict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Count, F, Min, Q, Subquery, Sum
+from django.db.models.functions import Coalesce
+from django.db.models.lookups import LessThan
+from django.utils import timezone
+from rest_framework.exceptions import Throttled
+
+from core.metrics import registry
+from users.models import User
+from .admission import admission_settings, degradation_settings, estimate_cost
+from .decode_cache import configure_for_worker
+from .detection_service import DetectionService
+from .models import DetectionBatch, DetectionJob
+
+
+logger = logging.getLogger(__name__)
+
+# Highest priority first
+PRIORITY_CLASSES = ('fast', 'standard', 'bulk')
+
+QUEUE_DEPTH = registry.gauge(
+    'detection_queue_depth',
+    'Pending detection jobs by priority class',
+    ['priority_class']
+)
+QUEUE_WAIT_SECONDS = registry.histogram(
+    'detection_queue_wait_seconds',
+    'Time jobs spent pending before a worker picked them up',
+    ['priority_class'],
+    buckets=(0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800, 3600)
+)
+JOBS_RUNNING = registry.gauge(
+    'detection_jobs_running',
+    'Detection jobs being run by this process',
+    ['priority_class']
+)
+JOBS_RECOVERED = registry.counter(
+    'detection_jobs_recovered_total',
+    'Jobs whose worker stopped sending heartbeats, by what happened to them',
+    ['outcome']
+)
+QUEUED_COST = registry.gauge(
+    'detection_queued_cost',
+    'Estimated worker-seconds of pending and processing detection jobs'
+)
+ADMISSION_REJECTED = registry.counter(
+    'detection_admission_rejected_total',
+    'Analysis requests refused for the queued cost budget or the per-user concurrency limit',
+    ['scope']
+)
+FAST_MODE_JOBS = registry.counter(
+    'detection_fast_mode_jobs_total',
+    'Jobs started in fast mode because the queue was under pressure'
+)
+
+OPEN_STATUSES = ('pending', 'processing')
+
+
+def scheduler_settings():
+    config = getattr(settings, 'JOB_SCHEDULER', {})
+    return {
+        'ENABLED': config.get('ENABLED', True),
+        'WORKERS': config.get('WORKERS', 2),
+        'FAST_LANE_WORKERS': config.get('FAST_LANE_WORKERS', 1),
+        'MAX_CONCURRENT_PER_USER': config.get('MAX_CONCURRENT_PER_USER', 2),
+        'FAST_LANE_MAX_BYTES': config.get('FAST_LANE_MAX_BYTES', 5 * 1024 * 1024),
+        'BULK_MIN_BYTES': config.get('BULK_MIN_BYTES', 50 * 1024 * 1024),
+        'AGING_SECONDS': config.get('AGING_SECONDS', 300),
+        'POLL_SECONDS': config.get('POLL_SECONDS', 2),
+        'HEARTBEAT_TIMEOUT_SECONDS': config.get('HEARTBEAT_TIMEOUT_SECONDS', 60),
+        'MAX_ATTEMPTS': config.get('MAX_ATTEMPTS', 3),
+        'RECOVERY_INTERVAL_SECONDS': config.get('RECOVERY_INTERVAL_SECONDS', 30),
+        'BATCH_MODEL_SETS': config.get('BATCH_MODEL_SETS', 16),
+    }
+
+
+class JobScheduler:
+    """
+    Runs pending DetectionJobs with priority classes and per-user fairness
+
+    Jobs are classified when queued: small images go to the fast lane,
+    videos and very large files to bulk, everything else is standard. When
+    a worker asks for work it considers the oldest pending job of every
+    (user, class) pair and picks, in order:
+
+    1. the highest class, where every AGING_SECONDS of waiting promotes a
+       job by one class so bulk work is never starved,
+    2. the user with the fewest jobs running, for fair share,
+    3. the oldest job.
+
+    Users already running MAX_CONCURRENT_PER_USER jobs are skipped. Claiming
+    is a conditional UPDATE on the pending status and the user's running
+    count, so several processes can share the queue without running a job
+    twice or going over a user's limit.
+
+    Each worker loop waits on its own wakeup event (wakeup_event()), and
+    wake() sets all of them when work is queued.
+
+    The jobs of a batch share one model selection per process: the first
+    of its jobs a worker runs loads the active variants, and the batch's
+    other jobs run with the same models (BATCH_MODEL_SETS batches are kept).
+
+    Running jobs write a heartbeat while they work. Jobs whose heartbeat is
+    older than HEARTBEAT_TIMEOUT_SECONDS belong to a dead worker and are put
+    back in the queue, keeping their checkpoint, until MAX_ATTEMPTS is used up.
+
+    Every job carries an estimated cost in worker-seconds. New work is
+    refused while the cost of open jobs, overall or for the requesting user,
+    would go over the admission budget, and jobs started while the queue is
+    above the degradation threshold run in fast mode.
+    """
+
+    def __init__(self):
+        self.config = scheduler_settings()
+        self.admission = admission_settings()
+        self.degradation = degradation_settings()
+        self._wakeups = []
+        self._wakeups_lock = threading.Lock()
+        self._batch_models = OrderedDict()
+        self._batch_models_lock = threading.Lock()
+
+    def wakeup_event(self):
+        """
+        New event for one worker loop, set by wake()
+
+        Every loop needs its own event: a loop clears its event when it wakes,
+        which would swallow the wakeup of a loop sharing it.
+        """
+        event = threading.Event()
+        with self._wakeups_lock:
+            self._wakeups.append(event)
+        return event
+
+    def wake(self):
+        """
+        Wake every worker loop to look for work
+        """
+        with self._wakeups_lock:
+            events = list(self._wakeups)
+        for event in events:
+            event.set()
+
+    def classify(self, document):
+        """
+        Priority class for analyzing a document
+
+        Args:
+            document (Document): Document to analyze
+
+        Returns:
+            str: 'fast', 'standard' or 'bulk'
+        """
+        try:
+            size = document.file.size
+        except (OSError, ValueError):
+            size = 0
+        if document.file_type == 'video' or size >= self.config['BULK_MIN_BYTES']:
+            return 'bulk'
+        if document.file_type == 'image' and size <= self.config['FAST_LANE_MAX_BYTES']:
+            return 'fast'
+        return 'standard'
+
+    def queued_cost(self, user=None):
+        """
+        Estimated cost of pending and processing jobs
+
+        Args:
+            user (User): Only count this user's jobs
+
+        Returns:
+            float: Total estimated worker-seconds
+        """
+        jobs = DetectionJob.objects.filter(status__in=OPEN_STATUSES)
+        if user is not None:
+            jobs = jobs.filter(document__user=user)
+        return jobs.aggregate(total=Sum('estimated_cost'))['total'] or 0.0
+
+    def under_pressure(self):
+        """
+        Whether new runs should trade accuracy for speed
+        """
+        threshold = self.admission['MAX_QUEUED_COST'] * self.degradation['QUEUE_PRESSURE']
+        return self.queued_cost() >= threshold
+
+    def admit(self, documents, user):
+        """
+        Estimate the cost of analyzing documents and check it against the budget
+
+        A request is refused when it would push the open jobs' cost over
+        MAX_QUEUED_COST, or the user's over MAX_USER_QUEUED_COST. Work is
+        always accepted while nothing is queued, so a single document larger
+        than the budget still runs. Concurrent requests may both fit in the
+        same headroom; the budget is a soft limit.
+
+        Args:
+            documents (list): Documents to analyze
+            user (User): User requesting the analysis
+
+        Returns:
+            dict: Estimated cost by document id
+
+        Raises:
+            Throttled: If the budget is exhausted; ``wait`` is the estimated
+                time until enough queued work has drained
+        """
+        costs = {document.id: estimate_cost(document, self.admission) for document in documents}
+        if not self.admission['ENABLED']:
+            return costs
+
+        requested = sum(costs.values())
+        workers = max(self.config['WORKERS'] + self.config['FAST_LANE_WORKERS'], 1)
+        limits = (
+            ('global', self.queued_cost(), self.admission['MAX_QUEUED_COST'], workers),
+            ('user', self.queued_cost(user), self.admission['MAX_USER_QUEUED_COST'],
+             min(self.config['MAX_CONCURRENT_PER_USER'], workers)),
+        )
+        for scope, queued, budget, throughput in limits:
+            if queued and queued + requested > budget:
+                ADMISSION_REJECTED.inc(scope=scope)
+                # Work has to drain until the request fits, or entirely if it never will
+                overflow = min(queued + requested - budget, queued)
+                wait = max(math.ceil(overflow / throughput), 1)
+                raise Throttled(
+                    wait=wait,
+                    detail=(
+                        "Too much analysis work is queued"
+                        + (" for your account" if scope == 'user' else "")
+                        + f"; try again in {wait} seconds."
+                    )
+                )
+        return costs
+
+    def enqueue(self, documents, batch=None, costs=None, latency_budget_ms=None):
+        """
+        Queue documents for analysis and wake the workers
+
+        Args:
+            documents (iterable): Documents to analyze
+            batch (DetectionBatch): Batch the jobs belong to
+            costs (dict): Estimated cost by document id, as returned by admit()
+            latency_budget_ms (int): Per-image latency budget for model variants
+
+        Returns:
+            list: The created pending jobs
+        """
+        costs = costs or {}
+        jobs = DetectionJob.objects.bulk_create([
+            DetectionJob(
+                document=document,
+                batch=batch,
+                status='pending',
+                priority_class=self.classify(document),
+                estimated_cost=(
+                    costs[document.id] if document.id in costs
+                    else estimate_cost(document, self.admission)
+                ),
+                latency_budget_ms=latency_budget_ms
+            )
+            for document in documents
+        ])
+        transaction.on_commit(self.wake)
+        return jobs
+
+    def run_now(self, document, user, latency_budget_ms=None):
+        """
+        Analyze a document in the calling thread, subject to admission
+
+        Args:
+            document (Document): Document to analyze
+            user (User): User requesting the analysis
+            latency_budget_ms (int): Per-image latency budget for model variants
+
+        Returns:
+            dict: Detection results, as from DetectionService.analyze_document
+
+        Raises:
+            Throttled: If the admission budget is exhausted, or the user
+                already runs MAX_CONCURRENT_PER_USER jobs
+        """
+        costs = self.admit([document], user)
+        fast_mode = self.under_pressure()
+        now = timezone.now()
+        cap = self.config['MAX_CONCURRENT_PER_USER']
+        # Under the same lock as _claim, so inline and queued jobs share the limit
+        with transaction.atomic():
+            self._lock_user(user.pk)
+            job = DetectionJob.objects.create(
+                document=document,
+                status='processing',
+                priority_class=self.classify(document),
+                processing_started_at=now,
+                heartbeat_at=now,
+                attempts=1,
+                estimated_cost=costs[document.id],
+                fast_mode=fast_mode,
+                latency_budget_ms=latency_budget_ms
+            )
+            running = DetectionJob.objects.filter(status='processing', document__user=user.pk)
+            if running.count() > cap:
+                ADMISSION_REJECTED.inc(scope='concurrency')
+                shortest = running.exclude(id=job.id).aggregate(cost=Min('estimated_cost'))['cost'] or 1
+                wait = max(math.ceil(shortest), 1)
+                # Raising rolls the job back
+                raise Throttled(
+                    wait=wait,
+                    detail=f"You already have {cap} analyses running; try again in {wait} seconds."
+                )
+        if fast_mode:
+            FAST_MODE_JOBS.inc()
+        return DetectionService().analyze_document(document.id, job=job)
+
+    def claim_next(self, classes=PRIORITY_CLASSES):
+        """
+        Atomically move the best pending job to processing
+
+        Args:
+            classes (tuple): Priority classes this worker may take
+
+        Returns:
+            DetectionJob: The claimed job, or None if nothing is runnable
+        """
+        now = timezone.now()
+        running = dict(
+            DetectionJob.objects.filter(status='processing')
+            .values_list('document__user')
+            .annotate(total=Count('id'))
+            .order_by()
+        )
+        heads = (
+            DetectionJob.objects.filter(status='pending', priority_class__in=classes)
+            .values('document__user', 'priority_class')
+            .annotate(oldest=Min('id'))
+            .order_by()
+        )
+        cap = self.config['MAX_CONCURRENT_PER_USER']
+        candidate_ids = [
+            head['oldest'] for head in heads
+            if running.get(head['document__user'], 0) < cap
+        ]
+        candidates = DetectionJob.objects.filter(id__in=candidate_ids).values(
+            'id', 'priority_class', 'started_at', 'document__user', 'attempts'
+        )
+        pressure = bool(candidates) and self.under_pressure()
+
+        def rank(job):
+            waited = (now - job['started_at']).total_seconds()
+            promotion = int(waited // self.config['AGING_SECONDS'])
+            priority = max(PRIORITY_CLASSES.index(job['priority_class']) - promotion, 0)
+            return priority, running.get(job['document__user'], 0), job['started_at'], job['id']
+
+        for job in sorted(candidates, key=rank):
+            fields = {}
+            # A retried job keeps its first mode so its checkpoint still applies
+            if pressure and not job['attempts']:
+                fields['fast_mode'] = True
+            if self._claim(job, now, fields):
+                if fields:
+                    FAST_MODE_JOBS.inc()
+                QUEUE_WAIT_SECONDS.observe(
+                    (now - job['started_at']).total_seconds(),
+                    priority_class=job['priority_class']
+                )
+                return DetectionJob.objects.select_related('document').get(id=job['id'])
+        return None
+
+    def _claim(self, job, now, fields):
+        """
+        Move a pending job to processing unless its user is at the limit
+
+        The running count is part of the UPDATE, so the limit holds across
+        threads and processes. SQLite runs one write at a time; databases
+        with row locks first lock the user's row, so concurrent claims for
+        the same user see each other's jobs.
+
+        Returns:
+            bool: Whether this call claimed the job
+        """
+        user_id = job['document__user']
+        running = (
+            DetectionJob.objects.filter(status='processing', document__user=user_id)
+            .values('document__user')
+            .annotate(total=Count('id'))
+            .values('total')
+            .order_by()
+        )
+        claim = DetectionJob.objects.filter(
+            LessThan(Coalesce(Subquery(running), 0), self.config['MAX_CONCURRENT_PER_USER']),
+            id=job['id'],
+            status='pending',
+        )
+        updates = dict(
+            status='processing',
+            processing_started_at=now,
+            heartbeat_at=now,
+            attempts=F('attempts') + 1,
+            **fields
+        )
+        if not connection.features.has_select_for_update:
+            return bool(claim.update(**updates))
+        with transaction.atomic():
+            self._lock_user(user_id)
+            return bool(claim.update(**updates))
+
+    def _lock_user(self, user_id):
+        """
+        Lock a user's row until the transaction ends, where the database can
+
+        SQLite has no row locks but runs one write transaction at a time.
+        """
+        if connection.features.has_select_for_update:
+            User.objects.select_for_update().filter(pk=user_id).exists()
+
+    def run_job(self, job):
+        """
+        Analyze a claimed job and settle its batch
+        """
+        JOBS_RUNNING.inc(priority_class=job.priority_class)
+        try:
+            DetectionService().analyze_document(job.document_id, job=job, models=self.batch_models(job))
+        finally:
+            JOBS_RUNNING.dec(priority_class=job.priority_class)
+        if job.batch_id:
+            self.update_batch(job.batch_id)
+
+    def batch_models(self, job):
+        """
+        Models the jobs of a batch run with, loaded once per process
+
+        Returns:
+            list: Selected model variants, or None for a job outside a batch
+        """
+        if not job.batch_id:
+            return None
+        key = (job.batch_id, job.fast_mode, job.latency_budget_ms)
+        with self._batch_models_lock:
+            models = self._batch_models.get(key)
+            if models is not None:
+                self._batch_models.move_to_end(key)
+                return models
+        models = DetectionService.select_models(job.fast_mode, job.latency_budget_ms)
+        with self._batch_models_lock:
+            self._batch_models[key] = models
+            while len(self._batch_models) > self.config['BATCH_MODEL_SETS']:
+                self._batch_models.popitem(last=False)
+        return models
+
+    def update_batch(self, batch_id):
+        """
+        Mark a batch processing, completed or failed from its jobs' states
+        """
+        counts = DetectionJob.objects.filter(batch_id=batch_id).aggregate(
+            open=Count('id', filter=Q(status__in=['pending', 'processing'])),
+            completed=Count('id', filter=Q(status='completed')),
+        )
+        if counts['open']:
+            DetectionBatch.objects.filter(id=batch_id, status='pending').update(status='processing')
+            return
+        DetectionBatch.objects.filter(id=batch_id).exclude(status__in=['completed', 'failed']).update(
+            status='completed' if counts['completed'] else 'failed',
+            completed_at=timezone.now()
+        )
+
+    def recover_stale_jobs(self):
+        """
+        Requeue or fail processing jobs whose worker stopped sending heartbeats
+
+        Returns:
+            dict: Number of jobs requeued and failed
+        """
+        cutoff = timezone.now() - timedelta(seconds=self.config['HEARTBEAT_TIMEOUT_SECONDS'])
+        stale = DetectionJob.objects.filter(status='processing').filter(
+            Q(heartbeat_at__lt=cutoff)
+            | Q(heartbeat_at__isnull=True, processing_started_at__lt=cutoff)
+            | Q(heartbeat_at__isnull=True, processing_started_at__isnull=True, started_at__lt=cutoff)
+        )
+
+        report = {'requeued': 0, 'failed': 0}
+        batch_ids = set()
+        for job in stale.values('id', 'attempts', 'batch_id'):
+            # Match the attempt too, in case the job moved on in the meantime
+            current = DetectionJob.objects.filter(id=job['id'], status='processing', attempts=job['attempts'])
+            if job['attempts'] >= self.config['MAX_ATTEMPTS']:
+                outcome = 'failed'
+                updated = current.update(
+                    status='failed',
+                    current_stage='',
+                    error_message=f"Worker stopped responding ({job['attempts']} attempts)"
+                )
+            else:
+                outcome = 'requeued'
+                updated = current.update(status='pending', current_stage='', processing_started_at=None)
+            if updated:
+                report[outcome] += 1
+                JOBS_RECOVERED.inc(outcome=outcome)
+                if job['batch_id']:
+                    batch_ids.add(job['batch_id'])
+
+        for batch_id in batch_ids:
+            self.update_batch(batch_id)
+        if report['requeued']:
+            logger.warning("Requeued %d detection jobs from unresponsive workers", report['requeued'])
+            self.wake()
+        if report['failed']:
+            logger.error("Failed %d detection jobs after repeated worker crashes", report['failed'])
+        return report
+
+    def update_queue_metrics(self):
+        depth = dict(
+            DetectionJob.objects.filter(status='pending')
+            .values_list('priority_class')
+            .annotate(total=Count('id'))
+            .order_by()
+        )
+        for priority_class in PRIORITY_CLASSES:
+            QUEUE_DEPTH.set(depth.get(priority_class, 0), priority_class=priority_class)
+        QUEUED_COST.set(self.queued_cost())
+
+    def work(self, classes=PRIORITY_CLASSES, should_stop=None):
+        """
+        Run jobs from the given classes until none can be claimed
+
+        Args:
+            classes (tuple): Priority classes to take jobs from
+            should_stop (callable): Checked before each job; returning True
+                ends the run early
+        """
+        configure_for_worker()
+        while should_stop is None or not should_stop():
+            self.update_queue_metrics()
+            job = self.claim_next(classes)
+            if job is None:
+                return
+            if job.batch_id:
+                self.update_batch(job.batch_id)
+            try:
+                self.run_job(job)
+            except Exception:
+                logger.exception("Detection job %s crashed", job.id)
+
+    def workers(self):
+        """
+        Worker loops to run, as (name, classes) pairs
+
+        The fast lane only takes small image jobs, so a photo never waits
+        behind long videos; general workers take every class by priority.
+        """
+        lanes = [
+            (f'fast-lane-{i}', ('fast',)) for i in range(self.config['FAST_LANE_WORKERS'])
+        ]
+        lanes += [
+            (f'worker-{i}', PRIORITY_CLASSES) for i in range(self.config['WORKERS'])
+        ]
+        return lanes
+
+
+_scheduler = None
+
+
+def get_scheduler():
+    """
+    Process-wide job scheduler
+    """
+    global _scheduler
+    if _scheduler is None:
+        _scheduler = JobScheduler()
+    return _scheduler
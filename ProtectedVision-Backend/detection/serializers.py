@@ -1,5 +1,7 @@
+from django.conf import settings
 from rest_framework import serializers
-from .models import DetectionModel, DetectionJob
+from .models import DetectionModel, DetectionBatch, DetectionJob
+from documents.detections import summarize, to_file
 from documents.models import Document, DocumentScan, SensitiveInformation
 
 
@@ -18,10 +20,19 @@ class DetectionModelSerializer(serializers.ModelSerializer):
             'model_type_display', 
             'version', 
             'active', 
+            'shadow',
+            'precision',
+            'input_size',
+            'latency_ms',
+            'mean_average_precision',
+            'memory_mb',
+            'evaluated_at',
             'created_at', 
             'updated_at'
         ]
-        read_only_fields = ['created_at', 'updated_at']
+        read_only_fields = [
+            'latency_ms', 'mean_average_precision', 'memory_mb', 'evaluated_at', 'created_at', 'updated_at'
+        ]
 
 
 class DetectionJobSerializer(serializers.ModelSerializer):
@@ -41,9 +52,24 @@ class DetectionJobSerializer(serializers.ModelSerializer):
             'models_used', 
             'started_at', 
             'completed_at', 
-            'error_message'
+            'error_message',
+            'stage_timings',
+            'model_timings',
+            'cascade',
+            'quality',
+            'near_duplicate',
+            'progress',
+            'current_stage',
+            'attempts',
+            'estimated_cost',
+            'fast_mode',
+            'latency_budget_ms'
+        ]
+        read_only_fields = [
+            'status', 'models_used', 'started_at', 'completed_at', 'error_message', 'stage_timings',
+            'model_timings', 'cascade', 'quality', 'near_duplicate', 'progress', 'current_stage', 'attempts',
+            'estimated_cost', 'fast_mode', 'latency_budget_ms'
         ]
-        read_only_fields = ['status', 'models_used', 'started_at', 'completed_at', 'error_message']
 
 
 class AnalyzeDocumentSerializer(serializers.Serializer):
@@ -51,6 +77,10 @@ class AnalyzeDocumentSerializer(serializers.Serializer):
     Serializer for document analysis request
     """
     document_id = serializers.IntegerField()
+    latency_budget_ms = serializers.IntegerField(
+        min_value=1, required=False,
+        help_text="Per-image latency to stay within; picks the most accurate model variants that do"
+    )
     
     def validate_document_id(self, value):
         try:
@@ -63,6 +93,80 @@ class AnalyzeDocumentSerializer(serializers.Serializer):
             raise serializers.ValidationError("Document not found")
 
 
+class BatchAnalyzeSerializer(serializers.Serializer):
+    """
+    Serializer for a batch analysis request
+    """
+    document_ids = serializers.ListField(child=serializers.IntegerField(), allow_empty=False)
+    latency_budget_ms = serializers.IntegerField(min_value=1, required=False)
+    
+    def validate_document_ids(self, value):
+        max_documents = getattr(settings, 'ML_MODELS', {}).get('MAX_BATCH_DOCUMENTS', 50)
+        document_ids = list(dict.fromkeys(value))
+        if len(document_ids) > max_documents:
+            raise serializers.ValidationError(f"At most {max_documents} documents can be analyzed at once")
+        
+        # Check existence and ownership of the whole set with one query
+        owners = dict(Document.objects.filter(id__in=document_ids).values_list('id', 'user_id'))
+        missing = [document_id for document_id in document_ids if document_id not in owners]
+        if missing:
+            raise serializers.ValidationError(f"Documents not found: {missing}")
+        user_id = self.context['request'].user.id
+        if any(owner != user_id for owner in owners.values()):
+            raise serializers.ValidationError("You don't have permission to analyze these documents")
+        return document_ids
+
+
+class BatchJobSerializer(serializers.ModelSerializer):
+    """
+    Compact serializer for the jobs of a batch
+    """
+    class Meta:
+        model = DetectionJob
+        fields = [
+            'id', 'document', 'status', 'progress', 'current_stage', 'fast_mode', 'completed_at', 'error_message'
+        ]
+        read_only_fields = fields
+
+
+class DetectionBatchSerializer(serializers.ModelSerializer):
+    """
+    Serializer for batch analysis status and progress
+    """
+    status_display = serializers.CharField(source='get_status_display', read_only=True)
+    total = serializers.IntegerField(read_only=True)
+    pending = serializers.IntegerField(read_only=True)
+    completed = serializers.IntegerField(read_only=True)
+    failed = serializers.IntegerField(read_only=True)
+    progress = serializers.SerializerMethodField()
+    jobs = BatchJobSerializer(many=True, read_only=True)
+    
+    class Meta:
+        model = DetectionBatch
+        fields = [
+            'id',
+            'status',
+            'status_display',
+            'total',
+            'pending',
+            'completed',
+            'failed',
+            'progress',
+            'created_at',
+            'completed_at',
+            'jobs'
+        ]
+        read_only_fields = fields
+    
+    def get_progress(self, obj):
+        """
+        Fraction of the batch's jobs that have finished
+        """
+        if not obj.total:
+            return 1.0
+        return round((obj.completed + obj.failed) / obj.total, 3)
+
+
 class SensitiveItemSerializer(serializers.Serializer):
     """
     Serializer for sensitive information items
@@ -71,6 +175,7 @@ class SensitiveItemSerializer(serializers.Serializer):
     confidence = serializers.FloatField()
     location = serializers.JSONField(required=False)
     count = serializers.IntegerField(default=1)
+    detected_by = serializers.CharField(required=False, allow_blank=True)
 
 
 class DetectionResultSerializer(serializers.Serializer):
@@ -79,6 +184,7 @@ class DetectionResultSerializer(serializers.Serializer):
     """
     document_id = serializers.IntegerField()
     risk_level = serializers.ChoiceField(choices=['low', 'medium', 'high'])
+    risk_score = serializers.FloatField(default=0)
     processing_time = serializers.FloatField()
     sensitive_items = SensitiveItemSerializer(many=True)
     
@@ -89,6 +195,14 @@ class DetectionResultSerializer(serializers.Serializer):
         document_id = validated_data.pop('document_id')
         sensitive_items = validated_data.pop('sensitive_items')
         
+        # Frame detections packed by the service are stored as one file,
+        # with a summary item per type among the sensitive items
+        detections = validated_data.pop('detections', None)
+        if detections is not None and len(detections):
+            validated_data['detections'] = to_file(detections)
+            validated_data['detection_count'] = len(detections)
+            sensitive_items = sensitive_items + summarize(detections)
+        
         # Get the document
         document = Document.objects.get(id=document_id)
         
@@ -99,14 +213,13 @@ class DetectionResultSerializer(serializers.Serializer):
         )
         
         # Create sensitive information records
-        for item in sensitive_items:
-            SensitiveInformation.objects.create(
-                scan=scan,
-                **item
-            )
+        SensitiveInformation.objects.bulk_create([
+            SensitiveInformation(scan=scan, **item)
+            for item in sensitive_items
+        ])
         
         # Mark the document as processed
         document.processed = True
-        document.save()
+        document.save(update_fields=['processed', 'updated_at'])
         
         return scan 
\ No newline at end of file
@@ -0,0 +1,234 @@
+"""
+Shadow-mode evaluation of candidate detection models
+
+A DetectionModel marked ``shadow`` is a candidate: it never serves users,
+but after a sample of completed jobs (SHADOW['SAMPLE_RATE']) it runs over
+the same document in the background, once the user already has the
+results. Its detections are matched by IoU against those of the production
+model of the same type. A ShadowEvaluation row stores the candidate's
+latency next to production's and how far the two agree. Aggregated per
+candidate version, the rows show whether a candidate can be promoted by
+clearing ``shadow``.
+
+Candidates run on a small thread pool of their own (SHADOW['MAX_WORKERS'])
+and never delay user requests: while SHADOW['MAX_PENDING'] evaluations are
+waiting, further samples are dropped.
+"""
+
+import logging
+import random
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db.models import Avg, Count, Max, Q, Sum
+
+from core.metrics import registry
+from documents.detections import scan_detections
+from .evaluation import iou
+from .model_graph import NODE_TYPES, TextRecognizer
+from .models import DetectionJob, DetectionModel, ShadowEvaluation
+
+
+logger = logging.getLogger(__name__)
+
+SHADOW_RUNS = registry.counter(
+    'detection_shadow_runs_total',
+    'Shadow evaluations of candidate models by outcome',
+    ['outcome']
+)
+
+_pool = None
+_pending = 0
+_lock = threading.Lock()
+
+
+def shadow_settings():
+    config = getattr(settings, 'SHADOW', {})
+    return {
+        'ENABLED': config.get('ENABLED', True),
+        'SAMPLE_RATE': config.get('SAMPLE_RATE', 0.1),
+        'MAX_WORKERS': config.get('MAX_WORKERS', 1),
+        'MAX_PENDING': config.get('MAX_PENDING', 100),
+        'IOU_THRESHOLD': config.get('IOU_THRESHOLD', 0.5),
+    }
+
+
+def get_shadow_pool():
+    """
+    Return the process-wide shadow thread pool, starting it on first use
+    """
+    global _pool
+    with _lock:
+        if _pool is None:
+            _pool = ThreadPoolExecutor(
+                max_workers=shadow_settings()['MAX_WORKERS'], thread_name_prefix='detection-shadow'
+            )
+    return _pool
+
+
+def schedule_shadow(job, scan):
+    """
+    Queue a shadow evaluation of a completed job, if it is sampled
+
+    Args:
+        job (DetectionJob): Completed production job
+        scan (DocumentScan): Scan the job saved
+
+    Returns:
+        bool: Whether an evaluation was queued
+    """
+    global _pending
+    config = shadow_settings()
+    if not config['ENABLED'] or random.random() >= config['SAMPLE_RATE']:
+        return False
+    if not DetectionModel.objects.filter(shadow=True, active=True).exists():
+        return False
+
+    with _lock:
+        if _pending >= config['MAX_PENDING']:
+            SHADOW_RUNS.inc(outcome='dropped')
+            return False
+        _pending += 1
+    get_shadow_pool().submit(_evaluate_queued, job.pk, scan.pk)
+    return True
+
+
+def _evaluate_queued(job_id, scan_id):
+    global _pending
+    try:
+        job = DetectionJob.objects.select_related('document').get(pk=job_id)
+        scan = job.document.scans.get(pk=scan_id)
+        evaluate(job, scan)
+    except Exception:
+        SHADOW_RUNS.inc(outcome='failed')
+        logger.exception("Shadow evaluation of job %s failed", job_id)
+    finally:
+        with _lock:
+            _pending -= 1
+
+
+def _box(location):
+    return (
+        location['x'], location['y'],
+        location['x'] + location['width'] - 1, location['y'] + location['height'] - 1
+    )
+
+
+def match(candidate, baseline, threshold):
+    """
+    Pair up two models' detections of the same type (and frame) by IoU
+
+    Each candidate detection, most confident first, takes the unmatched
+    baseline detection it overlaps most, if that overlap reaches the threshold.
+
+    Args:
+        candidate (list): The candidate's detections
+        baseline (list): Production's detections
+        threshold (float): IoU a pair needs
+
+    Returns:
+        list: IoU of every matched pair
+    """
+    unmatched = {}
+    for item in baseline:
+        unmatched.setdefault((item['type'], item.get('frame')), []).append(_box(item['location']))
+
+    overlaps = []
+    for item in sorted(candidate, key=lambda item: -item['confidence']):
+        boxes = unmatched.get((item['type'], item.get('frame')))
+        if not boxes:
+            continue
+        box = _box(item['location'])
+        best, best_index = max((iou(box, other), index) for index, other in enumerate(boxes))
+        if best >= threshold:
+            overlaps.append(best)
+            boxes.pop(best_index)
+    return overlaps
+
+
+def evaluate(job, scan, candidates=None):
+    """
+    Run shadow candidates over a job's document and compare them with production
+
+    Args:
+        job (DetectionJob): Completed production job
+        scan (DocumentScan): Scan the job saved
+        candidates (iterable): Candidate models; every shadow model by default
+
+    Returns:
+        list: The saved ShadowEvaluation rows
+    """
+    # Imported here: the detection service schedules shadow runs
+    from .detection_service import DetectionService
+
+    if candidates is None:
+        candidates = DetectionModel.objects.filter(shadow=True, active=True).order_by('id')
+    threshold = shadow_settings()['IOU_THRESHOLD']
+    production = scan_detections(scan)
+    used = {model.model_type: model for model in job.models_used.all()}
+    text_regions = [item['location'] for item in production if item['type'] in TextRecognizer.types]
+
+    evaluations = []
+    for candidate in candidates:
+        node = NODE_TYPES.get(candidate.model_type)
+        if node is None:
+            continue
+        inputs = {'text_regions': text_regions} if 'text_regions' in node.requires else {}
+        detections, graph = DetectionService().run_models(job.document, [candidate], job.fast_mode, inputs)
+        # Timings are keyed by model id, as a candidate often shares its
+        # name with the production version it would replace
+        candidate_timing = graph.timings.get(str(candidate.id))
+        if candidate_timing is None:
+            continue
+        baseline = used.get(candidate.model_type)
+        expected = [item for item in production if item['type'] in node.types]
+        overlaps = match(detections, expected, threshold)
+        total = len(detections) + len(expected)
+        baseline_timing = (job.model_timings or {}).get(str(baseline.id)) if baseline is not None else None
+        evaluations.append(ShadowEvaluation.objects.create(
+            candidate=candidate,
+            baseline=baseline,
+            job=job,
+            candidate_detections=len(detections),
+            baseline_detections=len(expected),
+            matched=len(overlaps),
+            agreement=2 * len(overlaps) / total if total else 1.0,
+            mean_iou=sum(overlaps) / len(overlaps) if overlaps else None,
+            candidate_seconds=candidate_timing.seconds,
+            baseline_seconds=baseline_timing['seconds'] if baseline_timing else None
+        ))
+        SHADOW_RUNS.inc(outcome='evaluated')
+    return evaluations
+
+
+def summarize(candidates):
+    """
+    Aggregate the shadow evaluations of each candidate version
+
+    Args:
+        candidates (QuerySet): Candidate DetectionModel rows
+
+    Returns:
+        dict: Summary by candidate id: mean agreement, IoU and latencies
+            (in seconds), and the cost as the candidate's total latency
+            over production's on the same jobs
+    """
+    rows = ShadowEvaluation.objects.filter(candidate__in=candidates).values('candidate').annotate(
+        evaluations=Count('id'),
+        agreement=Avg('agreement'),
+        mean_iou=Avg('mean_iou'),
+        candidate_latency=Avg('candidate_seconds'),
+        baseline_latency=Avg('baseline_seconds'),
+        # Only jobs with a production latency count towards the cost
+        candidate_total=Sum('candidate_seconds', filter=Q(baseline_seconds__isnull=False)),
+        baseline_total=Sum('baseline_seconds'),
+        last_evaluated_at=Max('created_at')
+    )
+    summaries = {}
+    for row in rows:
+        baseline_total = row.pop('baseline_total')
+        candidate_total = row.pop('candidate_total')
+        row['cost_ratio'] = candidate_total / baseline_total if baseline_total else None
+        summaries[row.pop('candidate')] = row
+    return summaries
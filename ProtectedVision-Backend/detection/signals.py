@@ -0,0 +1,17 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+
+from core.cache import invalidate
+from .models import DetectionModel
+
+
+def invalidate_model_cache(sender, instance, **kwargs):
+    """
+    Drop cached detection model listings once the change is committed
+    """
+    transaction.on_commit(lambda: invalidate('detection-models'))
+
+
+def connect_signals():
+    post_save.connect(invalidate_model_cache, sender=DetectionModel, dispatch_uid='invalidate_cache_save_DetectionModel')
+    post_delete.connect(invalidate_model_cache, sender=DetectionModel, dispatch_uid='invalidate_cache_delete_DetectionModel')
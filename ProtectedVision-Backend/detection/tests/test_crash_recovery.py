@@ -0,0 +1,149 @@
+"""
+Recovery of detection jobs whose worker died
+
+In-process counterpart of benchmarks/crash_recovery.py: instead of killing
+worker processes, a job is interrupted at a checkpoint and its heartbeat
+is aged past HEARTBEAT_TIMEOUT_SECONDS.
+"""
+
+import shutil
+import tempfile
+from datetime import timedelta
+from unittest import mock
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.test import TransactionTestCase, override_settings
+from django.utils import timezone
+
+from benchmarks.synthetic import make_pdf
+from detection.detection_service import DetectionService
+from detection.models import DetectionJob, DetectionModel
+from detection.progress import JobProgress
+from detection.scheduler import JobScheduler
+from documents.models import Document, DocumentScan
+from users.models import User
+
+PAGES = 8
+
+
+class WorkerKilled(BaseException):
+    """
+    Stops a job the way SIGKILL would, skipping its error handling
+    """
+
+
+class CrashRecoveryTests(TransactionTestCase):
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp(prefix='pv-test-media-')
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        overrides = override_settings(
+            MEDIA_ROOT=media_root,
+            ML_MODELS={**settings.ML_MODELS, 'SIMULATE_PROCESSING_DELAY': False},
+            JOB_SCHEDULER={**settings.JOB_SCHEDULER, 'HEARTBEAT_TIMEOUT_SECONDS': 60, 'MAX_ATTEMPTS': 3},
+            PROGRESS_EVENTS={**settings.PROGRESS_EVENTS, 'CHECKPOINT_INTERVAL_SECONDS': 0},
+            SHADOW={**settings.SHADOW, 'SAMPLE_RATE': 0},
+        )
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+
+        DetectionModel.objects.create(name='Test detector', model_type='yolo', version='1.0')
+        user = User.objects.create_user(username='crash', email='crash@test.local', password='crash-password')
+        self.document = Document.objects.create(
+            user=user, title='statement.pdf', file_type='pdf',
+            file=ContentFile(make_pdf(PAGES, width=400, height=520), name='statement.pdf')
+        )
+        self.scheduler = JobScheduler()
+        self.scheduler.enqueue([self.document])
+
+    def claim(self):
+        job = self.scheduler.claim_next()
+        self.assertIsNotNone(job)
+        return job
+
+    def expire_heartbeat(self, job):
+        """
+        Age a job's heartbeat as if its worker died a while ago
+        """
+        timeout = self.scheduler.config['HEARTBEAT_TIMEOUT_SECONDS']
+        DetectionJob.objects.filter(pk=job.pk).update(
+            heartbeat_at=timezone.now() - timedelta(seconds=timeout + 1)
+        )
+
+    def run_until_checkpoint(self, job, done):
+        """
+        Run a job and kill it once it has checkpointed ``done`` pages
+        """
+        record = JobProgress.checkpoint
+
+        def checkpoint(reporter, data):
+            record(reporter, data)
+            if data['done'] == done:
+                raise WorkerKilled()
+
+        with mock.patch.object(JobProgress, 'checkpoint', checkpoint):
+            with self.assertRaises(WorkerKilled):
+                self.scheduler.run_job(job)
+
+    def test_stale_job_is_requeued(self):
+        job = self.claim()
+        self.run_until_checkpoint(job, 3)
+
+        # A live heartbeat keeps the job with its worker
+        self.assertEqual(self.scheduler.recover_stale_jobs(), {'requeued': 0, 'failed': 0})
+
+        self.expire_heartbeat(job)
+        self.assertEqual(self.scheduler.recover_stale_jobs(), {'requeued': 1, 'failed': 0})
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'pending')
+        self.assertEqual(job.attempts, 1)
+        self.assertEqual(job.checkpoint['done'], 3)
+
+    def test_requeued_job_resumes_from_checkpoint(self):
+        self.run_until_checkpoint(self.claim(), 3)
+        self.expire_heartbeat(DetectionJob.objects.get())
+        self.scheduler.recover_stale_jobs()
+
+        retry = self.claim()
+        self.assertEqual(retry.attempts, 2)
+        checkpoints = []
+        record = JobProgress.checkpoint
+
+        def checkpoint(reporter, data):
+            checkpoints.append(data['done'])
+            record(reporter, data)
+
+        with mock.patch.object(JobProgress, 'checkpoint', checkpoint):
+            self.scheduler.run_job(retry)
+
+        # Only the pages after the checkpoint were analyzed again
+        self.assertEqual(checkpoints, list(range(4, PAGES + 1)))
+        retry.refresh_from_db()
+        self.assertEqual(retry.status, 'completed')
+        self.assertIsNone(retry.checkpoint)
+        self.assertEqual(DocumentScan.objects.filter(document=self.document).count(), 1)
+
+    def test_stale_worker_cannot_finish_job(self):
+        stale = self.claim()
+        takeover = {}
+
+        def store_hashes(service, document):
+            # The job is recovered and claimed again between the stale
+            # worker's last heartbeat and its _finish_job
+            self.expire_heartbeat(stale)
+            self.scheduler.recover_stale_jobs()
+            takeover['job'] = self.claim()
+
+        with mock.patch.object(DetectionService, '_store_hashes', store_hashes):
+            self.scheduler.run_job(stale)
+
+        current = DetectionJob.objects.get()
+        self.assertEqual(current.attempts, 2)
+        self.assertEqual(current.status, 'processing')
+        self.assertIsNone(current.completed_at)
+
+        # The attempt that owns the job can still finish it
+        self.scheduler.run_job(takeover['job'])
+        current.refresh_from_db()
+        self.assertEqual(current.status, 'completed')
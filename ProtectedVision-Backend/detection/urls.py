@@ -1,13 +1,18 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import DetectionModelViewSet, DetectionJobViewSet, AnalysisViewSet
+from .events import EventTicketView, job_events, user_events
+from .views import DetectionModelViewSet, DetectionJobViewSet, DetectionBatchViewSet, AnalysisViewSet
 
 # Setup the router
 router = DefaultRouter()
 router.register(r'models', DetectionModelViewSet, basename='detection-model')
 router.register(r'jobs', DetectionJobViewSet, basename='detection-job')
+router.register(r'batches', DetectionBatchViewSet, basename='detection-batch')
 router.register(r'analyze', AnalysisViewSet, basename='analyze')
 
 urlpatterns = [
+    path('jobs/<int:job_id>/events/', job_events, name='detection-job-events'),
+    path('events/', user_events, name='detection-events'),
+    path('events/ticket/', EventTicketView.as_view(), name='detection-event-ticket'),
     path('', include(router.urls)),
 ] 
\ No newline at end of file
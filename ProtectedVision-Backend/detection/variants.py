@@ -0,0 +1,95 @@
+"""
+Choice between variants of a detection model
+
+Variants of one detector, such as an INT8-quantized build or one that
+resizes its input to 320 pixels, are registered as DetectionModel rows that
+share a name and model type and differ in version, ``precision`` and
+``input_size``. benchmarks/model_variants.py measures each variant's
+latency, memory and mAP on a labelled synthetic set and stores them on the
+row. For every job, one variant per detector runs:
+
+- with a latency budget, the most accurate variant within it, or the
+  fastest if none fits
+- in fast mode, the fastest variant
+- otherwise the most accurate variant
+
+Variants that have not been evaluated are ranked by a nominal cost: the
+share of pixels their input size keeps, times a factor per precision.
+Larger, full-precision variants are presumed slower and more accurate.
+"""
+
+from django.conf import settings
+
+
+def variant_settings():
+    config = getattr(settings, 'MODEL_VARIANTS', {})
+    return {
+        'REFERENCE_INPUT_SIZE': config.get('REFERENCE_INPUT_SIZE', 1280),
+        'PRECISION_COST': {'fp32': 1.0, 'fp16': 0.7, 'int8': 0.4, **config.get('PRECISION_COST', {})},
+    }
+
+
+def relative_cost(model, config=None):
+    """
+    Nominal cost of a variant relative to the full-size FP32 model
+
+    Args:
+        model (DetectionModel): Variant
+        config (dict): variant_settings(), if already read
+
+    Returns:
+        float: Cost in (0, 1]
+    """
+    config = config or variant_settings()
+    pixels = 1.0
+    if model.input_size:
+        pixels = min(model.input_size / config['REFERENCE_INPUT_SIZE'], 1.0) ** 2
+    return pixels * config['PRECISION_COST'].get(model.precision, 1.0)
+
+
+def _fastest(group, config):
+    if all(model.latency_ms is not None for model in group):
+        return min(group, key=lambda model: model.latency_ms)
+    return min(group, key=lambda model: relative_cost(model, config))
+
+
+def _most_accurate(group, config):
+    if all(model.mean_average_precision is not None for model in group):
+        return max(group, key=lambda model: (model.mean_average_precision, -(model.latency_ms or 0)))
+    return max(group, key=lambda model: relative_cost(model, config))
+
+
+def select_variants(models, fast_mode=False, latency_budget_ms=None):
+    """
+    Pick one variant of every detector for a job
+
+    Args:
+        models (iterable): Active DetectionModel rows
+        fast_mode (bool): Prefer the fastest variants
+        latency_budget_ms (int): Per-image latency the requester accepts;
+            only variants with a measured latency count as within it
+
+    Returns:
+        list: The chosen models, in the order of their first variant
+    """
+    config = variant_settings()
+    groups = {}
+    for model in models:
+        groups.setdefault((model.model_type, model.name), []).append(model)
+
+    chosen = []
+    for group in groups.values():
+        if len(group) == 1:
+            chosen.append(group[0])
+        elif latency_budget_ms is not None:
+            within = [
+                model for model in group
+                if model.latency_ms is not None and model.latency_ms <= latency_budget_ms
+            ]
+            chosen.append(_most_accurate(within, config) if within else _fastest(group, config))
+        elif fast_mode:
+            chosen.append(_fastest(group, config))
+        else:
+            chosen.append(_most_accurate(group, config))
+    return chosen
+
@@ -1,15 +1,22 @@
 from rest_framework import viewsets, mixins, permissions, status, filters
 from rest_framework.decorators import action
 from rest_framework.response import Response
+from django.db import transaction
+from django.db.models import Count, Prefetch, Q
+from django.urls import reverse
 from django_filters.rest_framework import DjangoFilterBackend
-from .models import DetectionModel, DetectionJob
+from core.cache import cached_response
+from documents.models import Document, DocumentScan
+from .models import DetectionModel, DetectionBatch, DetectionJob
 from .serializers import (
     DetectionModelSerializer,
     DetectionJobSerializer,
+    DetectionBatchSerializer,
     AnalyzeDocumentSerializer,
-    DetectionResultSerializer
+    BatchAnalyzeSerializer
 )
-from .detection_service import DetectionService
+from .scheduler import get_scheduler
+from .shadow import summarize as summarize_shadow
 
 
 class DetectionModelViewSet(mixins.ListModelMixin,
@@ -18,13 +25,36 @@ class DetectionModelViewSet(mixins.ListModelMixin,
     """
     ViewSet for ML detection models
     """
-    queryset = DetectionModel.objects.filter(active=True)
+    # Shadow candidates are listed by the admin-only shadow action instead
+    queryset = DetectionModel.objects.filter(active=True, shadow=False)
     serializer_class = DetectionModelSerializer
     permission_classes = [permissions.IsAuthenticated]
     filter_backends = [DjangoFilterBackend, filters.OrderingFilter]
     filterset_fields = ['model_type']
     ordering_fields = ['name', 'created_at']
     ordering = ['name']
+    
+    # Models are the same for every user; saving or deleting one, including
+    # moving it in or out of shadow, invalidates
+    @cached_response(['detection-models'], per_user=False)
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
+    
+    @cached_response(['detection-models'], per_user=False)
+    def retrieve(self, request, *args, **kwargs):
+        return super().retrieve(request, *args, **kwargs)
+    
+    @action(detail=False, methods=['get'], permission_classes=[permissions.IsAdminUser])
+    def shadow(self, request):
+        """
+        Compare every shadow candidate with production over its sampled jobs
+        """
+        candidates = DetectionModel.objects.filter(shadow=True).order_by('model_type', 'name', 'version')
+        summaries = summarize_shadow(candidates)
+        return Response([
+            {**DetectionModelSerializer(candidate).data, 'shadow_evaluation': summaries.get(candidate.id)}
+            for candidate in candidates
+        ])
 
 
 class DetectionJobViewSet(mixins.ListModelMixin,
@@ -47,6 +77,33 @@ class DetectionJobViewSet(mixins.ListModelMixin,
         return DetectionJob.objects.filter(document__user=self.request.user)
 
 
+class DetectionBatchViewSet(mixins.ListModelMixin,
+                            mixins.RetrieveModelMixin,
+                            viewsets.GenericViewSet):
+    """
+    ViewSet for batch analysis status
+    """
+    serializer_class = DetectionBatchSerializer
+    permission_classes = [permissions.IsAuthenticated]
+    filter_backends = [DjangoFilterBackend, filters.OrderingFilter]
+    filterset_fields = ['status']
+    ordering_fields = ['created_at', 'completed_at']
+    ordering = ['-created_at']
+    
+    def get_queryset(self):
+        """
+        Return the current user's batches with their job counts
+        """
+        return DetectionBatch.objects.filter(user=self.request.user).annotate(
+            total=Count('jobs'),
+            pending=Count('jobs', filter=Q(jobs__status__in=['pending', 'processing'])),
+            completed=Count('jobs', filter=Q(jobs__status='completed')),
+            failed=Count('jobs', filter=Q(jobs__status='failed')),
+        ).prefetch_related(
+            Prefetch('jobs', queryset=DetectionJob.objects.order_by('id'))
+        )
+
+
 class AnalysisViewSet(viewsets.ViewSet):
     """
     ViewSet for document analysis
@@ -63,10 +120,12 @@ class AnalysisViewSet(viewsets.ViewSet):
         )
         if serializer.is_valid():
             document_id = serializer.validated_data['document_id']
+            document = Document.objects.get(id=document_id)
             
-            # Call the detection service
-            detection_service = DetectionService()
-            results = detection_service.analyze_document(document_id)
+            # Run the detection service now, unless too much work is queued
+            results = get_scheduler().run_now(
+                document, request.user, serializer.validated_data.get('latency_budget_ms')
+            )
             
             # Check for error
             if 'error' in results:
@@ -75,35 +134,68 @@ class AnalysisViewSet(viewsets.ViewSet):
                     status=status.HTTP_400_BAD_REQUEST
                 )
             
-            # Create DocumentScan and SensitiveInformation records
-            result_serializer = DetectionResultSerializer(data=results)
-            if result_serializer.is_valid():
-                scan = result_serializer.save()
-                
-                # Return the scan results
-                response_data = {
-                    'scan_id': scan.id,
-                    'document_id': scan.document.id,
-                    'risk_level': scan.risk_level,
-                    'processing_time': scan.processing_time,
-                    'scan_date': scan.scan_date,
-                    'sensitive_items': [
-                        {
-                            'type': si.type,
-                            'type_display': si.get_type_display(),
-                            'confidence': si.confidence,
-                            'location': si.location,
-                            'count': si.count,
-                            'redacted': si.redacted
-                        }
-                        for si in scan.sensitive_information.all()
-                    ]
-                }
-                return Response(response_data, status=status.HTTP_201_CREATED)
-            else:
-                return Response(
-                    result_serializer.errors,
-                    status=status.HTTP_400_BAD_REQUEST
-                )
+            # The service has saved the DocumentScan and SensitiveInformation records
+            scan = DocumentScan.objects.select_related('document').get(id=results['scan_id'])
+            
+            # Return the scan results
+            response_data = {
+                'scan_id': scan.id,
+                'document_id': scan.document.id,
+                'risk_level': scan.risk_level,
+                'risk_score': scan.risk_score,
+                'processing_time': scan.processing_time,
+                'scan_date': scan.scan_date,
+                'sensitive_items': [
+                    {
+                        'type': si.type,
+                        'type_display': si.get_type_display(),
+                        'confidence': si.confidence,
+                        'location': si.location,
+                        'count': si.count,
+                        'redacted': si.redacted,
+                        'detected_by': si.detected_by
+                    }
+                    for si in scan.sensitive_information.all()
+                ],
+                # Image quality metrics and what the quality gate did, if it ran
+                'quality': results.get('quality'),
+                # Earlier image this one is a near-duplicate of, if any
+                'near_duplicate': results.get('near_duplicate')
+            }
+            return Response(response_data, status=status.HTTP_201_CREATED)
+        
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+    
+    @action(detail=False, methods=['post'])
+    def batch(self, request):
+        """
+        Queue several documents for analysis and return the batch to poll
+        """
+        serializer = BatchAnalyzeSerializer(
+            data=request.data,
+            context={'request': request}
+        )
+        serializer.is_valid(raise_exception=True)
+        document_ids = serializer.validated_data['document_ids']
+        
+        documents = Document.objects.in_bulk(document_ids)
+        documents = [documents[document_id] for document_id in document_ids]
+        scheduler = get_scheduler()
+        # Refuses the whole batch with 429 and Retry-After when over budget
+        costs = scheduler.admit(documents, request.user)
+        with transaction.atomic():
+            batch = DetectionBatch.objects.create(user=request.user)
+            # The scheduler picks the jobs up once the transaction commits
+            scheduler.enqueue(
+                documents, batch=batch, costs=costs,
+                latency_budget_ms=serializer.validated_data.get('latency_budget_ms')
+            )
         
-        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST) 
\ No newline at end of file
+        return Response({
+            'batch_id': batch.id,
+            'status': batch.status,
+            'total': len(document_ids),
+            'status_url': request.build_absolute_uri(
+                reverse('detection-batch-detail', args=[batch.id])
+            ),
+        }, status=status.HTTP_202_ACCEPTED)
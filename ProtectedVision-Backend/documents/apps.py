@@ -0,0 +1,19 @@
+from django.apps import AppConfig
+from django.conf import settings
+from django.db.models.signals import post_migrate
+
+
+class DocumentsConfig(AppConfig):
+    name = 'documents'
+
+    def ready(self):
+        from core.background import register
+        from .retention import run_retention
+        from .signals import connect_signals, ensure_search_index
+
+        connect_signals()
+        post_migrate.connect(ensure_search_index, sender=self)
+
+        config = getattr(settings, 'RETENTION', {})
+        if config.get('ENABLED', True):
+            register('retention', run_retention, config.get('INTERVAL_SECONDS', 3600))
@@ -0,0 +1,411 @@
+import datetime
+import io
+import itertools
+import time
+from datetime import timedelta
+
+import cv2
+import numpy as np
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.files.base import ContentFile
+from django.core.management.color import no_style
+from django.db import connection, transaction
+from django.db.models import F, Max
+from django.utils import timezone
+from PIL import Image
+
+from detection.risk_engine import get_risk_engine
+from users.models import UserPreference
+from .models import Document, DocumentScan, SensitiveInformation, StoredBlob
+from .search import UNSCANNED, index_new_documents
+from .storage import blob_storage
+
+User = get_user_model()
+
+TITLES = [
+    "Bank Statement", "Credit Card Photo", "Passport Scan",
+    "Driver's License", "Medical Record", "Tax Document",
+    "Insurance Card", "Resume", "Work Contract"
+]
+
+
+def parse_weights(spec, choices):
+    """
+    Parse 'a=0.7,b=0.3' into a probability vector over ``choices``
+
+    Args:
+        spec (str): Comma separated name=weight pairs (empty for uniform)
+        choices (list): Allowed names, in output order
+
+    Returns:
+        ndarray: Normalised probabilities
+    """
+    if not spec:
+        return np.full(len(choices), 1.0 / len(choices))
+    weights = dict.fromkeys(choices, 0.0)
+    for part in spec.split(','):
+        name, _, value = part.partition('=')
+        name = name.strip()
+        if name not in weights:
+            raise ValueError(f"Unknown choice '{name}', expected one of {', '.join(choices)}")
+        weights[name] = float(value)
+    probabilities = np.array([weights[name] for name in choices])
+    if probabilities.sum() <= 0:
+        raise ValueError("At least one weight must be positive")
+    return probabilities / probabilities.sum()
+
+
+class SyntheticDataGenerator:
+    """
+    High-volume generator of users, documents, scans and sensitive items
+
+    Rows are built in memory one block of users at a time with vectorized
+    sampling and inserted in batches inside a single transaction per block.
+    Primary keys are assigned up front so no round-trip is needed to learn
+    them, and the backend's sequences are reset afterwards. Nothing else
+    should insert into these tables while the generator runs. Every document
+    points at one of a few shared stub files instead of writing a file per
+    row. The stubs are stored as blobs like uploads, and their reference
+    counts follow the rows that point at them. Scans are scored from their items with the risk engine. Output is
+    fully determined by the seed.
+    """
+
+    FILE_TYPES = [choice for choice, _ in Document.TYPE_CHOICES]
+    SENSITIVE_TYPES = [choice for choice, _ in SensitiveInformation.TYPE_CHOICES]
+
+    def __init__(self, seed=0, documents_per_user=20.0, scans_per_document=1.0,
+                 items_per_scan=3.0, file_type_weights='', sensitive_type_weights='',
+                 days=365, auto_delete_ratio=0.2, batch_size=5000, users_per_block=500,
+                 password='testpassword123'):
+        self.rng = np.random.default_rng(seed)
+        self.documents_per_user = documents_per_user
+        self.scans_per_document = scans_per_document
+        self.items_per_scan = items_per_scan
+        self.file_type_p = parse_weights(file_type_weights, self.FILE_TYPES)
+        self.sensitive_type_p = parse_weights(sensitive_type_weights, self.SENSITIVE_TYPES)
+        self.days = days
+        self.auto_delete_ratio = auto_delete_ratio
+        self.batch_size = batch_size
+        self.users_per_block = users_per_block
+        # Hashing is deliberately slow, so every synthetic user shares one hash
+        self.password_hash = make_password(password)
+
+    def generate(self, users, progress=None):
+        """
+        Create ``users`` users along with their documents, scans and items
+
+        Args:
+            users (int): Number of users to create
+            progress (callable): Called with a running dict of row counts
+
+        Returns:
+            dict: Rows created per model, elapsed seconds and rows per second
+        """
+        stubs = self.write_stub_files()
+        counts = {'users': 0, 'preferences': 0, 'documents': 0, 'scans': 0, 'sensitive_items': 0}
+        next_ids = {
+            model: (model.objects.aggregate(last=Max('pk'))['last'] or 0) + 1
+            for model in (User, Document, DocumentScan, SensitiveInformation)
+        }
+        now = timezone.now()
+        start = time.perf_counter()
+
+        for offset in range(0, users, self.users_per_block):
+            block = min(self.users_per_block, users - offset)
+            with transaction.atomic():
+                self._generate_block(block, next_ids, stubs, now, counts)
+            if progress:
+                progress(dict(counts))
+        # Saving the stubs took a reference each; only the rows keep them now
+        for name in set(stubs.values()):
+            blob_storage.release(name)
+        self.reset_sequences()
+
+        elapsed = time.perf_counter() - start
+        total = sum(counts.values())
+        return {
+            **counts,
+            'rows': total,
+            'seconds': round(elapsed, 3),
+            'rows_per_second': round(total / elapsed) if elapsed else None,
+        }
+
+    def reset_sequences(self):
+        """
+        Move the backend's id sequences past the ids assigned here
+
+        SQLite keeps its own; on PostgreSQL the next ordinary insert would
+        otherwise be given an id that is already taken.
+        """
+        statements = connection.ops.sequence_reset_sql(
+            no_style(), [User, UserPreference, Document, DocumentScan, SensitiveInformation]
+        )
+        if statements:
+            with connection.cursor() as cursor:
+                for sql in statements:
+                    cursor.execute(sql)
+
+    def write_stub_files(self):
+        """
+        Save one small placeholder file per document type as a blob
+
+        Each save takes a reference, which generate() releases once the
+        generated rows hold theirs.
+
+        Returns:
+            dict: Storage name of the stub for each file type
+        """
+        frame = np.full((240, 320, 3), 200, dtype=np.uint8)
+        cv2.rectangle(frame, (40, 60), (280, 200), (60, 60, 60), thickness=-1)
+
+        pdf = io.BytesIO()
+        Image.fromarray(frame).save(pdf, format='PDF')
+        contents = {
+            'image': ('stub.jpg', cv2.imencode('.jpg', frame)[1].tobytes()),
+            'pdf': ('stub.pdf', pdf.getvalue()),
+            # Only the container header matters for listing and retention tests
+            'video': ('stub.avi', b'RIFF\x00\x00\x00\x00AVI LIST'),
+        }
+
+        return {
+            file_type: blob_storage.save(filename, ContentFile(data))
+            for file_type, (filename, data) in contents.items()
+        }
+
+    def _reference_stubs(self, stubs, file_types):
+        """
+        Count the stub references of rows inserted without file field saves
+
+        Args:
+            stubs (dict): Storage name of the stub for each file type
+            file_types (ndarray): Index into FILE_TYPES of each new reference
+        """
+        for file_type, references in enumerate(np.bincount(file_types, minlength=len(self.FILE_TYPES)).tolist()):
+            if references:
+                StoredBlob.objects.filter(name=stubs[self.FILE_TYPES[file_type]]).update(
+                    references=F('references') + references
+                )
+
+    def _take_ids(self, next_ids, model, count):
+        first = next_ids[model]
+        next_ids[model] = first + count
+        return np.arange(first, first + count)
+
+    def _generate_block(self, block, next_ids, stubs, now, counts):
+        rng = self.rng
+        seconds_back = self.days * 86400
+
+        # Users and their preferences
+        user_ids = self._take_ids(next_ids, User, block)
+        joined = [now - timedelta(seconds=s) for s in rng.integers(0, seconds_back, block).tolist()]
+        User.objects.bulk_create([
+            User(
+                id=int(user_id),
+                username=f'synthetic{user_id}',
+                email=f'synthetic{user_id}@example.com',
+                first_name='Synthetic',
+                last_name=f'User {user_id}',
+                password=self.password_hash,
+                date_joined=date_joined,
+            )
+            for user_id, date_joined in zip(user_ids, joined)
+        ], batch_size=self.batch_size)
+
+        auto_delete = rng.random(block) < self.auto_delete_ratio
+        retention_days = rng.choice([7, 30, 90, 365], size=block)
+        UserPreference.objects.bulk_create([
+            UserPreference(
+                user_id=int(user_id),
+                auto_delete_processed_files=bool(delete),
+                auto_delete_after_days=int(days),
+            )
+            for user_id, delete, days in zip(user_ids, auto_delete, retention_days)
+        ], batch_size=self.batch_size)
+        counts['users'] += block
+        counts['preferences'] += block
+
+        # Documents
+        documents_per_user = rng.poisson(self.documents_per_user, block)
+        document_count = int(documents_per_user.sum())
+        if not document_count:
+            return
+        document_ids = self._take_ids(next_ids, Document, document_count)
+        owners = np.repeat(user_ids, documents_per_user)
+        file_types = rng.choice(len(self.FILE_TYPES), size=document_count, p=self.file_type_p)
+        titles = rng.integers(0, len(TITLES), document_count)
+        document_age = rng.integers(0, seconds_back, document_count)
+        scans_per_document = rng.poisson(self.scans_per_document, document_count)
+        created = self._timestamps(now, document_age)
+        documents = [
+            (document_id, owner, f'{TITLES[title]} {document_id}', self.FILE_TYPES[file_type])
+            for document_id, owner, title, file_type in zip(
+                document_ids.tolist(), owners.tolist(), titles.tolist(), file_types.tolist())
+        ]
+
+        self._insert_rows(Document, [
+            (document_id, owner, title, stubs[file_type], file_type, scan_count > 0, created_at, created_at)
+            for (document_id, owner, title, file_type), scan_count, created_at in zip(
+                documents, scans_per_document.tolist(), created)
+        ], ['id', 'user', 'title', 'file', 'file_type', 'processed', 'created_at', 'updated_at'])
+        self._reference_stubs(stubs, file_types)
+        counts['documents'] += document_count
+
+        # Scans, dated between the upload and now
+        scan_count = int(scans_per_document.sum())
+        if not scan_count:
+            index_new_documents(document + (UNSCANNED, None) for document in documents)
+            return
+        scan_ids = self._take_ids(next_ids, DocumentScan, scan_count)
+        scanned_documents = np.repeat(document_ids, scans_per_document)
+        scanned_types = np.repeat(file_types, scans_per_document)
+        scan_age = (np.repeat(document_age, scans_per_document) * rng.random(scan_count)).astype(np.int64)
+        scan_dates = self._timestamps(now, scan_age)
+        processing_times = rng.gamma(2.0, 1.0, scan_count)
+        with_processed_file = rng.random(scan_count) < 0.9
+
+        # Sensitive items, sampled first so each scan's risk follows from them
+        items_per_scan = rng.poisson(self.items_per_scan, scan_count)
+        item_count = int(items_per_scan.sum())
+        item_positions = np.repeat(np.arange(scan_count), items_per_scan)
+        item_types = rng.choice(len(self.SENSITIVE_TYPES), size=item_count, p=self.sensitive_type_p)
+        confidences = rng.uniform(0.5, 0.99, item_count)
+        boxes = np.column_stack([
+            rng.integers(0, 1500, item_count), rng.integers(0, 1000, item_count),
+            rng.integers(50, 300, item_count), rng.integers(20, 80, item_count),
+        ])
+        instance_counts = rng.integers(1, 4, item_count)
+        redacted = rng.random(item_count) < 0.5
+        risk_scores, risk_levels = self._risk(
+            item_positions, item_types, confidences, instance_counts, boxes, scan_count
+        )
+
+        self._insert_rows(DocumentScan, [
+            (scan_id, document_id, risk_level, risk_score, processing_time,
+             stubs[self.FILE_TYPES[file_type]] if has_file else None, scan_date)
+            for scan_id, document_id, risk_level, risk_score, processing_time, has_file, file_type, scan_date
+            in zip(scan_ids.tolist(), scanned_documents.tolist(), risk_levels.tolist(), risk_scores,
+                   processing_times.tolist(), with_processed_file.tolist(), scanned_types.tolist(),
+                   scan_dates)
+        ], ['id', 'document', 'risk_level', 'risk_score', 'processing_time', 'processed_file', 'scan_date'])
+        self._reference_stubs(stubs, scanned_types[with_processed_file])
+        counts['scans'] += scan_count
+
+        # Rows inserted without signals have to be indexed here
+        index_new_documents(self._index_rows(
+            documents, scans_per_document, scan_age, risk_levels, item_positions, item_types
+        ))
+
+        if not item_count:
+            return
+        item_ids = self._take_ids(next_ids, SensitiveInformation, item_count)
+        self._insert_rows(SensitiveInformation, [
+            (item_id, scan_id, self.SENSITIVE_TYPES[sensitive_type], confidence,
+             f'{{"x": {x}, "y": {y}, "width": {w}, "height": {h}}}', instance_count, is_redacted)
+            for item_id, scan_id, sensitive_type, confidence, (x, y, w, h), instance_count, is_redacted
+            in zip(item_ids.tolist(), scan_ids[item_positions].tolist(), item_types.tolist(),
+                   confidences.tolist(), boxes.tolist(), instance_counts.tolist(), redacted.tolist())
+        ], ['id', 'scan', 'type', 'confidence', 'location', 'count', 'redacted'])
+        counts['sensitive_items'] += item_count
+
+    def _index_rows(self, documents, scans_per_document, scan_age, risk_levels, item_positions, item_types):
+        """
+        Search index source rows of a block's documents
+
+        Each document is indexed with the risk level and item types of its
+        latest scan, as documents.search reads them from the database.
+        """
+        scan_count = len(scan_age)
+        document_positions = np.repeat(np.arange(len(documents)), scans_per_document)
+        # Latest first within each document: youngest, then highest id
+        order = np.lexsort((-np.arange(scan_count), scan_age, document_positions))
+        first_scans = np.cumsum(scans_per_document) - scans_per_document
+        item_bounds = np.searchsorted(item_positions, np.arange(scan_count + 1)).tolist()
+        order, item_types, risk_levels = order.tolist(), item_types.tolist(), risk_levels.tolist()
+        for document, scans, first_scan in zip(documents, scans_per_document.tolist(), first_scans.tolist()):
+            if not scans:
+                yield document + (UNSCANNED, None)
+                continue
+            latest = order[first_scan]
+            codes = set(item_types[item_bounds[latest]:item_bounds[latest + 1]])
+            yield document + (risk_levels[latest], ','.join(self.SENSITIVE_TYPES[code] for code in codes))
+
+    def _risk(self, item_positions, item_types, confidences, counts, boxes, scan_count):
+        """
+        Risk score and level of each scan, from its items
+
+        Returns:
+            tuple: Scores rounded as the detection service stores them, and
+            level names
+        """
+        engine = get_risk_engine()
+        type_codes = np.array(
+            [engine.type_index.get(code, engine.unknown_type) for code in self.SENSITIVE_TYPES], dtype=np.intp
+        )
+        scores = engine.score_arrays(
+            type_codes[item_types], confidences, counts.astype(np.float64),
+            (boxes[:, 2] * boxes[:, 3]).astype(np.float64)
+        )
+        totals = np.bincount(item_positions, weights=scores, minlength=scan_count)
+        return [round(total, 4) for total in totals.tolist()], engine.levels_for(totals)
+
+    def _timestamps(self, now, seconds_ago):
+        """
+        Database values for ``now`` minus each entry of ``seconds_ago``
+
+        SQLite stores datetimes as naive UTC text, which numpy can format for
+        the whole array at once; other backends get adapted datetimes.
+        """
+        if connection.vendor == 'sqlite' and settings.USE_TZ:
+            base = np.datetime64(timezone.make_naive(now, datetime.timezone.utc), 'us')
+            stamps = base - seconds_ago.astype('timedelta64[s]')
+            return np.char.replace(np.datetime_as_string(stamps, unit='us'), 'T', ' ').tolist()
+        adapt = connection.ops.adapt_datetimefield_value
+        return [adapt(now - timedelta(seconds=s)) for s in seconds_ago.tolist()]
+
+    def _insert_rows(self, model, rows, field_names):
+        """
+        Insert prepared rows with multi-row INSERT statements
+
+        These are the statements bulk_create() sends, batched the same way,
+        but written from plain tuples: bulk_create() would overwrite the
+        sampled dates of auto_now and auto_now_add fields with the current
+        time, and preparing every field of every instance caps it at about
+        20-30k rows/s. Values must already be in database form; columns not
+        listed in ``field_names`` get their field default.
+
+        Args:
+            model (Model): Model whose table receives the rows
+            rows (list): Tuples ordered like ``field_names``
+            field_names (list): Model field names of the tuple positions
+        """
+        meta = model._meta
+        given = [meta.get_field(name) for name in field_names]
+        defaults = [field for field in meta.concrete_fields if field not in given]
+        default_values = tuple(
+            field.get_db_prep_save(field.get_default(), connection) for field in defaults
+        )
+        fields = given + defaults
+        quote = connection.ops.quote_name
+        columns = ', '.join(quote(field.column) for field in fields)
+        row_sql = '(' + ', '.join(['%s'] * len(fields)) + ')'
+        insert = f'INSERT INTO {quote(meta.db_table)} ({columns}) VALUES '
+        rows_per_statement = connection.ops.bulk_batch_size(fields, rows)
+        full_statement = insert + ', '.join([row_sql] * rows_per_statement)
+
+        with connection.cursor() as cursor:
+            for start in range(0, len(rows), self.batch_size):
+                batch = rows[start:start + self.batch_size]
+                if default_values:
+                    batch = [row + default_values for row in batch]
+                statements = [
+                    tuple(itertools.chain.from_iterable(batch[offset:offset + rows_per_statement]))
+                    for offset in range(0, len(batch), rows_per_statement)
+                ]
+                # Full statements share one prepared statement
+                if len(statements[-1]) < rows_per_statement * len(fields):
+                    last = statements.pop()
+                    cursor.execute(insert + ', '.join([row_sql] * (len(last) // len(fields))), last)
+                if statements:
+                    cursor.executemany(full_statement, statements)
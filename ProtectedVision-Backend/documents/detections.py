@@ -0,0 +1,186 @@
+"""
+Packed storage of per-frame video detections
+
+A long video yields hundreds of thousands of boxes. Stored one
+SensitiveInformation row each, with a JSON location, they would make the
+table, and every query joining it, grow with the length of the footage.
+Instead a scan keeps its frame detections in a single file: a numpy
+structured array of ``detection_dtype()`` records (17 bytes each) sorted by
+frame and saved in ``.npy`` format to ``DocumentScan.detections``. The
+scan's SensitiveInformation rows hold one summary per detected type.
+
+Files are opened memory-mapped and frame ranges are located by binary
+search over the frame column, so reading frames 1000-2000 of an hour of
+footage only touches the pages holding those records.
+"""
+
+import functools
+import io
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+
+from core.lazy import lazy_import
+from .models import SensitiveInformation
+
+
+# Loaded on first use, so API processes that never read a packed file skip it
+np = lazy_import('numpy')
+
+TYPE_CODES = [code for code, _label in SensitiveInformation.TYPE_CHOICES]
+TYPE_INDEX = {code: index for index, code in enumerate(TYPE_CODES)}
+# Types the model reports that are not a known choice are stored as this
+UNKNOWN_TYPE = TYPE_INDEX['other']
+
+BOX_FIELDS = ('x', 'y', 'width', 'height')
+BOX_MAX = 2 ** 16 - 1
+
+
+def packed_settings():
+    config = getattr(settings, 'PACKED_DETECTIONS', {})
+    return {
+        'ENABLED': config.get('ENABLED', True),
+        'DEFAULT_LIMIT': config.get('DEFAULT_LIMIT', 1000),
+        'MAX_LIMIT': config.get('MAX_LIMIT', 10000),
+    }
+
+
+@functools.lru_cache(maxsize=None)
+def detection_dtype():
+    """
+    Record layout of a packed detection, without padding
+    """
+    return np.dtype([
+        ('frame', '<u4'),
+        ('type', 'u1'),
+        ('confidence', '<f4'),
+        ('x', '<u2'),
+        ('y', '<u2'),
+        ('width', '<u2'),
+        ('height', '<u2'),
+    ])
+
+
+def pack(detections):
+    """
+    Pack detection dicts into a record array sorted by frame
+
+    Args:
+        detections (list): Items with 'frame', 'type', 'confidence' and a
+            'location' dict of x, y, width and height
+
+    Returns:
+        ndarray: Records of detection_dtype()
+    """
+    records = np.empty(len(detections), dtype=detection_dtype())
+    records['frame'] = [item['frame'] for item in detections]
+    records['type'] = [TYPE_INDEX.get(item['type'], UNKNOWN_TYPE) for item in detections]
+    records['confidence'] = [item['confidence'] for item in detections]
+    boxes = np.array(
+        [[(item.get('location') or {}).get(field, 0) for field in BOX_FIELDS] for item in detections],
+        dtype=np.int64
+    ).reshape(-1, len(BOX_FIELDS))
+    np.clip(boxes, 0, BOX_MAX, out=boxes)
+    for column, field in enumerate(BOX_FIELDS):
+        records[field] = boxes[:, column]
+    return records[np.argsort(records['frame'], kind='stable')]
+
+
+def to_file(records):
+    """
+    File content of a record array, ready to assign to DocumentScan.detections
+    """
+    buffer = io.BytesIO()
+    np.save(buffer, records, allow_pickle=False)
+    return ContentFile(buffer.getvalue(), name='detections.npy')
+
+
+def load(scan):
+    """
+    Open a scan's packed detections
+
+    Returns:
+        ndarray: Memory-mapped records, or None if the scan has no packed file
+    """
+    if not scan.detections:
+        return None
+    try:
+        path = scan.detections.path
+    except NotImplementedError:
+        # Storages without local files are read into memory instead
+        with scan.detections.open('rb') as f:
+            return np.load(io.BytesIO(f.read()), allow_pickle=False)
+    return np.load(path, mmap_mode='r', allow_pickle=False)
+
+
+def frame_range(records, start=None, end=None):
+    """
+    Records of frames ``start`` to ``end``, both inclusive
+
+    Found by binary search over the sorted frame column; on a memory-mapped
+    array the result is a view, and nothing outside the range is read.
+    """
+    frames = records['frame']
+    first = 0 if start is None else int(np.searchsorted(frames, start, side='left'))
+    last = len(records) if end is None else int(np.searchsorted(frames, end, side='right'))
+    return records[first:max(first, last)]
+
+
+def decode(records):
+    """
+    Convert records back into detection dicts
+    """
+    return [
+        {
+            'frame': frame,
+            'type': TYPE_CODES[type_index],
+            'confidence': round(confidence, 4),
+            'location': {'x': x, 'y': y, 'width': width, 'height': height},
+        }
+        for frame, type_index, confidence, x, y, width, height in records.tolist()
+    ]
+
+
+def summarize(records):
+    """
+    One summary item per detected type
+
+    Each summary counts the type's boxes and carries the confidence and
+    location (with its frame) of the most confident one.
+
+    Returns:
+        list: Items in the form SensitiveInformation rows are created from
+    """
+    summaries = []
+    for type_index in np.unique(records['type']).tolist():
+        found = records[records['type'] == type_index]
+        best = found[int(np.argmax(found['confidence']))]
+        summaries.append({
+            'type': TYPE_CODES[type_index],
+            'confidence': round(float(best['confidence']), 4),
+            'count': len(found),
+            'location': {
+                'frame': int(best['frame']),
+                **{field: int(best[field]) for field in BOX_FIELDS},
+            },
+        })
+    return summaries
+
+
+def scan_detections(scan):
+    """
+    Every detection a scan stored, with its packed frame detections unpacked
+
+    Args:
+        scan (DocumentScan): Saved scan
+
+    Returns:
+        list: Detection dicts in the form the detection service produces
+    """
+    rows = scan.sensitive_information.all()
+    detections = []
+    if scan.detections:
+        # Summary rows of packed scans point at a frame
+        rows = rows.exclude(location__has_key='frame')
+        detections = [dict(item, count=1, detected_by='') for item in decode(load(scan))]
+    return detections + list(rows.values('type', 'confidence', 'count', 'location', 'detected_by'))
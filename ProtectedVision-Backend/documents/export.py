@@ -0,0 +1,280 @@
+"""
+Streaming export of a user's detection history
+
+The history is read with a single query joining documents, their scans and
+the scans' sensitive items, iterated server-side in chunks, and turned into
+output as it is read. Only one document's rows and one output buffer are
+held in memory at a time, whatever the size of the history.
+
+Two formats are available:
+
+- ``ndjson``: one JSON object per document, with its scans and their items
+  nested the way the document detail endpoint returns them
+- ``csv``: one row per sensitive item, with the document and scan columns
+  repeated (documents without scans and scans without items get one row)
+
+Video scans keep their per-frame boxes in a packed file and only a summary
+per type in the database (see documents/detections.py). Each such summary
+is replaced by the boxes of its type, read from the file a slice at a time,
+with the frame in their location.
+
+Either can be gzip-compressed on the fly.
+"""
+
+import csv
+import json
+import zlib
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+
+from core.metrics import registry
+from .detections import TYPE_INDEX, decode, load
+from .models import Document, DocumentScan
+
+
+EXPORT_ROWS = registry.counter(
+    'document_export_rows_total',
+    'Rows read by history exports, by output format',
+    ['output']
+)
+
+DOCUMENT_FIELDS = ['id', 'title', 'file_type', 'processed', 'created_at']
+SCAN_FIELDS = ['id', 'risk_level', 'risk_score', 'processing_time', 'scan_date']
+ITEM_FIELDS = ['id', 'type', 'confidence', 'count', 'location', 'redacted', 'detected_by']
+
+CSV_HEADER = (
+    [f'document_{field}' for field in DOCUMENT_FIELDS]
+    + [f'scan_{field}' for field in SCAN_FIELDS]
+    + [f'item_{field}' for field in ITEM_FIELDS]
+)
+
+CONTENT_TYPES = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv',
+}
+
+
+def export_settings():
+    config = getattr(settings, 'EXPORT', {})
+    return {
+        'CHUNK_SIZE': config.get('CHUNK_SIZE', 2000),
+        'BUFFER_BYTES': config.get('BUFFER_BYTES', 64 * 1024),
+        'GZIP_LEVEL': config.get('GZIP_LEVEL', 6),
+    }
+
+
+def history_rows(user, chunk_size):
+    """
+    Iterate (document, scan, item) value tuples of a user's history
+
+    Rows come ordered by document, scan and item, with None for the scan
+    and item columns of documents without scans or scans without items.
+    """
+    lookups = (
+        DOCUMENT_FIELDS
+        + [f'scans__{field}' for field in SCAN_FIELDS]
+        + [f'scans__sensitive_information__{field}' for field in ITEM_FIELDS]
+        + ['scans__detections']
+    )
+    rows = (
+        Document.objects.filter(user=user)
+        .order_by('id', 'scans__id', 'scans__sensitive_information__id')
+        .values_list(*lookups)
+    )
+    return unpacked(rows.iterator(chunk_size=chunk_size), chunk_size)
+
+
+def unpacked(rows, chunk_size):
+    """
+    Replace the summary rows of packed scans with their frame detections
+
+    Takes history rows with the scan's packed file name as an extra last
+    column, and yields history rows. Each box keeps the redacted flag and
+    model of its type's summary.
+    """
+    scan_column = len(DOCUMENT_FIELDS)
+    item_start = scan_column + len(SCAN_FIELDS)
+    type_column = item_start + ITEM_FIELDS.index('type')
+    location_column = item_start + ITEM_FIELDS.index('location')
+    redacted_column = item_start + ITEM_FIELDS.index('redacted')
+    detected_by_column = item_start + ITEM_FIELDS.index('detected_by')
+    records, records_scan = None, None
+    for row in rows:
+        packed, row = row[-1], row[:-1]
+        location = row[location_column]
+        # Summary rows of packed scans point at a frame
+        if not packed or not isinstance(location, dict) or 'frame' not in location:
+            yield row
+            continue
+        if records_scan != row[scan_column]:
+            records = load(DocumentScan(pk=row[scan_column], detections=packed))
+            records_scan = row[scan_column]
+        found = records[records['type'] == TYPE_INDEX[row[type_column]]]
+        for start in range(0, len(found), chunk_size):
+            for item in decode(found[start:start + chunk_size]):
+                yield row[:item_start] + (
+                    None,
+                    item['type'],
+                    item['confidence'],
+                    1,
+                    {'frame': item['frame'], **item['location']},
+                    row[redacted_column],
+                    row[detected_by_column],
+                )
+
+
+def _json_value(value):
+    return value.isoformat() if hasattr(value, 'isoformat') else value
+
+
+def ndjson_lines(rows):
+    """
+    Group history rows into one JSON line per document
+    """
+    document_end = len(DOCUMENT_FIELDS)
+    scan_end = document_end + len(SCAN_FIELDS)
+    document = None
+    scan = None
+    for row in rows:
+        if document is None or row[0] != document['id']:
+            if document is not None:
+                yield json.dumps(document) + '\n'
+            document = {
+                field: _json_value(value) for field, value in zip(DOCUMENT_FIELDS, row[:document_end])
+            }
+            document['scans'] = []
+            scan = None
+        if row[document_end] is None:
+            continue
+        if scan is None or row[document_end] != scan['id']:
+            scan = {
+                field: _json_value(value) for field, value in zip(SCAN_FIELDS, row[document_end:scan_end])
+            }
+            scan['sensitive_information'] = []
+            document['scans'].append(scan)
+        # Boxes of packed scans have no id of their own
+        if row[scan_end + ITEM_FIELDS.index('type')] is not None:
+            scan['sensitive_information'].append(dict(zip(ITEM_FIELDS, row[scan_end:])))
+    if document is not None:
+        yield json.dumps(document) + '\n'
+
+
+class _LineBuffer:
+    """
+    File-like target for csv.writer that hands back each written line
+    """
+
+    def write(self, value):
+        return value
+
+
+def csv_lines(rows):
+    """
+    Format history rows as CSV lines, header first
+    """
+    writer = csv.writer(_LineBuffer())
+    location = len(DOCUMENT_FIELDS) + len(SCAN_FIELDS) + ITEM_FIELDS.index('location')
+    yield writer.writerow(CSV_HEADER)
+    for row in rows:
+        row = list(row)
+        if row[location] is not None:
+            row[location] = json.dumps(row[location])
+        yield writer.writerow([_json_value(value) for value in row])
+
+
+def buffered(lines, size):
+    """
+    Join text lines into encoded chunks of about ``size`` bytes
+    """
+    parts = []
+    length = 0
+    for line in lines:
+        parts.append(line)
+        length += len(line)
+        if length >= size:
+            yield ''.join(parts).encode()
+            parts = []
+            length = 0
+    if parts:
+        yield ''.join(parts).encode()
+
+
+def gzipped(chunks, level):
+    """
+    Compress a stream of byte chunks into one gzip member
+    """
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+def counted(rows, output):
+    count = 0
+    try:
+        for row in rows:
+            count += 1
+            yield row
+    finally:
+        EXPORT_ROWS.inc(count, output=output)
+
+
+def export_chunks(user, output='ndjson', gzip=False):
+    """
+    Byte chunks of a user's exported history
+
+    Args:
+        user (User): Owner of the history
+        output (str): 'ndjson' or 'csv'
+        gzip (bool): Compress the stream
+
+    Returns:
+        iterator: Encoded (and possibly compressed) chunks
+    """
+    config = export_settings()
+    rows = counted(history_rows(user, config['CHUNK_SIZE']), output)
+    lines = ndjson_lines(rows) if output == 'ndjson' else csv_lines(rows)
+    chunks = buffered(lines, config['BUFFER_BYTES'])
+    if gzip:
+        chunks = gzipped(chunks, config['GZIP_LEVEL'])
+    return chunks
+
+
+async def _async_chunks(chunks):
+    # Pull each chunk on the thread the request's database connection lives on
+    next_chunk = sync_to_async(next, thread_sensitive=True)
+    done = object()
+    while True:
+        chunk = await next_chunk(chunks, done)
+        if chunk is done:
+            return
+        yield chunk
+
+
+def export_response(request, user, output='ndjson', gzip=False):
+    """
+    Streaming download of a user's history
+
+    Under ASGI the chunks are served through an async iterator; Django
+    would otherwise read a synchronous iterator to the end before sending
+    anything.
+    """
+    chunks = export_chunks(user, output, gzip)
+    if getattr(request, 'scope', None) is not None:
+        chunks = _async_chunks(chunks)
+
+    filename = f"detection-history-{user.pk}-{timezone.now():%Y%m%d}.{output}"
+    if gzip:
+        response = StreamingHttpResponse(chunks, content_type='application/gzip')
+        filename += '.gz'
+    else:
+        response = StreamingHttpResponse(chunks, content_type=f'{CONTENT_TYPES[output]}; charset=utf-8')
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    response['Cache-Control'] = 'no-store'
+    response['X-Accel-Buffering'] = 'no'
+    return response
@@ -0,0 +1,43 @@
+from django.core.management.base import BaseCommand
+
+from documents.retention import RetentionEngine
+
+
+class Command(BaseCommand):
+    """
+    Delete expired scans and processed files once, outside the server schedule
+    """
+    help = "Apply users' auto-delete preferences to processed files and scans"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help="Only report how many scans have expired"
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=None,
+            help="Scans deleted per transaction"
+        )
+        parser.add_argument(
+            '--max-batches', type=int, default=None,
+            help="Stop after this many batches"
+        )
+        parser.add_argument(
+            '--pause', type=float, default=None,
+            help="Seconds to sleep between batches"
+        )
+
+    def handle(self, *args, **options):
+        engine = RetentionEngine(
+            batch_size=options['batch_size'],
+            batch_pause=options['pause'],
+            max_batches=options['max_batches'],
+        )
+        report = engine.run(dry_run=options['dry_run'])
+        if report['dry_run']:
+            self.stdout.write(f"{report['scans_deleted']} scans have expired")
+            return
+        self.stdout.write(self.style.SUCCESS(
+            f"Deleted {report['scans_deleted']} scans and {report['files_deleted']} files "
+            f"({report['bytes_reclaimed']} bytes) in {report['batches']} batches, {report['seconds']}s"
+        ))
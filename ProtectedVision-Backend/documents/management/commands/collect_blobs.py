@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+
+from documents.storage import blob_storage
+
+
+class Command(BaseCommand):
+    """
+    Garbage-collect content-addressed blobs with no remaining references
+    """
+    help = "Delete stored blobs that no document or scan points at"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--grace-seconds', type=int, default=3600,
+            help="Keep blobs released more recently than this"
+        )
+        parser.add_argument(
+            '--recount', action='store_true',
+            help="Rebuild reference counts from the database first"
+        )
+
+    def handle(self, *args, **options):
+        if options['recount']:
+            corrected = blob_storage.recount()
+            self.stdout.write(f"Corrected {corrected} reference counts")
+
+        report = blob_storage.collect(grace_seconds=options['grace_seconds'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Deleted {report['blobs']} blobs ({report['bytes']} bytes)"
+        ))
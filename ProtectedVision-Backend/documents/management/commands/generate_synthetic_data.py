@@ -0,0 +1,66 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from documents.data_generator import SyntheticDataGenerator
+
+
+class Command(BaseCommand):
+    """
+    Bulk-generate a large, reproducible dataset for performance testing
+    """
+    help = "Create synthetic users, documents, scans and sensitive items in bulk"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000, help="Number of users to create")
+        parser.add_argument('--seed', type=int, default=0, help="Random seed (same seed, same data)")
+        parser.add_argument('--documents-per-user', type=float, default=20.0,
+                            help="Mean documents per user (Poisson)")
+        parser.add_argument('--scans-per-document', type=float, default=1.0,
+                            help="Mean scans per document (Poisson, 0 leaves it unprocessed)")
+        parser.add_argument('--items-per-scan', type=float, default=3.0,
+                            help="Mean sensitive items per scan (Poisson)")
+        parser.add_argument('--file-types', default='image=0.7,pdf=0.2,video=0.1',
+                            help="Relative weights of document types, e.g. image=0.7,pdf=0.2,video=0.1")
+        parser.add_argument('--sensitive-types', default='',
+                            help="Relative weights of sensitive types (uniform when empty)")
+        parser.add_argument('--days', type=int, default=365,
+                            help="Spread upload and scan dates over this many past days")
+        parser.add_argument('--auto-delete-ratio', type=float, default=0.2,
+                            help="Fraction of users with auto-delete of processed files enabled")
+        parser.add_argument('--batch-size', type=int, default=5000, help="Rows per INSERT batch")
+        parser.add_argument('--fast-sqlite', action='store_true',
+                            help="Disable SQLite fsync and journaling while generating (not crash safe)")
+
+    def handle(self, *args, **options):
+        try:
+            generator = SyntheticDataGenerator(
+                seed=options['seed'],
+                documents_per_user=options['documents_per_user'],
+                scans_per_document=options['scans_per_document'],
+                items_per_scan=options['items_per_scan'],
+                file_type_weights=options['file_types'],
+                sensitive_type_weights=options['sensitive_types'],
+                days=options['days'],
+                auto_delete_ratio=options['auto_delete_ratio'],
+                batch_size=options['batch_size'],
+            )
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        if options['fast_sqlite'] and connection.vendor == 'sqlite':
+            with connection.cursor() as cursor:
+                cursor.execute('PRAGMA synchronous = OFF')
+                cursor.execute('PRAGMA journal_mode = MEMORY')
+
+        def progress(counts):
+            self.stdout.write(
+                f"  {counts['users']} users, {counts['documents']} documents, "
+                f"{counts['scans']} scans, {counts['sensitive_items']} items"
+            )
+
+        result = generator.generate(options['users'], progress=progress if options['verbosity'] > 1 else None)
+        self.stdout.write(self.style.SUCCESS(
+            f"Created {result['users']} users, {result['documents']} documents, "
+            f"{result['scans']} scans and {result['sensitive_items']} sensitive items "
+            f"({result['rows']} rows in {result['seconds']}s, {result['rows_per_second']} rows/s)"
+        ))
@@ -0,0 +1,23 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from documents.search import create_index, index_documents, search_available
+
+
+class Command(BaseCommand):
+    """
+    Rebuild the full-text document search index from the database
+    """
+    help = "Re-index every document for full-text search"
+
+    def handle(self, *args, **options):
+        if not search_available():
+            raise CommandError("Full-text search needs SQLite with FTS5 and SEARCH['ENABLED']")
+
+        start = time.perf_counter()
+        create_index()
+        indexed = index_documents()
+        self.stdout.write(self.style.SUCCESS(
+            f"Indexed {indexed} documents in {time.perf_counter() - start:.1f}s"
+        ))
@@ -2,6 +2,8 @@ from django.db import models
 from django.conf import settings
 from django.utils.translation import gettext_lazy as _
 
+from .storage import blob_storage
+
 
 class Document(models.Model):
     """
@@ -15,7 +17,7 @@ class Document(models.Model):
     
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='documents')
     title = models.CharField(max_length=255)
-    file = models.FileField(upload_to='documents/%Y/%m/%d/')
+    file = models.FileField(upload_to='documents/%Y/%m/%d/', storage=blob_storage)
     file_type = models.CharField(max_length=10, choices=TYPE_CHOICES)
     processed = models.BooleanField(default=False)
     created_at = models.DateTimeField(auto_now_add=True)
@@ -42,7 +44,10 @@ class DocumentScan(models.Model):
     
     document = models.ForeignKey(Document, on_delete=models.CASCADE, related_name='scans')
     risk_level = models.CharField(max_length=10, choices=RISK_LEVEL_CHOICES, default='low')
-    processed_file = models.FileField(upload_to='processed_documents/%Y/%m/%d/', null=True, blank=True)
+    risk_score = models.FloatField(default=0, help_text="Weighted risk score the risk level was derived from")
+    processed_file = models.FileField(upload_to='processed_documents/%Y/%m/%d/', storage=blob_storage, null=True, blank=True)
+    detections = models.FileField(upload_to='detections/%Y/%m/%d/', storage=blob_storage, null=True, blank=True, help_text="Packed per-frame detections of a video")
+    detection_count = models.PositiveIntegerField(default=0, help_text="Number of packed detections")
     processing_time = models.FloatField(help_text="Processing time in seconds")
     scan_date = models.DateTimeField(auto_now_add=True)
     
@@ -51,6 +56,9 @@ class DocumentScan(models.Model):
     
     class Meta:
         ordering = ['-scan_date']
+        indexes = [
+            models.Index(fields=['scan_date']),
+        ]
         verbose_name = _("Document Scan")
         verbose_name_plural = _("Document Scans")
 
@@ -79,10 +87,32 @@ class SensitiveInformation(models.Model):
     location = models.JSONField(null=True, blank=True, help_text="Coordinates in document [x, y, width, height]")
     count = models.PositiveIntegerField(default=1, help_text="Number of instances found")
     redacted = models.BooleanField(default=False)
+    detected_by = models.CharField(max_length=255, blank=True, default='', help_text="Name of the model that found it")
     
     def __str__(self):
         return f"{self.get_type_display()} in {self.scan.document.title}"
     
     class Meta:
         verbose_name = _("Sensitive Information")
-        verbose_name_plural = _("Sensitive Information") 
\ No newline at end of file
+        verbose_name_plural = _("Sensitive Information")
+
+
+class StoredBlob(models.Model):
+    """
+    Reference count of a file kept by ContentAddressedStorage
+    """
+    name = models.CharField(max_length=255, unique=True)
+    size = models.BigIntegerField(help_text="Size in bytes")
+    references = models.IntegerField(default=0, help_text="Number of file fields pointing at this blob")
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    def __str__(self):
+        return f"{self.name} ({self.references} references)"
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['references']),
+        ]
+        verbose_name = _("Stored Blob")
+        verbose_name_plural = _("Stored Blobs")
@@ -0,0 +1,150 @@
+import logging
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+
+from core.metrics import registry
+from users.models import UserPreference
+from .models import Document, DocumentScan
+
+
+logger = logging.getLogger(__name__)
+
+ROWS_DELETED = registry.counter(
+    'retention_scans_deleted_total',
+    'Expired document scans deleted by the retention worker'
+)
+BYTES_RECLAIMED = registry.counter(
+    'retention_bytes_reclaimed_total',
+    'Bytes of processed files deleted by the retention worker'
+)
+
+
+class RetentionEngine:
+    """
+    Enforce UserPreference.auto_delete_processed_files
+
+    Users who enabled auto-delete are grouped by their retention period, and
+    each group is handled with one range query over the indexed scan_date
+    column. Expired scans are removed oldest first in bounded batches, each
+    deleted in its own short transaction with a pause in between, so the
+    worker never holds long locks or starves request traffic.
+    """
+
+    def __init__(self, batch_size=None, batch_pause=None, max_batches=None):
+        config = getattr(settings, 'RETENTION', {})
+        self.batch_size = batch_size or config.get('BATCH_SIZE', 500)
+        self.batch_pause = config.get('BATCH_PAUSE_SECONDS', 0.5) if batch_pause is None else batch_pause
+        self.max_batches = max_batches or config.get('MAX_BATCHES_PER_RUN', 200)
+
+    def expired_scans(self, retention_days, now=None):
+        """
+        Scans past the retention period of users who opted into auto-delete
+
+        Args:
+            retention_days (int): auto_delete_after_days of the user group
+            now (datetime): Reference time (defaults to now)
+
+        Returns:
+            QuerySet: Expired scans, oldest first
+        """
+        cutoff = (now or timezone.now()) - timedelta(days=retention_days)
+        return DocumentScan.objects.filter(
+            scan_date__lt=cutoff,
+            document__user__preferences__auto_delete_processed_files=True,
+            document__user__preferences__auto_delete_after_days=retention_days,
+        ).order_by('scan_date')
+
+    def run(self, dry_run=False):
+        """
+        Delete expired scans and their processed files
+
+        Args:
+            dry_run (bool): Only count what would be deleted
+
+        Returns:
+            dict: Scans deleted, files deleted, bytes reclaimed and timing
+        """
+        start = time.perf_counter()
+        now = timezone.now()
+        report = {'scans_deleted': 0, 'files_deleted': 0, 'bytes_reclaimed': 0, 'batches': 0}
+
+        retention_periods = (
+            UserPreference.objects.filter(auto_delete_processed_files=True)
+            .values_list('auto_delete_after_days', flat=True)
+            .distinct()
+        )
+        for retention_days in retention_periods:
+            expired = self.expired_scans(retention_days, now)
+            if dry_run:
+                report['scans_deleted'] += expired.count()
+                continue
+
+            while report['batches'] < self.max_batches:
+                batch = list(expired.values_list('id', 'processed_file', 'detections')[:self.batch_size])
+                if not batch:
+                    break
+                self._delete_batch(batch, report)
+                report['batches'] += 1
+                if len(batch) < self.batch_size:
+                    break
+                time.sleep(self.batch_pause)
+
+        report['seconds'] = round(time.perf_counter() - start, 3)
+        report['dry_run'] = dry_run
+        if not dry_run:
+            ROWS_DELETED.inc(report['scans_deleted'])
+            BYTES_RECLAIMED.inc(report['bytes_reclaimed'])
+        logger.info(
+            "Retention run: %(scans_deleted)d scans, %(files_deleted)d files, "
+            "%(bytes_reclaimed)d bytes reclaimed in %(seconds)ss", report
+        )
+        return report
+
+    def _delete_batch(self, batch, report):
+        scan_ids = [scan_id for scan_id, _, _ in batch]
+        storage = DocumentScan._meta.get_field('processed_file').storage
+        # Processed files and packed video detections
+        names = {name for _, processed, detections in batch for name in (processed, detections) if name}
+        blob_names = {name for name in names if storage.is_blob(name)}
+        legacy_names = names - blob_names
+
+        # Deleting the rows releases their blob references (documents.signals).
+        # delete() runs in its own transaction; wrapping the lookup of related
+        # rows in it too would make SQLite fail with "database is locked"
+        # when detection workers are writing at the same time
+        DocumentScan.objects.filter(id__in=scan_ids).delete()
+        report['scans_deleted'] += len(scan_ids)
+
+        # Files saved before content-addressed storage can still be shared
+        # (copies of one upload), so only remove those no
+        # remaining document or scan points at
+        still_used = set(
+            DocumentScan.objects.filter(processed_file__in=legacy_names)
+            .values_list('processed_file', flat=True)
+        )
+        still_used.update(
+            Document.objects.filter(file__in=legacy_names)
+            .values_list('file', flat=True)
+        )
+
+        collected = storage.collect(blob_names)
+        report['files_deleted'] += collected['blobs']
+        report['bytes_reclaimed'] += collected['bytes']
+
+        for name in legacy_names - still_used:
+            try:
+                size = storage.size(name)
+                storage.delete(name)
+            except FileNotFoundError:
+                continue
+            report['files_deleted'] += 1
+            report['bytes_reclaimed'] += size
+
+def run_retention():
+    """
+    Entry point for the periodic background task
+    """
+    return RetentionEngine().run()
@@ -0,0 +1,361 @@
+"""
+Full-text search over documents and what was detected in them
+
+Documents are indexed in an SQLite FTS5 table with one row per document,
+keyed by the document id. Each row holds the title, the types found by the
+latest scan (codes and readable names, so "passport" and "credit card" both
+match), and facet tokens for the file type and the latest risk level.
+
+Every indexed word is prefixed with its owner, so "Passport" in a document
+of user 12 is stored as ``u12xpassport``. Searches only ever touch their own
+user's entries: a query for a common word costs as much as that user's
+matches, not everyone's, and facet counts are counts over the index alone.
+
+The index is created after migrate and kept in sync by the signals in
+``documents.signals``; code that writes rows without signals (bulk inserts
+and updates) calls index_documents() itself. ``rebuild_search_index``
+rebuilds it from scratch. On other databases, or with SEARCH['ENABLED'] off,
+the document list falls back to a title substring match.
+"""
+
+import functools
+import re
+import sqlite3
+import time
+import unicodedata
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models.expressions import RawSQL
+from rest_framework import filters, status
+from rest_framework.exceptions import APIException
+
+from core.metrics import registry
+from .models import Document, DocumentScan, SensitiveInformation
+
+
+SEARCH_SECONDS = registry.histogram(
+    'document_search_seconds',
+    'Time to run a full-text document search, facets included'
+)
+
+INDEX_TABLE = 'documents_search'
+
+# Risk facet of documents that have no scan yet
+UNSCANNED = 'unscanned'
+RISK_FACETS = [level for level, _label in DocumentScan.RISK_LEVEL_CHOICES] + [UNSCANNED]
+TYPE_FACETS = [file_type for file_type, _label in Document.TYPE_CHOICES]
+
+# Letters and digits; FTS5's tokenizer splits on underscores as well
+WORD_RE = re.compile(r'[^\W_]+')
+
+
+class SearchUnavailable(APIException):
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = "Full-text search is not available on this database."
+    default_code = 'search_unavailable'
+
+
+def search_settings():
+    config = getattr(settings, 'SEARCH', {})
+    return {
+        'ENABLED': config.get('ENABLED', True),
+        'MAX_TERMS': config.get('MAX_TERMS', 16),
+        'PREFIX_LAST_TERM': config.get('PREFIX_LAST_TERM', True),
+        'DEFAULT_LIMIT': config.get('DEFAULT_LIMIT', 50),
+        'MAX_LIMIT': config.get('MAX_LIMIT', 200),
+    }
+
+
+@functools.lru_cache(maxsize=None)
+def _fts5_compiled():
+    try:
+        sqlite3.connect(':memory:').execute('CREATE VIRTUAL TABLE probe USING fts5(text)')
+    except sqlite3.OperationalError:
+        return False
+    return True
+
+
+def search_available():
+    """
+    Whether searches can use the full-text index
+    """
+    return search_settings()['ENABLED'] and connection.vendor == 'sqlite' and _fts5_compiled()
+
+
+def create_index():
+    """
+    Create the FTS5 table if it does not exist yet
+
+    Returns:
+        bool: True if the table was created by this call
+    """
+    with connection.cursor() as cursor:
+        if INDEX_TABLE in connection.introspection.table_names(cursor):
+            return False
+        cursor.execute(
+            f"CREATE VIRTUAL TABLE {INDEX_TABLE} USING fts5("
+            "title, content, tags, tokenize='porter unicode61 remove_diacritics 2')"
+        )
+    return True
+
+
+def words(text):
+    return WORD_RE.findall(unicodedata.normalize('NFKC', text or '').lower())
+
+
+def scoped(user_id, values):
+    """
+    Owner-prefixed index tokens of ``values``
+    """
+    return ' '.join(f'u{user_id}x{value}' for value in values)
+
+
+def _source_sql(where):
+    """
+    Query of (id, user_id, title, file_type, risk_level, detected types)
+    per document, risk and types taken from its latest scan
+    """
+    documents = Document._meta.db_table
+    scans = DocumentScan._meta.db_table
+    items = SensitiveInformation._meta.db_table
+    return f"""
+        SELECT
+            document.id,
+            document.user_id,
+            document.title,
+            document.file_type,
+            COALESCE(scan.risk_level, '{UNSCANNED}'),
+            (SELECT group_concat(DISTINCT item.type) FROM {items} item WHERE item.scan_id = scan.id)
+        FROM {documents} document
+        LEFT JOIN {scans} scan ON scan.id = (
+            SELECT latest.id FROM {scans} latest
+            WHERE latest.document_id = document.id
+            ORDER BY latest.scan_date DESC, latest.id DESC
+            LIMIT 1
+        )
+        {where}
+    """
+
+
+@functools.lru_cache(maxsize=None)
+def _type_words():
+    return {
+        code: words(f'{code} {label}') for code, label in SensitiveInformation.TYPE_CHOICES
+    }
+
+
+def index_row(document_id, user_id, title, file_type, risk_level, types):
+    """
+    Index row of a document, from a row of the source query
+    """
+    type_words = _type_words()
+    content = []
+    for code in (types or '').split(','):
+        if code:
+            content.extend(type_words.get(code) or words(code))
+    return (
+        document_id,
+        scoped(user_id, words(title)),
+        scoped(user_id, content),
+        scoped(user_id, ['owner', file_type, risk_level]),
+    )
+
+
+INSERT_SQL = f"INSERT INTO {INDEX_TABLE} (rowid, title, content, tags) VALUES (%s, %s, %s, %s)"
+
+
+def _write_rows(cursor, where='', params=None, batch_size=2000):
+    insert = INSERT_SQL
+    indexed = 0
+    with connection.cursor() as source:
+        source.execute(_source_sql(where), params)
+        while True:
+            rows = source.fetchmany(batch_size)
+            if not rows:
+                return indexed
+            cursor.executemany(insert, [index_row(*row) for row in rows])
+            indexed += len(rows)
+
+
+def index_documents(document_ids=None, chunk_size=500):
+    """
+    Rewrite the index rows of the given documents from the database
+
+    Documents that no longer exist lose their row. Without ids the whole
+    index is rebuilt.
+
+    Args:
+        document_ids (iterable): Ids of the documents to re-index
+        chunk_size (int): Ids per statement
+
+    Returns:
+        int: Number of documents indexed
+    """
+    if not search_available():
+        return 0
+
+    indexed = 0
+    with transaction.atomic(), connection.cursor() as cursor:
+        if document_ids is None:
+            cursor.execute(f"DELETE FROM {INDEX_TABLE}")
+            return _write_rows(cursor)
+
+        document_ids = sorted(set(document_ids))
+        for start in range(0, len(document_ids), chunk_size):
+            chunk = document_ids[start:start + chunk_size]
+            placeholders = ', '.join(['%s'] * len(chunk))
+            cursor.execute(f"DELETE FROM {INDEX_TABLE} WHERE rowid IN ({placeholders})", chunk)
+            indexed += _write_rows(cursor, f"WHERE document.id IN ({placeholders})", chunk)
+    return indexed
+
+
+def index_new_documents(rows):
+    """
+    Index documents that have no index row yet, from rows built in memory
+
+    For bulk loaders that already hold what the source query would read,
+    which spares reading it back.
+
+    Args:
+        rows (iterable): (id, user_id, title, file_type, risk_level, types)
+            tuples like the source query's, with UNSCANNED for documents
+            without scans and the types comma separated
+
+    Returns:
+        int: Number of documents indexed
+    """
+    if not search_available():
+        return 0
+    index_rows = [index_row(*row) for row in rows]
+    with connection.cursor() as cursor:
+        cursor.executemany(INSERT_SQL, index_rows)
+    return len(index_rows)
+
+
+def schedule_index(document_id):
+    """
+    Re-index a document once the current transaction commits
+    """
+    transaction.on_commit(lambda: index_documents([document_id]))
+
+
+def match_expression(text, user_id, file_type=None, risk_level=None):
+    """
+    Build an FTS5 MATCH expression from free text and facet filters
+
+    Words are matched in the title and detected types, all of them required;
+    the last word also matches as a prefix. Only letters and digits of the
+    text are used, so user input can never form FTS5 syntax.
+
+    Args:
+        text (str): Search text
+        user_id (int): Owner the results are restricted to
+        file_type (str): Only documents of this type
+        risk_level (str): Only documents whose latest scan has this risk level
+
+    Returns:
+        str: MATCH expression
+    """
+    config = search_settings()
+    terms = [f'"u{user_id}x{term}"' for term in words(text)[:config['MAX_TERMS']]]
+    if terms and config['PREFIX_LAST_TERM']:
+        terms[-1] += '*'
+
+    tags = [value for value in (file_type, risk_level) if value]
+    if not terms:
+        # Every document of the user carries the owner tag
+        tags = tags or ['owner']
+        return 'tags : ({})'.format(scoped(user_id, tags).replace(' ', ' AND '))
+
+    expression = '{{title content}} : ({})'.format(' '.join(terms))
+    if tags:
+        expression += ' AND tags : ({})'.format(scoped(user_id, tags).replace(' ', ' AND '))
+    return expression
+
+
+def count_matches(cursor, expression):
+    cursor.execute(f"SELECT count(*) FROM {INDEX_TABLE} WHERE {INDEX_TABLE} MATCH %s", [expression])
+    return cursor.fetchone()[0]
+
+
+def search_documents(user, text='', file_type=None, risk_level=None, ordering='newest',
+                     limit=None, offset=0):
+    """
+    Search a user's documents and count the matches per facet
+
+    Facet counts follow the usual convention: type counts apply the risk
+    filter but not the type filter, and risk counts the other way round,
+    so each count says how many results picking that value would give.
+
+    Args:
+        user (User): Owner of the documents
+        text (str): Search text; empty to list by facets only
+        file_type (str): Type facet filter
+        risk_level (str): Risk facet filter
+        ordering (str): 'newest' (most recently uploaded first) or
+            'relevance' (BM25, title matches weighted over detected types)
+        limit (int): Maximum ids to return
+        offset (int): Ids to skip
+
+    Returns:
+        dict: Matching ``ids`` in order, the total ``count`` and ``facets``
+            counts per type and risk level
+    """
+    if not search_available():
+        raise SearchUnavailable()
+    limit = limit or search_settings()['DEFAULT_LIMIT']
+    start = time.perf_counter()
+
+    if ordering == 'relevance' and words(text):
+        order = f"bm25({INDEX_TABLE}, 4.0, 1.0, 0.0), rowid DESC"
+    else:
+        # Ids grow with uploads, and FTS5 walks rowids in order without sorting
+        order = "rowid DESC"
+
+    with connection.cursor() as cursor:
+        facets = {
+            'file_type': {
+                value: count_matches(cursor, match_expression(text, user.pk, value, risk_level))
+                for value in TYPE_FACETS
+            },
+            'risk_level': {
+                value: count_matches(cursor, match_expression(text, user.pk, file_type, value))
+                for value in RISK_FACETS
+            },
+        }
+        if file_type:
+            count = facets['file_type'][file_type]
+        else:
+            count = sum(facets['file_type'].values())
+
+        ids = []
+        if count > offset:
+            cursor.execute(
+                f"SELECT rowid FROM {INDEX_TABLE} WHERE {INDEX_TABLE} MATCH %s "
+                f"ORDER BY {order} LIMIT %s OFFSET %s",
+                [match_expression(text, user.pk, file_type, risk_level), limit, offset]
+            )
+            ids = [row[0] for row in cursor.fetchall()]
+
+    SEARCH_SECONDS.observe(time.perf_counter() - start)
+    return {'ids': ids, 'count': count, 'facets': facets}
+
+
+class FullTextSearchFilter(filters.SearchFilter):
+    """
+    SearchFilter that matches ``?search=`` against the full-text index
+
+    Falls back to SearchFilter's substring match over ``search_fields``
+    when the index is not available.
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        terms = self.get_search_terms(request)
+        if not terms or not search_available():
+            return super().filter_queryset(request, queryset, view)
+        matches = RawSQL(
+            f"SELECT rowid FROM {INDEX_TABLE} WHERE {INDEX_TABLE} MATCH %s",
+            [match_expression(' '.join(terms), request.user.pk)]
+        )
+        return queryset.filter(pk__in=matches)
@@ -1,5 +1,7 @@
 from rest_framework import serializers
+from .detections import TYPE_CODES, packed_settings
 from .models import Document, DocumentScan, SensitiveInformation
+from .search import RISK_FACETS, TYPE_FACETS, search_settings
 
 
 class SensitiveInformationSerializer(serializers.ModelSerializer):
@@ -17,7 +19,8 @@ class SensitiveInformationSerializer(serializers.ModelSerializer):
             'confidence', 
             'location', 
             'count', 
-            'redacted'
+            'redacted',
+            'detected_by'
         ]
 
 
@@ -35,12 +38,14 @@ class DocumentScanSerializer(serializers.ModelSerializer):
             'document', 
             'risk_level', 
             'risk_level_display', 
+            'risk_score',
             'processed_file', 
             'processing_time',
             'scan_date', 
+            'detection_count',
             'sensitive_information'
         ]
-        read_only_fields = ['document', 'scan_date']
+        read_only_fields = ['document', 'risk_score', 'scan_date', 'detection_count']
 
 
 class DocumentSerializer(serializers.ModelSerializer):
@@ -78,4 +83,47 @@ class DocumentWithScansSerializer(DocumentSerializer):
     scans = DocumentScanSerializer(many=True, read_only=True)
     
     class Meta(DocumentSerializer.Meta):
-        fields = DocumentSerializer.Meta.fields + ['scans'] 
\ No newline at end of file
+        fields = DocumentSerializer.Meta.fields + ['scans'] 
+
+
+class DocumentSearchSerializer(serializers.Serializer):
+    """
+    Query parameters of the document search endpoint
+    """
+    q = serializers.CharField(required=False, allow_blank=True, default='')
+    file_type = serializers.ChoiceField(choices=TYPE_FACETS, required=False)
+    risk_level = serializers.ChoiceField(choices=RISK_FACETS, required=False)
+    ordering = serializers.ChoiceField(choices=['newest', 'relevance'], required=False, default='newest')
+    limit = serializers.IntegerField(min_value=1, required=False)
+    offset = serializers.IntegerField(min_value=0, required=False, default=0)
+    
+    def validate_limit(self, value):
+        return min(value, search_settings()['MAX_LIMIT'])
+
+
+class DocumentExportSerializer(serializers.Serializer):
+    """
+    Query parameters of the history export endpoint
+    """
+    output = serializers.ChoiceField(choices=['ndjson', 'csv'], required=False, default='ndjson')
+    gzip = serializers.BooleanField(required=False, default=False)
+    user = serializers.IntegerField(required=False, help_text="Staff only: export another user's history")
+
+
+class DetectionRangeSerializer(serializers.Serializer):
+    """
+    Query parameters of the packed detections endpoint
+    """
+    start_frame = serializers.IntegerField(min_value=0, required=False)
+    end_frame = serializers.IntegerField(min_value=0, required=False)
+    type = serializers.ChoiceField(choices=TYPE_CODES, required=False)
+    limit = serializers.IntegerField(min_value=1, required=False)
+    offset = serializers.IntegerField(min_value=0, required=False, default=0)
+    
+    def validate_limit(self, value):
+        return min(value, packed_settings()['MAX_LIMIT'])
+    
+    def validate(self, data):
+        if data.get('end_frame') is not None and data.get('start_frame', 0) > data['end_frame']:
+            raise serializers.ValidationError("start_frame must not be after end_frame")
+        return data
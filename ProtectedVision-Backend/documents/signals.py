@@ -0,0 +1,58 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+
+from core.cache import invalidate
+from .models import Document, DocumentScan
+from .search import create_index, index_documents, schedule_index
+from .storage import ContentAddressedStorage
+
+
+def release_stored_files(sender, instance, **kwargs):
+    """
+    Release the blob references held by a deleted row's file fields
+    """
+    for field in sender._meta.get_fields():
+        storage = getattr(field, 'storage', None)
+        if isinstance(storage, ContentAddressedStorage):
+            storage.release(getattr(instance, field.attname).name)
+
+
+def invalidate_document_cache(sender, instance, **kwargs):
+    """
+    Drop cached detail responses of the document a row belongs to
+
+    Runs on commit, so no request can cache the old rows under the new version.
+    Sensitive items are only written together with their scan's document,
+    whose save covers them.
+    """
+    document_id = instance.pk if sender is Document else instance.document_id
+    transaction.on_commit(lambda: invalidate(f'document:{document_id}'))
+
+
+def update_search_index(sender, instance, **kwargs):
+    """
+    Re-index the document a row belongs to once the transaction commits
+
+    As with the cache, the document save that follows writing a scan's
+    sensitive items covers those items.
+    """
+    schedule_index(instance.pk if sender is Document else instance.document_id)
+
+
+def ensure_search_index(sender, using, verbosity=1, **kwargs):
+    """
+    Create the full-text index after migrate, filling it from existing rows
+    """
+    if create_index():
+        indexed = index_documents()
+        if verbosity >= 2:
+            print(f"  Created the document search index ({indexed} documents)")
+
+
+def connect_signals():
+    for model in (Document, DocumentScan):
+        post_delete.connect(release_stored_files, sender=model, dispatch_uid=f'release_stored_files_{model.__name__}')
+        post_save.connect(invalidate_document_cache, sender=model, dispatch_uid=f'invalidate_cache_save_{model.__name__}')
+        post_delete.connect(invalidate_document_cache, sender=model, dispatch_uid=f'invalidate_cache_delete_{model.__name__}')
+        post_save.connect(update_search_index, sender=model, dispatch_uid=f'search_index_save_{model.__name__}')
+        post_delete.connect(update_search_index, sender=model, dispatch_uid=f'search_index_delete_{model.__name__}')
@@ -0,0 +1,181 @@
+import hashlib
+import os
+import tempfile
+from datetime import timedelta
+
+from django.apps import apps
+from django.core.files.storage import FileSystemStorage
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, FileField
+from django.utils import timezone
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """
+    File storage that keeps one copy of every distinct file
+
+    Saved files are named after the SHA-256 of their content
+    (``blobs/ab/cd/<digest>.<ext>``) and tracked in StoredBlob with a
+    reference count. Saving content that already exists only costs hashing
+    it and bumping the count, and deleting a file releases one reference.
+    Blobs that are no longer referenced are removed by collect().
+
+    Files saved before this storage was introduced keep their old names and
+    are deleted directly, as with FileSystemStorage.
+    """
+    prefix = 'blobs'
+
+    @property
+    def blobs(self):
+        return apps.get_model('documents', 'StoredBlob').objects
+
+    def is_blob(self, name):
+        return bool(name) and name.startswith(self.prefix + '/')
+
+    def blob_name(self, digest, name):
+        """
+        Storage name of the blob for a digest, keeping the original extension
+        """
+        extension = os.path.splitext(name)[1].lower()[:10]
+        return f'{self.prefix}/{digest[:2]}/{digest[2:4]}/{digest}{extension}'
+
+    def get_available_name(self, name, max_length=None):
+        # The real name is derived from the content in _save, so there is
+        # nothing to de-duplicate against here
+        return name
+
+    def _save(self, name, content):
+        sha = hashlib.sha256()
+        size = 0
+        for chunk in content.chunks():
+            sha.update(chunk)
+            size += len(chunk)
+        blob_name = self.blob_name(sha.hexdigest(), name)
+
+        # Holding the row while writing keeps collect() from removing the
+        # file between the reference check and the write
+        with transaction.atomic():
+            while not self._reference(blob_name):
+                try:
+                    with transaction.atomic():
+                        self.blobs.create(name=blob_name, size=size, references=1)
+                except IntegrityError:
+                    # A concurrent save of the same content created the row
+                    # after our update; take a reference to it instead
+                    continue
+                if not self.exists(blob_name):
+                    self._write_blob(blob_name, content)
+                break
+        return blob_name
+
+    def _reference(self, name):
+        """
+        Add one reference to an existing blob; False if it has no row yet
+        """
+        return bool(self.blobs.filter(name=name).update(
+            references=F('references') + 1, updated_at=timezone.now()
+        ))
+
+    def _write_blob(self, name, content):
+        path = self.path(name)
+        directory = os.path.dirname(path)
+        os.makedirs(directory, exist_ok=True)
+        # Write under a temporary name first so a crash never leaves a
+        # truncated file behind the final name
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.upload-')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                for chunk in content.chunks():
+                    f.write(chunk)
+            if self.file_permissions_mode is not None:
+                os.chmod(tmp_path, self.file_permissions_mode)
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def release(self, name):
+        """
+        Drop one reference to a blob; the file stays until collect() runs
+        """
+        if self.is_blob(name):
+            self.blobs.filter(name=name).update(
+                references=F('references') - 1, updated_at=timezone.now()
+            )
+
+    def delete(self, name):
+        if self.is_blob(name):
+            self.release(name)
+        else:
+            super().delete(name)
+
+    def collect(self, names=None, grace_seconds=0):
+        """
+        Delete blobs that are no longer referenced
+
+        Args:
+            names (iterable): Only consider these blob names
+            grace_seconds (int): Skip blobs released more recently than this
+
+        Returns:
+            dict: Number of blobs and bytes deleted
+        """
+        candidates = self.blobs.filter(references__lte=0)
+        if names is not None:
+            candidates = candidates.filter(name__in=[name for name in names if self.is_blob(name)])
+        if grace_seconds:
+            candidates = candidates.filter(updated_at__lt=timezone.now() - timedelta(seconds=grace_seconds))
+
+        report = {'blobs': 0, 'bytes': 0}
+        for pk, name, size in candidates.values_list('pk', 'name', 'size').iterator():
+            with transaction.atomic():
+                # Re-check under the write lock in case the blob was saved again
+                deleted, _ = self.blobs.filter(pk=pk, references__lte=0).delete()
+                if not deleted:
+                    continue
+                try:
+                    os.remove(self.path(name))
+                except FileNotFoundError:
+                    pass
+            report['blobs'] += 1
+            report['bytes'] += size
+        return report
+
+    def recount(self, batch_size=1000):
+        """
+        Rebuild reference counts from the file fields that use this storage
+
+        Counts drift when rows are removed without signals (raw SQL,
+        queryset.update), so run this before collect() after such changes.
+
+        Returns:
+            int: Number of blobs whose count was corrected
+        """
+        counts = {}
+        for model in apps.get_models():
+            for field in model._meta.concrete_fields:
+                if not isinstance(field, FileField) or field.storage is not self:
+                    continue
+                rows = (
+                    model._base_manager.filter(**{f'{field.attname}__startswith': self.prefix + '/'})
+                    .values_list(field.attname)
+                    .annotate(total=Count('pk'))
+                    .order_by()
+                )
+                for name, total in rows:
+                    counts[name] = counts.get(name, 0) + total
+
+        changed = []
+        for blob in self.blobs.only('pk', 'name', 'references').iterator():
+            references = counts.get(blob.name, 0)
+            if blob.references != references:
+                blob.references = references
+                blob.updated_at = timezone.now()
+                changed.append(blob)
+        for start in range(0, len(changed), batch_size):
+            self.blobs.bulk_update(changed[start:start + batch_size], ['references', 'updated_at'])
+        return len(changed)
+
+
+blob_storage = ContentAddressedStorage()
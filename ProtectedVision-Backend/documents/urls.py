@@ -3,9 +3,11 @@ from rest_framework.routers import DefaultRouter
 from .views import DocumentViewSet, DocumentScanViewSet
 
 # Setup the router
+# 'scans' must be registered first, otherwise the document detail route
+# matches it as a document id
 router = DefaultRouter()
-router.register(r'', DocumentViewSet, basename='document')
 router.register(r'scans', DocumentScanViewSet, basename='document-scan')
+router.register(r'', DocumentViewSet, basename='document')
 
 urlpatterns = [
     path('', include(router.urls)),
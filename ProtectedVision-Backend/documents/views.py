@@ -1,12 +1,22 @@
 from rest_framework import viewsets, mixins, permissions, status, filters
 from rest_framework.decorators import action
+from rest_framework.exceptions import NotFound, PermissionDenied
 from rest_framework.response import Response
+from django.contrib.auth import get_user_model
+from django.shortcuts import get_object_or_404
 from django_filters.rest_framework import DjangoFilterBackend
+from core.cache import cached_response
+from .detections import TYPE_INDEX, decode, frame_range, load, packed_settings
+from .export import export_response
 from .models import Document, DocumentScan
+from .search import FullTextSearchFilter, search_documents
 from .serializers import (
     DocumentSerializer,
     DocumentWithScansSerializer,
-    DocumentScanSerializer
+    DocumentScanSerializer,
+    DocumentSearchSerializer,
+    DocumentExportSerializer,
+    DetectionRangeSerializer
 )
 
 
@@ -16,7 +26,7 @@ class DocumentViewSet(viewsets.ModelViewSet):
     """
     serializer_class = DocumentSerializer
     permission_classes = [permissions.IsAuthenticated]
-    filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
+    filter_backends = [DjangoFilterBackend, FullTextSearchFilter, filters.OrderingFilter]
     filterset_fields = ['file_type', 'processed']
     search_fields = ['title']
     ordering_fields = ['created_at', 'updated_at', 'title']
@@ -36,6 +46,69 @@ class DocumentViewSet(viewsets.ModelViewSet):
             return DocumentWithScansSerializer
         return self.serializer_class
     
+    @cached_response(lambda view, request, *args, **kwargs: [f"document:{kwargs['pk']}"])
+    def retrieve(self, request, *args, **kwargs):
+        """
+        Return a document with its scans, cached until either changes
+        """
+        return super().retrieve(request, *args, **kwargs)
+    
+    @action(detail=False, methods=['get'])
+    def search(self, request):
+        """
+        Full-text search over titles and detected types, with facet counts
+        
+        Query parameters: q (search text), file_type and risk_level (facet
+        filters), ordering ('newest' or 'relevance'), limit and offset.
+        """
+        params = DocumentSearchSerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        query = params.validated_data
+        result = search_documents(
+            request.user,
+            text=query['q'],
+            file_type=query.get('file_type'),
+            risk_level=query.get('risk_level'),
+            ordering=query['ordering'],
+            limit=query.get('limit'),
+            offset=query['offset']
+        )
+        
+        # The index can briefly lag behind deletes, so look documents up by owner too
+        documents = self.get_queryset().in_bulk(result['ids'])
+        serializer = DocumentSerializer(
+            [documents[pk] for pk in result['ids'] if pk in documents],
+            many=True,
+            context={'request': request}
+        )
+        return Response({
+            'count': result['count'],
+            'facets': result['facets'],
+            'results': serializer.data,
+        })
+    
+    @action(detail=False, methods=['get'])
+    def export(self, request):
+        """
+        Stream the full detection history as NDJSON or CSV
+        
+        Query parameters: output ('ndjson' or 'csv'), gzip (compress the
+        download) and, for staff, user (whose history to export). The query
+        parameter is not called ``format``, which DRF reserves for choosing
+        a renderer.
+        """
+        params = DocumentExportSerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        query = params.validated_data
+        
+        user = request.user
+        if query.get('user') is not None and query['user'] != user.pk:
+            if not user.is_staff:
+                raise PermissionDenied("Only staff can export another user's history.")
+            user = get_object_or_404(get_user_model(), pk=query['user'])
+        
+        return export_response(request, user, query['output'], query['gzip'])
+    
     @action(detail=True, methods=['get'])
     def scans(self, request, pk=None):
         """
@@ -64,4 +137,35 @@ class DocumentScanViewSet(mixins.RetrieveModelMixin,
         """
         Filter scans to return only those related to the current user's documents
         """
-        return DocumentScan.objects.filter(document__user=self.request.user) 
\ No newline at end of file
+        return DocumentScan.objects.filter(document__user=self.request.user)
+    
+    @action(detail=True, methods=['get'])
+    def detections(self, request, pk=None):
+        """
+        Return a range of a video scan's packed frame detections
+        
+        Query parameters: start_frame and end_frame (inclusive bounds),
+        type, limit and offset. Only the requested frames are read from the
+        packed file.
+        """
+        scan = self.get_object()
+        params = DetectionRangeSerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        query = params.validated_data
+        
+        records = load(scan)
+        if records is None:
+            raise NotFound("This scan has no packed frame detections.")
+        
+        records = frame_range(records, query.get('start_frame'), query.get('end_frame'))
+        if query.get('type'):
+            records = records[records['type'] == TYPE_INDEX[query['type']]]
+        offset = query['offset']
+        limit = query.get('limit') or packed_settings()['DEFAULT_LIMIT']
+        
+        return Response({
+            'scan': scan.id,
+            'total': scan.detection_count,
+            'count': len(records),
+            'detections': decode(records[offset:offset + limit]),
+        })
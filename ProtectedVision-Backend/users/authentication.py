@@ -0,0 +1,186 @@
+"""
+JWT authentication without a database round trip per request
+
+The token's signature and expiry are checked as usual. The user row it names
+comes from a small in-process cache with a short TTL, and revoked tokens are
+checked against an in-memory set of blacklisted token ids, refreshed from
+the blacklist table every REVOCATION_REFRESH_SECONDS.
+"""
+
+import copy
+import threading
+import time
+from collections import OrderedDict
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+from rest_framework_simplejwt.utils import datetime_from_epoch
+
+from core.metrics import registry
+
+
+USER_CACHE_REQUESTS = registry.counter(
+    'auth_user_cache_requests_total',
+    'Authenticated requests by whether the user came from the in-process cache',
+    ['outcome']
+)
+
+
+def auth_cache_settings():
+    config = getattr(settings, 'JWT_AUTH_CACHE', {})
+    return {
+        'USER_TTL_SECONDS': config.get('USER_TTL_SECONDS', 60),
+        'MAX_USERS': config.get('MAX_USERS', 10000),
+        'REVOCATION_REFRESH_SECONDS': config.get('REVOCATION_REFRESH_SECONDS', 30),
+        'REVOCATION_OVERLAP_SECONDS': config.get('REVOCATION_OVERLAP_SECONDS', 300),
+    }
+
+
+class UserCache:
+    """
+    Bounded LRU of user rows that expire after a TTL
+
+    Callers get a shallow copy, so one request modifying its user cannot
+    leak into another. Saving or deleting a user evicts it in this process;
+    other processes see the change once their entry expires.
+    """
+
+    def __init__(self, ttl, max_users):
+        self.ttl = ttl
+        self.max_users = max_users
+        self._lock = threading.Lock()
+        self._users = OrderedDict()
+
+    def get(self, user_id):
+        with self._lock:
+            entry = self._users.get(user_id)
+            if entry is None:
+                return None
+            user, expires = entry
+            if expires <= time.monotonic():
+                del self._users[user_id]
+                return None
+            self._users.move_to_end(user_id)
+        return copy.copy(user)
+
+    def put(self, user):
+        with self._lock:
+            self._users[user.pk] = (copy.copy(user), time.monotonic() + self.ttl)
+            self._users.move_to_end(user.pk)
+            while len(self._users) > self.max_users:
+                self._users.popitem(last=False)
+
+    def evict(self, user_id):
+        with self._lock:
+            self._users.pop(user_id, None)
+
+
+class RevocationList:
+    """
+    In-memory set of blacklisted token ids
+
+    The set is refreshed lazily: the first check after REVOCATION_REFRESH_SECONDS
+    reads the blacklist rows stamped since the last refresh, and entries drop
+    out once their token has expired anyway. Tokens revoked by this process
+    are added immediately.
+
+    A row is stamped when it is created, which can be well before its
+    transaction commits, and by another process's clock. Each refresh
+    therefore reads back REVOCATION_OVERLAP_SECONDS before the previous one
+    started, so rows committed late are still picked up.
+    """
+
+    def __init__(self, refresh_seconds, overlap_seconds):
+        self.refresh_seconds = refresh_seconds
+        self.overlap = timedelta(seconds=overlap_seconds)
+        self._lock = threading.Lock()
+        self._expiry_by_jti = {}
+        self._since = None
+        self._next_refresh = 0.0
+
+    def is_revoked(self, jti):
+        if time.monotonic() >= self._next_refresh:
+            self.refresh()
+        return jti in self._expiry_by_jti
+
+    def add(self, jti, expires_at):
+        with self._lock:
+            self._expiry_by_jti[jti] = expires_at
+
+    def refresh(self):
+        with self._lock:
+            # Another thread may have refreshed while this one waited
+            if time.monotonic() < self._next_refresh:
+                return
+            now = timezone.now()
+            rows = BlacklistedToken.objects.filter(token__expires_at__gt=now)
+            if self._since is not None:
+                rows = rows.filter(blacklisted_at__gte=self._since)
+            for jti, expires_at in rows.values_list('token__jti', 'token__expires_at'):
+                self._expiry_by_jti[jti] = expires_at
+            self._since = now - self.overlap
+            self._expiry_by_jti = {
+                jti: expires_at for jti, expires_at in self._expiry_by_jti.items() if expires_at > now
+            }
+            self._next_refresh = time.monotonic() + self.refresh_seconds
+
+
+_config = auth_cache_settings()
+user_cache = UserCache(_config['USER_TTL_SECONDS'], _config['MAX_USERS'])
+revocations = RevocationList(_config['REVOCATION_REFRESH_SECONDS'], _config['REVOCATION_OVERLAP_SECONDS'])
+
+
+def revoke_token(token, user=None):
+    """
+    Blacklist a validated access or refresh token
+
+    Access tokens are recorded as outstanding tokens first, as the blacklist
+    only references those.
+
+    Args:
+        token (Token): Validated token to revoke
+        user (User): Owner of the token
+    """
+    jti = token[api_settings.JTI_CLAIM]
+    expires_at = datetime_from_epoch(token['exp'])
+    outstanding, _created = OutstandingToken.objects.get_or_create(
+        jti=jti,
+        defaults={'token': str(token), 'expires_at': expires_at, 'user': user}
+    )
+    BlacklistedToken.objects.get_or_create(token=outstanding)
+    revocations.add(jti, expires_at)
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """
+    JWTAuthentication that resolves users from the in-process cache and
+    rejects blacklisted access tokens
+    """
+
+    def get_validated_token(self, raw_token):
+        token = super().get_validated_token(raw_token)
+        if revocations.is_revoked(token.get(api_settings.JTI_CLAIM)):
+            raise InvalidToken(_("Token is blacklisted"))
+        return token
+
+    def get_user(self, validated_token):
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken(_("Token contained no recognizable user identification"))
+
+        user = user_cache.get(user_id)
+        if user is not None:
+            USER_CACHE_REQUESTS.inc(outcome='hit')
+            return user
+
+        USER_CACHE_REQUESTS.inc(outcome='miss')
+        user = super().get_user(validated_token)
+        user_cache.put(user)
+        return user
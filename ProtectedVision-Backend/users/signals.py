@@ -0,0 +1,29 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+
+from core.cache import invalidate
+from .authentication import user_cache
+from .models import User, UserPreference
+
+
+def invalidate_user_cache(sender, instance, **kwargs):
+    """
+    Drop cached profile and preference responses once the change is committed
+
+    Saving the user itself also evicts it from this process's authentication
+    cache, so a deactivated user is refused on the next request.
+    """
+    user_id = instance.pk if sender is User else instance.user_id
+
+    def on_commit():
+        invalidate(f'user:{user_id}')
+        if sender is User:
+            user_cache.evict(user_id)
+
+    transaction.on_commit(on_commit)
+
+
+def connect_signals():
+    for model in (User, UserPreference):
+        post_save.connect(invalidate_user_cache, sender=model, dispatch_uid=f'invalidate_cache_save_{model.__name__}')
+        post_delete.connect(invalidate_user_cache, sender=model, dispatch_uid=f'invalidate_cache_delete_{model.__name__}')
@@ -1,8 +1,13 @@
 from rest_framework import generics, status, permissions
 from rest_framework.response import Response
 from rest_framework.views import APIView
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import RefreshToken
 from rest_framework_simplejwt.views import TokenObtainPairView
 from django.contrib.auth import get_user_model
+from core.cache import cached_response
+from .authentication import revoke_token
 from .models import UserPreference
 from .serializers import (
     CustomTokenObtainPairSerializer,
@@ -40,6 +45,37 @@ class UserProfileView(generics.RetrieveUpdateAPIView):
     
     def get_object(self):
         return self.request.user
+    
+    @cached_response(lambda view, request, *args, **kwargs: [f'user:{request.user.pk}'])
+    def retrieve(self, request, *args, **kwargs):
+        return super().retrieve(request, *args, **kwargs)
+
+
+class LogoutView(APIView):
+    """
+    API endpoint for logging out
+    
+    Blacklists the access token used for the request and, if given, the
+    refresh token, so neither can be used again.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+    
+    def post(self, request):
+        raw_refresh = request.data.get('refresh')
+        if raw_refresh:
+            try:
+                refresh = RefreshToken(raw_refresh)
+            except TokenError as e:
+                return Response({'refresh': [str(e)]}, status=status.HTTP_400_BAD_REQUEST)
+            if str(refresh.get(api_settings.USER_ID_CLAIM)) != str(request.user.pk):
+                return Response(
+                    {'refresh': ["Token does not belong to this user"]},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            revoke_token(refresh, request.user)
+        if request.auth is not None:
+            revoke_token(request.auth, request.user)
+        return Response({"detail": "Logged out successfully"}, status=status.HTTP_200_OK)
 
 
 class PasswordChangeView(generics.GenericAPIView):
@@ -75,4 +111,8 @@ class UserPreferenceView(generics.RetrieveUpdateAPIView):
     def get_object(self):
         user = self.request.user
         preference, created = UserPreference.objects.get_or_create(user=user)
-        return preference 
\ No newline at end of file
+        return preference
+    
+    @cached_response(lambda view, request, *args, **kwargs: [f'user:{request.user.pk}'])
+    def retrieve(self, request, *args, **kwargs):
+        return super().retrieve(request, *args, **kwargs) 
\ No newline at end of file